@@ -0,0 +1,138 @@
+import json
+import time
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.token_meter import TokenMeter
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from game_logic.game_controller import GameController
+from game_logic.action_prefetcher import ActionPrefetcher
+
+print("--- Test ActionPrefetcher: Speculative Action Outcomes ---")
+
+SCENE = {
+    "scene_id": "scene_01_start",
+    "narrative": "A crossroads under a grey sky.",
+    "interactive_elements": [
+        {"id": "examine_sign", "name": "Examine the signpost", "type": "examine"},
+        {"id": "go_north", "name": "Walk north", "type": "navigate"},
+        {"id": "go_south", "name": "Walk south", "type": "navigate"},
+        {"id": "talk_hermit", "name": "Talk to the hermit", "type": "dialogue", "target_id": "hermit"},
+    ]
+}
+
+calls = []
+calls_lock = threading.Lock()
+
+def mock_generate(prompt, model_id, expected_response_type):
+    with calls_lock:
+        calls.append((expected_response_type, str(prompt)))
+    time.sleep(0.05) # Simulated backend latency
+    if expected_response_type == 'npc_dialogue_response':
+        return json.dumps({"dialogue_text": "Leave me be.", "new_npc_status": "ending_dialogue", "attitude_towards_player_change": "0"})
+    destination = "scene_north" if "'go_north'" in prompt else "scene_south" if "'go_south'" in prompt else "scene_01_start"
+    return json.dumps({"scene_id": destination, "narrative": f"You arrive at {destination}.", "interactive_elements": SCENE["interactive_elements"]})
+
+def build_controller(prefetcher_kwargs=None, meter=None):
+    ui = UIManager()
+    akm = ApiKeyManager()
+    akm.store_api_key("prefetch-key")
+    llm = LLMInterface(akm, token_meter=meter)
+    llm.generate = mock_generate
+    llm.generate_image = lambda image_prompt: "http://example.com/mock.png"
+    ms = ModelSelector(akm)
+    ms.set_selected_model("gemini-pro-mock")
+    gwhr = GWHR()
+    gwhr.initialize({"world_title": "Prefetch Vale", "main_characters": [{"id": "hermit", "name": "Hermit", "description": "A recluse."}]})
+    gwhr.update_state({'current_scene_data': SCENE})
+    prefetcher = ActionPrefetcher(llm, **(prefetcher_kwargs or {}))
+    gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, action_prefetcher=prefetcher)
+    gc.current_game_state = "AWAITING_PLAYER_ACTION"
+    return gc, prefetcher
+
+# Test 1: Navigate outcomes are pre-generated and the picked one is committed without a new call
+print("\n--- Test 1: Prefetch hit ---")
+calls.clear()
+gc, prefetcher = build_controller({'prefetch_types': ('navigate', 'dialogue'), 'max_prefetch_per_scene': 2})
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+assert prefetcher.get_stats()['submitted'] == 2
+assert set(prefetcher.entries) == {"go_north", "go_south"}, f"Navigate elements should be speculated first: {list(prefetcher.entries)}"
+time.sleep(0.2) # Player reads the scene
+calls_before_pick = len(calls)
+gc.process_player_action("interact_element", "go_north")
+assert len(calls) == calls_before_pick, "Prefetched outcome should have been used instead of a new LLM call"
+assert gc.gwhr.data_store['current_scene_data']['scene_id'] == "scene_north"
+stats = prefetcher.get_stats()
+assert stats['hits'] == 1 and stats['diverged'] == 0, stats
+assert not prefetcher.entries, "Unpicked speculations should be dropped once the player chooses"
+assert gc.prompt_assembler.get_prefix_reuse_report()['scene_description']['calls'] == 1, "Only the committed action prompt should be counted"
+print(f"Stats: {stats}")
+print("Test 1 Passed.")
+
+# Test 2: State changes after the snapshot invalidate the speculation
+print("\n--- Test 2: Divergence ---")
+calls.clear()
+gc, prefetcher = build_controller({'prefetch_types': ('navigate',)})
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+gc.gwhr.data_store['current_scene_data']['narrative'] = "The sky turns red." # Something the action prompt depends on
+gc.process_player_action("interact_element", "go_south")
+stats = prefetcher.get_stats()
+assert stats['diverged'] == 1 and stats['hits'] == 0, stats
+live_prompts = [p for t, p in calls if t == 'scene_description' and 'The sky turns red.' in p]
+assert len(live_prompts) == 1, "A fresh generation against the live state should have been issued"
+assert gc.gwhr.data_store['current_scene_data']['scene_id'] == "scene_south"
+print("Test 2 Passed.")
+
+# Test 3: Dialogue openings can be prefetched too
+print("\n--- Test 3: Dialogue prefetch ---")
+calls.clear()
+gc, prefetcher = build_controller({'prefetch_types': ('dialogue',)})
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+assert list(prefetcher.entries) == ["talk_hermit"]
+gc.process_player_action("interact_element", "talk_hermit")
+dialogue_calls = [c for c in calls if c[0] == 'npc_dialogue_response']
+assert len(dialogue_calls) == 1, f"Expected only the speculative dialogue call, got {len(dialogue_calls)}"
+assert prefetcher.get_stats()['hits'] == 1
+assert gc.gwhr.data_store['npcs']['hermit']['dialogue_log'][-1]['npc'] == "Leave me be."
+print("Test 3 Passed.")
+
+# Test 4: Token budget caps speculation; unused entries are cancelled
+print("\n--- Test 4: Budget and cancellation ---")
+calls.clear()
+gc, prefetcher = build_controller({'prefetch_types': ('navigate',), 'token_budget_per_scene': 10})
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+stats = prefetcher.get_stats()
+assert stats['submitted'] == 0 and stats['skipped_budget'] == 2, stats
+gc, prefetcher = build_controller({'prefetch_types': ('navigate',), 'max_concurrency': 1})
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+prefetcher.cancel_all()
+stats = prefetcher.get_stats()
+assert stats['cancelled'] + stats['discarded'] == 2 and not prefetcher.entries, stats
+assert stats['cancelled'] >= 1, "The queued speculation behind a single worker should be cancelled before it runs"
+print("Test 4 Passed.")
+
+# Test 5: Speculative calls are metered under the player's session, and charged to it only when used
+print("\n--- Test 5: Session tagging and charging ---")
+meter = TokenMeter(per_turn_token_budget=1000)
+gc, prefetcher = build_controller({'prefetch_types': ('navigate',)}, meter=meter)
+del gc.llm_interface.generate # Back to the real (metered) generate with its mock backend
+gc.llm_interface.set_session("player_one")
+gc.prefetch_likely_actions(SCENE["interactive_elements"])
+for entry in list(prefetcher.entries.values()):
+    entry['future'].result(timeout=5)
+sessions = {r['session_id'] for r in meter.records if r['response_type'] == 'scene_description'}
+assert sessions == {"player_one"}, f"Speculative calls should carry the caller's session tag, got {sessions}"
+speculative_tokens = meter.get_speculative_usage("player_one")
+assert speculative_tokens > 0 and meter.get_session_usage("player_one") == 0, "Speculation stays off the live budgets"
+meter.begin_turn("player_one")
+gc.process_player_action("interact_element", "go_north")
+charged = prefetcher.get_stats()['charged_tokens']
+assert prefetcher.get_stats()['hits'] == 1 and 0 < charged < speculative_tokens, (charged, speculative_tokens)
+assert meter.get_session_usage("player_one") == meter.get_turn_usage("player_one") == charged, "Only the used outcome is charged"
+prefetcher.shutdown()
+print("Test 5 Passed.")
+
+print("\n--- Action Prefetcher Tests Complete ---")
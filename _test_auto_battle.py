@@ -0,0 +1,105 @@
+import copy
+import builtins
+from api.api_key_manager import ApiKeyManager
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from api.llm_interface import LLMInterface
+from game_logic.game_controller import GameController
+from game_logic.combat_resolver import CombatResolver, AUTO_BATTLE_STRATEGY, default_battle_policy
+
+print("--- Test Auto-Battle ---")
+
+def make_combat(player_hp=100, npc_hp=(25, 25), npc_attack=8):
+    return {
+        'turn': 1,
+        'player': {'id': 'player', 'name': 'Player', 'current_hp': player_hp, 'max_hp': 100, 'attack_power': 12,
+                   'defense_power': 3, 'evasion_chance': 0.1, 'hit_chance': 0.8},
+        'npcs': [{'id': f'bandit_{i}', 'name': f'Bandit {i}', 'current_hp': hp, 'max_hp': hp, 'attack_power': npc_attack,
+                  'defense_power': 2, 'evasion_chance': 0.05, 'hit_chance': 0.7} for i, hp in enumerate(npc_hp)],
+        'last_turn_player_strategies': [],
+    }
+
+# Test 1: Resolver auto-battle runs to the end on a copy and is deterministic
+print("\n--- Test 1: Resolver auto-battle ---")
+combat = make_combat()
+snapshot = copy.deepcopy(combat)
+result = CombatResolver(seed=21).auto_battle(combat)
+assert combat == snapshot, "auto_battle must not modify the live combat state"
+assert result['stop_reason'] == 'combat_ended' and result['final_state']['victor'] == 'player', result['stop_reason']
+assert [t['turn'] for t in result['turns']] == list(range(1, len(result['turns']) + 1))
+assert all(npc['current_hp'] == 0 for npc in result['final_state']['npcs'])
+hp_lost = -sum(t['player_hp_change'] for t in result['turns'])
+assert result['final_state']['player']['current_hp'] == 100 - hp_lost
+assert CombatResolver(seed=21).auto_battle(make_combat()) == result, "Same seed must replay the same auto-battle"
+assert default_battle_policy(make_combat(npc_hp=(3,))) == 'quick_attack'
+assert default_battle_policy(make_combat(player_hp=40)) == 'standard_attack'
+print("Test 1 Passed.")
+
+# Test 2: Decision points and turn limits hand control back to the player
+print("\n--- Test 2: Decision point ---")
+deadly = make_combat(player_hp=60, npc_hp=(400, 400, 400), npc_attack=20)
+paused = CombatResolver(seed=4).auto_battle(deadly, decision_hp_fraction=0.3)
+assert paused['stop_reason'] == 'decision_point', paused['stop_reason']
+assert 0 < paused['final_state']['player']['current_hp'] < 30
+assert not paused['final_state']['combat_ended']
+already_low = make_combat(player_hp=20, npc_hp=(400,), npc_attack=1)
+capped = CombatResolver(seed=4).auto_battle(already_low, max_turns=5)
+assert capped['stop_reason'] == 'max_turns' and len(capped['turns']) == 5, "Starting below the threshold must not pause immediately"
+print("Test 2 Passed.")
+
+# Test 3: Controller auto-battle: one narration call for the whole fight, HP written back in one batch
+print("\n--- Test 3: Controller auto-battle ---")
+ui = UIManager()
+akm = ApiKeyManager()
+akm.store_api_key("auto-battle-key")
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = GWHR()
+wolf_attrs = {"current_hp": 30, "max_hp": 30, "attack_power": 5, "defense_power": 1, "evasion_chance": 0.05, "hit_chance": 0.6}
+gwhr.initialize({"world_title": "Auto Arena", "initial_scene_id": "den",
+                 "npcs": {f"wolf_{i}": {"id": f"wolf_{i}", "name": f"Wolf {i}", "attributes": copy.deepcopy(wolf_attrs), "status": "hostile"} for i in range(3)}})
+gwhr.update_state({'current_scene_data': {"scene_id": "den", "narrative": "Wolves.", "interactive_elements": []}})
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, combat_resolver=CombatResolver(seed=8))
+
+requested_types = []
+original_generate = llm.generate
+def recording_generate(prompt, model_id, expected_response_type):
+    requested_types.append(expected_response_type)
+    return original_generate(prompt, model_id, expected_response_type)
+llm.generate = recording_generate
+state_updates = []
+original_update_state = gwhr.update_state
+def recording_update_state(updates):
+    state_updates.append(sorted(updates))
+    return original_update_state(updates)
+gwhr.update_state = recording_update_state
+shown_strategies = []
+original_present = ui.present_combat_strategies
+def auto_pick(strategies):
+    shown_strategies.append([s['id'] for s in strategies])
+    return AUTO_BATTLE_STRATEGY['id']
+ui.present_combat_strategies = auto_pick
+original_input = builtins.input
+builtins.input = lambda prompt="": "" # Enter on the results screen
+try:
+    gc.initiate_combat(["wolf_0", "wolf_1", "wolf_2"])
+finally:
+    builtins.input = original_input
+    ui.present_combat_strategies = original_present
+assert AUTO_BATTLE_STRATEGY['id'] in shown_strategies[0]
+assert len(shown_strategies) == 1, "A winnable fight should finish in one auto-battle"
+assert requested_types == ['combat_turn_narration'], requested_types
+assert ['npcs', 'player_state'] in state_updates and all(keys == ['npcs', 'player_state'] for keys in state_updates if 'npcs' in keys)
+npcs = gwhr.get_data_store()['npcs']
+assert all(npcs[f"wolf_{i}"]['status'] == 'defeated' and npcs[f"wolf_{i}"]['attributes']['current_hp'] == 0 for i in range(3))
+auto_events = [e for e in gwhr.get_data_store()['event_log'] if e['type'] == 'combat_auto_battle']
+assert len(auto_events) == 1 and auto_events[0]['payload']['stop_reason'] == 'combat_ended'
+turn_log = auto_events[0]['payload']['turn_log']
+assert len(turn_log) >= 3 and turn_log[0].startswith("T1 ")
+assert gc.current_game_state == "AWAITING_PLAYER_ACTION"
+print("Test 3 Passed.")
+
+print("\n--- Auto-Battle Tests Completed ---")
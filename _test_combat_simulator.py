@@ -0,0 +1,104 @@
+import io
+import copy
+import builtins
+import contextlib
+from api.api_key_manager import ApiKeyManager
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from api.llm_interface import LLMInterface
+from game_logic.game_controller import GameController
+from game_logic.combat_resolver import CombatResolver
+from game_logic import combat_simulator
+from game_logic.combat_simulator import CombatSimulator, threat_label
+
+print("--- Test Monte Carlo Combat Simulator ---")
+
+player = {'current_hp': 100, 'max_hp': 100, 'attack_power': 12, 'defense_power': 4, 'evasion_chance': 0.1, 'hit_chance': 0.8}
+goblin = {'current_hp': 30, 'max_hp': 30, 'attack_power': 7, 'defense_power': 2}
+dragon = {'current_hp': 400, 'max_hp': 400, 'attack_power': 40, 'defense_power': 10, 'hit_chance': 0.9}
+
+# Test 1: Summary statistics are sane, seeded runs repeat, and stronger foes are less winnable
+print("\n--- Test 1: Simulation summaries ---")
+simulator = CombatSimulator(n_fights=1500, seed=3, use_numpy=False)
+easy = simulator.simulate(player, [goblin])
+assert easy['backend'] == 'python' and easy['fights'] == 1500
+assert abs(easy['win_probability'] + easy['loss_probability'] + easy['timeout_probability'] - 1.0) < 1e-9
+assert easy['win_probability'] > 0.95 and easy['threat'] == 'trivial', easy
+assert easy['expected_turns_to_win'] >= 1 and easy['expected_turns'] >= 1
+assert easy['hp_loss']['p10'] <= easy['hp_loss']['p50'] <= easy['hp_loss']['p90'] <= easy['hp_loss']['max']
+assert sum(easy['hp_loss_histogram']) == 1500 and len(easy['hp_loss_histogram']) == 10
+assert CombatSimulator(n_fights=1500, seed=3, use_numpy=False).simulate(player, [goblin])['hp_loss'] == easy['hp_loss']
+group = simulator.simulate(player, [goblin, goblin, goblin])
+assert group['win_probability'] <= easy['win_probability'] and group['hp_loss']['mean'] > easy['hp_loss']['mean']
+hopeless = simulator.simulate(player, [dragon], n_fights=300)
+assert hopeless['win_probability'] < 0.05 and hopeless['threat'] == 'deadly' and hopeless['expected_turns_to_win'] is None
+stalled = simulator.simulate(player, [goblin], strategy='defend', n_fights=200)
+assert stalled['win_probability'] == 0.0
+assert [threat_label(p) for p in (0.99, 0.85, 0.6, 0.1)] == ['trivial', 'manageable', 'risky', 'deadly']
+print("Test 1 Passed.")
+
+# Test 2: NumPy batches agree with the one-by-one CombatResolver mechanics
+print("\n--- Test 2: NumPy backend ---")
+if combat_simulator.np is None:
+    assert CombatSimulator().use_numpy is False and CombatSimulator(use_numpy=True).use_numpy is False
+    print("NumPy not installed; vectorized backend skipped.")
+else:
+    for strategy in (None, 'power_attack', 'try_flee'): # Same strategy, same mechanics on both backends
+        vectorized = CombatSimulator(n_fights=20000, seed=5).simulate(player, [goblin, goblin], strategy)
+        scalar = CombatSimulator(n_fights=4000, seed=5, use_numpy=False).simulate(player, [goblin, goblin], strategy)
+        assert vectorized['backend'] == 'numpy'
+        assert abs(vectorized['win_probability'] - scalar['win_probability']) < 0.03, (vectorized, scalar)
+        assert abs(vectorized['loss_probability'] - scalar['loss_probability']) < 0.03, (vectorized, scalar)
+        assert abs(vectorized['timeout_probability'] - scalar['timeout_probability']) < 0.03, (vectorized, scalar)
+        assert abs(vectorized['expected_turns'] - scalar['expected_turns']) < 0.3
+        assert abs(vectorized['hp_loss']['mean'] - scalar['hp_loss']['mean']) < 2.0
+fleeing = CombatSimulator(n_fights=2000, seed=5, use_numpy=False).simulate(player, [goblin, goblin], 'try_flee')
+assert fleeing['win_probability'] == 0 and fleeing['timeout_probability'] > 0.9, "Fleeing ends fights undecided"
+print("Test 2 Passed.")
+
+# Test 3: World validation flags unwinnable NPCs and combat shows a pre-fight threat estimate
+print("\n--- Test 3: World validation and threat display ---")
+ui = UIManager()
+akm = ApiKeyManager()
+akm.store_api_key("combat-sim-key")
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Balance Vale", "initial_scene_id": "vale",
+                 "player_state": {"attributes": copy.deepcopy(player)},
+                 "npcs": {"goblin_1": {"id": "goblin_1", "name": "Goblin", "attributes": copy.deepcopy(goblin), "status": "hostile"},
+                          "dragon_1": {"id": "dragon_1", "name": "Dragon", "attributes": copy.deepcopy(dragon), "status": "hostile"}}})
+gwhr.update_state({'current_scene_data': {"scene_id": "vale", "narrative": "A vale.", "interactive_elements": []}})
+sim = CombatSimulator(n_threat_fights=300, seed=2, use_numpy=False)
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm,
+                    combat_resolver=CombatResolver(seed=2), combat_simulator=sim)
+printed = io.StringIO()
+with contextlib.redirect_stdout(printed):
+    assessment = gc.check_combat_balance()
+assert assessment['unwinnable'] == ['dragon_1'], assessment
+assert assessment['per_npc']['goblin_1']['threat'] == 'trivial'
+assert "Balance warning - NPC 'dragon_1'" in printed.getvalue()
+
+threat_args = []
+original_show = ui.show_combat_interface
+def recording_show(player_hp, player_max_hp, combatants_info, threat_estimate=None):
+    threat_args.append(threat_estimate)
+    return original_show(player_hp, player_max_hp, combatants_info, threat_estimate=threat_estimate)
+ui.show_combat_interface = recording_show
+original_input = builtins.input
+builtins.input = lambda prompt="": "1"
+printed = io.StringIO()
+try:
+    with contextlib.redirect_stdout(printed):
+        gc.initiate_combat(["goblin_1"])
+finally:
+    builtins.input = original_input
+assert threat_args[0] and threat_args[0]['threat'] == 'trivial' and threat_args[0]['fights'] == 300
+assert all(arg is None for arg in threat_args[1:]), "Threat estimate is a pre-fight display only"
+assert "--- Threat: TRIVIAL ---" in printed.getvalue()
+print("Test 3 Passed.")
+
+print("\n--- Monte Carlo Combat Simulator Tests Completed ---")
@@ -0,0 +1,101 @@
+import json
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from game_logic.game_controller import GameController
+from game_logic.dialogue_session import DialogueSession
+
+print("--- Test DialogueSession: Cached Context and Targeted NPC Updates ---")
+
+def build_world(npc_count=200):
+    gwhr = GWHR()
+    characters = [{"id": "sage", "name": "Sage", "description": "An old scholar.", "knowledge": [{"topic_id": "prophecy"}]}]
+    characters += [{"id": f"villager_{i}", "name": f"Villager {i}", "description": "A villager."} for i in range(npc_count)]
+    gwhr.initialize({"world_title": "Session Vale", "main_characters": characters})
+    gwhr.update_state({'current_scene_data': {"scene_id": "library", "narrative": "Dusty shelves.", "interactive_elements": []},
+                       'current_game_time': 4})
+    return gwhr
+
+# Test 1: GWHR.update_npc touches only the one NPC
+print("\n--- Test 1: Targeted NPC update ---")
+gwhr = build_world(npc_count=3)
+other_before = gwhr.data_store['npcs']['villager_0']
+entry = {'player': 'hi', 'npc': 'hello', 'time': 4}
+assert gwhr.update_npc('sage', fields={'status': 'talking'}, attributes={'disposition_towards_player': 2}, dialogue_entry=entry)
+sage = gwhr.data_store['npcs']['sage']
+assert sage['status'] == 'talking' and sage['attributes']['disposition_towards_player'] == 2 and sage['dialogue_log'] == [entry]
+assert sage['attributes']['current_hp'] == 50, "Attributes are merged, not replaced"
+entry['npc'] = 'mutated'
+assert sage['dialogue_log'][0]['npc'] == 'hello', "Stored entry must be a copy"
+assert gwhr.data_store['npcs']['villager_0'] is other_before
+assert gwhr.update_npc('nobody', fields={'status': 'x'}) is False
+print("Test 1 Passed.")
+
+# Test 2: The context block is built once; each turn only adds the NPC's recent exchanges
+print("\n--- Test 2: Session prompt segments ---")
+gwhr = build_world(npc_count=3)
+session = DialogueSession('sage', gwhr.data_store['npcs']['sage'], gwhr)
+session_segments, first_turn = session.prompt_segments("Hello")
+gwhr.get_current_context = lambda *a, **k: (_ for _ in ()).throw(AssertionError("full context copy during a session"))
+gwhr.data_store['current_scene_data']['narrative'] = "Changed after the session started."
+for i in range(3):
+    session.record_exchange(f"question {i}", f"answer {i}", 'talking', 1, 4)
+session_segments_later, later_turn = session.prompt_segments("One more thing")
+assert session_segments_later == session_segments, "Character block must be reused verbatim"
+assert "Dusty shelves" in later_turn[0] and "Changed after" not in later_turn[0]
+assert "answer 2" in later_turn[0] and "answer 1" in later_turn[0] and "answer 0" not in later_turn[0], "Preview shows the last two exchanges"
+assert "'One more thing'" in later_turn[0]
+sage = gwhr.data_store['npcs']['sage']
+assert len(sage['dialogue_log']) == 3 and sage['attributes']['disposition_towards_player'] == 3 and sage['last_interaction_time'] == 4
+assert session.npc_data['dialogue_log'] == sage['dialogue_log'] and len(session.exchanges) == 3
+print("Test 2 Passed.")
+
+# Test 3: A whole dialogue never copies the world and matches the prefetcher's opening prompt
+print("\n--- Test 3: Controller dialogue loop ---")
+ui = UIManager()
+akm = ApiKeyManager()
+akm.store_api_key("dialogue-session-key")
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = build_world()
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm)
+opening_prompt = gc._build_dialogue_prompt('sage', gwhr.data_store['npcs']['sage'], "Greetings", gwhr=gwhr.snapshot(), record_stats=False)
+
+replies = iter([
+    {"dialogue_text": "Welcome, seeker.", "new_npc_status": "talking", "attitude_towards_player_change": "2"},
+    {"dialogue_text": "The prophecy is old.", "new_npc_status": "talking", "attitude_towards_player_change": None},
+    {"dialogue_text": "Farewell.", "new_npc_status": "ending_dialogue", "attitude_towards_player_change": "-1"},
+])
+prompts = []
+def mock_generate(prompt, model_id, expected_response_type):
+    prompts.append(str(prompt))
+    return json.dumps(next(replies))
+llm.generate = mock_generate
+player_lines = iter(["Tell me of the prophecy.", "Thank you."])
+ui.get_free_text_input = lambda prompt_message="": next(player_lines)
+
+copies = []
+original_get_data_store = gwhr.get_data_store
+def counting_get_data_store():
+    copies.append('get_data_store')
+    return original_get_data_store()
+gwhr.get_data_store = counting_get_data_store
+gwhr.get_current_context = lambda *a, **k: copies.append('get_current_context') or {}
+original_update_state = gwhr.update_state
+gwhr.update_state = lambda updates: copies.append(f"update_state:{sorted(updates)}") or original_update_state(updates)
+
+gc.handle_npc_dialogue('sage', initial_player_input="Greetings")
+assert copies == [], f"Dialogue turns must not copy or rewrite the world: {copies}"
+assert len(prompts) == 3 and str(opening_prompt) == prompts[0], "Opening prompt must match what the prefetcher would build"
+sage = gwhr.data_store['npcs']['sage']
+assert [e['npc'] for e in sage['dialogue_log']] == ["Welcome, seeker.", "The prophecy is old.", "Farewell."]
+assert sage['attributes']['disposition_towards_player'] == 1, "Invalid attitude change is skipped, the others applied"
+assert sage['status'] == 'ending_dialogue' and gc.current_game_state == "AWAITING_PLAYER_ACTION"
+assert len([e for e in gwhr.data_store['event_log'] if e['type'] == 'dialogue_exchange']) == 3
+print("Test 3 Passed.")
+
+print("\n--- DialogueSession Tests Completed ---")
@@ -0,0 +1,117 @@
+import io
+import json
+import time
+import builtins
+import threading
+import contextlib
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.image_pipeline import ImagePipeline
+from game_logic.game_controller import GameController
+from game_logic import game_events
+from game_logic.game_events import GameEventQueue
+
+print("--- Test Event-Driven Game Loop ---")
+
+original_input = builtins.input
+def scripted_input(lines):
+    lines = iter(lines)
+    def fake_input(prompt=""):
+        line = next(lines, None)
+        if line is None:
+            raise EOFError
+        return line() if callable(line) else line
+    return fake_input
+
+# Test 1: Input, EOF and timers all arrive through the queue
+print("\n--- Test 1: Event queue ---")
+events = GameEventQueue()
+release = threading.Event()
+builtins.input = scripted_input([lambda: release.wait(2) and "look"])
+assert events.request_input("> ") and not events.request_input("> "), "Only one read may be outstanding"
+release.set()
+assert events.get(timeout=2) == (game_events.PLAYER_INPUT, "look")
+events.request_input("> ")
+assert events.get(timeout=2) == (game_events.INPUT_EOF, None)
+events.call_later(0.05, "tick")
+cancelled = events.call_later(0.05, "never")
+cancelled.cancel()
+assert events.get(timeout=2) == (game_events.TIMER, "tick")
+assert events.get(timeout=0.2) is None
+print("Test 1 Passed.")
+
+def build_controller(image_pipeline=None):
+    ui = UIManager()
+    akm = ApiKeyManager()
+    akm.store_api_key("events-key")
+    llm = LLMInterface(akm)
+    ms = ModelSelector(akm)
+    ms.set_selected_model("gemini-pro-mock")
+    gwhr = GWHR()
+    elements = [{"id": "wait", "name": "Wait a while", "type": "examine"}]
+    turn = [0]
+    def mock_generate(prompt, model_id, expected_response_type):
+        turn[0] += 1
+        return json.dumps({"scene_id": "tavern", "narrative": f"Turn {turn[0]} in the tavern.", "interactive_elements": elements})
+    llm.generate = mock_generate
+    gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, image_pipeline=image_pipeline)
+    return gc, ui, gwhr, llm
+
+# Test 2: A background image is recorded while the loop waits for the player, not on the next command
+print("\n--- Test 2: Image completion wakes the loop ---")
+def slow_image(image_prompt):
+    time.sleep(0.1)
+    return "https://img.example/tavern.png"
+probe = LLMInterface(ApiKeyManager())
+probe.generate_image = slow_image
+pipeline = ImagePipeline(probe, max_workers=1)
+gc, ui, gwhr, llm = build_controller(image_pipeline=pipeline)
+with contextlib.redirect_stdout(io.StringIO()):
+    assert gc.initiate_scene("tavern")
+assert gwhr.get_data_store()['current_scene_data'].get('background_image_pending')
+def wait_for_image():
+    deadline = time.time() + 3
+    while time.time() < deadline:
+        if gwhr.data_store['current_scene_data'].get('background_image_url') == "https://img.example/tavern.png":
+            return "look around" # Invalid command; the loop just asks again
+        time.sleep(0.01)
+    return "image never applied"
+builtins.input = scripted_input([wait_for_image])
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        gc.game_loop()
+except EOFError:
+    pass
+assert gwhr.data_store['current_scene_data'].get('background_image_url') == "https://img.example/tavern.png"
+assert gc.scene_version == 1, f"Invalid commands and image events must not re-render the scene ({gc.scene_version} renders)"
+pipeline.shutdown()
+print("Test 2 Passed.")
+
+# Test 3: No fixed sleeps and one render per scene change
+print("\n--- Test 3: Per-action overhead ---")
+gc, ui, gwhr, llm = build_controller()
+with contextlib.redirect_stdout(io.StringIO()):
+    gc.initiate_scene("tavern")
+actions = 20
+builtins.input = scripted_input(["1"] * actions)
+started = time.perf_counter()
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        gc.game_loop()
+except EOFError:
+    pass
+elapsed = time.perf_counter() - started
+stats = gc.get_loop_stats()
+assert stats['actions'] == actions
+assert gc.scene_version == 1 + actions, f"Expected one render per scene, got {gc.scene_version}"
+assert elapsed < actions * 0.05, f"{actions} instant actions took {elapsed:.2f}s"
+assert stats['overhead_per_event_ms'] < 5.0, stats
+print(f"{actions} actions in {elapsed:.3f}s, loop overhead {stats['overhead_per_event_ms']:.3f} ms/event")
+print("Test 3 Passed.")
+
+builtins.input = original_input
+print("\n--- Game Event Loop Tests Complete ---")
@@ -0,0 +1,65 @@
+import builtins
+from ui.headless_ui import HeadlessUIManager
+from game_logic.headless_runner import HeadlessSessionRunner, ScriptedPolicy, RandomPolicy, format_report, build_headless_controller
+
+print("--- Test HeadlessSessionRunner: Scripted and Random Sessions Without a Terminal ---")
+
+def no_stdin(prompt=""):
+    raise AssertionError(f"Headless sessions must never read stdin (prompt: {prompt!r})")
+builtins.input = no_stdin
+
+# Test 1: A scripted session runs setup, puzzles, the menu and a move, then ends cleanly
+print("\n--- Test 1: Scripted session ---")
+# Mock opening scene: 1 rune puzzle, 2 raven combat, 3 lever puzzle, 4 Willow dialogue, 5 go north.
+script = ["1", "m", "2", "0", "5", "3"]
+report = HeadlessSessionRunner(track_memory=False).run(ScriptedPolicy(script))
+assert report['end_reason'] == 'policy_finished', report['end_reason']
+assert report['turns'] == 4, "'1', 'm', '5' and '3' are game loop commands; '2' (inventory) and '0' answer the menu"
+assert report['lines_by_kind'] == {'api_key': 1, 'model_choice': 1, 'preference': 1, 'command': 4, 'menu': 2, 'continue': 1}, report['lines_by_kind']
+assert report['phases']['setup']['calls'] == 1 and report['phases']['puzzle']['calls'] == 2 and report['phases']['menu']['calls'] == 1
+assert report['phases']['action_llm']['calls'] == 1, "Only 'go north' is a generic action"
+assert 'memory' not in report
+print(format_report(report))
+print("Test 1 Passed.")
+
+# Test 2: Random sessions hit the command budget, reproduce from a seed and report sane percentiles
+print("\n--- Test 2: Random policy ---")
+runner = HeadlessSessionRunner(track_memory=False)
+first = runner.run(RandomPolicy(seed=7, max_commands=60))
+second = runner.run(RandomPolicy(seed=7, max_commands=60))
+assert first['turns'] == 60 and first['end_reason'] == 'policy_finished' and first['turns_per_s'] > 0
+assert {p: s['calls'] for p, s in first['phases'].items()} == {p: s['calls'] for p, s in second['phases'].items()}
+assert first['lines_by_kind'] == second['lines_by_kind']
+for phase, stats in first['phases'].items():
+    assert stats['p50_ms'] <= stats['p90_ms'] <= stats['p99_ms'] <= stats['max_ms'], (phase, stats)
+assert first['phases']['action']['calls'] + first['lines_by_kind'].get('menu', 0) >= 60 - 5
+print(format_report(first))
+print("Test 2 Passed.")
+
+# Test 3: Memory growth is sampled along the session
+print("\n--- Test 3: Memory sampling ---")
+report = HeadlessSessionRunner(memory_sample_every=20).run(RandomPolicy(seed=3, max_commands=100, menu_rate=0.0))
+memory = report['memory']
+assert [s['turn'] for s in memory['samples']] == [0, 20, 40, 60, 80, 100], "The read that ends the session is sampled too"
+assert all(a['event_log'] < b['event_log'] for a, b in zip(memory['samples'], memory['samples'][1:])), "Event log grows every turn"
+assert memory['peak_bytes'] >= memory['end_bytes'] > 0 and 'growth_bytes_per_1k_turns' in memory
+ui = HeadlessUIManager(ScriptedPolicy(["2"]))
+ui.display_scene({"scene_id": "s", "narrative": "n", "interactive_elements": [{"id": "a"}, {"id": "b"}]})
+assert ui.current_choices[1]['id'] == 'b' and ui.get_player_action(ui.current_choices) == 'b'
+print(format_report(report))
+print("Test 3 Passed.")
+
+# Test 4: A session whose opening scene cannot be generated stops instead of restarting forever
+print("\n--- Test 4: Failed start ---")
+def failing_scene_controller(ui_manager):
+    controller = build_headless_controller(ui_manager)
+    generate = controller.llm_interface.generate
+    controller.llm_interface.generate = lambda prompt, model_id, expected_response_type: (
+        None if expected_response_type == 'scene_description' else generate(prompt, model_id, expected_response_type))
+    return controller
+report = HeadlessSessionRunner(controller_factory=failing_scene_controller, track_memory=False).run(RandomPolicy(seed=1, max_commands=10))
+assert report['end_reason'] == 'start_failed' and report['turns'] == 0, report['end_reason']
+assert report['phases']['scene']['calls'] == 1, "One failed start, no retries"
+print("Test 4 Passed.")
+
+print("\n--- HeadlessSessionRunner Tests Completed ---")
@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.image_cache import ImageCache
+from engine.image_pipeline import ImagePipeline
+from game_logic.game_controller import GameController
+
+print("--- Test Background Image Pipeline and Image Cache ---")
+
+cache_dir = tempfile.mkdtemp(prefix="image_cache_test_")
+
+# Test 1: Content-addressed storage, normalization and persistence
+print("\n--- Test 1: ImageCache basics ---")
+cache = ImageCache(cache_dir, max_bytes=1024 * 1024)
+assert cache.get(["Scene: A quiet harbor."]) is None
+key = cache.put(["Scene: A quiet harbor."], "https://img.example/harbor.png")
+assert os.path.exists(os.path.join(cache_dir, key[:2], f"{key}.json"))
+assert cache.get(["  scene:   a QUIET harbor. "]) == "https://img.example/harbor.png", "Normalized prompts should share an entry"
+reopened = ImageCache(cache_dir, max_bytes=1024 * 1024)
+assert reopened.get(["Scene: A quiet harbor."]) == "https://img.example/harbor.png", "Entries should persist across instances"
+print("Test 1 Passed.")
+
+# Test 2: Size-based eviction drops the least recently used entries
+print("\n--- Test 2: Eviction ---")
+small_dir = tempfile.mkdtemp(prefix="image_cache_small_")
+small = ImageCache(small_dir, max_bytes=1024 * 1024)
+small.put(["Scene 0"], "https://img.example/0.png")
+small.max_bytes = small.get_stats()['total_bytes'] * 3 + 10 # Room for three entries of this size
+small.put(["Scene 1"], "https://img.example/1.png")
+small.put(["Scene 2"], "https://img.example/2.png")
+assert small.get(["Scene 0"]) is not None # Touch 0 so 1 becomes least recently used
+small.put(["Scene 3"], "https://img.example/3.png")
+stats = small.get_stats()
+assert stats['evictions'] >= 1 and stats['total_bytes'] <= small.max_bytes, stats
+assert small.get(["Scene 1"]) is None, "Least recently used entry should be evicted first"
+assert small.get(["Scene 0"]) is not None and small.get(["Scene 3"]) is not None
+print(f"Small cache stats: {stats}")
+print("Test 2 Passed.")
+
+# Test 3: Scenes render before their image exists, then the image is swapped in
+print("\n--- Test 3: Non-blocking scene image ---")
+release_image = threading.Event()
+image_calls = []
+
+def build_controller(pipeline_cache):
+    ui = UIManager()
+    akm = ApiKeyManager()
+    akm.store_api_key("image-pipeline-key")
+    llm = LLMInterface(akm)
+    def mock_generate(prompt, model_id, expected_response_type):
+        return json.dumps({"scene_id": "harbor", "narrative": "Gulls circle the harbor.", "interactive_elements": [{"id": "leave", "name": "Leave", "type": "navigate"}]})
+    def slow_generate_image(image_prompt):
+        image_calls.append(image_prompt)
+        release_image.wait(timeout=5)
+        return "https://img.example/generated-harbor.png"
+    llm.generate = mock_generate
+    llm.generate_image = slow_generate_image
+    ms = ModelSelector(akm)
+    ms.set_selected_model("gemini-pro-mock")
+    pipeline = ImagePipeline(llm, image_cache=pipeline_cache, max_workers=1)
+    gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), GWHR(), llm, image_pipeline=pipeline)
+    return gc, ui, pipeline
+
+scene_cache = ImageCache(os.path.join(cache_dir, "scenes"))
+gc, ui, pipeline = build_controller(scene_cache)
+assert gc.initiate_scene("harbor") is True, "Scene should load without waiting for its image"
+scene = gc.gwhr.data_store['current_scene_data']
+assert scene['background_image_url'] is None and scene['background_image_pending'] is True
+assert len(image_calls) == 1
+release_image.set()
+pipeline.wait_idle(timeout=5)
+assert ui.current_background_image_url == "https://img.example/generated-harbor.png", "UI should swap in the finished image"
+gc.apply_ready_images()
+scene = gc.gwhr.data_store['current_scene_data']
+assert scene['background_image_url'] == "https://img.example/generated-harbor.png" and 'background_image_pending' not in scene
+assert gc.gwhr.data_store['scene_history'][-1]['image_url'] == "https://img.example/generated-harbor.png"
+assert len(gc.gwhr.data_store['scene_history']) == 1, "Swapping in the image must not add another scene_history entry"
+pipeline.shutdown()
+gc, ui, pipeline = build_controller(None)
+gc.llm_interface.generate_image = lambda image_prompt: None # The image backend gives up
+assert gc.initiate_scene("harbor") is True and gc.gwhr.data_store['current_scene_data']['background_image_pending'] is True
+pipeline.wait_idle(timeout=5)
+gc.apply_ready_images()
+scene = gc.gwhr.data_store['current_scene_data']
+assert scene['background_image_url'] is None and 'background_image_pending' not in scene, "A failed image must not stay pending"
+assert gc._awaited_image_key is None and gc._image_requests == {} and pipeline.get_stats()['failed'] == 1
+pipeline.shutdown()
+print("Test 3 Passed.")
+
+# Test 4: Revisiting a scene costs no image call, even from a fresh process
+print("\n--- Test 4: Revisit served from disk ---")
+image_calls.clear()
+gc2, ui2, pipeline2 = build_controller(ImageCache(os.path.join(cache_dir, "scenes")))
+assert gc2.initiate_scene("harbor") is True
+assert image_calls == [], f"Cached scene image should not be regenerated, got {len(image_calls)} call(s)"
+assert gc2.gwhr.data_store['current_scene_data']['background_image_url'] == "https://img.example/generated-harbor.png"
+assert pipeline2.get_stats()['cache_hits'] == 1
+pipeline2.shutdown()
+print("Test 4 Passed.")
+
+shutil.rmtree(cache_dir, ignore_errors=True)
+shutil.rmtree(small_dir, ignore_errors=True)
+print("\n--- Image Pipeline Tests Complete ---")
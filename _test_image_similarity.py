@@ -0,0 +1,78 @@
+import json
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.image_similarity import MinHashIndex
+from game_logic.game_controller import GameController
+
+print("--- Test MinHash Image Prompt Reuse ---")
+
+BASE = "Scene after action: The lantern-lit tavern hums with quiet talk while rain taps the shutters. NPCs: Barkeep Hilda, Old Tom."
+NEAR = "Scene after action: The lantern-lit tavern hums with quiet talk while rain taps the shutters. NPCs: Barkeep Hilda, Old Tom (asleep)."
+FAR = "Scene after action: A frozen mountain pass under a blood-red moon, wolves howling below. NPCs: The Wanderer."
+
+# Test 1: Signature similarity tracks shingle overlap
+print("\n--- Test 1: Similarity estimates ---")
+index = MinHashIndex(num_perm=128, bands=32)
+sig_base = index.signature([BASE])
+assert index.estimate_similarity(sig_base, index.signature([BASE.upper()])) == 1.0, "Normalization should ignore case"
+near_similarity = index.estimate_similarity(sig_base, index.signature([NEAR]))
+far_similarity = index.estimate_similarity(sig_base, index.signature([FAR]))
+assert near_similarity > 0.8, f"Near-duplicate prompts should be similar, got {near_similarity}"
+assert far_similarity < 0.3, f"Unrelated prompts should not be similar, got {far_similarity}"
+print(f"near={near_similarity:.2f} far={far_similarity:.2f}")
+print("Test 1 Passed.")
+
+# Test 2: Per-scene-type thresholds and reuse report
+print("\n--- Test 2: Thresholds and report ---")
+index = MinHashIndex(default_threshold=0.99, thresholds={'scene_after_action': 0.75})
+index.add([BASE], "https://img.example/tavern.png", 'scene_after_action')
+index.add([BASE], "https://img.example/tavern-scene.png", 'scene')
+match = index.find_similar([NEAR], 'scene_after_action')
+assert match and match[0] == "https://img.example/tavern.png", match
+assert index.find_similar([NEAR], 'scene') is None, "Stricter default threshold should reject the near-duplicate"
+assert index.find_similar([FAR], 'scene_after_action') is None
+report = index.get_reuse_report()
+assert report['scene_after_action']['lookups'] == 2 and report['scene_after_action']['reuses'] == 1
+assert report['scene_after_action']['threshold'] == 0.75 and report['scene']['threshold'] == 0.99
+assert abs(report['_overall']['reuse_rate'] - 1 / 3) < 1e-9, report['_overall']
+print(f"Report: {report}")
+print("Test 2 Passed.")
+
+# Test 3: process_player_action skips generate_image for a near-identical scene update
+print("\n--- Test 3: Controller reuse ---")
+ui = UIManager()
+akm = ApiKeyManager()
+akm.store_api_key("similarity-key")
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = GWHR()
+elements = [{"id": "wait", "name": "Wait a while", "type": "examine"}]
+gwhr.update_state({'current_scene_data': {"scene_id": "tavern", "narrative": "A tavern.", "interactive_elements": elements}})
+outcomes = iter([
+    "The lantern-lit tavern hums with quiet talk while rain taps the shutters. Hilda polishes a mug.",
+    "The lantern-lit tavern hums with quiet talk while rain taps the shutters. Hilda polishes a cup.",
+])
+def mock_generate(prompt, model_id, expected_response_type):
+    return json.dumps({"scene_id": "tavern", "narrative": next(outcomes), "interactive_elements": elements,
+                       "npcs_in_scene": [{"name": "Hilda"}]})
+image_calls = []
+def mock_generate_image(image_prompt):
+    image_calls.append(image_prompt)
+    return f"https://img.example/tavern-{len(image_calls)}.png"
+llm.generate = mock_generate
+llm.generate_image = mock_generate_image
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm,
+                    image_similarity_index=MinHashIndex(thresholds={'scene_after_action': 0.8}))
+gc.process_player_action("interact_element", "wait")
+gc.process_player_action("interact_element", "wait")
+assert len(image_calls) == 1, f"Second, nearly identical scene update should reuse the image, got {len(image_calls)} calls"
+assert gwhr.data_store['current_scene_data']['background_image_url'] == "https://img.example/tavern-1.png"
+assert gc.image_similarity_index.get_reuse_report()['scene_after_action']['reuses'] == 1
+print("Test 3 Passed.")
+
+print("\n--- Image Similarity Tests Complete ---")
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.llm_cassette import LLMCassette
+from game_logic.latency_regression import record_cassette, replay_cassette, run_sessions, compare_latency, write_json, format_result
+
+print("--- Test LLMCassette: Record/Replay of Backend Calls and Turn Latency Regression ---")
+workdir = tempfile.mkdtemp(prefix="llm-cassette-test-")
+
+# Test 1: Responses and latencies round-trip through the cassette file
+print("\n--- Test 1: Record and replay on LLMInterface ---")
+akm = ApiKeyManager()
+akm.store_api_key("cassette-key")
+cassette_path = os.path.join(workdir, "unit.json")
+backend_calls = []
+def slow_backend(prompt, model_id, expected_response_type):
+    backend_calls.append(expected_response_type)
+    time.sleep(0.03)
+    return f"{expected_response_type}#{len(backend_calls)}"
+recorder = LLMCassette(cassette_path, mode='record')
+llm = LLMInterface(akm, cassette=recorder)
+llm._call_backend = slow_backend
+assert llm.generate("Describe the harbour.", "gemini-pro-mock", 'scene_description') == "scene_description#1"
+assert llm.generate("Describe   the harbour.", "gemini-pro-mock", 'scene_description') == "scene_description#2" # Same key
+assert llm.generate("Weather?", "gemini-pro-mock", 'weather_update_description') == "weather_update_description#3"
+image_url = llm.generate_image("A harbour at dusk")
+assert recorder.save() and recorder.get_stats()['recorded'] == 4 and recorder.get_stats()['keys'] == 3
+
+backend_calls.clear()
+player = LLMCassette(cassette_path, mode='replay', latency_scale=0.5)
+llm = LLMInterface(akm, cassette=player)
+llm._call_backend = slow_backend
+started = time.perf_counter()
+replies = [llm.generate("Describe the harbour.", "gemini-pro-mock", 'scene_description') for _ in range(3)]
+elapsed = time.perf_counter() - started
+assert replies == ["scene_description#1", "scene_description#2", "scene_description#2"], "Recorded order, then the last one"
+assert 0.035 <= elapsed < 0.5, elapsed # Three replays at about half of 30 ms each
+assert llm.generate_image("A harbour at dusk") == image_url and backend_calls == []
+assert llm.generate("Never recorded.", "gemini-pro-mock", 'scene_description') == "scene_description#1" and backend_calls == ['scene_description']
+strict = LLMInterface(akm, cassette=LLMCassette(cassette_path, mode='replay', miss_policy='fail'))
+assert strict.generate("Never recorded.", "gemini-pro-mock", 'scene_description') is None, "A strict miss fails like a backend error"
+stats = player.get_stats()
+assert stats['replayed'] == 4 and stats['misses'] == 1 and stats['replayed_latency_s'] > 0.03, stats
+print("Test 1 Passed.")
+
+# Test 2: Whole headless sessions replay exactly, with turn latency percentiles
+print("\n--- Test 2: Session record/replay ---")
+session_cassette = os.path.join(workdir, "sessions.json")
+recorded = record_cassette(session_cassette, seeds=(5, 6), turns=40)
+replayed = replay_cassette(session_cassette, seeds=(5, 6), turns=40, latency_scale=0.0)
+print(f"Recorded: {format_result(recorded)}")
+print(f"Replayed: {format_result(replayed)}")
+assert recorded['turns'] == replayed['turns'] == 80
+assert replayed['cassette']['misses'] == 0 and replayed['cassette']['replayed'] == recorded['cassette']['recorded'] > 0
+latency = replayed['turn_latency']
+assert latency['count'] == 80 and latency['p50_ms'] <= latency['p95_ms'] <= latency['max_ms'], latency
+print("Test 2 Passed.")
+
+# Test 3: A slower replay is flagged against the baseline, an equivalent one is not
+print("\n--- Test 3: Latency regression check ---")
+baseline = replay_cassette(session_cassette, seeds=(5, 6), turns=40, latency_scale=0.0)
+assert compare_latency(baseline, replay_cassette(session_cassette, seeds=(5, 6), turns=40, latency_scale=0.0), min_delta_ms=5.0) == []
+slower = run_sessions(LLMCassette(session_cassette, mode='replay', latency_s=0.01), seeds=(5, 6), turns=40) # +10 ms per LLM call
+regressions = compare_latency(baseline, slower, threshold=0.2, min_delta_ms=5.0)
+assert any(r.startswith("turn p50") for r in regressions) and any(r.startswith("turn p95") for r in regressions), regressions
+baseline_path = os.path.join(workdir, "baseline.json")
+write_json(baseline_path, baseline)
+cli = [sys.executable, "-m", "game_logic.latency_regression", "--replay", session_cassette, "--baseline", baseline_path,
+       "--seeds", "5", "6", "--turns", "40", "--latency-scale", "0"]
+passing = subprocess.run(cli + ["--min-delta-ms", "5"], capture_output=True, text=True)
+assert passing.returncode == 0 and "No turn latency regression" in passing.stdout, passing.stdout[-500:] + passing.stderr[-500:]
+write_json(baseline_path, dict(baseline, turn_latency=dict(baseline['turn_latency'], p50_ms=0.001, p95_ms=0.001))) # An impossibly fast baseline
+failing = subprocess.run(cli + ["--min-delta-ms", "0"], capture_output=True, text=True)
+assert failing.returncode == 1 and "REGRESSION: turn p50" in failing.stdout and "REGRESSION: turn p95" in failing.stdout, failing.stdout[-500:]
+print("Test 3 Passed.")
+
+print("\n--- LLMCassette Tests Completed ---")
@@ -0,0 +1,103 @@
+import io
+import contextlib
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.token_meter import TokenMeter
+from engine.model_selector import ModelSelector
+from api.model_router import ModelRouter
+
+print("--- Test Latency-Aware Model Routing ---")
+
+akm = ApiKeyManager()
+akm.store_api_key("router-key")
+
+# Test 1: Response types route to their tier; the selected model leads its own tier
+print("\n--- Test 1: Tier routing ---")
+router = ModelRouter()
+ms = ModelSelector(akm, model_router=router)
+ms.set_selected_model("gemini-2.5-pro-mock")
+assert router.route('combat_turn_outcome', ms.get_selected_model())[0] == "gemini-2.5-flash-mock"
+assert router.route('weather_update_description')[0] == "gemini-2.5-flash-mock"
+assert router.route('detailed_world_blueprint')[0] == "gemini-2.5-pro-mock"
+assert router.route('scene_description')[0] == "gemini-2.5-pro-mock", "Empty balanced tier should fall back to strong first"
+assert router.route('combat_turn_outcome') == ["gemini-2.5-flash-mock", "gemini-2.5-pro-mock"]
+print("Test 1 Passed.")
+
+# Test 2: Observed latency reorders a tier and SLO breaches demote a model
+print("\n--- Test 2: Latency adaptation ---")
+router = ModelRouter(latency_slo_s={'fast': 3.0})
+router.set_tier_models('fast', ["flash-a", "flash-b"])
+assert router.route('combat_turn_outcome')[:2] == ["flash-a", "flash-b"], "Configured order breaks ties"
+router.record_result("flash-a", 1.5, True)
+router.record_result("flash-b", 0.4, True)
+assert router.route('combat_turn_outcome')[0] == "flash-b", "Lower observed latency should be preferred"
+for _ in range(5):
+    router.record_result("flash-b", 6.0, True) # Now consistently over the fast tier's SLO
+assert router.route('combat_turn_outcome')[0] == "flash-a", "A model breaching the SLO should be demoted"
+router.set_tier_models('strong', ["pro-x"])
+assert router.route('combat_turn_outcome') == ["flash-a", "pro-x", "flash-b"]
+later = router._clock() + 600.0 # Five half-lives without traffic
+router._clock = lambda: later
+assert router.route('combat_turn_outcome') == ["flash-a", "flash-b", "pro-x"], "An idle demoted model fades back to healthy"
+print(f"Health: {router.get_health_report()}")
+print("Test 2 Passed.")
+
+# Test 3: Failing models cascade to the next candidate and get benched, then recover after cooldown
+print("\n--- Test 3: Fallback cascade and circuit breaker ---")
+now = [1000.0]
+router = ModelRouter(failure_threshold=2, cooldown_s=30.0)
+router._clock = lambda: now[0]
+router.set_tier_models('fast', ["flash-broken"])
+router.set_tier_models('strong', ["pro-ok"])
+meter = TokenMeter()
+llm = LLMInterface(akm, token_meter=meter, model_router=router)
+backend_calls = []
+def flaky_backend(prompt, model_id, expected_response_type):
+    backend_calls.append(model_id)
+    if model_id == "flash-broken":
+        raise TimeoutError("simulated upstream timeout")
+    return '{"new_weather_condition": "rainy"}'
+llm._call_backend = flaky_backend
+for _ in range(2):
+    assert llm.generate("Old Condition: clear", "pro-ok", "weather_update_description") == '{"new_weather_condition": "rainy"}'
+assert backend_calls == ["flash-broken", "pro-ok", "flash-broken", "pro-ok"], backend_calls
+assert router.get_health_report()["flash-broken"]['benched'] is True
+backend_calls.clear()
+llm.generate("Old Condition: clear", "pro-ok", "weather_update_description")
+assert backend_calls == ["pro-ok"], f"Benched model should no longer be tried first: {backend_calls}"
+now[0] += 31.0
+assert router.route('weather_update_description')[0] == "flash-broken", "After the cooldown the model should get a probe call"
+assert router.route('weather_update_description')[0] == "flash-broken", "Routing alone does not claim the probe"
+assert router.begin_call("flash-broken") and not router.begin_call("flash-broken"), "Only one call gets the probe"
+assert router.route('weather_update_description')[0] == "pro-ok", "A model being probed is routed last"
+router.release_call("flash-broken") # That probe was never made; the next call may claim it
+backend_calls.clear()
+llm.generate("Old Condition: clear", "pro-ok", "weather_update_description")
+assert backend_calls == ["flash-broken", "pro-ok"] and router.get_health_report()["flash-broken"]['benched'] is True, "A failed probe re-benches immediately"
+by_model = meter.get_usage_report('model_id')
+assert by_model["flash-broken"]['calls'] == 3 and by_model["pro-ok"]['calls'] == 4
+print("Test 3 Passed.")
+
+# Test 4: Available models are cached for the TTL
+print("\n--- Test 4: fetch_available_models TTL cache ---")
+clock = [0.0]
+ms = ModelSelector(akm, models_cache_ttl_s=60.0)
+ms._clock = lambda: clock[0]
+def count_fetches(action):
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        action()
+    return buffer.getvalue().count("Simulating Gemini API call")
+assert count_fetches(ms.fetch_available_models) == 1
+clock[0] = 30.0
+assert count_fetches(ms.fetch_available_models) == 0, "Should be served from cache within the TTL"
+assert count_fetches(lambda: ms.fetch_available_models(force_refresh=True)) == 1
+clock[0] = 100.0
+assert count_fetches(ms.fetch_available_models) == 1, "Should refetch after the TTL expires"
+other_akm = ApiKeyManager()
+other_akm.store_api_key("another-key")
+ms.api_key_manager = other_akm
+assert count_fetches(ms.fetch_available_models) == 1, "A different API key gets its own cache entry"
+print("Test 4 Passed.")
+
+print("\n--- Model Router Tests Complete ---")
@@ -0,0 +1,101 @@
+import json
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.token_meter import estimate_tokens
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.npc_memory import NPCMemory
+from game_logic.game_controller import GameController
+
+print("--- Test NPCMemory: Rolling Summaries with a Bounded Prompt ---")
+
+akm = ApiKeyManager()
+akm.store_api_key("npc-memory-key")
+
+def make_log(count, start=0):
+    return [{'player': f"Question {i}: tell me about the old mill and the miller's daughter, please.",
+             'npc': f"Answer {i}: " + "the mill has stood for a century and its wheel still turns at night " * 3, 'time': i}
+            for i in range(start, start + count)]
+
+# Test 1: Older exchanges are folded in the background; recent ones stay verbatim
+print("\n--- Test 1: Background folding ---")
+memory = NPCMemory(LLMInterface(akm), recent_exchanges=3, summarize_batch=4)
+log = make_log(6)
+assert not memory.refresh_if_needed('miller', 'Miller', log, "gemini-pro-mock"), "Only 3 exchanges left the window"
+context = memory.memory_context('miller', 'Miller', log)
+assert [e['player'][:10] for e in context['recent_exchanges']] == ["Question 3", "Question 4", "Question 5"]
+assert "Question 0" in context['not_yet_summarized'], "Exchanges awaiting a summary must stay visible"
+log += make_log(1, start=6)
+assert memory.refresh_if_needed('miller', 'Miller', log, "gemini-pro-mock")
+assert memory.wait_idle(timeout=10)
+stored = memory.get_memory('miller')
+assert stored['summarized_count'] == 4 and "Question 0" in stored['summary'] and "Question 3" in stored['summary']
+assert stored['facts'] and len(stored['facts']) <= memory.max_facts
+context = memory.memory_context('miller', 'Miller', log)
+assert 'not_yet_summarized' not in context and context['summary_of_earlier_conversations'] == stored['summary']
+assert memory.get_stats()['refreshes'] == 1 and memory.get_stats()['exchanges_summarized'] == 4
+print("Test 1 Passed.")
+
+# Test 2: Prompt footprint stays bounded however long the relationship runs
+print("\n--- Test 2: Bounded footprint ---")
+memory = NPCMemory(LLMInterface(akm), recent_exchanges=4, summarize_batch=6)
+log = []
+sizes = []
+for batch in range(20):
+    log += make_log(10, start=len(log))
+    memory.refresh_if_needed('miller', 'Miller', log, "gemini-pro-mock")
+    memory.wait_idle(timeout=10)
+    sizes.append(estimate_tokens(json.dumps(memory.memory_context('miller', 'Miller', log))))
+bound = (memory.summary_token_budget + memory.max_facts * memory.fact_token_budget + memory.pending_token_budget
+         + 2 * memory.recent_exchanges * memory.exchange_token_budget) * 1.5 # JSON punctuation
+assert max(sizes) <= bound, (max(sizes), bound)
+assert max(sizes[5:]) <= sizes[4] * 1.5, f"Footprint must plateau, got {sizes}"
+assert len(log) == 200 and memory.get_memory('miller')['summarized_count'] >= 180
+print("Test 2 Passed.")
+
+# Test 3: LLM failures still fold locally; dialogue prompts carry the memory, not the raw log
+print("\n--- Test 3: Fallback and dialogue integration ---")
+failing_llm = LLMInterface(akm)
+failing_llm.generate = lambda prompt, model_id, expected_response_type: None
+memory = NPCMemory(failing_llm, recent_exchanges=2, summarize_batch=2)
+log = make_log(4)
+memory.refresh_if_needed('miller', 'Miller', log, "gemini-pro-mock")
+memory.wait_idle(timeout=10)
+stored = memory.get_memory('miller')
+assert stored['summarized_count'] == 2 and "Question 0" in stored['summary'] and memory.get_stats()['llm_failures'] == 1
+memory.forget('miller')
+assert memory.get_memory('miller')['summarized_count'] == 0
+
+ui = UIManager()
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Mill Town", "main_characters": [{"id": "miller", "name": "Miller", "description": "Runs the mill."}]})
+gwhr.update_npc('miller', fields={'dialogue_log': make_log(30)})
+gwhr.update_state({'current_scene_data': {"scene_id": "mill", "narrative": "The mill.", "interactive_elements": []}})
+npc_memory = NPCMemory(llm, recent_exchanges=3, summarize_batch=5)
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, npc_memory=npc_memory)
+dialogue_prompts = []
+summary_started = threading.Event()
+original_generate = llm.generate
+def recording_generate(prompt, model_id, expected_response_type):
+    if expected_response_type == 'npc_memory_summary':
+        summary_started.set()
+        return original_generate(prompt, model_id, expected_response_type)
+    dialogue_prompts.append(str(prompt))
+    return json.dumps({"dialogue_text": "Mind the wheel.", "new_npc_status": "ending_dialogue", "attitude_towards_player_change": "0"})
+llm.generate = recording_generate
+gc.handle_npc_dialogue('miller', initial_player_input="Hello again")
+assert summary_started.wait(timeout=10), "A background refresh should start after the exchange"
+assert '"memory_of_player"' in dialogue_prompts[0] and "dialogue_log_with_player_preview" not in dialogue_prompts[0]
+assert "Question 29" in dialogue_prompts[0] and "Question 10:" not in dialogue_prompts[0].split('"not_yet_summarized"')[0]
+npc_memory.wait_idle(timeout=10)
+assert npc_memory.get_memory('miller')['summarized_count'] == 28
+assert len(gwhr.data_store['npcs']['miller']['dialogue_log']) == 31, "The full log is kept as history"
+print("Test 3 Passed.")
+
+print("\n--- NPCMemory Tests Completed ---")
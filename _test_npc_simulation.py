@@ -0,0 +1,116 @@
+import json
+import time
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.npc_simulation import NPCSimulation
+from game_logic.action_memo import action_state_hash
+from game_logic.game_controller import GameController
+
+print("--- Test NPCSimulation: Batched NPC Autonomy Ticks ---")
+
+# Test 1: Mood, disposition and HP follow their rules; only visible changes are written, external edits are picked up
+print("\n--- Test 1: Autonomy rules ---")
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Saltmarsh", "key_locations": [{"name": "Dock"}, {"name": "Chapel"}], "main_characters": [
+    {"name": "Oswin", "attributes": {"mood": "elated", "disposition_towards_player": 40, "current_hp": 10}},
+    {"name": "Maud", "attributes": {"mood": "anxious", "current_hp": 0}, "current_location_id": "Dock"},
+]})
+sim = NPCSimulation(seed=3, mood_noise=0.0, move_chance=0.0)
+sim.attach(gwhr)
+hints = sim.tick(gwhr, 1)
+oswin, maud = gwhr.data_store['npcs']['oswin']['attributes'], gwhr.data_store['npcs']['maud']['attributes']
+assert oswin['mood'] == "elated" and oswin['disposition_towards_player'] == 40 and oswin['current_hp'] == 11, oswin
+assert hints == []
+hints = sim.tick(gwhr, 39) # One 39-unit tick: the authored mood is his baseline, HP is capped at max
+assert oswin['mood'] == "elated" and oswin['disposition_towards_player'] == round(40 * 0.995 ** 40) and oswin['current_hp'] == 50, oswin
+assert hints == ["npc_recovered:oswin"], hints
+assert maud == {**maud, 'mood': "anxious", 'current_hp': 0}, "Unknown moods and the dead are left alone"
+assert gwhr.data_store['npcs']['maud']['current_location_id'] == "Dock"
+gwhr.update_npc('oswin', attributes={'mood': 'furious'}) # E.g. the player insulted him in a dialogue
+assert sim._stale
+sim.tick(gwhr, 3) # 3 + (-3 - 3) * 0.9**3 = -1.37
+assert oswin['mood'] == "irritated" and sim.get_stats()['syncs'] == 2, "Resynced from GWHR, then drifted back towards elated"
+sim.tick(gwhr, 40)
+assert oswin['mood'] == "elated"
+sim.tick(gwhr, 1)
+sim.tick(gwhr, 1)
+assert sim.get_stats()['syncs'] == 2, "Its own writes do not force a resync"
+gwhr.initialize({"world_title": "Saltmarsh Again", "main_characters": [{"name": "Oswin", "attributes": {"mood": "hostile"}}]})
+sim.tick(gwhr, 40)
+assert gwhr.data_store['npcs']['oswin']['attributes']['mood'] == "hostile", "A new world brings new baselines"
+print("Test 1 Passed.")
+
+# Test 2: Ten thousand NPCs tick in one pass with a single GWHR write
+print("\n--- Test 2: 10k NPC tick ---")
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Teeming City", "key_locations": [{"name": f"Ward {i}"} for i in range(20)],
+                 "main_characters": [{"name": f"Citizen {i}", "current_location_id": f"Ward {i % 20}",
+                                      "attributes": {"current_hp": 20 + i % 30}} for i in range(10000)]})
+notifications = []
+gwhr.add_mutation_listener(notifications.append)
+sim = NPCSimulation(seed=7)
+sim.attach(gwhr)
+sim.tick(gwhr, 1) # First tick includes the initial sync
+timings = []
+for _ in range(5):
+    notifications.clear()
+    started = time.perf_counter()
+    sim.tick(gwhr, 1)
+    timings.append((time.perf_counter() - started) * 1000)
+    assert notifications == [['npcs']], notifications
+stats = sim.get_stats()
+print(f"10k NPC tick: best {min(timings):.1f} ms, mean {sum(timings) / len(timings):.1f} ms; {stats}")
+assert stats['npcs'] == 10000 and stats['syncs'] == 1 and min(timings) < 250
+moved = sum(1 for i, npc in enumerate(gwhr.data_store['npcs'].values()) if npc['current_location_id'] != f"Ward {i % 20}")
+assert 1000 < moved < 4500, moved # 1 - 0.95**6 of them, give or take those that walked back
+assert all(npc['attributes']['current_hp'] <= 50 for npc in gwhr.data_store['npcs'].values())
+print("Test 2 Passed.")
+
+# Test 3: The controller ticks NPCs from the world scheduler and escalates notable changes as dynamic events
+print("\n--- Test 3: Controller integration ---")
+akm = ApiKeyManager()
+akm.store_api_key("npc-simulation-key")
+ui = UIManager()
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+event_prompts = []
+def mock_generate(prompt, model_id, expected_response_type):
+    if expected_response_type == 'dynamic_event_outcome':
+        event_prompts.append(str(prompt))
+        return json.dumps({"event_id": "npc_event", "description": "Someone is up and about again."})
+    if expected_response_type == 'weather_update_description':
+        return json.dumps({"new_weather_condition": "fog", "new_weather_intensity": "light", "weather_effects_description": "Fog."})
+    return None
+llm.generate = mock_generate
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Saltmarsh", "main_characters": [
+    {"name": "Oswin", "attributes": {"current_hp": 5}}, {"name": "Edda", "attributes": {"current_hp": 8}}]})
+sim = NPCSimulation(seed=1, mood_noise=0.0, escalation_cooldown=100)
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, npc_simulation=sim)
+gc.advance_time(2) # One coalesced 2-unit tick
+assert sim.get_stats()['ticks'] == 1 and gwhr.data_store['npcs']['oswin']['attributes']['current_hp'] == 7
+gc.advance_time(60) # Both recover but only one escalation per tick
+assert sim.get_stats()['ticks'] == 2 and gwhr.data_store['npcs']['edda']['attributes']['current_hp'] == 50
+npc_events = [p for p in event_prompts if "Event Hint: npc_recovered:" in p]
+assert len(npc_events) == 1 and "NPC Driven: True" in npc_events[0], event_prompts
+gwhr.update_npcs({'oswin': {'attributes': {'current_hp': 1}}, 'edda': {'attributes': {'current_hp': 1}}})
+gc.advance_time(60)
+npc_events = [p for p in event_prompts if "Event Hint: npc_recovered:" in p]
+assert len(npc_events) == 2 and "npc_recovered:oswin" in npc_events[0] and "npc_recovered:edda" in npc_events[1], \
+    "The NPC that escalated last time is on cooldown, so the other one gets its turn"
+assert gc.world_scheduler.get_stats()['errors'] == 0
+gwhr.update_state({'current_scene_data': {"scene_id": "quay", "narrative": "Edda mends a net.", "npcs_in_scene": [{"name": "Edda"}],
+                                          "interactive_elements": [{"id": "talk_edda", "type": "dialogue", "target_id": "edda"}]}})
+state_hash = action_state_hash(gwhr.data_store)
+gwhr.update_npcs({'oswin': {'attributes': {'current_hp': 3, 'mood': 'furious'}}, 'edda': {'attributes': {'mood': 'cheerful'}}})
+assert action_state_hash(gwhr.data_store) == state_hash, "Drift and NPCs outside the scene leave the action memo key alone"
+gwhr.update_npcs({'edda': {'attributes': {'current_hp': 0}}})
+assert action_state_hash(gwhr.data_store) != state_hash, "An NPC in the scene dying does not"
+print("Test 3 Passed.")
+
+print("\n--- NPCSimulation Tests Completed ---")
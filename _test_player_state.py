@@ -0,0 +1,139 @@
+import json
+import math
+import random
+import time
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.player_state import PlayerStateIndex, compile_player_updates
+from game_logic.game_controller import GameController
+
+print("--- Test PlayerStateIndex: Indexed Inventory/Skills and the player_updates Applier ---")
+
+# Test 1: A whole payload through process_player_action: messages, warnings and a single GWHR write
+print("\n--- Test 1: Applying player_updates from an action outcome ---")
+akm = ApiKeyManager()
+akm.store_api_key("player-state-key")
+ui = UIManager()
+ui.display_scene = lambda scene_data: None
+shown = []
+ui.display_message = lambda message, message_type="info": shown.append((message_type, message))
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+outcome = {"scene_id": "forge", "narrative_update": "The smith rewards you.", "player_updates": {
+    "attributes": {"strength": "+2", "sanity": "-15", "insight": 9, "evasion_chance": "+0.05", "charisma": "+1", "dexterity": "lots"},
+    "skills_learned": [{"name": "Smithing"}, {"name": "Haggling", "level": 2}, {"name": "Smithing"}, {"level": 3}],
+    "inventory_updates": {"add": [{"id": "ingot", "name": "Iron Ingot", "quantity": 3}, {"id": "torch", "name": "Torch", "quantity": 1},
+                                  {"id": "bad", "name": "Bad", "quantity": -4}],
+                          "remove": [{"id": "rope", "quantity": 1}, "coin_pouch", "ghost_item"]}}}
+llm.generate = lambda prompt, model_id, expected_response_type: json.dumps(outcome)
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Anvil Town", "player_state": {
+    "skills": [{"name": "Haggling", "level": 1}],
+    "inventory": [{"id": "torch", "name": "Torch", "quantity": 2}, {"id": "rope", "name": "Rope", "quantity": 2},
+                  {"id": "coin_pouch", "name": "Coin Pouch", "quantity": 1}]}})
+gwhr.update_state({'current_scene_data': {"scene_id": "forge", "narrative": "Sparks fly.",
+                                          "interactive_elements": [{"id": "help_smith", "name": "Help the smith", "type": "examine"}]}})
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm)
+notifications = []
+gwhr.add_mutation_listener(notifications.append)
+gc.process_player_action("choice", "help_smith")
+player_state = gwhr.data_store['player_state']
+attributes = player_state['attributes']
+assert (attributes['strength'], attributes['sanity'], attributes['insight'], attributes['dexterity']) == (12, 85, 9, 10)
+assert attributes['evasion_chance'] == 0.15 and 'charisma' not in attributes, "Float attributes stay floats"
+assert [(s['name'], s['level']) for s in player_state['skills']] == [("Haggling", 1), ("Smithing", 1)]
+assert [(i['id'], i['quantity']) for i in player_state['inventory']] == [("torch", 3), ("rope", 1), ("ingot", 3)]
+growth = [message for kind, message in shown if kind == "growth"]
+assert growth == ["Attribute strength changed from 10 to 12.", "Attribute sanity changed from 100 to 85.",
+                  "Attribute insight changed from 5 to 9.", "Attribute evasion_chance changed from 0.1 to 0.15.",
+                  "New skill learned: Smithing (Level 1)!", "Obtained: Iron Ingot (x3).", "Obtained: Torch (x1).",
+                  "Lost: Rope (x1).", "Lost: Coin Pouch (x1)."], growth
+warnings = [message for kind, message in shown if kind == "warning"]
+assert len(warnings) == 5 and any("charisma" in w for w in warnings) and any("ghost_item" in w for w in warnings), warnings
+assert notifications.count(['player_state']) == 1, notifications
+assert gwhr.data_store['event_log'][-1]['type'] == "player_update"
+print("Test 1 Passed.")
+
+# Test 2: Large inventories: updates cost O(payload) lookups, the index is built once
+print("\n--- Test 2: Scaling to a large inventory ---")
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Hoard", "player_state": {
+    "inventory": [{"id": f"item_{i}", "name": f"Item {i}", "quantity": 1} for i in range(50000)],
+    "skills": [{"name": f"Skill {i}", "level": 1} for i in range(5000)]}})
+index = PlayerStateIndex()
+index.attach(gwhr)
+started = time.perf_counter()
+for turn in range(200):
+    messages, warnings = index.apply(gwhr, {"inventory_updates": {"add": [{"id": f"item_{turn * 97}", "name": "Stacked", "quantity": 2},
+                                                                      {"id": f"new_{turn}", "name": "New", "quantity": 1}]},
+                                            "skills_learned": [{"name": f"Skill {turn}"}, {"name": f"Fresh {turn}"}]})
+    assert len(messages) == 3 and not warnings, (messages, warnings)
+elapsed = time.perf_counter() - started
+stats = index.get_stats()
+print(f"200 payloads against 50k items / 5k skills: {elapsed * 1000:.1f} ms; {stats}")
+assert stats['rebuilds'] == 2 and stats['writes'] == 200, "Built once for items and once for skills, then kept in step"
+inventory = gwhr.data_store['player_state']['inventory']
+assert len(inventory) == 50200 and inventory[97]['quantity'] == 3 and index.item(gwhr.data_store['player_state'], "new_199")['name'] == "New"
+index.apply(gwhr, {"inventory_updates": {"remove": ["item_0", "item_1"]}})
+assert index.item(gwhr.data_store['player_state'], "item_2") is gwhr.data_store['player_state']['inventory'][0]
+gwhr.data_store['player_state']['inventory'] = [{"id": "only", "name": "Only", "quantity": 1}] # Replaced behind GWHR's back
+assert index.item(gwhr.data_store['player_state'], "item_2") is None and index.item(gwhr.data_store['player_state'], "only")
+assert elapsed < 5.0
+print("Test 2 Passed.")
+
+# Test 3: Fuzzed malformed payloads never raise and never corrupt the player state
+print("\n--- Test 3: Fuzzing malformed payloads ---")
+rng = random.Random(1234)
+JUNK = [None, True, False, 0, -3, 2.5, float('nan'), float('inf'), 10 ** 400, "", "+", "-", "+3", "-2", "7", "abc", "1e999",
+        [], {}, [1, 2], {"x": 1}, "+0.5", " 12 ", "item_1", 5]
+def junk(depth=0):
+    roll = rng.random()
+    if depth < 3 and roll < 0.2:
+        return [junk(depth + 1) for _ in range(rng.randrange(4))]
+    if depth < 3 and roll < 0.45:
+        keys = ["id", "name", "quantity", "level", "add", "remove", "attributes", "skills_learned", "inventory_updates",
+                "strength", "sanity", "evasion_chance", "max_hp", 3, None]
+        return {rng.choice(keys): junk(depth + 1) for _ in range(rng.randrange(5))}
+    return rng.choice(JUNK)
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Fuzz", "player_state": {"inventory": [{"id": "item_1", "name": "One", "quantity": 2}]}})
+index = PlayerStateIndex()
+index.attach(gwhr)
+def near_valid():
+    # A well-formed payload with one leaf swapped for junk, so the fuzzing also reaches the apply paths
+    payload = {"attributes": {"strength": "+1", "sanity": "-2"}, "skills_learned": [{"name": rng.choice(["Lore", "Stealth"]), "level": 2}],
+               "inventory_updates": {"add": [{"id": rng.choice(["item_1", "gem"]), "name": "Gem", "quantity": 2}],
+                                     "remove": [{"id": rng.choice(["item_1", "gem"]), "quantity": 3}]}}
+    containers = [payload, payload["attributes"], payload["skills_learned"][0], payload["inventory_updates"],
+                  payload["inventory_updates"]["add"][0], payload["inventory_updates"]["remove"][0]]
+    target = rng.choice(containers)
+    target[rng.choice(list(target))] = junk(2)
+    return payload
+for _ in range(3000):
+    roll = rng.random()
+    if roll < 0.4:
+        payload = near_valid()
+    elif roll < 0.7:
+        payload = {section: junk(1) for section in rng.sample(["attributes", "skills_learned", "inventory_updates", "junk"], rng.randrange(1, 4))}
+    else:
+        payload = junk()
+    compiled, compile_warnings = compile_player_updates(payload)
+    messages, warnings = index.apply(gwhr, payload)
+    assert isinstance(messages, list) and len(warnings) >= len(compile_warnings)
+player_state = gwhr.data_store['player_state']
+ids = [item['id'] for item in player_state['inventory']]
+assert len(ids) == len(set(ids)), "Stacks merge by id"
+assert all(isinstance(item['quantity'], int) and item['quantity'] >= 1 for item in player_state['inventory'])
+assert all(isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) for value in player_state['attributes'].values())
+names = [skill['name'] for skill in player_state['skills']]
+assert len(names) == len(set(names)) and all(isinstance(name, str) and name for name in names)
+assert index.get_stats()['payloads'] == 3000 and index.get_stats()['rejected'] > 0
+print(f"Fuzz stats: {index.get_stats()}")
+print("Test 3 Passed.")
+
+print("\n--- PlayerStateIndex Tests Completed ---")
@@ -0,0 +1,99 @@
+import json
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.prompt_assembler import PromptAssembler, AssembledPrompt
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from game_logic.game_controller import GameController
+
+print("--- Test PromptAssembler: Static-First Ordering and Prefix Reuse ---")
+
+# Test 1: Segment ordering and cache boundaries
+print("\n--- Test 1: Ordering and boundaries ---")
+assembler = PromptAssembler()
+assembler.set_static_segment('engine_guidelines', "Engine Guidelines: be coherent.")
+prompt1 = assembler.assemble('weather_update_description', session_segments=["Session: S1"], turn_segments=["Old Condition: clear"])
+assert isinstance(prompt1, AssembledPrompt) and isinstance(prompt1, str)
+guidelines_pos = prompt1.index("Engine Guidelines")
+schema_pos = prompt1.index("Response Format (weather_update_description)")
+session_pos = prompt1.index("Session: S1")
+turn_pos = prompt1.index("Old Condition: clear")
+assert guidelines_pos < schema_pos < session_pos < turn_pos, "Segments not ordered static -> session -> turn"
+assert len(prompt1.cache_boundaries) == 2, f"Expected static and session boundaries, got {prompt1.cache_boundaries}"
+assert prompt1.cacheable_prefix_length == prompt1.cache_boundaries[0]
+assert prompt1[:prompt1.cacheable_prefix_length].endswith("and 'weather_effects_description' (a narrative string for the player).")
+assert prompt1[:prompt1.cache_boundaries[1]].endswith("Session: S1")
+overridden = assembler.assemble('weather_update_description', turn_segments=["Old Condition: clear"], record_stats=False,
+                                static_overrides={'world_summary': "World: Elsewhere"})
+assert overridden.index("Engine Guidelines") < overridden.index("World: Elsewhere") < overridden.index("Response Format")
+assert list(assembler.static_segments) == ['engine_guidelines'], "Overrides apply to that call only"
+print("Test 1 Passed.")
+
+# Test 2: Reuse accounting per response type
+print("\n--- Test 2: Reuse report ---")
+prompt2 = assembler.assemble('weather_update_description', session_segments=["Session: S1"], turn_segments=["Old Condition: stormy"])
+prompt3 = assembler.assemble('weather_update_description', session_segments=["Session: S2"], turn_segments=["Old Condition: misty"])
+report = assembler.get_prefix_reuse_report()['weather_update_description']
+assert report['calls'] == 3
+assert report['prefix_hits'] == 2, f"Expected 2 prefix hits, got {report['prefix_hits']}"
+expected_reused = prompt2.cache_boundaries[1] + prompt3.cache_boundaries[0]
+expected_total = len(prompt1) + len(prompt2) + len(prompt3)
+assert abs(report['expected_prefix_reuse_rate'] - expected_reused / expected_total) < 1e-9, report
+print(f"Weather reuse report: {report}")
+print("Test 2 Passed.")
+
+# Test 3: GameController prompts keep volatile values out of the cacheable prefix
+print("\n--- Test 3: GameController scene prompts ---")
+ui = UIManager()
+akm = ApiKeyManager()
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+adv_setup = AdventureSetup(ui, llm, ms)
+gwhr = GWHR()
+gc = GameController(akm, ui, ms, adv_setup, gwhr, llm)
+assert gc.prompt_assembler is adv_setup.prompt_assembler, "Controller should share AdventureSetup's assembler by default"
+akm.store_api_key("prompt-assembler-key")
+ms.set_selected_model("gemini-pro-mock")
+gwhr.initialize({"world_title": "Prefix Isle", "setting_description": "A misty archipelago.", "key_locations": [{"name": "Harbor", "description": "Docks."}]})
+
+captured_prompts = []
+original_generate = llm.generate
+def capturing_generate(prompt, model_id, expected_response_type):
+    captured_prompts.append(prompt)
+    return original_generate(prompt, model_id, expected_response_type)
+llm.generate = capturing_generate
+llm.generate_image = lambda image_prompt: "https://fakeurl.com/prefix.png"
+
+gc.initiate_scene("scene_a")
+gwhr.update_state({'current_game_time': 7})
+gc.initiate_scene("scene_b")
+assert len(captured_prompts) == 2
+first, second = captured_prompts
+assert "World: Prefix Isle" in first[:first.cacheable_prefix_length], "World summary should be in the static prefix"
+assert "Requested Scene ID" not in first[:first.cache_boundaries[-1]], "Scene ID leaked into a cacheable tier"
+assert "Current Game Time" not in first[:first.cache_boundaries[-1]], "Game time leaked into a cacheable tier"
+assert first[:first.cacheable_prefix_length] == second[:second.cacheable_prefix_length], "Static prefix differs between scene calls"
+scene_report = gc.get_prefix_reuse_report()['scene_description']
+assert scene_report['prefix_hits'] == 1 and scene_report['expected_prefix_reuse_rate'] > 0
+assert 'world_summary' not in gc.prompt_assembler.static_segments, "The world summary is passed per call, not stored on the shared assembler"
+print(f"Scene reuse report: {scene_report}")
+llm.generate = original_generate
+print("Test 3 Passed.")
+
+# Test 4: AdventureSetup blueprint prompt puts the preference last
+print("\n--- Test 4: Blueprint prompt ordering ---")
+adv_setup.store_preference("A haunted lighthouse mystery")
+blueprint_prompts = []
+def capture_blueprint(prompt, model_id, expected_response_type):
+    blueprint_prompts.append(prompt)
+    return "Mock blueprint"
+llm.generate = capture_blueprint
+adv_setup.generate_detailed_world_blueprint()
+assert blueprint_prompts[0].endswith("Player Adventure Preference: 'A haunted lighthouse mystery'")
+assert blueprint_prompts[0].startswith("Engine Guidelines:")
+llm.generate = original_generate
+print("Test 4 Passed.")
+
+print("\n--- PromptAssembler Tests Complete ---")
@@ -0,0 +1,116 @@
+import os
+import json
+import tempfile
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.puzzle_cache import PuzzleTransitionCache, puzzle_transition_key
+from game_logic.game_controller import GameController
+
+print("--- Test PuzzleTransitionCache: Replayed and Authored Puzzle Transitions ---")
+
+akm = ApiKeyManager()
+akm.store_api_key("puzzle-cache-key")
+
+def build_session(puzzle_cache, llm_calls):
+    ui = UIManager()
+    ui.display_scene = lambda scene_data: None
+    llm = LLMInterface(akm)
+    ms = ModelSelector(akm)
+    ms.set_selected_model("gemini-pro-mock")
+    gwhr = GWHR()
+    gwhr.initialize({"world_title": "Lever Keep", "setting_description": "A keep full of levers."})
+    gwhr.update_state({'current_scene_data': {"scene_id": "hall", "narrative": "Two levers.", "interactive_elements": []},
+                       'environmental_puzzle_log': {'gate': {'elements_state': {'lever_A': 'up', 'lever_B': 'up'}, 'clues_found': [], 'status': 'unsolved'}}})
+    def mock_generate(prompt, model_id, expected_response_type):
+        llm_calls.append(str(prompt))
+        if "Element Acted Upon ID: lever_A" in str(prompt) and '"lever_A": "up"' in str(prompt):
+            return json.dumps({"action_feedback_narrative": "Lever A clunks down.", "puzzle_state_changed": True,
+                               "updated_puzzle_elements_state": {"lever_A": "down"}, "new_clues_revealed": ["A hum starts."],
+                               "puzzle_solved": False, "solution_narrative": None})
+        return json.dumps({"action_feedback_narrative": "It will not budge.", "puzzle_state_changed": False,
+                           "updated_puzzle_elements_state": {}, "new_clues_revealed": [], "puzzle_solved": False, "solution_narrative": None})
+    llm.generate = mock_generate
+    gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, puzzle_cache=puzzle_cache)
+    return gc, gwhr
+
+# Test 1: Key is canonical; a repeated state+action pair replays without the LLM
+print("\n--- Test 1: Repeated action in the same state ---")
+assert puzzle_transition_key("w", "gate", {"a": 1, "b": 2}, "lever_A", None) == puzzle_transition_key("w", "gate", {"b": 2, "a": 1}, "lever_A", None)
+assert puzzle_transition_key("w", "gate", {}, "lever_A", None) != puzzle_transition_key("w", "gate", {}, "lever_A", "crowbar")
+assert puzzle_transition_key("w", "gate", {}, "lever_A", None) != puzzle_transition_key("other world", "gate", {}, "lever_A", None)
+cache = PuzzleTransitionCache()
+llm_calls = []
+gc, gwhr = build_session(cache, llm_calls)
+gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+assert len(llm_calls) == 1, "Second pull of lever B in an unchanged state must be replayed"
+gc.evaluate_environmental_puzzle_action('gate', 'lever_A')
+assert len(llm_calls) == 2
+gc.evaluate_environmental_puzzle_action('gate', 'lever_A')
+assert len(llm_calls) == 3, "Lever A is now down: a new state is a new key"
+puzzle = gwhr.data_store['environmental_puzzle_log']['gate']
+assert puzzle['elements_state'] == {'lever_A': 'down', 'lever_B': 'up'} and puzzle['clues_found'] == ["A hum starts."]
+stats = cache.get_stats()
+assert stats['hits'] == 1 and stats['misses'] == 3 and stats['entries'] == 3, stats
+assert gwhr.data_store['current_game_time'] == 4, "Replayed actions still take game time"
+print("Test 1 Passed.")
+
+# Test 2: Transitions persist and are shared by later sessions of the same world
+print("\n--- Test 2: Shared across sessions ---")
+with tempfile.TemporaryDirectory() as cache_dir:
+    cache_path = os.path.join(cache_dir, "puzzles.json")
+    first_calls = []
+    gc, gwhr = build_session(PuzzleTransitionCache(cache_path=cache_path), first_calls)
+    gc.evaluate_environmental_puzzle_action('gate', 'lever_A')
+    assert len(first_calls) == 1 and os.path.exists(cache_path)
+    second_calls = []
+    gc, gwhr = build_session(PuzzleTransitionCache(cache_path=cache_path), second_calls)
+    gc.evaluate_environmental_puzzle_action('gate', 'lever_A')
+    assert second_calls == [], "Another session of the same world replays the recorded transition"
+    puzzle = gwhr.data_store['environmental_puzzle_log']['gate']
+    assert puzzle['elements_state']['lever_A'] == 'down' and puzzle['clues_found'] == ["A hum starts."]
+    failing_calls = []
+    gc, gwhr = build_session(PuzzleTransitionCache(cache_path=cache_path), failing_calls)
+    gc.llm_interface.generate = lambda prompt, model_id, expected_response_type: failing_calls.append(prompt) or None
+    gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+    gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+    assert len(failing_calls) == 2, "LLM failures must not be cached"
+print("Test 2 Passed.")
+
+# Test 3: Authored puzzles never reach the LLM
+print("\n--- Test 3: Authored deterministic puzzle ---")
+authored = {
+    'puzzle_id': 'gate',
+    'initial_state': {'lever_A': 'up', 'lever_B': 'up', 'gate': 'closed'},
+    'transitions': [
+        {'element_id': 'lever_A', 'when': {'lever_A': 'up'}, 'set': {'lever_A': 'down'}, 'feedback': "Lever A drops."},
+        {'element_id': 'lever_B', 'when': {'lever_A': 'down', 'lever_B': 'up'}, 'set': {'lever_B': 'down', 'gate': 'open'},
+         'clues': ["The gate grinds open."], 'feedback': "Lever B drops."},
+        {'element_id': 'gate', 'item_id': 'crowbar', 'set': {'gate': 'pried'}, 'feedback': "The crowbar bends."},
+    ],
+    'solved_when': {'gate': 'open'},
+    'solution_narrative': "The way is clear.",
+    'default_feedback': "Nothing happens."
+}
+cache = PuzzleTransitionCache(authored_puzzles=[authored])
+llm_calls = []
+gc, gwhr = build_session(cache, llm_calls)
+gwhr.update_state({'environmental_puzzle_log': {}})
+gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+assert gwhr.data_store['environmental_puzzle_log'] == {}, "Out-of-order action changes nothing"
+gc.evaluate_environmental_puzzle_action('gate', 'gate')
+assert gwhr.data_store['environmental_puzzle_log'] == {}, "Transition requiring an item does not fire without it"
+gc.evaluate_environmental_puzzle_action('gate', 'lever_A')
+gc.evaluate_environmental_puzzle_action('gate', 'lever_B')
+puzzle = gwhr.data_store['environmental_puzzle_log']['gate']
+assert puzzle['elements_state'] == {'lever_A': 'down', 'lever_B': 'down', 'gate': 'open'} and puzzle['status'] == 'solved'
+assert puzzle['clues_found'] == ["The gate grinds open."]
+assert llm_calls == [] and cache.get_stats()['authored'] == 4
+assert [e['type'] for e in gwhr.data_store['event_log'] if e['type'].startswith('puzzle_')].count('puzzle_solved') == 1
+print("Test 3 Passed.")
+
+print("\n--- PuzzleTransitionCache Tests Completed ---")
@@ -0,0 +1,83 @@
+import json
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.response_validation import ResponseValidator, repair_json_text
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from game_logic.game_controller import GameController
+
+print("--- Test Response Validation and Repair ---")
+
+akm = ApiKeyManager()
+akm.store_api_key("validation-key")
+
+# Test 1: Common LLM JSON faults are repaired without another call
+print("\n--- Test 1: Local repair ---")
+faulty = {
+    'code_fence': '```json\n{"new_weather_condition": "rainy"}\n```',
+    'trailing_comma': '{"new_weather_condition": "rainy", "new_weather_intensity": "light",}',
+    'unescaped_quote': '{"new_weather_condition": "the so-called "red" fog"}',
+    'truncated_tail': '{"new_weather_condition": "rainy", "weather_effects_description": "Puddles form on the',
+}
+for expected_fix, text in faulty.items():
+    candidate, fixes = repair_json_text(text)
+    assert expected_fix in fixes, f"{expected_fix} not detected: {fixes}"
+    json.loads(candidate)
+llm = LLMInterface(akm)
+def no_followups(prompt, model_id, expected_response_type):
+    raise AssertionError("Locally repairable responses must not trigger a follow-up call")
+llm.generate = no_followups
+validator = ResponseValidator(llm)
+for text in faulty.values():
+    assert validator.parse(text, 'weather_update_description', "mock-model")['new_weather_condition']
+combat = validator.parse('{"turn_summary_narrative": "Hit!", "player_hp_change": "-5", "combat_ended": "false", "npc_hp_changes": [{"npc_id": "x", "hp_change": -3}, "oops"]}',
+                         'combat_turn_outcome', "mock-model")
+assert combat['player_hp_change'] == -5 and combat['combat_ended'] is False and combat['npc_hp_changes'] == [{"npc_id": "x", "hp_change": -3}]
+update_only = validator.parse('{"scene_id": "hall", "narrative_update": "The door creaks open."}', 'scene_description', "mock-model")
+assert update_only == {"scene_id": "hall", "narrative_update": "The door creaks open."}, "Action outcomes may carry only narrative_update"
+report = validator.get_repair_report()
+assert report['weather_update_description']['repaired_locally'] == 4 and report['weather_update_description']['followup_calls'] == 0
+assert report['combat_turn_outcome']['fixes'] == {'field_coercion': 1}
+print(f"Report: {report['_overall']}")
+print("Test 1 Passed.")
+
+# Test 2: A missing required field costs one small follow-up, not the full prompt again
+print("\n--- Test 2: Targeted follow-up ---")
+followup_prompts = []
+def fix_field(prompt, model_id, expected_response_type):
+    followup_prompts.append(prompt)
+    return '{"title": "On Ley Lines"}'
+llm.generate = fix_field
+validator = ResponseValidator(llm)
+entry = validator.parse('{"knowledge_id": "ley_lines", "content": "Rivers of power under the hills."}', 'codex_entry_generation', "mock-model")
+assert entry == {"knowledge_id": "ley_lines", "content": "Rivers of power under the hills.", "title": "On Ley Lines"}, entry
+assert len(followup_prompts) == 1 and '"title"' in followup_prompts[0] and "Context Hint" not in followup_prompts[0]
+llm.generate = lambda prompt, model_id, expected_response_type: "I cannot help with that."
+assert validator.parse('not json at all', 'codex_entry_generation', "mock-model") is None
+report = validator.get_repair_report()['codex_entry_generation']
+assert report['repaired_by_followup'] == 1 and report['failed'] == 1 and report['followup_calls'] == 2
+llm.generate = lambda prompt, model_id, expected_response_type: followup_prompts.append(prompt) or '{"narrative": "A hall."}'
+scene = validator.parse('{"scene_id": "hall", "narrative_update": 3}', 'scene_description', "mock-model")
+assert scene == {"scene_id": "hall", "narrative": "A hall."} and '"narrative"' in followup_prompts[-1], "Neither narrative field: one follow-up"
+print("Test 2 Passed.")
+
+# Test 3: The controller uses the repaired response instead of its canned fallback
+print("\n--- Test 3: Controller integration ---")
+ui = UIManager()
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+gwhr = GWHR()
+gwhr.update_state({'current_game_time': 10, 'world_state': {'current_weather': {'condition': 'clear'}}})
+def fenced_weather(prompt, model_id, expected_response_type):
+    return '```json\n{"new_weather_condition": "stormy", "new_weather_intensity": "violent", "weather_effects_description": "Thunder rolls.",}\n```'
+llm.generate = fenced_weather
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm, response_validator=ResponseValidator(llm))
+gc.check_and_update_time_based_events()
+weather = gwhr.data_store['world_state']['current_weather']
+assert weather['condition'] == "stormy", weather
+assert gc.response_validator.get_repair_report()['_overall']['repaired_locally'] == 1
+print("Test 3 Passed.")
+
+print("\n--- Response Validation Tests Complete ---")
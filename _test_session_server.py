@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+import os
+import tempfile
+import threading
+import http.client
+from game_logic.session_server import SessionServer
+
+print("--- Test SessionServer: Many Sessions over HTTP with Backpressure and Eviction ---")
+
+def http_request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                           headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+async def call(port, method, path, body=None):
+    return await asyncio.to_thread(http_request, port, method, path, body)
+
+eviction_dir = tempfile.mkdtemp(prefix="session-server-test-")
+
+# Test 1: Independent sessions over HTTP share one LLMInterface but keep their own worlds
+print("\n--- Test 1: Independent sessions ---")
+async def test_independent_sessions():
+    server = SessionServer(eviction_dir=eviction_dir)
+    await server.start(port=0)
+    port = server._server.sockets[0].getsockname()[1]
+    try:
+        created = await asyncio.gather(*(call(port, "POST", "/sessions", {"preference": f"World {i}"}) for i in range(3)))
+        assert all(status == 201 for status, _ in created), created
+        ids = [reply['session_id'] for _, reply in created]
+        first = created[0][1]
+        assert len(set(ids)) == 3 and first['kind'] == 'command' and not first['ended']
+        assert first['choices'] and first['scene']['scene_id'] and "World 0" in first['output'], "Setup output belongs to its session"
+        status, reply = await call(port, "POST", f"/sessions/{ids[0]}/input", {"line": "5"})
+        assert status == 200 and reply['kind'] == 'command', reply
+        assert "Invalid command" not in reply['output']
+        controllers = [server.sessions[session_id].controller for session_id in ids]
+        assert controllers[0].gwhr is not controllers[1].gwhr
+        assert controllers[0].gwhr.data_store['current_game_time'] == 1 and controllers[1].gwhr.data_store['current_game_time'] == 0
+        assert len({id(c.llm_interface) for c in controllers}) == 1, "One shared LLMInterface"
+        usage = server.llm_interface.token_meter.get_usage_report(group_by='session_id')
+        assert all(session_id in usage for session_id in ids), "Tokens are metered per session"
+        assert (await call(port, "POST", f"/sessions/{ids[1]}/input", {"nope": 1}))[0] == 400
+        assert (await call(port, "POST", "/sessions/ffffffffffffffffffffffffffffffff/input", {"line": "1"}))[0] == 404
+        assert (await call(port, "GET", "/nowhere"))[0] == 404
+        status, stats = await call(port, "GET", "/stats")
+        assert status == 200 and stats['created'] == 3 and stats['live_sessions'] == 3 and stats['lines'] == 1
+        status, _ = await call(port, "DELETE", f"/sessions/{ids[2]}")
+        assert status == 200 and ids[2] not in server.sessions
+        assert (await call(port, "GET", f"/sessions/{ids[2]}"))[0] == 404
+    finally:
+        await server.stop()
+asyncio.run(test_independent_sessions())
+print("Test 1 Passed.")
+
+# Test 2: A session with a full queue is pushed back without slowing others down
+print("\n--- Test 2: Per-session backpressure ---")
+async def test_backpressure():
+    server = SessionServer(eviction_dir=eviction_dir, max_pending_per_session=1)
+    original_generate = server.llm_interface.generate
+    turn_started, release_turn = threading.Event(), threading.Event()
+    held = {'session': None}
+    def held_generate(prompt, model_id, expected_response_type):
+        # Holds whatever the busy session's turn asks the LLM for until the test releases it.
+        if threading.current_thread() is held['session']:
+            turn_started.set()
+            release_turn.wait(10)
+        return original_generate(prompt, model_id, expected_response_type)
+    server.llm_interface.generate = held_generate
+    await server.start(port=0)
+    try:
+        busy_status, busy = await server.create_session()
+        other_status, other = await server.create_session()
+        assert busy_status == other_status == 201
+        held['session'] = server.sessions[busy['session_id']].thread
+        busy_lines = [asyncio.create_task(server.send_line(busy['session_id'], "5"))]
+        assert await asyncio.to_thread(turn_started.wait, 5), "The busy session's turn reached the LLM"
+        busy_lines += [asyncio.create_task(server.send_line(busy['session_id'], "5")) for _ in range(2)]
+        await asyncio.sleep(0.05) # The session thread is held inside its turn; one more line fits the queue
+        assert server.get_stats()['rejected'] == 1 and not any(task.done() for task in busy_lines[:1])
+        started = time.perf_counter()
+        status, reply = await server.send_line(other['session_id'], "m")
+        assert status == 200 and reply['kind'] == 'menu' and time.perf_counter() - started < 0.25, "Other sessions are not blocked"
+        await server.send_line(other['session_id'], "0")
+        release_turn.set()
+        statuses = sorted(status for status, _ in await asyncio.gather(*busy_lines))
+        assert statuses == [200, 200, 429], statuses
+        assert server.get_stats()['rejected'] == 1 and server.sessions[busy['session_id']].in_flight == 0
+    finally:
+        release_turn.set()
+        await server.stop()
+asyncio.run(test_backpressure())
+print("Test 2 Passed.")
+
+# Test 3: Idle sessions are evicted to disk and restored where they left off
+print("\n--- Test 3: Eviction and restore ---")
+async def test_eviction():
+    server = SessionServer(eviction_dir=eviction_dir, idle_timeout_s=0.0, max_live_sessions=2)
+    await server.start(port=0)
+    try:
+        _, first = await server.create_session()
+        session_id = first['session_id']
+        await server.send_line(session_id, "5")
+        scene_before = server.sessions[session_id].controller.gwhr.data_store['current_scene_data']['scene_id']
+        assert await server.sweep_idle() == 1 and session_id not in server.sessions
+        assert os.path.exists(os.path.join(eviction_dir, f"{session_id}.json"))
+        status, reply = await server.send_line(session_id, "m")
+        assert status == 200 and reply['kind'] == 'menu', reply
+        restored = server.sessions[session_id].controller.gwhr.data_store
+        assert restored['current_game_time'] == 1 and restored['current_scene_data']['scene_id'] == scene_before
+        await server.send_line(session_id, "0")
+        server.idle_timeout_s = 3600.0
+        await server.create_session()
+        await server.create_session() # Over max_live_sessions: the least recently used idle session makes room
+        assert session_id not in server.sessions and len(server.sessions) == 2
+        stats = server.get_stats()
+        assert stats['evicted'] == 2 and stats['restored'] == 1, stats
+        status, reply = await server.send_line(session_id, "5")
+        assert status == 200 and server.sessions[session_id].controller.gwhr.data_store['current_game_time'] == 2
+    finally:
+        await server.stop()
+    assert len([name for name in os.listdir(eviction_dir) if name.endswith(".json")]) >= 3, "Stopping saves live sessions"
+asyncio.run(test_eviction())
+print("Test 3 Passed.")
+
+print("\n--- SessionServer Tests Completed ---")
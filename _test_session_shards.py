@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+from game_logic.session_shards import ConsistentHashRing, ShardedSessionRouter, run_scaling_benchmark, format_benchmark
+
+# Shard workers are spawned processes that re-import this file, so the tests only run under __main__.
+
+def check_ring():
+    keys = [f"{i:032x}" for i in range(10000)]
+    ring = ConsistentHashRing(["w0", "w1", "w2", "w3"])
+    before = {key: ring.node_for(key) for key in keys}
+    shares = [list(before.values()).count(node) / len(keys) for node in ("w0", "w1", "w2", "w3")]
+    assert all(0.15 < share < 0.35 for share in shares), shares
+    ring.add_node("w4")
+    after = {key: ring.node_for(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == "w4" for key in moved), "Adding a node only takes keys, it never shuffles the others"
+    assert 0.1 < len(moved) / len(keys) < 0.3, len(moved)
+    ring.remove_node("w4")
+    assert {key: ring.node_for(key) for key in keys} == before
+    assert ConsistentHashRing().node_for("anything") is None
+
+async def check_routing_and_migration(eviction_dir):
+    router = ShardedSessionRouter(num_workers=2, eviction_dir=eviction_dir)
+    await router.start(listen=False)
+    try:
+        created = await asyncio.gather(*(router.create_session(f"World {i}") for i in range(8)))
+        assert all(status == 201 for status, _ in created), created
+        ids = [reply['session_id'] for _, reply in created]
+        assert all(router.placement[session_id] == router.ring.node_for(session_id) for session_id in ids)
+        assert len(set(router.placement.values())) == 2, "Eight sessions should land on both workers"
+        for session_id in ids:
+            status, reply = await router.send_line(session_id, "5")
+            assert status == 200 and reply['kind'] == 'command', reply
+        for session_id in ids:
+            status = await router.session_status(session_id)
+            assert status['live'] and status['game_time'] == 1 and status['worker'] == router.placement[session_id]
+        stats = await router.get_stats_async()
+        assert stats['live_sessions'] == 8 and stats['lines'] == 8 and stats['per_worker']['w0']['created'] >= 1
+
+        # A third worker takes over exactly the sessions the ring now gives it, with their state
+        holders_before = dict(router.placement)
+        new_worker = await router.add_worker()
+        expected_moves = {s for s in ids if router.ring.node_for(s) == new_worker}
+        assert {s for s in ids if router.placement[s] != holders_before[s]} == expected_moves
+        assert all(router.placement[s] == new_worker for s in expected_moves) and router.stats['migrated'] == len(expected_moves)
+        for session_id in ids:
+            status, reply = await router.send_line(session_id, "5")
+            assert status == 200, reply
+            assert (await router.session_status(session_id))['game_time'] == 2, "Game state survives the move"
+
+        # Removing it hands its sessions back
+        assert await router.remove_worker(new_worker)
+        assert set(router.placement.values()) <= {"w0", "w1"} and router.placement == holders_before
+        for session_id in ids:
+            assert (await router.session_status(session_id))['game_time'] == 2
+        assert await router.close_session(ids[0]) and await router.session_status(ids[0]) is None
+    finally:
+        final_stats = await router.stop()
+    assert set(final_stats) == {"w0", "w1"} and sum(s['live_sessions'] for s in final_stats.values()) == 0
+    saved = [name for name in os.listdir(eviction_dir) if name.endswith(".json")]
+    assert len(saved) == 7, "Stopping the workers saves their live sessions for the next start"
+
+    # A fresh router over the same directory picks the sessions back up through the ring
+    router = ShardedSessionRouter(num_workers=2, eviction_dir=eviction_dir)
+    await router.start(listen=False)
+    try:
+        status, reply = await router.send_line(ids[1], "5")
+        assert status == 200 and (await router.session_status(ids[1]))['game_time'] == 3
+    finally:
+        await router.stop()
+
+if __name__ == "__main__":
+    print("--- Test ShardedSessionRouter: Consistent Hashing, Sticky Routing and Snapshot Migration ---")
+
+    # Test 1: Consistent hashing spreads keys evenly and moves the minimum on a ring change
+    print("\n--- Test 1: ConsistentHashRing ---")
+    check_ring()
+    print("Test 1 Passed.")
+
+    # Test 2: Sessions stick to their ring owner and migrate as GWHR snapshots on rebalance
+    print("\n--- Test 2: Routing and migration across worker processes ---")
+    asyncio.run(check_routing_and_migration(tempfile.mkdtemp(prefix="session-shards-test-")))
+    print("Test 2 Passed.")
+
+    # Test 3: The scaling benchmark plays identical sessions at each worker count
+    print("\n--- Test 3: Scaling benchmark ---")
+    results = asyncio.run(run_scaling_benchmark([1, 2], sessions=4, turns=5, seed=11))
+    print(format_benchmark(results))
+    assert [r['workers'] for r in results] == [1, 2]
+    assert results[0]['replies'] == results[1]['replies'] >= 4 * 5, "Same seeds, same sessions, same work"
+    assert all(r['replies_per_s'] > 0 for r in results) and results[0]['speedup'] == 1.0 and results[0]['efficiency'] == 1.0
+    print("Test 3 Passed.")
+
+    print("\n--- ShardedSessionRouter Tests Completed ---")
@@ -0,0 +1,114 @@
+import time
+import asyncio
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.single_flight import SingleFlight, request_key
+
+print("--- Test Single-Flight Request Coalescing ---")
+
+akm = ApiKeyManager()
+akm.store_api_key("single-flight-key")
+
+backend_calls = []
+calls_lock = threading.Lock()
+def slow_backend(prompt, model_id, expected_response_type):
+    with calls_lock:
+        backend_calls.append(expected_response_type)
+    time.sleep(0.2) # Long enough for every concurrent caller to arrive while the first is in flight
+    return f'{{"scene_id": "scene_01_start", "call": {len(backend_calls)}}}'
+
+def make_llm(response_types):
+    llm = LLMInterface(akm, single_flight=SingleFlight(response_types=response_types))
+    llm._call_backend = slow_backend
+    return llm
+
+# Test 1: Concurrent identical threaded calls share one backend request
+print("\n--- Test 1: Threaded coalescing ---")
+llm = make_llm(['scene_description'])
+results = []
+def worker(prompt):
+    results.append(llm.generate(prompt, "mock-model", 'scene_description'))
+threads = [threading.Thread(target=worker, args=("Initiate scene: scene_01_start" + (" " if i % 2 else ""),)) for i in range(6)]
+for t in threads: t.start()
+for t in threads: t.join()
+assert len(backend_calls) == 1, f"Expected one backend call, got {len(backend_calls)}"
+assert len(set(results)) == 1 and results[0] is not None
+stats = llm.single_flight.get_stats()['scene_description']
+assert stats['leaders'] == 1 and stats['coalesced'] == 5, stats
+assert llm.token_meter.get_usage_report()['scene_description']['calls'] == 1, "Coalesced callers must not be metered twice"
+assert llm.single_flight.in_flight() == 0
+llm.generate("Initiate scene: scene_01_start", "mock-model", 'scene_description')
+assert len(backend_calls) == 2, "Completed results must not be cached"
+print("Test 1 Passed.")
+
+# Test 2: Different prompts, models and opted-out types are not coalesced
+print("\n--- Test 2: Keys and per-type opt-in ---")
+assert request_key("a  b\n", "m", "t") == request_key("a b", "m", "t")
+assert request_key("a b", "m1", "t") != request_key("a b", "m2", "t")
+backend_calls.clear()
+llm = make_llm(['scene_description'])
+threads = [threading.Thread(target=llm.generate, args=("Player Strategy: Attack", "mock-model", 'combat_turn_outcome')) for _ in range(3)]
+threads += [threading.Thread(target=llm.generate, args=(f"Initiate scene: scene_{i}", "mock-model", 'scene_description')) for i in range(2)]
+for t in threads: t.start()
+for t in threads: t.join()
+assert len(backend_calls) == 5, f"Nothing here should coalesce, got {len(backend_calls)} backend calls"
+print("Test 2 Passed.")
+
+# Test 3: asyncio callers coalesce with each other and with threaded callers
+print("\n--- Test 3: Asyncio coalescing ---")
+backend_calls.clear()
+llm = make_llm(['codex_entry_generation'])
+prompt = "Context Hint: ancient_ruins"
+thread_result = []
+async def run():
+    thread = threading.Thread(target=lambda: thread_result.append(llm.generate(prompt, "mock-model", 'codex_entry_generation')))
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(llm.generate_async(prompt, "mock-model", 'codex_entry_generation')) for _ in range(4)]
+    await asyncio.sleep(0.05)
+    thread.start()
+    ticks = 0
+    while not all(t.done() for t in tasks):
+        ticks += 1 # The event loop keeps running while the shared request is in flight
+        await asyncio.sleep(0.01)
+    thread.join()
+    return [t.result() for t in tasks], ticks, time.perf_counter() - started
+async_results, ticks, elapsed = asyncio.run(run())
+assert len(backend_calls) == 1, f"Expected one backend call, got {len(backend_calls)}"
+assert set(async_results) == set(thread_result) and len(set(async_results)) == 1
+assert ticks > 5, "Awaiting a coalesced call must not block the event loop"
+assert llm.single_flight.get_stats()['_overall']['coalesced'] == 4
+print(f"elapsed={elapsed:.2f}s ticks={ticks}")
+print("Test 3 Passed.")
+
+# Test 4: Every coalesced caller's session is charged, and the report counts them apart from backend calls
+print("\n--- Test 4: Metering coalesced callers ---")
+backend_calls.clear()
+llm = make_llm(['scene_description'])
+def session_worker(session_id):
+    llm.set_session(session_id)
+    llm.generate("Initiate scene: harbour", "mock-model", 'scene_description')
+threads = [threading.Thread(target=session_worker, args=(f"session_{i}",)) for i in range(4)]
+for t in threads: t.start()
+for t in threads: t.join()
+assert len(backend_calls) == 1
+usage = [llm.token_meter.get_session_usage(f"session_{i}") for i in range(4)]
+assert len(set(usage)) == 1 and usage[0] > 0, f"Each session pays for the shared scene: {usage}"
+report = llm.token_meter.get_usage_report()['scene_description']
+assert report['calls'] == 1 and report['coalesced'] == 3, report
+assert report['total_tokens'] == sum(usage)
+assert sum(1 for entry in llm.token_meter.records if entry['coalesced']) == 3
+by_session = llm.token_meter.get_usage_report('session_id')
+assert sorted(bucket['calls'] for bucket in by_session.values()) == [0, 0, 0, 1]
+async def run_async_sessions():
+    async def one(session_id):
+        llm.set_session(session_id)
+        return await llm.generate_async("Initiate scene: harbour", "mock-model", 'scene_description')
+    return await asyncio.gather(*(one(f"async_{i}") for i in range(3)))
+asyncio.run(run_async_sessions())
+assert len(backend_calls) == 2
+assert all(llm.token_meter.get_session_usage(f"async_{i}") == usage[0] for i in range(3))
+assert llm.token_meter.get_usage_report()['scene_description']['coalesced'] == 5
+print("Test 4 Passed.")
+
+print("\n--- Single-Flight Tests Complete ---")
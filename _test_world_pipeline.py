@@ -0,0 +1,85 @@
+import time
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.world_pipeline import WorldGenerationPipeline
+from game_logic.game_controller import GameController
+
+print("--- Test Pipelined World Generation ---")
+
+DELAYS = {'detailed_world_blueprint': 0.1, 'world_conception_section': 0.2, 'world_conception_document': 0.3, 'scene_description': 0.1}
+
+def build(slow_section=None, failing_section=None):
+    ui = UIManager()
+    akm = ApiKeyManager()
+    akm.store_api_key("pipeline-key")
+    llm = LLMInterface(akm)
+    ms = ModelSelector(akm)
+    ms.set_selected_model("gemini-pro-mock")
+    setup = AdventureSetup(ui, llm, ms)
+    setup.store_preference("A drowned city ruled by clockwork herons")
+    calls = [] # (response_type, section, start, end)
+    mock_backend = llm._call_backend
+    nested = threading.local()
+    def timed_backend(prompt, model_id, expected_response_type):
+        if getattr(nested, 'active', False): # The section mock reuses the full-document mock internally
+            return mock_backend(prompt, model_id, expected_response_type)
+        section = str(prompt).split("World Section: ")[1].split("\n")[0] if "World Section: " in str(prompt) else None
+        start = time.perf_counter()
+        time.sleep(DELAYS.get(expected_response_type, 0.0) * (3 if slow_section and section == slow_section else 1))
+        nested.active = True
+        try:
+            response = None if section == failing_section and section else mock_backend(prompt, model_id, expected_response_type)
+        finally:
+            nested.active = False
+        calls.append((expected_response_type, section, start, time.perf_counter()))
+        return response
+    llm._call_backend = timed_backend
+    gwhr = GWHR()
+    pipeline = WorldGenerationPipeline(setup)
+    gc = GameController(akm, ui, ms, setup, gwhr, llm, world_pipeline=pipeline)
+    return gc, pipeline, gwhr, calls
+
+# Test 1: Conception sections fan out in parallel and merge into one document
+print("\n--- Test 1: Parallel section fan-out ---")
+gc, pipeline, gwhr, calls = build()
+assert gc.generate_world_flow()
+timings = pipeline.get_stage_timings()
+section_calls = [c for c in calls if c[0] == 'world_conception_section']
+assert sorted(c[1] for c in section_calls) == ['characters', 'core', 'locations', 'plot_hook']
+assert timings['conception'] < 0.2 * 4 * 0.75, f"Sections should overlap, conception took {timings['conception']:.2f}s"
+store = gwhr.get_data_store()
+assert store['world_title'] == "The Mocked Isle of Eldoria" and len(store['key_locations']) == 3 and 'initial_plot_hook' in store
+assert "NullPointer Witch Lysandra" in [npc['name'] for npc in store['npcs'].values()], "Characters should become GWHR NPCs"
+assert {'blueprint', 'section:core', 'section:characters', 'conception', 'first_scene', 'total'} <= set(timings)
+print(f"Timings: { {k: round(v, 2) for k, v in timings.items()} }")
+print("Test 1 Passed.")
+
+# Test 2: The first scene starts while the slow character section is still generating and is reused on load
+print("\n--- Test 2: Early first scene ---")
+gc, pipeline, gwhr, calls = build(slow_section='characters')
+assert gc.generate_world_flow()
+characters_end = [c[3] for c in calls if c[1] == 'characters'][0]
+scene_start = [c[2] for c in calls if c[0] == 'scene_description'][0]
+assert scene_start < characters_end, "The scene should not wait for the character section"
+assert pipeline.get_stage_timings()['scene_context_ready'] < pipeline.get_stage_timings()['total']
+assert gc.initiate_scene('scene_01_start')
+assert len([c for c in calls if c[0] == 'scene_description']) == 1, "initiate_scene should use the pre-generated scene"
+assert gwhr.get_data_store()['current_scene_data']['scene_id'] == 'scene_01_start'
+print("Test 2 Passed.")
+
+# Test 3: A failed section falls back to the one-shot document and drops the early scene
+print("\n--- Test 3: Section failure fallback ---")
+gc, pipeline, gwhr, calls = build(failing_section='characters')
+assert gc.generate_world_flow()
+assert 'conception_fallback' in pipeline.get_stage_timings()
+assert [c for c in calls if c[0] == 'world_conception_document'], "Fallback should request the full document"
+assert gwhr.get_data_store()['world_title'] == "The Mocked Isle of Eldoria"
+assert gc._pregenerated_scene is None, "An early scene built from a discarded partial world must not be used"
+print("Test 3 Passed.")
+
+print("\n--- World Pipeline Tests Complete ---")
@@ -0,0 +1,98 @@
+import json
+import time
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.world_scheduler import WorldEventScheduler
+from game_logic.game_controller import GameController
+
+print("--- Test WorldEventScheduler: Ordered Events and Multi-Tick Fast-Forward ---")
+
+# Test 1: Events fire in time order, recurring ones per occurrence or coalesced, in O(due events)
+print("\n--- Test 1: Scheduler ordering and fast-forward ---")
+scheduler = WorldEventScheduler()
+fired = []
+record = lambda name: (lambda due_time, payload: fired.append((name, due_time, (payload or {}).get('missed_occurrences', 0))))
+scheduler.every(10, record("tide"), event_id="tide")
+scheduler.every(10, record("weather"), event_id="weather", coalesce=True)
+scheduler.at(15, record("bell"))
+cancelled = scheduler.at(12, record("never"))
+scheduler.at(25, lambda due_time, payload: scheduler.after(0, record("echo"))) # Scheduled from a callback, same advance
+assert scheduler.cancel(cancelled) and not scheduler.cancel(cancelled)
+scheduler.advance_to(5)
+assert fired == []
+scheduler.advance_to(13) # From 5: passes 10 even though 13 is not a multiple of 10
+assert fired == [("tide", 10, 0), ("weather", 10, 0)], fired
+fired.clear()
+scheduler.advance_to(42)
+assert fired == [("bell", 15, 0), ("tide", 20, 0), ("echo", 25, 0), ("tide", 30, 0), ("weather", 40, 2), ("tide", 40, 0)], fired
+assert scheduler.now == 42 and scheduler.pending() == [(50, "tide"), (50, "weather")]
+started = time.perf_counter()
+fired.clear()
+scheduler.advance_to(10_000_000) # A million tide occurrences would take seconds; coalesced weather is one call
+assert time.perf_counter() - started < 30
+assert fired[-1] == ("tide", 10_000_000, 0) and [f for f in fired if f[0] == "weather"] == [("weather", 10_000_000, 999_995)]
+scheduler.cancel("tide")
+stats_before = scheduler.get_stats()['fired']
+scheduler.advance_to(20_000_000)
+assert scheduler.get_stats()['fired'] == stats_before + 1, "Only the coalesced weather is due"
+print("Test 1 Passed.")
+
+# Test 2: The controller's weather no longer depends on landing exactly on a multiple of 10
+print("\n--- Test 2: Weather across advance_time jumps ---")
+akm = ApiKeyManager()
+akm.store_api_key("world-scheduler-key")
+ui = UIManager()
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+weather_prompts = []
+def mock_generate(prompt, model_id, expected_response_type):
+    if expected_response_type == 'weather_update_description':
+        weather_prompts.append(str(prompt))
+        return json.dumps({"new_weather_condition": f"rain{len(weather_prompts)}", "new_weather_intensity": "light",
+                           "weather_effects_description": "Rain."})
+    if expected_response_type == 'dynamic_event_outcome':
+        return json.dumps({"event_id": "bridge_collapse", "description": "The old bridge gives way."})
+    return None
+llm.generate = mock_generate
+gwhr = GWHR()
+gwhr.initialize({"world_title": "Clockwork Vale", "main_characters": [{"name": "Tilda", "role": "ferrywoman"}]})
+gc = GameController(akm, ui, ms, AdventureSetup(ui, llm, ms), gwhr, llm)
+gwhr.update_state({'current_game_time': 8})
+gc.advance_time(5) # 8 -> 13 used to skip the change due at 10
+assert len(weather_prompts) == 1 and "Current Game Time: 10" in weather_prompts[0]
+assert gwhr.data_store['world_state']['current_weather']['condition'] == "rain1"
+gc.advance_time(1)
+gc.advance_time(5)
+assert len(weather_prompts) == 1, "Nothing due between 13 and 19"
+gc.advance_time(31) # 19 -> 50: changes due at 20, 30, 40 and 50 collapse into the latest one
+assert len(weather_prompts) == 2 and "Current Game Time: 50" in weather_prompts[1]
+print("Test 2 Passed.")
+
+# Test 3: Dynamic events and NPC schedules interleave with the weather; a new world resets the schedule
+print("\n--- Test 3: Dynamic events, NPC schedules and world resets ---")
+npc_id = next(iter(gwhr.data_store['npcs']))
+gc.schedule_npc_event(npc_id, 3, {'current_location_id': 'ferry_dock'})
+gc.schedule_npc_event(npc_id, 7, {'current_location_id': 'market'}, every=20)
+gc.schedule_dynamic_event(8, "bridge_collapse")
+gc.advance_time(25) # 50 -> 75: npc@53, npc@57, dynamic@58, weather@70 (coalesced from 60), npc@77 not yet
+order = [e['type'] for e in gwhr.data_store['event_log'] if e['type'] in ('npc_schedule', 'dynamic_event', 'weather_change')]
+assert order[-4:] == ['npc_schedule', 'npc_schedule', 'dynamic_event', 'weather_change'], order
+assert gwhr.data_store['npcs'][npc_id]['current_location_id'] == 'market'
+assert gwhr.data_store['dynamic_world_events_log'][-1]['timestamp'] == 75, "Dynamic events log the time they are applied at"
+gc.schedule_dynamic_event(1, "stale_event")
+dynamic_events_before = len(gwhr.data_store['dynamic_world_events_log'])
+gwhr.initialize({"world_title": "Fresh Vale"}) # Keeps the clock at 75 but replaces the world
+pending = gc.world_scheduler.pending()
+assert gc.world_scheduler.now == 75 and [due for due, _ in pending] == [80, 80] and 'weather' in dict((e, d) for d, e in pending)
+gc.advance_time(12)
+assert len(weather_prompts) == 4 and "Current Game Time: 80" in weather_prompts[-1]
+assert len(gwhr.data_store['dynamic_world_events_log']) == dynamic_events_before, "One-shot events of the old world are dropped"
+assert gc.world_scheduler.get_stats()['errors'] == 0
+print("Test 3 Passed.")
+
+print("\n--- WorldEventScheduler Tests Completed ---")
@@ -0,0 +1,74 @@
+import io
+import shutil
+import tempfile
+import contextlib
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.world_templates import WorldTemplateLibrary, preference_terms
+from game_logic.game_controller import GameController
+from game_logic.world_template_builder import build_template_library
+
+print("--- Test World Template Library ---")
+
+library_dir = tempfile.mkdtemp(prefix="world_templates_test_")
+ui = UIManager()
+akm = ApiKeyManager()
+akm.store_api_key("template-key")
+llm = LLMInterface(akm)
+ms = ModelSelector(akm)
+ms.set_selected_model("gemini-pro-mock")
+
+try:
+    # Test 1: Batch build stores every theme with its opening scene, and the index survives a reload
+    print("\n--- Test 1: Batch build ---")
+    themes = ["Pirate adventure among cursed islands hunting sunken treasure",
+              "Cyberpunk megacity heist against a corrupt AI corporation",
+              "Wuxia martial arts tale of rival sects and a stolen sword manual"]
+    library = WorldTemplateLibrary(library_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        built = build_template_library(themes, library, llm, ms, ui, max_workers=3)
+    assert len(built) == 3 and len(WorldTemplateLibrary(library_dir)) == 3
+    template = library.get(built[0])
+    assert template['blueprint'] and template['world_conception_document']['world_title']
+    assert template['opening_scene_id'] == 'scene_01_start' and template['opening_scene_json']
+    print("Test 1 Passed.")
+
+    # Test 2: Lexical matching picks the closest theme and rejects unrelated preferences
+    print("\n--- Test 2: Preference matching ---")
+    assert preference_terms("I want 武侠 swords") == ['武', '侠', 'swords']
+    template, score = library.find_best("a heist in a neon cyberpunk city run by an evil corporation")
+    assert template['theme'].startswith("Cyberpunk"), template['theme']
+    assert library.find_best("pirates and sunken treasure")[0]['theme'].startswith("Pirate")
+    assert library.find_best("quiet gardening simulator") is None
+    print(f"Best match score: {score:.2f}")
+    print("Test 2 Passed.")
+
+    # Test 3: A matched preference starts the game without any world-generation or opening-scene calls
+    print("\n--- Test 3: Instant start ---")
+    llm_calls = []
+    def recording_generate(prompt, model_id, expected_response_type):
+        llm_calls.append(expected_response_type)
+        return None
+    llm.generate = recording_generate
+    ui.show_adventure_preference_screen = lambda: "Cursed pirate islands and sunken treasure!"
+    setup = AdventureSetup(ui, llm, ms, template_library=WorldTemplateLibrary(library_dir))
+    gwhr = GWHR()
+    gc = GameController(akm, ui, ms, setup, gwhr, llm)
+    assert gc.request_adventure_preferences_flow()
+    assert setup.matched_template and setup.matched_template['theme'].startswith("Pirate")
+    assert gc.generate_world_flow()
+    assert gc.initiate_scene('scene_01_start')
+    assert llm_calls == [], f"Instant start should not call the LLM, got {llm_calls}"
+    assert gwhr.get_data_store()['world_title'] == "The Mocked Isle of Eldoria"
+    assert gwhr.get_data_store()['current_scene_data']['scene_id'] == 'scene_01_start'
+    ui.show_adventure_preference_screen = lambda: "quiet gardening simulator"
+    assert setup.request_adventure_preference() and setup.matched_template is None
+    print("Test 3 Passed.")
+finally:
+    shutil.rmtree(library_dir, ignore_errors=True)
+
+print("\n--- World Template Tests Complete ---")
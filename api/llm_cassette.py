@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import threading
+from api.single_flight import request_key
+
+CASSETTE_VERSION = 1
+IMAGE_RESPONSE_TYPE = 'image_generation' # Cassette key type for LLMInterface.generate_image
+IMAGE_MODEL_ID = 'image'
+
+
+class LLMCassette:
+    # Record/replay of backend calls for deterministic sessions. In 'record' mode every backend response
+    # is stored with its latency under request_key(prompt, model_id, response_type); in 'replay' mode the
+    # same requests are served from the cassette after sleeping the recorded latency times latency_scale
+    # (or a fixed latency_s), so a full session replays with the timing of the recording and none of the
+    # backend's variance. A key asked several times replays its responses in recorded order, then repeats
+    # the last one. Requests missing from the cassette go to the backend (miss_policy='backend') or fail
+    # as a backend error would (miss_policy='fail'); either way they are counted.
+    MODES = ('record', 'replay')
+
+    def __init__(self, path: str | None = None, mode: str = 'replay', latency_scale: float = 1.0,
+                 latency_s: float | None = None, miss_policy: str = 'backend'):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        if miss_policy not in ('backend', 'fail'):
+            raise ValueError("miss_policy must be 'backend' or 'fail'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale # Replay: recorded latency multiplier; 0 replays as fast as possible
+        self.latency_s = latency_s # Replay: fixed latency for every call instead of the recorded one
+        self.miss_policy = miss_policy
+        self._entries: dict[str, list] = {} # key -> [{'model_id', 'response_type', 'response', 'latency_s'}]
+        self._cursors: dict[str, int] = {} # key -> next recorded response to replay
+        self.stats = {'recorded': 0, 'replayed': 0, 'misses': 0, 'replayed_latency_s': 0.0}
+        self._lock = threading.Lock()
+        if self.path and mode == 'replay': # A recording starts empty and replaces the file on save()
+            self.load(self.path)
+
+    def load(self, path: str) -> int:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"LLMCassette: Could not read cassette '{path}': {e}")
+            return 0
+        if not isinstance(data, dict) or data.get('version') != CASSETTE_VERSION or not isinstance(data.get('entries'), dict):
+            print(f"LLMCassette: Ignoring cassette '{path}' with an unknown format.")
+            return 0
+        with self._lock:
+            for key, recordings in data['entries'].items():
+                if isinstance(recordings, list):
+                    self._entries.setdefault(key, []).extend(r for r in recordings if isinstance(r, dict) and 'response' in r)
+            self._cursors.clear()
+            return sum(len(recordings) for recordings in self._entries.values())
+
+    def save(self, path: str | None = None) -> bool:
+        path = path or self.path
+        if not path:
+            return False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {'version': CASSETTE_VERSION, 'entries': self._entries}
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, sort_keys=True)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"LLMCassette: Could not write cassette '{path}': {e}")
+                return False
+        return True
+
+    def call(self, prompt: str, model_id: str, response_type: str, backend):
+        # Stands in for backend(): records around it, or replays instead of it.
+        key = request_key(prompt, model_id, response_type)
+        if self.mode == 'record':
+            started = time.perf_counter()
+            response = backend()
+            latency_s = time.perf_counter() - started
+            with self._lock:
+                self._entries.setdefault(key, []).append({'model_id': model_id, 'response_type': response_type,
+                                                          'response': response, 'latency_s': latency_s})
+                self.stats['recorded'] += 1
+            return response
+
+        with self._lock:
+            recordings = self._entries.get(key)
+            if recordings:
+                cursor = self._cursors.get(key, 0)
+                recording = recordings[min(cursor, len(recordings) - 1)]
+                self._cursors[key] = cursor + 1
+                self.stats['replayed'] += 1
+            else:
+                recording = None
+                self.stats['misses'] += 1
+        if recording is None:
+            print(f"LLMCassette: No recording for {response_type} on '{model_id}'" +
+                  (", calling the backend." if self.miss_policy == 'backend' else "."))
+            if self.miss_policy == 'fail':
+                raise LookupError(f"no cassette recording for {response_type}")
+            return backend()
+        delay = self.latency_s if self.latency_s is not None else (recording.get('latency_s') or 0.0) * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.stats['replayed_latency_s'] += delay
+        return recording['response']
+
+    def rewind(self):
+        # Replays the cassette from the start again, e.g. before the next session of a benchmark.
+        with self._lock:
+            self._cursors.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, mode=self.mode, keys=len(self._entries),
+                        recordings=sum(len(recordings) for recordings in self._entries.values()))
@@ -1,12 +1,31 @@
 import urllib.parse # For URL encoding image prompt snippets
 import json # For using json.dumps in mock responses
+import time # For measuring call latency
+import asyncio
 from api.api_key_manager import ApiKeyManager # Assuming execution from root or PYTHONPATH configured
+from api.token_meter import TokenMeter, estimate_tokens
+from api.model_router import ModelRouter
+from api.single_flight import SingleFlight, request_key
+from api.llm_cassette import LLMCassette, IMAGE_MODEL_ID, IMAGE_RESPONSE_TYPE
 
 class LLMInterface:
-    def __init__(self, api_key_manager: ApiKeyManager):
+    def __init__(self, api_key_manager: ApiKeyManager, token_meter: TokenMeter | None = None,
+                 model_router: ModelRouter | None = None, single_flight: SingleFlight | None = None,
+                 cassette: LLMCassette | None = None):
         self.api_key_manager = api_key_manager
+        self.token_meter = token_meter if token_meter is not None else TokenMeter()
+        self.model_router = model_router # When set, model_id is only the last resort of the routed cascade
+        self.single_flight = single_flight # Optional coalescing of identical concurrent requests, per response type
+        self.cassette = cassette # Optional record/replay of backend calls for deterministic benchmark sessions
 
-    def generate(self, prompt: str, model_id: str, expected_response_type: str) -> str | None:
+    def set_session(self, session_id: str):
+        self.token_meter.set_session(session_id)
+
+    def begin_turn(self) -> int:
+        return self.token_meter.begin_turn()
+
+    def _prepare_call(self, prompt: str, model_id: str, expected_response_type: str) -> int | None:
+        # Returns the prompt's estimated token count, or None if the call must not be made.
         api_key = self.api_key_manager.get_api_key()
         if not api_key:
             print("LLMInterface: Error - API Key not available. Cannot make LLM call.")
@@ -17,12 +36,100 @@ class LLMInterface:
             print("LLMInterface: Error - Model ID not provided. Cannot make LLM call.")
             return None
 
+        prompt_tokens = estimate_tokens(str(prompt))
+        budget_error = self.token_meter.check_budget(prompt_tokens)
+        if budget_error:
+            print(f"LLMInterface: Error - Token budget check failed ({expected_response_type}): {budget_error}. Skipping LLM call.")
+            return None
+        return prompt_tokens
+
+    def generate(self, prompt: str, model_id: str, expected_response_type: str) -> str | None:
+        prompt_tokens = self._prepare_call(prompt, model_id, expected_response_type)
+        if prompt_tokens is None:
+            return None
+        led = [] # Stays empty if this caller shared another caller's in-flight request
+        def call():
+            led.append(True)
+            return self._generate_routed(prompt, model_id, expected_response_type, prompt_tokens)
+        if self.single_flight and self.single_flight.is_enabled(expected_response_type):
+            response = self.single_flight.do(request_key(prompt, model_id, expected_response_type), expected_response_type, call)
+            if not led:
+                self._record_coalesced(model_id, expected_response_type, prompt_tokens, response)
+            return response
+        return call()
+
+    async def generate_async(self, prompt: str, model_id: str, expected_response_type: str) -> str | None:
+        # Same contract as generate for asyncio callers: the blocking backend call runs on a worker
+        # thread, and identical requests coalesce with threaded callers of the same key.
+        prompt_tokens = self._prepare_call(prompt, model_id, expected_response_type)
+        if prompt_tokens is None:
+            return None
+        led = []
+        def call():
+            led.append(True)
+            return self._generate_routed(prompt, model_id, expected_response_type, prompt_tokens)
+        if self.single_flight and self.single_flight.is_enabled(expected_response_type):
+            response = await self.single_flight.do_async(request_key(prompt, model_id, expected_response_type), expected_response_type, call)
+            if not led:
+                self._record_coalesced(model_id, expected_response_type, prompt_tokens, response)
+            return response
+        return await asyncio.to_thread(call)
+
+    def _record_coalesced(self, model_id: str, expected_response_type: str, prompt_tokens: int, response: str | None):
+        # The leader's _timed_call metered the backend request under its own session; a follower's session
+        # consumed the same prompt and completion, so it is charged them too, flagged as coalesced.
+        self.token_meter.record(expected_response_type, model_id, prompt_tokens, estimate_tokens(response), coalesced=True)
+
+    def _generate_routed(self, prompt: str, model_id: str, expected_response_type: str, prompt_tokens: int) -> str | None:
+        if not self.model_router:
+            return self._timed_call(prompt, model_id, expected_response_type, prompt_tokens)
+
+        cascade = self.model_router.route(expected_response_type, model_id)[:self.model_router.max_attempts]
+        for attempt, candidate_model_id in enumerate(cascade):
+            if not self.model_router.begin_call(candidate_model_id):
+                continue # Benched, or another call is already probing it
+            if attempt:
+                print(f"LLMInterface: Falling back to '{candidate_model_id}' for {expected_response_type} (attempt {attempt + 1}/{len(cascade)}).")
+            try:
+                response = self._timed_call(prompt, candidate_model_id, expected_response_type, prompt_tokens)
+            except BaseException:
+                self.model_router.release_call(candidate_model_id)
+                raise
+            if response is not None:
+                return response
+        print(f"LLMInterface: Error - All routed models failed for {expected_response_type}: {cascade}")
+        return None
+
+    def _timed_call(self, prompt: str, model_id: str, expected_response_type: str, prompt_tokens: int) -> str | None:
+        start_time = time.perf_counter()
+        try:
+            if self.cassette:
+                response = self.cassette.call(prompt, model_id, expected_response_type,
+                                              lambda: self._call_backend(prompt, model_id, expected_response_type))
+            else:
+                response = self._call_backend(prompt, model_id, expected_response_type)
+        except Exception as e:
+            print(f"LLMInterface: Error - Backend call to '{model_id}' failed: {e}")
+            response = None
+        latency_s = time.perf_counter() - start_time
+        # A real backend would report usage metadata; the local estimate stands in for it here.
+        self.token_meter.record(expected_response_type, model_id, prompt_tokens, estimate_tokens(response), latency_s)
+        if self.model_router:
+            self.model_router.record_result(model_id, latency_s, response is not None)
+        return response
+
+    def _call_backend(self, prompt: str, model_id: str, expected_response_type: str) -> str | None:
         print("LLMInterface: Preparing to call LLM (simulated)...")
         print(f"  Model ID: {model_id}")
         print(f"  Expected Response Type: {expected_response_type}")
         # Ensure prompt is a string before slicing, though type hint suggests it is.
         prompt_str = str(prompt) 
         print(f"  Prompt (first 100 chars): {prompt_str[:100]}...")
+        # Prompts built by PromptAssembler carry the offsets where their static and session tiers end.
+        # A real backend would hand these to the provider's prefix/context cache.
+        cache_boundaries = getattr(prompt, 'cache_boundaries', ())
+        if cache_boundaries:
+            print(f"  Cacheable prefix boundaries (chars): {list(cache_boundaries)} of {len(prompt_str)}")
 
         # Simulate LLM call based on expected_response_type
         if expected_response_type == 'detailed_world_blueprint':
@@ -49,6 +156,15 @@ class LLMInterface:
 }}'''
             print("LLMInterface: Mock LLM call successful (world_conception_document as JSON string).")
             return mock_json_string
+        elif expected_response_type == 'world_conception_section':
+            # Serve the requested keys out of the full mock document.
+            full_document = json.loads(self._call_backend(prompt, model_id, 'world_conception_document'))
+            section_keys = list(full_document)
+            if "Section Keys:" in prompt_str:
+                section_keys = [k.strip() for k in prompt_str.split("Section Keys:")[1].split("\n")[0].split(",")]
+            mock_json_string = json.dumps({k: full_document[k] for k in section_keys if k in full_document}, indent=2)
+            print("LLMInterface: Mock LLM call successful (world_conception_section as JSON string).")
+            return mock_json_string
         elif expected_response_type == 'scene_description':
             prompt_snippet_for_scene_id = prompt_str[:70].replace("\n", " ").replace("'", "\\'").replace('"', '\\"') # Escape single and double quotes
             mock_json_string = f'''
@@ -170,6 +286,20 @@ class LLMInterface:
 '''
             print("LLMInterface: Mock LLM call successful (combat_turn_outcome as JSON string).")
             return mock_json_string
+        elif expected_response_type == 'combat_turn_narration':
+            # Mechanics come pre-resolved in the prompt; the mock just retells them.
+            resolved_lines = []
+            if "Resolved Mechanics:" in prompt_str:
+                for line in prompt_str.split("Resolved Mechanics:")[1].strip().split("\n"):
+                    if not line.strip():
+                        break
+                    resolved_lines.append(line.strip())
+            mock_json_string = json.dumps({
+                "turn_summary_narrative": "Steel flashes in the dim light. " + " ".join(resolved_lines),
+                "player_strategy_feedback": None
+            }, indent=2)
+            print("LLMInterface: Mock LLM call successful (combat_turn_narration as JSON string).")
+            return mock_json_string
         elif expected_response_type == 'environmental_puzzle_solution_eval':
             puzzle_id_in_prompt = "unknown_puzzle"
             action_in_prompt = "unknown_action"
@@ -282,6 +412,22 @@ class LLMInterface:
 '''
             print("LLMInterface: Mock LLM call successful (weather_update_description as JSON string).")
             return mock_json_string
+        elif expected_response_type == 'npc_memory_summary':
+            # Fold the player's lines into a one-sentence summary; each exchange yields one "fact".
+            player_lines = []
+            if "Exchanges to fold in:" in prompt_str:
+                player_lines = [line[len("Player:"):].strip() for line in prompt_str.split("Exchanges to fold in:")[1].split("\n")
+                                if line.startswith("Player:")]
+            previous_summary = ""
+            if "Previous Summary:" in prompt_str:
+                previous_summary = prompt_str.split("Previous Summary:")[1].split("\n")[0].strip()
+                previous_summary = "" if previous_summary == "(none)" else previous_summary + " "
+            mock_json_string = json.dumps({
+                "summary": f"{previous_summary}The player talked about: {'; '.join(player_lines)}.",
+                "salient_facts": [f"Player mentioned '{line[:40]}'" for line in player_lines[:2]]
+            }, indent=2)
+            print("LLMInterface: Mock LLM call successful (npc_memory_summary as JSON string).")
+            return mock_json_string
         else:
             # Generic mock response for other types
             mock_response = f"Mock LLM Response for {expected_response_type} using prompt (first 20 chars: '{prompt_str[:20]}...')."
@@ -293,7 +439,15 @@ class LLMInterface:
         if not api_key:
             print("LLMInterface: Error - API Key not available. Cannot make Image LLM call.")
             return None
+        if self.cassette:
+            try:
+                return self.cassette.call(image_prompt, IMAGE_MODEL_ID, IMAGE_RESPONSE_TYPE, lambda: self._call_image_backend(image_prompt))
+            except LookupError as e:
+                print(f"LLMInterface: Error - Image generation failed: {e}")
+                return None
+        return self._call_image_backend(image_prompt)
 
+    def _call_image_backend(self, image_prompt: str) -> str | None:
         print("LLMInterface: Preparing to call Image Generation LLM (imagen-3.0-generate-002 - simulated)...")
         # Ensure image_prompt is a string before slicing
         image_prompt_str = str(image_prompt)
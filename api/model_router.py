@@ -0,0 +1,213 @@
+import re
+import time
+import threading
+
+# Which kind of model each response type needs: world generation is rare and high-stakes,
+# combat turns and weather run every few turns and mostly need to be quick.
+DEFAULT_TIER_BY_RESPONSE_TYPE = {
+    'detailed_world_blueprint': 'strong',
+    'world_conception_document': 'strong',
+    'world_conception_section': 'strong',
+    'scene_description': 'balanced',
+    'npc_dialogue_response': 'balanced',
+    'environmental_puzzle_solution_eval': 'balanced',
+    'dynamic_event_outcome': 'balanced',
+    'codex_entry_generation': 'fast',
+    'combat_turn_outcome': 'fast',
+    'combat_turn_narration': 'fast',
+    'weather_update_description': 'fast',
+    'npc_memory_summary': 'fast',
+}
+
+# Tiers tried, in order, once every model of the preferred tier is exhausted or degraded.
+DEFAULT_FALLBACK_TIERS = {
+    'fast': ('balanced', 'strong'),
+    'balanced': ('strong', 'fast'),
+    'strong': ('balanced', 'fast'),
+}
+
+DEFAULT_LATENCY_SLO_S = {'fast': 3.0, 'balanced': 8.0, 'strong': 30.0}
+
+
+def classify_model_tier(model_id: str) -> str:
+    # Whole name tokens only: 'mini' must not match inside 'gemini'.
+    tokens = set(re.split(r"[^a-z0-9]+", (model_id or '').lower()))
+    if tokens & {'flash', 'lite', 'mini', 'haiku', 'nano'}:
+        return 'fast'
+    if tokens & {'pro', 'ultra', 'opus', 'large'}:
+        return 'strong'
+    return 'balanced'
+
+
+class ModelRouter:
+    def __init__(self, tier_by_response_type: dict | None = None, fallback_tiers: dict | None = None,
+                 latency_slo_s: dict | None = None, default_tier: str = 'balanced',
+                 ewma_alpha: float = 0.3, max_error_rate: float = 0.5,
+                 failure_threshold: int = 3, cooldown_s: float = 60.0, max_attempts: int = 3,
+                 ewma_half_life_s: float | None = 120.0):
+        self.tier_by_response_type = dict(DEFAULT_TIER_BY_RESPONSE_TYPE)
+        self.tier_by_response_type.update(tier_by_response_type or {})
+        self.fallback_tiers = dict(DEFAULT_FALLBACK_TIERS)
+        self.fallback_tiers.update(fallback_tiers or {})
+        self.latency_slo_s = dict(DEFAULT_LATENCY_SLO_S)
+        self.latency_slo_s.update(latency_slo_s or {})
+        self.default_tier = default_tier
+        self.ewma_alpha = ewma_alpha
+        self.max_error_rate = max_error_rate
+        self.failure_threshold = failure_threshold # Consecutive failures before a model is benched
+        self.cooldown_s = cooldown_s
+        self.max_attempts = max_attempts
+        # Latency and error EWMAs fade towards neutral at this rate while a model gets no traffic, so a model
+        # demoted for being slow or flaky is eventually tried again; None keeps them as last observed.
+        self.ewma_half_life_s = ewma_half_life_s
+        self.tier_models: dict[str, list] = {} # tier -> model ids, in configured preference order
+        self.model_health: dict[str, dict] = {}
+        self._clock = time.monotonic
+        self._lock = threading.Lock()
+
+    def set_tier_models(self, tier: str, model_ids: list):
+        with self._lock:
+            self.tier_models[tier] = list(model_ids)
+
+    def configure_from_available_models(self, model_ids: list, selected_model_id: str | None = None):
+        # Buckets the fetched models by name; the player's pick leads its own tier.
+        tiers: dict[str, list] = {}
+        for model_id in model_ids or []:
+            tiers.setdefault(classify_model_tier(model_id), []).append(model_id)
+        if selected_model_id:
+            selected_tier = classify_model_tier(selected_model_id)
+            models = [m for m in tiers.get(selected_tier, []) if m != selected_model_id]
+            tiers[selected_tier] = [selected_model_id] + models
+        with self._lock:
+            self.tier_models = tiers
+        print(f"ModelRouter: Tier models configured: {tiers}")
+
+    def get_tier(self, response_type: str) -> str:
+        return self.tier_by_response_type.get(response_type, self.default_tier)
+
+    def _model_tier(self, model_id: str) -> str:
+        # Called with the lock held.
+        for tier, models in self.tier_models.items():
+            if model_id in models:
+                return tier
+        return classify_model_tier(model_id)
+
+    def _health(self, model_id: str) -> dict:
+        return self.model_health.setdefault(model_id, {
+            'calls': 0, 'failures': 0, 'consecutive_failures': 0,
+            'ewma_latency_s': None, 'ewma_error_rate': 0.0, 'benched_until': 0.0,
+            'probing': False, 'updated_at': self._clock()
+        })
+
+    def _current_ewmas(self, health: dict, tier: str, now: float) -> tuple:
+        # (latency, error rate) faded towards neutral (the tier's optimistic prior, no errors) since the last result.
+        latency, error_rate = health['ewma_latency_s'], health['ewma_error_rate']
+        if not self.ewma_half_life_s:
+            return latency, error_rate
+        factor = 0.5 ** (max(0.0, now - health['updated_at']) / self.ewma_half_life_s)
+        if latency is not None:
+            prior = self.latency_slo_s.get(tier, 0.0) / 2
+            latency = prior + (latency - prior) * factor
+        return latency, error_rate * factor
+
+    def _is_degraded(self, model_id: str, tier: str, now: float) -> bool:
+        # Called with the lock held.
+        health = self.model_health.get(model_id)
+        if not health:
+            return False
+        if health['benched_until']:
+            # Once the cooldown is over the model is routed normally again, but only one call at a time may
+            # probe it (half-open, see begin_call); a failure re-benches it straight away because its
+            # consecutive failure count is still at the threshold.
+            return health['benched_until'] > now or health['probing']
+        latency, error_rate = self._current_ewmas(health, tier, now)
+        if error_rate > self.max_error_rate:
+            return True
+        slo = self.latency_slo_s.get(tier)
+        return slo is not None and latency is not None and latency > slo
+
+    def _expected_latency(self, model_id: str, tier: str, now: float) -> float:
+        health = self.model_health.get(model_id)
+        if not health or health['ewma_latency_s'] is None:
+            return self.latency_slo_s.get(tier, 0.0) / 2 # Optimistic prior so unseen models get tried
+        latency, error_rate = self._current_ewmas(health, tier, now)
+        # Errors cost a retry, so weigh latency by how often the call has to be repeated.
+        return latency * (1.0 + error_rate)
+
+    def route(self, response_type: str, requested_model_id: str | None = None) -> list:
+        # Ordered cascade of models to try: healthy models of the preferred tier by expected latency,
+        # then the fallback tiers, then the caller's model, with degraded models pushed to the very end.
+        tier = self.get_tier(response_type)
+        now = self._clock()
+        healthy, degraded = [], []
+        with self._lock:
+            for candidate_tier in (tier,) + tuple(self.fallback_tiers.get(tier, ())):
+                models = self.tier_models.get(candidate_tier, [])
+                ranked = sorted(models, key=lambda m: (self._expected_latency(m, candidate_tier, now), models.index(m)))
+                for model_id in ranked:
+                    (degraded if self._is_degraded(model_id, candidate_tier, now) else healthy).append(model_id)
+            if requested_model_id:
+                (degraded if self._is_degraded(requested_model_id, tier, now) else healthy).append(requested_model_id)
+        cascade = []
+        for model_id in healthy + degraded:
+            if model_id not in cascade:
+                cascade.append(model_id)
+        return cascade
+
+    def begin_call(self, model_id: str) -> bool:
+        # Claimed right before a routed call. Once a benched model's cooldown is over, the first call claims
+        # its single probe and others skip it (False) until record_result or release_call ends the probe.
+        # Within the cooldown a benched model is only reached as the cascade's last resort, as before.
+        now = self._clock()
+        with self._lock:
+            health = self.model_health.get(model_id)
+            if not health or not health['benched_until'] or health['benched_until'] > now:
+                return True
+            if health['probing']:
+                return False
+            health['probing'] = True
+            return True
+
+    def release_call(self, model_id: str):
+        # The claimed call was not made after all; the next route may probe the model again.
+        with self._lock:
+            health = self.model_health.get(model_id)
+            if health:
+                health['probing'] = False
+
+    def record_result(self, model_id: str, latency_s: float, success: bool):
+        alpha = self.ewma_alpha
+        now = self._clock()
+        with self._lock:
+            health = self._health(model_id)
+            latency, error_rate = self._current_ewmas(health, self._model_tier(model_id), now)
+            health['calls'] += 1
+            health['probing'] = False
+            health['updated_at'] = now
+            if latency is None:
+                health['ewma_latency_s'] = latency_s
+            else:
+                health['ewma_latency_s'] = alpha * latency_s + (1 - alpha) * latency
+            health['ewma_error_rate'] = alpha * (0.0 if success else 1.0) + (1 - alpha) * error_rate
+            if success:
+                health['consecutive_failures'] = 0
+                health['benched_until'] = 0.0
+            else:
+                health['failures'] += 1
+                health['consecutive_failures'] += 1
+                if health['consecutive_failures'] >= self.failure_threshold:
+                    health['benched_until'] = self._clock() + self.cooldown_s
+                    print(f"ModelRouter: '{model_id}' failed {health['consecutive_failures']} times in a row; benched for {self.cooldown_s}s.")
+
+    def get_health_report(self) -> dict:
+        now = self._clock()
+        report = {}
+        with self._lock:
+            for model_id, h in self.model_health.items():
+                latency, error_rate = self._current_ewmas(h, self._model_tier(model_id), now)
+                report[model_id] = {
+                    'calls': h['calls'], 'failures': h['failures'],
+                    'ewma_latency_s': latency, 'ewma_error_rate': error_rate,
+                    'benched': h['benched_until'] > now
+                }
+        return report
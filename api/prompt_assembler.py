@@ -0,0 +1,220 @@
+import hashlib
+import threading
+
+# Segment tiers, ordered from most static to most volatile. Everything before the first
+# boundary is identical across calls of the same response type within a world, so a
+# provider-side prefix/KV cache can reuse it.
+SEGMENT_TIERS = ('static', 'session', 'turn')
+
+RESPONSE_SCHEMA_INSTRUCTIONS = {
+    'detailed_world_blueprint': (
+        "Response Format (detailed_world_blueprint): Based on the player's adventure preference and adhering to the "
+        "engine guidelines, generate a detailed world blueprint. The blueprint should outline key locations, "
+        "potential characters, main objectives, and a central conflict or mystery. "
+        "It should be rich enough to form the basis of a text adventure game."
+    ),
+    'world_conception_document': (
+        "Response Format (world_conception_document): Based *only* on the Detailed World Blueprint provided, generate a comprehensive World Conception Document. "
+        "This document *must* be a single, valid JSON object. The JSON object should include a root-level 'world_title' (string), "
+        "'setting_description' (string), 'key_locations' (list of objects, each with 'name' and 'description' strings), "
+        "'main_characters' (list of objects, each with 'name', 'role', and 'description' strings), "
+        "and an 'initial_plot_hook' (string). Ensure all text strings are appropriately escaped for JSON."
+    ),
+    'world_conception_section': (
+        "Response Format (world_conception_section): Based *only* on the Detailed World Blueprint provided, generate one section "
+        "of the World Conception Document as a single, valid JSON object containing exactly the keys listed under 'Section Keys' "
+        "('world_title' and 'setting_description' are strings, 'key_locations' is a list of objects with 'name' and 'description', "
+        "'main_characters' is a list of objects with 'name', 'role' and 'description', 'initial_plot_hook' is a string). "
+        "Other sections are generated separately and must not be included."
+    ),
+    'scene_description': (
+        "Response Format (scene_description): Output a single valid JSON object structured as scene data with fields: "
+        "'scene_id' (string), 'narrative' (string), 'npcs_in_scene' (list of objects with 'name', 'status' and 'dialogue_hook'), "
+        "'interactive_elements' (list of objects with 'id', 'name' and 'type' — one of 'navigate', 'dialogue', 'combat_trigger', "
+        "'puzzle_element' — plus 'target_id' for dialogue/combat and 'puzzle_id' for puzzle elements), "
+        "'environmental_effects' (string), optional 'narrative_update' (string), optional 'on_scene_load_knowledge' "
+        "(list of objects with 'topic_id' and 'summary'), and optional 'player_updates' (object with 'attributes' "
+        "mapping attribute names to '+N'/'-N' or an absolute number, 'skills_learned' (list of objects with 'name' and "
+        "'level') and 'inventory_updates' (object with an 'add' list of items with 'id', 'name' and 'quantity', and a "
+        "'remove' list of item ids or objects with 'id' and 'quantity')). Take the current weather into account in the narrative."
+    ),
+    'npc_dialogue_response': (
+        "Response Format (npc_dialogue_response): Generate the dialogue response of the NPC you are roleplaying. "
+        "Your response must be a single valid JSON object including fields: "
+        "'dialogue_text' (string, what you, the NPC, say), "
+        "'new_npc_status' (string, your updated short-term status, e.g., 'intrigued', 'annoyed', 'helpful'), "
+        "'attitude_towards_player_change' (string, e.g., '+5', '-2', or '0', reflecting change in your disposition), "
+        "'knowledge_revealed' (list of new knowledge topic objects with 'topic_id' and 'summary' if you reveal something new), "
+        "and optional 'dialogue_options_for_player' (list of 2-4 objects with 'id' and 'name' for player choices to continue talking to you). "
+        "If the player says '/bye' or '/end', or if the conversation naturally concludes, make 'dialogue_text' a polite closing and set 'new_npc_status' to 'ending_dialogue'."
+    ),
+    'combat_turn_outcome': (
+        "Response Format (combat_turn_outcome): Based on the player's chosen strategy and current combatant states, determine the detailed outcome of this combat turn. "
+        "Narrate the action and its results. Calculate HP changes for all affected combatants. Decide if the combat has ended "
+        "(e.g., player defeated, or all NPCs defeated). Provide feedback on the player's strategy if appropriate. "
+        "Suggest 3-4 available strategies for the player's next turn if combat continues. Output a single valid JSON object with fields: "
+        "'turn_summary_narrative' (string), 'player_hp_change' (int), 'npc_hp_changes' (list of {'npc_id': string, 'hp_change': int}), "
+        "'combat_ended' (boolean), 'victor' (string: 'player', 'npc', 'draw', or null), 'player_strategy_feedback' (optional string), "
+        "and 'available_player_strategies' (list of {'id': string, 'name': string} objects for next turn if combat is not ended)."
+    ),
+    'combat_turn_narration': (
+        "Response Format (combat_turn_narration): The mechanics of these combat turns are already resolved; do not change any numbers, "
+        "hits, misses or who is defeated. Narrate the resolved actions vividly and in order. Output a single valid JSON object with fields: "
+        "'turn_summary_narrative' (string) and 'player_strategy_feedback' (optional string)."
+    ),
+    'npc_memory_summary': (
+        "Response Format (npc_memory_summary): Fold the new exchanges into the NPC's memory of the player. Output a single valid JSON object with fields: "
+        "'summary' (string, at most 80 words, merging the previous summary with the new exchanges from the NPC's point of view) and "
+        "'salient_facts' (list of short strings: new durable facts the NPC learned about the player or promised, e.g. names, deals, secrets; empty if none)."
+    ),
+    'environmental_puzzle_solution_eval': (
+        "Response Format (environmental_puzzle_solution_eval): Evaluate the puzzle interaction. Output a single valid JSON object with fields: "
+        "'puzzle_id' (string, echo back the puzzle_id), 'action_feedback_narrative' (string, immediate result of action), "
+        "'puzzle_state_changed' (boolean), 'updated_puzzle_elements_state' (optional dictionary of specific element state changes, e.g., {'element_X': 'new_value'}), "
+        "'new_clues_revealed' (optional list of strings or clue_ids representing new information gained), 'puzzle_solved' (boolean), "
+        "and 'solution_narrative' (optional string if solved)."
+    ),
+    'codex_entry_generation': (
+        "Response Format (codex_entry_generation): Generate a new Knowledge Codex entry based on the discovery. The entry should be factual and expand on the hint. "
+        "Output JSON with fields: 'knowledge_id' (string, unique, derived from the context hint, e.g., 'ancient_runes_translation_codex'), "
+        "'title' (string, concise title for the codex entry), "
+        "'content' (string, detailed textual content of the codex entry, 2-3 sentences), "
+        "'source_type' (string, echo back the provided source type), "
+        "'source_detail' (string, echo back the provided source detail)."
+    ),
+    'dynamic_event_outcome': (
+        "Response Format (dynamic_event_outcome): Generate the outcome for the dynamic world event. The outcome should be surprising yet plausible. "
+        "Output JSON with fields: 'event_id' (string, can be a more specific ID derived from the hint), "
+        "'description' (string, narrative of what happens), "
+        "'effects_on_world' (list of strings, describing changes to game state, environment, or NPC status; these are for logging and potential future state changes), "
+        "'new_scene_id' (optional string, if the event forces an immediate scene change)."
+    ),
+    'weather_update_description': (
+        "Response Format (weather_update_description): Describe a plausible weather change based on the old condition. "
+        "Output JSON with fields: 'new_weather_condition' (e.g., 'rainy', 'foggy', 'sunny'), "
+        "'new_weather_intensity' (e.g., 'light', 'moderate', 'heavy'), "
+        "and 'weather_effects_description' (a narrative string for the player)."
+    ),
+}
+
+SEGMENT_SEPARATOR = "\n\n"
+
+
+class AssembledPrompt(str):
+    # A plain prompt string that additionally carries its cacheable prefix boundaries, so it can be
+    # passed through LLMInterface.generate (and any test double replacing it) unchanged.
+    def __new__(cls, text: str, response_type: str, cache_boundaries: tuple = (), prefix_hashes: tuple = ()):
+        instance = super().__new__(cls, text)
+        instance.response_type = response_type
+        instance.cache_boundaries = cache_boundaries # Character offsets ending the static and session tiers
+        instance.prefix_hashes = prefix_hashes
+        return instance
+
+    @property
+    def cacheable_prefix_length(self) -> int:
+        return self.cache_boundaries[0] if self.cache_boundaries else 0
+
+
+class PromptAssembler:
+    def __init__(self, schema_instructions: dict | None = None, max_tracked_prefixes: int = 64):
+        self.static_segments: dict[str, str] = {} # Insertion-ordered world/engine-wide segments
+        self.schema_instructions: dict[str, str] = dict(RESPONSE_SCHEMA_INSTRUCTIONS)
+        if schema_instructions:
+            self.schema_instructions.update(schema_instructions)
+        self.max_tracked_prefixes = max_tracked_prefixes
+        self._stats: dict[str, dict] = {}
+        self._seen_prefixes: dict[str, dict] = {} # response_type -> {prefix_hash: None}, insertion ordered
+        self._lock = threading.Lock()
+
+    def set_static_segment(self, name: str, text: str | None):
+        # Copy-on-write, so an assemble() running on another thread keeps iterating the dict it started with.
+        with self._lock:
+            segments = dict(self.static_segments)
+            if text:
+                segments[name] = text
+            else:
+                segments.pop(name, None)
+            self.static_segments = segments
+
+    def get_schema_instructions(self, response_type: str) -> str | None:
+        return self.schema_instructions.get(response_type)
+
+    @staticmethod
+    def _join(segments) -> str:
+        if isinstance(segments, dict):
+            segments = segments.values()
+        return SEGMENT_SEPARATOR.join(s for s in (segments or []) if s)
+
+    def assemble(self, response_type: str, session_segments=None, turn_segments=None, include_static: bool = True,
+                 record_stats: bool = True, static_overrides: dict | None = None) -> AssembledPrompt:
+        # static_overrides replaces or adds static segments for this call only (e.g. the world summary of the
+        # world a caller is building), leaving the shared segments untouched.
+        static_segments = self.static_segments
+        if static_overrides:
+            static_segments = dict(static_segments)
+            static_segments.update(static_overrides)
+        static_parts = [text for text in static_segments.values() if text] if include_static else []
+        schema_text = self.schema_instructions.get(response_type)
+        if schema_text:
+            static_parts.append(schema_text)
+
+        tiers = [self._join(static_parts), self._join(session_segments), self._join(turn_segments)]
+        text = ""
+        boundaries = []
+        for tier_text in tiers:
+            if tier_text:
+                text = text + SEGMENT_SEPARATOR + tier_text if text else tier_text
+            boundaries.append(len(text))
+        # The turn tier always ends at len(text); only the static and session boundaries are cacheable.
+        cache_boundaries = tuple(b for b in boundaries[:2] if b > 0)
+        prefix_hashes = tuple(hashlib.sha1(text[:b].encode('utf-8')).hexdigest() for b in cache_boundaries)
+
+        # Speculative prompts (see ActionPrefetcher) are built with record_stats=False so the report
+        # reflects the prompts the game logically issued, not how many times they were pre-generated.
+        if record_stats:
+            self._record_reuse(response_type, text, cache_boundaries, prefix_hashes)
+        return AssembledPrompt(text, response_type, cache_boundaries, prefix_hashes)
+
+    def _record_reuse(self, response_type: str, text: str, cache_boundaries: tuple, prefix_hashes: tuple):
+        with self._lock:
+            stats = self._stats.setdefault(response_type, {
+                'calls': 0, 'prefix_hits': 0, 'total_chars': 0, 'reused_chars': 0, 'cacheable_chars': 0
+            })
+            seen = self._seen_prefixes.setdefault(response_type, {})
+            reused_chars = 0
+            # Longest boundary whose prefix an earlier call of this type already sent.
+            for boundary, prefix_hash in zip(cache_boundaries, prefix_hashes):
+                if prefix_hash in seen:
+                    reused_chars = boundary
+            stats['calls'] += 1
+            stats['total_chars'] += len(text)
+            stats['cacheable_chars'] += cache_boundaries[-1] if cache_boundaries else 0
+            if reused_chars:
+                stats['prefix_hits'] += 1
+                stats['reused_chars'] += reused_chars
+            for prefix_hash in prefix_hashes:
+                seen.pop(prefix_hash, None)
+                seen[prefix_hash] = None
+            while len(seen) > self.max_tracked_prefixes:
+                seen.pop(next(iter(seen)))
+
+    def get_prefix_reuse_report(self) -> dict:
+        report = {}
+        with self._lock:
+            for response_type, stats in self._stats.items():
+                calls = stats['calls']
+                report[response_type] = {
+                    'calls': calls,
+                    'prefix_hits': stats['prefix_hits'],
+                    'prefix_hit_rate': stats['prefix_hits'] / calls if calls else 0.0,
+                    # Fraction of all prompt characters for this type that a prefix cache would serve.
+                    'expected_prefix_reuse_rate': stats['reused_chars'] / stats['total_chars'] if stats['total_chars'] else 0.0,
+                    'avg_prompt_chars': stats['total_chars'] / calls if calls else 0.0,
+                    'avg_cacheable_chars': stats['cacheable_chars'] / calls if calls else 0.0,
+                }
+        return report
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+            self._seen_prefixes.clear()
@@ -0,0 +1,351 @@
+import re
+import json
+import threading
+
+# Field specs per expected_response_type: field -> (allowed types, required). Only fields the controller
+# reads are listed; unknown fields pass through untouched. A bad optional field is dropped so the
+# controller's own .get() default applies; a missing or bad required field triggers a follow-up request.
+_STR = (str,)
+_OPT_STR = (str, type(None))
+_INT = (int,)
+_BOOL = (bool,)
+_LIST = (list,)
+_OPT_LIST = (list, type(None))
+_OPT_DICT = (dict, type(None))
+
+RESPONSE_SCHEMAS = {
+    'scene_description': {
+        'scene_id': (_OPT_STR, False), # Action outcomes may keep the current scene
+        'narrative': (_STR, False),
+        'narrative_update': (_STR, False), # Action outcomes may only add to the current scene's narrative
+        'npcs_in_scene': (_LIST, False),
+        'interactive_elements': (_LIST, False),
+        'environmental_effects': (_OPT_STR, False),
+        'on_scene_load_knowledge': (_OPT_LIST, False),
+    },
+    'npc_dialogue_response': {
+        'dialogue_text': (_STR, True),
+        'npc_id': (_OPT_STR, False),
+        'new_npc_status': (_OPT_STR, False),
+        'attitude_towards_player_change': ((str, int, type(None)), False),
+        'knowledge_revealed': (_OPT_LIST, False),
+        'dialogue_options_for_player': (_OPT_LIST, False),
+    },
+    'combat_turn_outcome': {
+        'turn_summary_narrative': (_STR, True),
+        'player_hp_change': (_INT, False),
+        'npc_hp_changes': (_LIST, False),
+        'combat_ended': (_BOOL, False),
+        'victor': (_OPT_STR, False),
+        'available_player_strategies': (_OPT_LIST, False),
+    },
+    'npc_memory_summary': {
+        'summary': (_STR, True),
+        'salient_facts': (_OPT_LIST, False),
+    },
+    'combat_turn_narration': {
+        'turn_summary_narrative': (_STR, True),
+        'player_strategy_feedback': (_OPT_STR, False),
+    },
+    'environmental_puzzle_solution_eval': {
+        'action_feedback_narrative': (_STR, True),
+        'puzzle_state_changed': (_BOOL, False),
+        'updated_puzzle_elements_state': (_OPT_DICT, False),
+        'new_clues_revealed': (_OPT_LIST, False),
+        'puzzle_solved': (_BOOL, False),
+        'solution_narrative': (_OPT_STR, False),
+        'knowledge_revealed': (_OPT_LIST, False),
+    },
+    'codex_entry_generation': {
+        'knowledge_id': (_STR, True),
+        'title': (_STR, True),
+        'content': (_STR, True),
+        'source_type': (_OPT_STR, False),
+        'source_detail': (_OPT_STR, False),
+    },
+    'dynamic_event_outcome': {
+        'description': (_STR, True),
+        'event_id': (_OPT_STR, False),
+        'effects_on_world': (_OPT_LIST, False),
+        'new_scene_id': (_OPT_STR, False),
+    },
+    'weather_update_description': {
+        'new_weather_condition': (_STR, True),
+        'new_weather_intensity': (_OPT_STR, False),
+        'weather_effects_description': (_OPT_STR, False),
+    },
+}
+
+# Groups of optional fields of which at least one must be present and valid (reported as the group's first field).
+REQUIRED_ONE_OF = {
+    'scene_description': (('narrative', 'narrative_update'),),
+}
+
+# Lists whose items the controller treats as dicts (item.get(...)); stray strings/nulls are filtered out.
+DICT_ITEM_LISTS = {
+    'npcs_in_scene', 'interactive_elements', 'on_scene_load_knowledge', 'knowledge_revealed',
+    'dialogue_options_for_player', 'npc_hp_changes', 'available_player_strategies',
+}
+
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_INT_PATTERN = re.compile(r"^[+-]?\d+$")
+
+
+def _coerce(value, allowed_types: tuple):
+    # Cheap lossless conversions for values LLMs commonly quote: "-10" -> -10, "true" -> True.
+    if int in allowed_types and isinstance(value, str) and _INT_PATTERN.match(value.strip()):
+        return int(value.strip()), True
+    if int in allowed_types and isinstance(value, float) and value.is_integer():
+        return int(value), True
+    if bool in allowed_types and isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true', True
+    return value, False
+
+
+def _compile_schema(schema: dict, required_one_of: tuple = ()):
+    # Flattens the spec into a tuple of per-field checks so validation is one pass over the fields.
+    checks = tuple(
+        (field, allowed_types, required, bool in allowed_types, field in DICT_ITEM_LISTS)
+        for field, (allowed_types, required) in schema.items()
+    )
+
+    def validate(data: dict) -> tuple:
+        problems = []
+        fixes = 0
+        for field, allowed_types, required, wants_bool, dict_items in checks:
+            if field not in data:
+                if required:
+                    problems.append(field)
+                continue
+            value = data[field]
+            # bool is an int subclass; only accept it where a bool is actually expected.
+            if not isinstance(value, allowed_types) or (isinstance(value, bool) and not wants_bool):
+                value, coerced = _coerce(value, allowed_types)
+                if not coerced:
+                    if required:
+                        problems.append(field)
+                    else:
+                        del data[field]
+                        fixes += 1
+                    continue
+                data[field] = value
+                fixes += 1
+            if dict_items and isinstance(value, list):
+                kept = [item for item in value if isinstance(item, dict)]
+                if len(kept) != len(value):
+                    data[field] = kept
+                    fixes += 1
+        for group in required_one_of:
+            if not any(field in data for field in group):
+                problems.append(group[0])
+        return problems, fixes
+
+    return validate
+
+
+def repair_json_text(text: str) -> tuple:
+    # Local fixes for the usual LLM JSON faults. Returns (candidate_text, applied_fix_names).
+    fixes = []
+    stripped = text.strip()
+    fence_match = _FENCE_PATTERN.search(stripped)
+    if fence_match and '```' in stripped:
+        stripped = fence_match.group(1).strip()
+        fixes.append('code_fence')
+    start = stripped.find('{')
+    if start == -1:
+        return stripped, fixes
+    if stripped[:start].strip():
+        fixes.append('surrounding_text')
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    i = start
+    length = len(stripped)
+    while i < length:
+        char = stripped[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                # A quote only closes the string if what follows could continue the JSON structure.
+                j = i + 1
+                while j < length and stripped[j] in ' \t\r\n':
+                    j += 1
+                if j < length and stripped[j] not in ',:}]':
+                    out.append('\\"')
+                    if 'unescaped_quote' not in fixes:
+                        fixes.append('unescaped_quote')
+                    i += 1
+                    continue
+                in_string = False
+            elif char == '\n':
+                out.append('\\n')
+                if 'control_character' not in fixes:
+                    fixes.append('control_character')
+                i += 1
+                continue
+            out.append(char)
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            out.append(char)
+        elif char in '}]':
+            _drop_trailing_comma(out, fixes)
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                if stripped[i + 1:].strip() and 'surrounding_text' not in fixes:
+                    fixes.append('surrounding_text')
+                break
+        else:
+            out.append(char)
+        i += 1
+
+    if in_string or stack:
+        # Truncated tail: close the open string, drop a dangling separator or key, then close the brackets.
+        if in_string:
+            if escaped:
+                out.pop()
+            out.append('"')
+        tail = ''.join(out).rstrip()
+        if tail.endswith(':'):
+            tail += ' null'
+        elif tail.endswith(','):
+            tail = tail[:-1]
+        elif stack and stack[-1] == '}' and re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"$', tail):
+            tail += ': null'
+        tail = tail + ''.join(reversed(stack))
+        fixes.append('truncated_tail')
+        return tail, fixes
+    return ''.join(out), fixes
+
+
+def _drop_trailing_comma(out: list, fixes: list):
+    j = len(out) - 1
+    while j >= 0 and out[j] in (' ', '\t', '\r', '\n'):
+        j -= 1
+    if j >= 0 and out[j] == ',':
+        del out[j]
+        if 'trailing_comma' not in fixes:
+            fixes.append('trailing_comma')
+
+
+class ResponseValidator:
+    # Parses and validates LLM JSON per expected_response_type: strict parse first, then local repair,
+    # and only when both fail a short follow-up asking the model to fix just the broken fields.
+    def __init__(self, llm_interface=None, schemas: dict | None = None, max_followups: int = 1,
+                 followup_snippet_chars: int = 1500):
+        self.llm_interface = llm_interface # Needed only for follow-ups; None keeps repair purely local
+        self.schemas = dict(RESPONSE_SCHEMAS)
+        self.schemas.update(schemas or {})
+        self.max_followups = max_followups
+        self.followup_snippet_chars = followup_snippet_chars
+        self._validators = {response_type: _compile_schema(schema, REQUIRED_ONE_OF.get(response_type, ()))
+                            for response_type, schema in self.schemas.items()}
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, response_type: str, outcome: str, fixes: list = (), followups: int = 0):
+        with self._lock:
+            stats = self._stats.setdefault(response_type, {
+                'responses': 0, 'clean': 0, 'repaired_locally': 0, 'repaired_by_followup': 0,
+                'failed': 0, 'followup_calls': 0, 'fixes': {}
+            })
+            stats['responses'] += 1
+            stats[outcome] += 1
+            stats['followup_calls'] += followups
+            for fix in fixes:
+                stats['fixes'][fix] = stats['fixes'].get(fix, 0) + 1
+
+    def _load(self, raw: str) -> tuple:
+        # Returns (parsed object or None, applied fixes).
+        try:
+            return json.loads(raw), []
+        except (json.JSONDecodeError, TypeError):
+            pass
+        candidate, fixes = repair_json_text(str(raw))
+        try:
+            return json.loads(candidate), fixes
+        except json.JSONDecodeError:
+            return None, fixes
+
+    def parse(self, raw: str, response_type: str, model_id: str | None = None) -> dict | None:
+        if raw is None:
+            return None
+        data, fixes = self._load(raw)
+        validate = self._validators.get(response_type)
+        if not isinstance(data, dict):
+            data = None
+        problems = []
+        if data is not None and validate:
+            problems, coerced = validate(data)
+            if coerced:
+                fixes = fixes + ['field_coercion']
+        if data is not None and not problems:
+            self._record(response_type, 'repaired_locally' if fixes else 'clean', fixes)
+            return data
+
+        followups = 0
+        while followups < self.max_followups and self.llm_interface and model_id:
+            followups += 1
+            patch = self._request_fix(raw, data, problems, response_type, model_id)
+            if patch is None:
+                continue
+            if data is None:
+                data = patch
+            else:
+                for field in problems:
+                    if field in patch:
+                        data[field] = patch[field]
+            problems, _ = validate(data) if validate else ([], 0)
+            if not problems:
+                self._record(response_type, 'repaired_by_followup', fixes, followups)
+                return data
+        print(f"ResponseValidator: Could not repair {response_type} response (problems: {problems or 'unparseable JSON'}).")
+        self._record(response_type, 'failed', fixes, followups)
+        return None
+
+    def _request_fix(self, raw: str, data: dict | None, problems: list, response_type: str, model_id: str) -> dict | None:
+        schema = self.schemas.get(response_type, {})
+        if data is None:
+            # Nothing salvageable locally: send the broken text back instead of re-running the full prompt.
+            snippet = str(raw)[:self.followup_snippet_chars]
+            prompt = (f"The following {response_type} response is not valid JSON. "
+                      f"Return the same content as one valid JSON object and nothing else.\n---\n{snippet}\n---")
+        else:
+            field_specs = ", ".join(f"\"{field}\" ({'/'.join(t.__name__ for t in schema[field][0])})" for field in problems)
+            context = json.dumps(data, ensure_ascii=False)[:self.followup_snippet_chars]
+            prompt = (f"Your previous {response_type} response was missing or had invalid values for: {field_specs}. "
+                      f"Return ONLY a JSON object containing these fields, consistent with the response below.\n---\n{context}\n---")
+        print(f"ResponseValidator: Local repair failed for {response_type}; requesting a targeted fix.")
+        reply = self.llm_interface.generate(prompt, model_id, response_type)
+        if reply is None:
+            return None
+        patch, _ = self._load(reply)
+        return patch if isinstance(patch, dict) else None
+
+    def get_repair_report(self) -> dict:
+        report = {}
+        totals = {'responses': 0, 'clean': 0, 'repaired_locally': 0, 'repaired_by_followup': 0, 'failed': 0, 'followup_calls': 0}
+        with self._lock:
+            for response_type, stats in self._stats.items():
+                responses = stats['responses']
+                report[response_type] = dict(stats, fixes=dict(stats['fixes']),
+                                             local_repair_rate=stats['repaired_locally'] / responses,
+                                             followup_repair_rate=stats['repaired_by_followup'] / responses,
+                                             failure_rate=stats['failed'] / responses)
+                for key in totals:
+                    totals[key] += stats[key]
+        responses = totals['responses']
+        report['_overall'] = dict(totals,
+                                  local_repair_rate=totals['repaired_locally'] / responses if responses else 0.0,
+                                  followup_repair_rate=totals['repaired_by_followup'] / responses if responses else 0.0,
+                                  failure_rate=totals['failed'] / responses if responses else 0.0)
+        return report
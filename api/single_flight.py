@@ -0,0 +1,107 @@
+import re
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+
+# Response types worth coalescing: many sessions of the same world ask for the same opening scene or
+# codex topic at once. Dialogue and combat prompts carry per-player state, so they rarely collide.
+DEFAULT_COALESCED_RESPONSE_TYPES = ('scene_description', 'codex_entry_generation', 'dynamic_event_outcome',
+                                    'weather_update_description', 'detailed_world_blueprint',
+                                    'world_conception_document', 'world_conception_section')
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def request_key(prompt: str, model_id: str, expected_response_type: str) -> str:
+    # Whitespace-insensitive so re-indented but otherwise identical prompts coalesce.
+    normalized = _WHITESPACE.sub(" ", str(prompt)).strip()
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    return f"{expected_response_type}:{model_id}:{digest}"
+
+
+class SingleFlight:
+    # Concurrent identical requests share one execution: the first caller (leader) runs it, everyone
+    # arriving while it is in flight waits on the same Future. Nothing is cached once the call returns.
+    # Threads block on the Future; asyncio callers await it without blocking their event loop.
+    def __init__(self, response_types=DEFAULT_COALESCED_RESPONSE_TYPES):
+        self.response_types: set = set(response_types or ())
+        self._inflight: dict[str, Future] = {}
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, response_type: str):
+        self.response_types.add(response_type)
+
+    def disable(self, response_type: str):
+        self.response_types.discard(response_type)
+
+    def is_enabled(self, response_type: str) -> bool:
+        return response_type in self.response_types
+
+    def _claim(self, key: str, response_type: str) -> tuple:
+        with self._lock:
+            stats = self._stats.setdefault(response_type, {'leaders': 0, 'coalesced': 0})
+            future = self._inflight.get(key)
+            if future is not None:
+                stats['coalesced'] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            stats['leaders'] += 1
+            return future, True
+
+    def _settle(self, key: str, future: Future, result=None, error: BaseException | None = None):
+        # Drop the key before waking followers so a caller arriving afterwards starts a fresh request.
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, response_type: str, fn):
+        future, is_leader = self._claim(key, response_type)
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, key: str, response_type: str, fn):
+        # fn is a blocking callable; the leader runs it on a worker thread (context, and so the session
+        # tag, is copied by to_thread) and shares the Future with threaded callers of the same key.
+        future, is_leader = self._claim(key, response_type)
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await asyncio.to_thread(fn)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            report = {}
+            total_leaders = 0
+            total_coalesced = 0
+            for response_type, stats in self._stats.items():
+                calls = stats['leaders'] + stats['coalesced']
+                total_leaders += stats['leaders']
+                total_coalesced += stats['coalesced']
+                report[response_type] = dict(stats, coalesce_rate=stats['coalesced'] / calls if calls else 0.0)
+            total_calls = total_leaders + total_coalesced
+            report['_overall'] = {'leaders': total_leaders, 'coalesced': total_coalesced,
+                                  'coalesce_rate': total_coalesced / total_calls if total_calls else 0.0}
+        return report
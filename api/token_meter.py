@@ -0,0 +1,171 @@
+import re
+import time
+import threading
+import contextvars
+from collections import deque
+
+# Rough BPE-style estimate: CJK characters are about one token each, latin words about one token
+# per four characters, and a newline plus its indentation collapses into a single token.
+_TOKEN_PATTERN = re.compile(
+    r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]"
+    r"|[A-Za-z]+"
+    r"|\d+"
+    r"|\n[ \t]*"
+    r"|[^\sA-Za-z\d]"
+)
+
+# Session the current thread/task is generating for. A pooled LLMInterface serves many sessions,
+# so the tag travels with the caller's context instead of living on the interface.
+current_session_id: contextvars.ContextVar[str] = contextvars.ContextVar('llm_session_id', default='default')
+# Set to a list while generating speculatively (see ActionPrefetcher): calls made in that context are
+# appended to it and kept out of the session and turn totals until charge() bills the ones that were used.
+speculative_records: contextvars.ContextVar[list | None] = contextvars.ContextVar('llm_speculative_records', default=None)
+
+
+def _piece_tokens(piece: str) -> int:
+    # Token cost of one _TOKEN_PATTERN match.
+    first = piece[0]
+    if first.isalpha() and first.isascii():
+        return 1 + (len(piece) - 1) // 4
+    if first.isdigit():
+        return 1 + (len(piece) - 1) // 3
+    return 1
+
+
+def estimate_tokens(text: str | None) -> int:
+    if not text:
+        return 0
+    return sum(_piece_tokens(match.group(0)) for match in _TOKEN_PATTERN.finditer(text))
+
+
+def truncate_to_token_budget(text: str, max_tokens: int, marker: str = "\n... (context truncated)") -> str:
+    if max_tokens is None or estimate_tokens(text) <= max_tokens:
+        return text
+    # Walk the token matches once and cut at the end of the last one that still fits.
+    count = 0
+    cut = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = _piece_tokens(match.group(0))
+        if count + cost > max_tokens:
+            break
+        count += cost
+        cut = match.end()
+    return text[:cut] + marker
+
+
+class TokenMeter:
+    GROUP_KEYS = ('response_type', 'model_id', 'session_id')
+
+    def __init__(self, per_session_token_budget: int | None = None, per_turn_token_budget: int | None = None,
+                 max_records: int = 10000):
+        self.per_session_token_budget = per_session_token_budget
+        self.per_turn_token_budget = per_turn_token_budget
+        self.records: deque = deque(maxlen=max_records)
+        self._aggregates: dict[str, dict] = {group: {} for group in self.GROUP_KEYS}
+        self._session_tokens: dict[str, int] = {}
+        self._turn_tokens: dict[str, int] = {}
+        self._turn_numbers: dict[str, int] = {}
+        self._speculative_tokens: dict[str, int] = {} # Spent speculatively, whether charged later or not
+        self._lock = threading.Lock()
+
+    def set_session(self, session_id: str):
+        current_session_id.set(session_id)
+
+    def get_session(self) -> str:
+        return current_session_id.get()
+
+    def begin_turn(self, session_id: str | None = None) -> int:
+        session_id = session_id or self.get_session()
+        with self._lock:
+            self._turn_tokens[session_id] = 0
+            self._turn_numbers[session_id] = self._turn_numbers.get(session_id, 0) + 1
+            return self._turn_numbers[session_id]
+
+    def check_budget(self, prompt_tokens: int, session_id: str | None = None) -> str | None:
+        # Returns a reason string if the call would exceed a budget, otherwise None. Speculative calls are
+        # not held to the per-turn budget: they are made for a turn that has not started yet.
+        session_id = session_id or self.get_session()
+        with self._lock:
+            session_used = self._session_tokens.get(session_id, 0)
+            turn_used = self._turn_tokens.get(session_id, 0)
+        if (self.per_turn_token_budget is not None and speculative_records.get() is None
+                and turn_used + prompt_tokens > self.per_turn_token_budget):
+            return f"per-turn budget exceeded for session '{session_id}' ({turn_used} used + {prompt_tokens} prompt > {self.per_turn_token_budget})"
+        if self.per_session_token_budget is not None and session_used + prompt_tokens > self.per_session_token_budget:
+            return f"per-session budget exceeded for session '{session_id}' ({session_used} used + {prompt_tokens} prompt > {self.per_session_token_budget})"
+        return None
+
+    def record(self, response_type: str, model_id: str, prompt_tokens: int, completion_tokens: int,
+               latency_s: float = 0.0, session_id: str | None = None, coalesced: bool = False) -> dict:
+        # coalesced marks a caller that shared another caller's in-flight request (see SingleFlight): its
+        # session is charged the tokens as usual, but it is counted apart from the backend calls.
+        session_id = session_id or self.get_session()
+        total = prompt_tokens + completion_tokens
+        speculative = speculative_records.get()
+        with self._lock:
+            entry = {
+                'timestamp': time.time(), 'session_id': session_id,
+                'turn': self._turn_numbers.get(session_id, 0),
+                'response_type': response_type, 'model_id': model_id,
+                'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'latency_s': latency_s, 'speculative': speculative is not None, 'coalesced': coalesced
+            }
+            self.records.append(entry)
+            if speculative is None:
+                self._session_tokens[session_id] = self._session_tokens.get(session_id, 0) + total
+                self._turn_tokens[session_id] = self._turn_tokens.get(session_id, 0) + total
+            else:
+                self._speculative_tokens[session_id] = self._speculative_tokens.get(session_id, 0) + total
+                speculative.append(entry)
+            for group in self.GROUP_KEYS:
+                bucket = self._aggregates[group].setdefault(entry[group], {
+                    'calls': 0, 'coalesced': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'latency_s': 0.0
+                })
+                bucket['coalesced' if coalesced else 'calls'] += 1
+                bucket['prompt_tokens'] += prompt_tokens
+                bucket['completion_tokens'] += completion_tokens
+                bucket['latency_s'] += latency_s
+        return entry
+
+    def charge(self, entries: list, session_id: str | None = None) -> int:
+        # Bills speculative records whose result was used to the caller's session and current turn.
+        session_id = session_id or self.get_session()
+        with self._lock:
+            total = sum(entry['prompt_tokens'] + entry['completion_tokens'] for entry in entries)
+            self._session_tokens[session_id] = self._session_tokens.get(session_id, 0) + total
+            self._turn_tokens[session_id] = self._turn_tokens.get(session_id, 0) + total
+        return total
+
+    def get_speculative_usage(self, session_id: str | None = None) -> int:
+        with self._lock:
+            return self._speculative_tokens.get(session_id or self.get_session(), 0)
+
+    def get_session_usage(self, session_id: str | None = None) -> int:
+        with self._lock:
+            return self._session_tokens.get(session_id or self.get_session(), 0)
+
+    def get_turn_usage(self, session_id: str | None = None) -> int:
+        with self._lock:
+            return self._turn_tokens.get(session_id or self.get_session(), 0)
+
+    def get_usage_report(self, group_by: str = 'response_type') -> dict:
+        if group_by not in self.GROUP_KEYS:
+            print(f"TokenMeter: Unknown group_by '{group_by}'. Expected one of {self.GROUP_KEYS}.")
+            return {}
+        report = {}
+        with self._lock:
+            for key, bucket in self._aggregates[group_by].items():
+                # calls are backend requests; token totals also include what coalesced callers were charged.
+                calls = bucket['calls']
+                charged = calls + bucket['coalesced']
+                report[key] = {
+                    'calls': calls,
+                    'coalesced': bucket['coalesced'],
+                    'prompt_tokens': bucket['prompt_tokens'],
+                    'completion_tokens': bucket['completion_tokens'],
+                    'total_tokens': bucket['prompt_tokens'] + bucket['completion_tokens'],
+                    'avg_prompt_tokens': bucket['prompt_tokens'] / charged if charged else 0.0,
+                    'avg_latency_s': bucket['latency_s'] / calls if calls else 0.0,
+                }
+        # Heaviest consumers first.
+        return dict(sorted(report.items(), key=lambda item: item[1]['total_tokens'], reverse=True))
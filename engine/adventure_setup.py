@@ -2,19 +2,32 @@ import json # For parsing JSON string from LLM
 from ui.ui_manager import UIManager
 from api.llm_interface import LLMInterface
 from engine.model_selector import ModelSelector
+from api.prompt_assembler import PromptAssembler
+from engine.world_templates import WorldTemplateLibrary
+import copy
 
 class AdventureSetup:
-    def __init__(self, ui_manager: UIManager, llm_interface: LLMInterface, model_selector: ModelSelector):
+    def __init__(self, ui_manager: UIManager, llm_interface: LLMInterface, model_selector: ModelSelector,
+                 prompt_assembler: PromptAssembler | None = None,
+                 template_library: WorldTemplateLibrary | None = None, template_min_score: float = 0.3):
         self.ui_manager = ui_manager
         self.llm_interface = llm_interface
         self.model_selector = model_selector
+        self.prompt_assembler = prompt_assembler if prompt_assembler is not None else PromptAssembler()
+        self.prompt_assembler.set_static_segment('engine_guidelines', self._engine_guidelines())
         self.adventure_preference: str | None = None
         self.detailed_world_blueprint: str | None = None
         self.world_conception_document: dict | None = None # New attribute
+        self.template_library = template_library # Optional pre-generated worlds for an instant start
+        self.template_min_score = template_min_score
+        self.matched_template: dict | None = None
 
     def _engine_guidelines(self) -> str:
         return "Engine Guidelines: The world must be coherent and offer multiple paths. Include at least one friendly NPC and one potential adversary. The primary goal should be discoverable through exploration or interaction. Ensure there's a sense of mystery."
 
+    def get_engine_guidelines(self) -> str:
+        return self._engine_guidelines()
+
     def request_adventure_preference(self) -> str | None:
         # This method assumes ui_manager.show_adventure_preference_screen() will be implemented
         # and will return the text input from the user or None/empty if no input.
@@ -24,11 +37,32 @@ class AdventureSetup:
 
         if preference_text and preference_text.strip():
             self.store_preference(preference_text.strip()) # store_preference now uses ui_manager
+            self.apply_matching_template(self.adventure_preference)
             return self.adventure_preference
         else:
             # No message here, GameController will handle messaging if no preference provided overall
             return None
 
+    def apply_matching_template(self, preference_text: str) -> dict | None:
+        # Adopts the closest pre-generated world, so the blueprint and conception LLM calls are skipped.
+        self.matched_template = None
+        if not self.template_library:
+            return None
+        match = self.template_library.find_best(preference_text, self.template_min_score)
+        if not match:
+            self.ui_manager.display_message("AdventureSetup: No world template is close enough to the preference; generating a new world.", "info")
+            return None
+        template, score = match
+        document = template.get('world_conception_document')
+        if not template.get('blueprint') or not isinstance(document, dict):
+            self.ui_manager.display_message(f"AdventureSetup: World template '{template.get('template_id')}' is incomplete; generating a new world.", "warning")
+            return None
+        self.detailed_world_blueprint = template['blueprint']
+        self.world_conception_document = copy.deepcopy(document)
+        self.matched_template = template
+        self.ui_manager.display_message(f"AdventureSetup: Using pre-generated world '{document.get('world_title', template.get('template_id'))}' (theme: {template.get('theme')}, match {score:.2f}).", "info")
+        return template
+
     def get_adventure_preference(self) -> str | None:
         return self.adventure_preference
 
@@ -48,14 +82,10 @@ class AdventureSetup:
             self.ui_manager.display_message("AdventureSetup: Error - Model not selected. Cannot generate blueprint.", "error")
             return None
 
-        guidelines = self._engine_guidelines()
-        prompt = (
-            f"Player Adventure Preference: '{player_adventure_preference}'\n\n"
-            f"Engine Guidelines: '{guidelines}'\n\n"
-            "Task: Based on the player's preference and adhering to the engine guidelines, "
-            "generate a detailed world blueprint. The blueprint should outline key locations, "
-            "potential characters, main objectives, and a central conflict or mystery. "
-            "It should be rich enough to form the basis of a text adventure game."
+        # Engine guidelines and the blueprint instructions form the cacheable prefix; only the preference varies.
+        prompt = self.prompt_assembler.assemble(
+            'detailed_world_blueprint',
+            turn_segments=[f"Player Adventure Preference: '{player_adventure_preference}'"]
         )
 
         self.ui_manager.display_message("AdventureSetup: Requesting detailed world blueprint from LLM...", "info")
@@ -88,13 +118,9 @@ class AdventureSetup:
             self.ui_manager.display_message("AdventureSetup: Error - Model not selected. Cannot generate world conception.", "error")
             return None
 
-        prompt = (
-            f"Detailed World Blueprint is as follows:\n---BEGIN BLUEPRINT---\n{detailed_blueprint}\n---END BLUEPRINT---\n\n"
-            "Task: Based *only* on the Detailed World Blueprint provided above, generate a comprehensive World Conception Document. "
-            "This document *must* be a single, valid JSON object. The JSON object should include a root-level 'world_title' (string), "
-            "'setting_description' (string), 'key_locations' (list of objects, each with 'name' and 'description' strings), "
-            "'main_characters' (list of objects, each with 'name', 'role', and 'description' strings), "
-            "and an 'initial_plot_hook' (string). Ensure all text strings are appropriately escaped for JSON."
+        prompt = self.prompt_assembler.assemble(
+            'world_conception_document',
+            session_segments=[f"Detailed World Blueprint is as follows:\n---BEGIN BLUEPRINT---\n{detailed_blueprint}\n---END BLUEPRINT---"]
         )
 
         self.ui_manager.display_message("AdventureSetup: Requesting World Conception Document (JSON) from LLM...", "info")
@@ -121,5 +147,34 @@ class AdventureSetup:
             self.world_conception_document = None # Ensure it's None on error
             return None
 
+    def generate_world_section(self, section_name: str, section_keys: list) -> dict | None:
+        # One independently generated slice of the World Conception Document. The blueprint sits in the
+        # session tier, so every section request shares the same cacheable prefix.
+        detailed_blueprint = self.get_detailed_world_blueprint()
+        selected_model_id = self.model_selector.get_selected_model()
+        if not detailed_blueprint or not selected_model_id:
+            self.ui_manager.display_message(f"AdventureSetup: Error - Blueprint or model missing. Cannot generate world section '{section_name}'.", "error")
+            return None
+
+        prompt = self.prompt_assembler.assemble(
+            'world_conception_section',
+            session_segments=[f"Detailed World Blueprint is as follows:\n---BEGIN BLUEPRINT---\n{detailed_blueprint}\n---END BLUEPRINT---"],
+            turn_segments=[f"World Section: {section_name}\nSection Keys: {', '.join(section_keys)}"]
+        )
+        json_string = self.llm_interface.generate(prompt, selected_model_id, expected_response_type='world_conception_section')
+        if not json_string:
+            self.ui_manager.display_message(f"AdventureSetup: Failed to generate world section '{section_name}' (LLM returned None).", "error")
+            return None
+        try:
+            parsed_dict = json.loads(json_string)
+        except json.JSONDecodeError as e:
+            self.ui_manager.display_message(f"AdventureSetup: Error - Failed to parse world section '{section_name}' JSON: {e}", "error")
+            return None
+        missing_keys = [key for key in section_keys if key not in parsed_dict] if isinstance(parsed_dict, dict) else section_keys
+        if missing_keys:
+            self.ui_manager.display_message(f"AdventureSetup: Error - World section '{section_name}' is missing keys: {missing_keys}", "error")
+            return None
+        return {key: parsed_dict[key] for key in section_keys}
+
     def get_world_conception_document(self) -> dict | None:
         return self.world_conception_document
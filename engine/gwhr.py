@@ -1,6 +1,10 @@
 import copy
 
 class GWHR: # GameWorldHistoryRecorder
+    TURN_VOLATILE_KEYS = ('current_game_time', 'event_log', 'scene_history', 'combat_log', 'dynamic_world_events_log')
+    WORLD_CONCEPTION_KEYS = ('world_title', 'setting_description', 'key_locations', 'main_characters', 'initial_plot_hook')
+    SCENE_PRESENTATION_KEYS = ('background_image_url', 'background_image_pending', 'image_prompt_elements')
+
     def __init__(self):
         default_player_state = {
             'attributes': {
@@ -37,6 +41,15 @@ class GWHR: # GameWorldHistoryRecorder
                 }
             }
         }
+        self._mutation_listeners: list = [] # Called with the list of top-level keys each mutation touched
+
+    def add_mutation_listener(self, listener):
+        # listener(keys): keys is None when the whole store was replaced (initialize).
+        self._mutation_listeners.append(listener)
+
+    def _notify_mutation(self, keys: list | None):
+        for listener in getattr(self, '_mutation_listeners', []):
+            listener(keys)
 
     def initialize(self, initial_world_data: dict):
         # Start by taking a deep copy of the defaults set in __init__
@@ -130,6 +143,7 @@ class GWHR: # GameWorldHistoryRecorder
         world_state_in_temp.setdefault('current_weather', copy.deepcopy(default_weather_structure))
         
         self.data_store = temp_store # Assign the fully constructed store
+        self._notify_mutation(None)
 
         print(f"GWHR: Initialized/Merged with world data. World Title: '{self.data_store.get('world_title', 'N/A')}'")
         print(f"GWHR: Player state attributes: {self.data_store.get('player_state', {}).get('attributes')}")
@@ -138,7 +152,7 @@ class GWHR: # GameWorldHistoryRecorder
             first_npc_id = list(self.data_store['npcs'].keys())[0]
             print(f"GWHR: First NPC ({first_npc_id}) attributes: {self.data_store['npcs'][first_npc_id].get('attributes')}")
 
-    def log_event(self, event_description: str, event_type: str = "general", causal_factors: list = None):
+    def log_event(self, event_description: str, event_type: str = "general", causal_factors: list = None, payload: dict = None):
         event_log = self.data_store.setdefault('event_log', [])
         event_entry = {
             "time": self.data_store.get('current_game_time', 0),
@@ -146,6 +160,8 @@ class GWHR: # GameWorldHistoryRecorder
             "description": event_description,
             "causal_factors": causal_factors if causal_factors is not None else []
         }
+        if payload is not None:
+            event_entry["payload"] = copy.deepcopy(payload)
         event_log.append(event_entry)
 
     def log_dialogue(self, speaker: str, utterance: str, npc_id: str = None):
@@ -181,13 +197,116 @@ class GWHR: # GameWorldHistoryRecorder
                 updated_keys.append(key)
 
         if updated_keys:
+             self._notify_mutation(updated_keys)
              print(f"GWHR: State updated for keys: {updated_keys}. (Simulated deep merge/logic).")
         else:
              print(f"GWHR: Update_state called with no keys to update or empty updates dictionary.")
 
+    def set_scene_image(self, image_url: str, scene_id: str | None = None) -> bool:
+        # Targeted update for an image that finished after the scene was stored; avoids update_state,
+        # which would record the same scene in scene_history a second time.
+        scene_data = self.data_store.get('current_scene_data', {})
+        if scene_id is not None and scene_data.get('scene_id') != scene_id:
+            return False
+        scene_data['background_image_url'] = image_url
+        scene_data.pop('background_image_pending', None)
+        scene_history = self.data_store.get('scene_history', [])
+        if scene_history and scene_history[-1].get('scene_id') == scene_data.get('scene_id'):
+            scene_history[-1]['image_url'] = image_url
+        return True
+
+    def update_npc(self, npc_id: str, fields: dict | None = None, attributes: dict | None = None,
+                   dialogue_entry: dict | None = None) -> bool:
+        # Targeted update of one NPC in place; update_state({'npcs': ...}) would copy every NPC.
+        # fields replace top-level values, attributes are merged, dialogue_entry is appended to dialogue_log.
+        npc = self.data_store.get('npcs', {}).get(npc_id)
+        if npc is None:
+            print(f"GWHR: update_npc called for unknown NPC '{npc_id}'.")
+            return False
+        for key, value in (fields or {}).items():
+            npc[key] = copy.deepcopy(value)
+        if attributes:
+            npc.setdefault('attributes', {}).update(copy.deepcopy(attributes))
+        if dialogue_entry is not None:
+            npc.setdefault('dialogue_log', []).append(copy.deepcopy(dialogue_entry))
+        self._notify_mutation(['npcs'])
+        return True
+
+    def update_npcs(self, updates: dict) -> int:
+        # Batched update_npc: {npc_id: {'fields': {...}, 'attributes': {...}}} with a single mutation
+        # notification. Values are stored as given (callers pass fresh scalars); unknown NPCs are skipped.
+        npcs = self.data_store.get('npcs', {})
+        applied = 0
+        for npc_id, update in updates.items():
+            npc = npcs.get(npc_id)
+            if npc is None:
+                continue
+            npc.update(update.get('fields') or {})
+            if update.get('attributes'):
+                npc.setdefault('attributes', {}).update(update['attributes'])
+            applied += 1
+        if applied:
+            self._notify_mutation(['npcs'])
+        return applied
+
+    def update_player_state(self, fields: dict | None = None, attributes: dict | None = None) -> bool:
+        # Targeted player_state update: fields replace top-level values (e.g. a rebuilt inventory list),
+        # attributes are merged. Stored as given, without copying, so callers hand over values they no longer
+        # mutate; update_state({'player_state': ...}) would deep-copy the whole inventory on every change.
+        if not fields and not attributes:
+            return False
+        player_state = self.data_store.setdefault('player_state', {})
+        player_state.update(fields or {})
+        if attributes:
+            player_state.setdefault('attributes', {}).update(attributes)
+        self._notify_mutation(['player_state'])
+        return True
+
     def get_current_context(self, granularity: str = "full", context_type: str = "general") -> dict:
+        if granularity == "session":
+            # Session-stable state only: the clock and append-only logs change every turn, and the world
+            # conception is already part of the static prompt prefix.
+            excluded = self.TURN_VOLATILE_KEYS + self.WORLD_CONCEPTION_KEYS
+            context = {key: copy.deepcopy(value) for key, value in self.data_store.items() if key not in excluded}
+            # Image fields are presentation only and may be filled in after the scene is stored.
+            scene_data = context.get('current_scene_data')
+            if isinstance(scene_data, dict):
+                for key in self.SCENE_PRESENTATION_KEYS:
+                    scene_data.pop(key, None)
+            return context
         print("GWHR: get_current_context currently returns a full copy. This will be refined for targeted context provision.")
-        return copy.deepcopy(self.data_store) 
+        return copy.deepcopy(self.data_store)
+
+    def get_world_summary(self) -> str | None:
+        # Compact, rarely-changing description of the world conception for static prompt prefixes.
+        title = self.data_store.get('world_title')
+        if not title:
+            return None
+        lines = [f"World: {title}"]
+        if self.data_store.get('setting_description'):
+            lines.append(f"Setting: {self.data_store['setting_description']}")
+        location_names = [loc.get('name') for loc in self.data_store.get('key_locations', []) if isinstance(loc, dict) and loc.get('name')]
+        if location_names:
+            lines.append(f"Key Locations: {', '.join(location_names)}")
+        if self.data_store.get('initial_plot_hook'):
+            lines.append(f"Plot Hook: {self.data_store['initial_plot_hook']}")
+        return "\n".join(lines)
 
     def get_data_store(self) -> dict:
         return copy.deepcopy(self.data_store)
+
+    def get_current_scene_data(self) -> dict:
+        # Copies only the scene instead of the whole store.
+        return copy.deepcopy(self.data_store.get('current_scene_data', {}))
+
+    def restore(self, data_store: dict):
+        # Replaces the whole store with a saved one (e.g. a session reloaded from disk); no merging with defaults.
+        self.data_store = copy.deepcopy(data_store)
+        self._notify_mutation(None)
+
+    def snapshot(self) -> 'GWHR':
+        # Detached copy that can be mutated freely (e.g. to build speculative prompts) without touching live state.
+        snapshot = GWHR.__new__(GWHR)
+        snapshot.data_store = copy.deepcopy(self.data_store)
+        snapshot._mutation_listeners = [] # Listeners follow the live state only
+        return snapshot
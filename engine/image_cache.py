@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_image_prompt_elements(image_prompt_elements) -> str:
+    # Case and whitespace differences should not produce a second image for the same scene.
+    if isinstance(image_prompt_elements, str):
+        image_prompt_elements = [image_prompt_elements]
+    parts = [re.sub(r"\s+", " ", str(element)).strip().lower() for element in image_prompt_elements or [] if element]
+    return "\n".join(parts)
+
+
+def build_scene_image_prompt(scene_data: dict, label: str = "Scene") -> str:
+    narrative = scene_data.get('narrative', '')
+    npcs = ", ".join([npc.get('name', 'N/A') for npc in scene_data.get('npcs_in_scene', []) if npc.get('name')])
+    return f"{label}: {narrative[:150]}. NPCs: {npcs[:100]}."
+
+
+def image_prompt_key(image_prompt_elements) -> str:
+    return hashlib.sha256(normalize_image_prompt_elements(image_prompt_elements).encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    # Content-addressed: each entry lives at <cache_dir>/<key[:2]>/<key>.json where key is the hash of the
+    # normalized image_prompt_elements. Least recently used entries are evicted once max_bytes is exceeded.
+    def __init__(self, cache_dir: str, max_bytes: int = 50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index: OrderedDict = OrderedDict() # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+        for _mtime, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        if entries:
+            print(f"ImageCache: Loaded {len(entries)} cached image(s) ({self._total_bytes} bytes) from '{self.cache_dir}'.")
+        self._evict()
+
+    def get(self, image_prompt_elements) -> str | None:
+        key = image_prompt_key(image_prompt_elements)
+        with self._lock:
+            if key not in self._index:
+                self.stats['misses'] += 1
+                return None
+            path = self._path_for(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                os.utime(path) # Recency survives restarts through the file mtime
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"ImageCache: Dropping unreadable entry {key[:12]}: {e}")
+                self._total_bytes -= self._index.pop(key)
+                self.stats['misses'] += 1
+                return None
+            self._index.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry.get('image_url')
+
+    def put(self, image_prompt_elements, image_url: str) -> str:
+        key = image_prompt_key(image_prompt_elements)
+        payload = json.dumps({
+            'image_url': image_url,
+            'normalized_prompt': normalize_image_prompt_elements(image_prompt_elements),
+            'stored_at': time.time()
+        }).encode('utf-8')
+        path = self._path_for(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path) # Readers never see a half-written entry
+            self._total_bytes += len(payload) - self._index.pop(key, 0)
+            self._index[key] = len(payload)
+            self.stats['stores'] += 1
+            self._evict()
+        return key
+
+    def _evict(self):
+        # Keep at least the newest entry even if it alone exceeds the limit.
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path_for(key))
+            except OSError:
+                pass
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._index)
+            stats['total_bytes'] = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
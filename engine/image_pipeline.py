@@ -0,0 +1,100 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from api.llm_interface import LLMInterface
+from engine.image_cache import ImageCache, image_prompt_key
+
+
+class ImagePipeline:
+    # Generates scene images on a worker pool so scenes can render before their image exists.
+    # Finished images are queued for the game thread (drain_completed) and announced to listeners,
+    # which run on the worker thread and must only touch thread-safe state. A failed generation is
+    # queued and announced the same way with image_url None, so waiting scenes can give up on it.
+    def __init__(self, llm_interface: LLMInterface, image_cache: ImageCache | None = None, max_workers: int = 2):
+        self.llm_interface = llm_interface
+        self.image_cache = image_cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-gen")
+        self.completed: queue.Queue = queue.Queue() # (key, image_url) pairs awaiting the game thread
+        self.listeners: list = []
+        self._pending: dict = {} # key -> Future, so the same prompt is only generated once at a time
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'generated': 0, 'failed': 0, 'coalesced': 0}
+
+    def add_listener(self, callback):
+        # callback(key, image_url), invoked from a worker thread; image_url is None if generation failed.
+        self.listeners.append(callback)
+
+    def request(self, image_prompt_elements: list) -> str | None:
+        # Returns a cached image URL immediately, or None after scheduling generation in the background.
+        key = image_prompt_key(image_prompt_elements)
+        with self._lock:
+            self.stats['requests'] += 1
+        if self.image_cache:
+            cached_url = self.image_cache.get(image_prompt_elements)
+            if cached_url:
+                with self._lock:
+                    self.stats['cache_hits'] += 1
+                print(f"ImagePipeline: Cache hit for image {key[:12]}.")
+                return cached_url
+        with self._lock:
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+                return None
+            self._pending[key] = self.executor.submit(self._generate, key, list(image_prompt_elements))
+        print(f"ImagePipeline: Queued background generation for image {key[:12]}.")
+        return None
+
+    def _generate(self, key: str, image_prompt_elements: list):
+        try:
+            image_prompt = "\n".join(str(element) for element in image_prompt_elements)
+            image_url = self.llm_interface.generate_image(image_prompt)
+            if not image_url:
+                with self._lock:
+                    self.stats['failed'] += 1
+                print(f"ImagePipeline: Image generation failed for {key[:12]}.")
+                image_url = None
+            else:
+                if self.image_cache:
+                    self.image_cache.put(image_prompt_elements, image_url)
+                with self._lock:
+                    self.stats['generated'] += 1
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            print(f"ImagePipeline: Error generating image {key[:12]}: {e}")
+            image_url = None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        self.completed.put((key, image_url))
+        for listener in list(self.listeners):
+            try:
+                listener(key, image_url)
+            except Exception as e:
+                print(f"ImagePipeline: Image-ready listener failed: {e}")
+
+    def drain_completed(self) -> list:
+        ready = []
+        while True:
+            try:
+                ready.append(self.completed.get_nowait())
+            except queue.Empty:
+                return ready
+
+    def wait_idle(self, timeout: float | None = None):
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,128 @@
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from engine.image_cache import normalize_image_prompt_elements
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHashIndex:
+    # Near-duplicate lookup over past image prompts. Each prompt is reduced to a MinHash signature of its
+    # character shingles; LSH banding narrows the candidates and the fraction of matching signature slots
+    # estimates the Jaccard similarity. Lookups only match entries of the same scene type.
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 5,
+                 default_threshold: float = 0.85, thresholds: dict | None = None,
+                 max_entries: int = 2000, seed: int = 1):
+        if num_perm % bands != 0:
+            print(f"MinHashIndex: num_perm ({num_perm}) is not divisible by bands ({bands}); using {num_perm // bands * bands} permutations.")
+            num_perm = num_perm // bands * bands
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self.default_threshold = default_threshold
+        self.thresholds: dict[str, float] = dict(thresholds or {})
+        self.max_entries = max_entries
+        rng = random.Random(seed) # Fixed seed: signatures stay comparable across runs
+        self._permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._entries: OrderedDict = OrderedDict() # entry_id -> {'signature', 'image_url', 'scene_type'}
+        self._buckets: dict[tuple, list] = {} # (scene_type, band, band_values) -> [entry_id]
+        self._next_id = 0
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def set_threshold(self, scene_type: str, threshold: float):
+        self.thresholds[scene_type] = threshold
+
+    def get_threshold(self, scene_type: str) -> float:
+        return self.thresholds.get(scene_type, self.default_threshold)
+
+    def _shingles(self, image_prompt_elements) -> set:
+        text = normalize_image_prompt_elements(image_prompt_elements)
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, image_prompt_elements) -> tuple:
+        base_hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+                       for s in self._shingles(image_prompt_elements)]
+        return tuple(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in base_hashes)
+                     for a, b in self._permutations)
+
+    @staticmethod
+    def estimate_similarity(signature_a: tuple, signature_b: tuple) -> float:
+        if not signature_a or len(signature_a) != len(signature_b):
+            return 0.0
+        return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / len(signature_a)
+
+    def _band_keys(self, scene_type: str, signature: tuple):
+        for band in range(self.bands):
+            start = band * self.rows_per_band
+            yield (scene_type, band, signature[start:start + self.rows_per_band])
+
+    def add(self, image_prompt_elements, image_url: str, scene_type: str = 'default') -> int:
+        signature = self.signature(image_prompt_elements)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {'signature': signature, 'image_url': image_url, 'scene_type': scene_type}
+            for band_key in self._band_keys(scene_type, signature):
+                self._buckets.setdefault(band_key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return entry_id
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band_key in self._band_keys(entry['scene_type'], entry['signature']):
+            bucket = self._buckets.get(band_key)
+            if bucket and entry_id in bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def find_similar(self, image_prompt_elements, scene_type: str = 'default') -> tuple | None:
+        # Returns (image_url, estimated_similarity) of the closest prior prompt above the type's threshold.
+        signature = self.signature(image_prompt_elements)
+        threshold = self.get_threshold(scene_type)
+        best = None
+        with self._lock:
+            stats = self._stats.setdefault(scene_type, {'lookups': 0, 'reuses': 0, 'similarity_sum': 0.0})
+            stats['lookups'] += 1
+            candidates = set()
+            for band_key in self._band_keys(scene_type, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                similarity = self.estimate_similarity(signature, entry['signature'])
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (entry['image_url'], similarity)
+            if best:
+                stats['reuses'] += 1
+                stats['similarity_sum'] += best[1]
+        return best
+
+    def get_reuse_report(self) -> dict:
+        report = {}
+        with self._lock:
+            total_lookups = 0
+            total_reuses = 0
+            for scene_type, stats in self._stats.items():
+                total_lookups += stats['lookups']
+                total_reuses += stats['reuses']
+                report[scene_type] = {
+                    'lookups': stats['lookups'],
+                    'reuses': stats['reuses'],
+                    'reuse_rate': stats['reuses'] / stats['lookups'] if stats['lookups'] else 0.0,
+                    'avg_reused_similarity': stats['similarity_sum'] / stats['reuses'] if stats['reuses'] else 0.0,
+                    'threshold': self.get_threshold(scene_type),
+                }
+            report['_overall'] = {
+                'lookups': total_lookups,
+                'reuses': total_reuses,
+                'reuse_rate': total_reuses / total_lookups if total_lookups else 0.0,
+                'indexed_prompts': len(self._entries),
+            }
+        return report
@@ -1,19 +1,32 @@
+import time
 from api.api_key_manager import ApiKeyManager # Assumes execution from root or api in PYTHONPATH
+from api.model_router import ModelRouter
 
 class ModelSelector:
-    def __init__(self, api_key_manager: ApiKeyManager):
+    def __init__(self, api_key_manager: ApiKeyManager, model_router: ModelRouter | None = None,
+                 models_cache_ttl_s: float = 300.0):
         self.api_key_manager = api_key_manager
         self.selected_model_id: str | None = None
+        self.model_router = model_router # Optional per-response-type routing; see LLMInterface.generate
+        self.models_cache_ttl_s = models_cache_ttl_s
+        self._models_cache: dict[str, tuple] = {} # api key -> (fetched_at, model list)
+        self._clock = time.monotonic
 
-    def fetch_available_models(self) -> list[str]:
+    def fetch_available_models(self, force_refresh: bool = False) -> list[str]:
         api_key = self.api_key_manager.get_api_key()
         if not api_key:
             print("ModelSelector: Error - API Key not available.") # Later, use UIManager
             return []
+
+        cached = self._models_cache.get(api_key)
+        if cached and not force_refresh and self._clock() - cached[0] < self.models_cache_ttl_s:
+            return list(cached[1])
         
         print("ModelSelector: Simulating Gemini API call to fetch available models...")
         # In a real scenario, this would involve an actual API call
-        return ["gemini-2.5-pro-mock", "gemini-2.5-flash-mock"]
+        models = ["gemini-2.5-pro-mock", "gemini-2.5-flash-mock"]
+        self._models_cache[api_key] = (self._clock(), list(models))
+        return models
 
     def display_models(self, model_list: list[str]):
         print("ModelSelector: Available models:")
@@ -26,6 +39,8 @@ class ModelSelector:
     def set_selected_model(self, model_id: str):
         self.selected_model_id = model_id
         print(f"ModelSelector: Model set to {model_id}")
+        if self.model_router:
+            self.model_router.configure_from_available_models(self.fetch_available_models(), model_id)
 
     def get_selected_model(self) -> str | None:
         return self.selected_model_id
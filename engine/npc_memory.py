@@ -0,0 +1,134 @@
+import json
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from api.llm_interface import LLMInterface
+from api.prompt_assembler import PromptAssembler
+from api.token_meter import truncate_to_token_budget
+
+
+def format_exchange(entry: dict, npc_name: str) -> str:
+    return f"Player: {entry.get('player', '')}\n{npc_name}: {entry.get('npc', '')}"
+
+
+class NPCMemory:
+    # Rolling memory per NPC with a fixed prompt footprint: the last few exchanges verbatim, everything
+    # older folded into a summary plus a short list of salient facts. Folding runs on a background worker
+    # (typically while the player is typing or reading), one LLM call per batch of older exchanges.
+    # Exchanges already pushed out of the recent window but not yet folded in are kept as a compact
+    # local digest, so nothing drops out of the prompt while a refresh is pending.
+    def __init__(self, llm_interface: LLMInterface, prompt_assembler: PromptAssembler | None = None,
+                 recent_exchanges: int = 4, summarize_batch: int = 6, summary_token_budget: int = 150,
+                 exchange_token_budget: int = 60, max_facts: int = 8, fact_token_budget: int = 25,
+                 pending_token_budget: int = 80, max_workers: int = 1):
+        self.llm_interface = llm_interface
+        self.prompt_assembler = prompt_assembler or PromptAssembler()
+        self.recent_exchanges = recent_exchanges
+        self.summarize_batch = summarize_batch
+        self.summary_token_budget = summary_token_budget
+        self.exchange_token_budget = exchange_token_budget
+        self.max_facts = max_facts
+        self.fact_token_budget = fact_token_budget
+        self.pending_token_budget = pending_token_budget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="npc-memory")
+        self._memories: dict[str, dict] = {} # npc_id -> {'summary', 'facts', 'summarized_count'}
+        self._futures: dict = {} # npc_id -> Future of the refresh in flight
+        self.stats = {'refreshes': 0, 'llm_failures': 0, 'exchanges_summarized': 0}
+        self._lock = threading.Lock()
+
+    def get_memory(self, npc_id: str) -> dict:
+        with self._lock:
+            memory = self._memories.get(npc_id, {'summary': '', 'facts': [], 'summarized_count': 0})
+            return {'summary': memory['summary'], 'facts': list(memory['facts']), 'summarized_count': memory['summarized_count']}
+
+    def memory_context(self, npc_id: str, npc_name: str, dialogue_log: list) -> dict:
+        # What a dialogue prompt sees of the relationship; bounded no matter how long dialogue_log is.
+        memory = self.get_memory(npc_id)
+        recent_start = max(0, len(dialogue_log) - self.recent_exchanges)
+        # The recent window always wins; summarized_count can lag behind it, never run ahead of it.
+        pending = dialogue_log[min(memory['summarized_count'], recent_start):recent_start]
+        context = {
+            "summary_of_earlier_conversations": memory['summary'] or None,
+            "salient_facts": memory['facts'],
+            "recent_exchanges": [
+                {'player': truncate_to_token_budget(str(entry.get('player', '')), self.exchange_token_budget, marker="..."),
+                 'npc': truncate_to_token_budget(str(entry.get('npc', '')), self.exchange_token_budget, marker="...")}
+                for entry in dialogue_log[recent_start:]
+            ],
+        }
+        if pending:
+            context["not_yet_summarized"] = self._local_digest(pending, npc_name, self.pending_token_budget)
+        return context
+
+    @staticmethod
+    def _local_digest(entries: list, npc_name: str, token_budget: int) -> str:
+        # Cheap extractive stand-in for a summary: the start of each line of each exchange.
+        digest = " | ".join(f"Player: {str(e.get('player', ''))[:60]}; {npc_name}: {str(e.get('npc', ''))[:60]}" for e in entries)
+        return truncate_to_token_budget(digest, token_budget, marker="...")
+
+    def refresh_if_needed(self, npc_id: str, npc_name: str, dialogue_log: list, model_id: str | None) -> bool:
+        # Schedules a background fold of older exchanges once a full batch has left the recent window.
+        fold_end = len(dialogue_log) - self.recent_exchanges
+        with self._lock:
+            memory = self._memories.setdefault(npc_id, {'summary': '', 'facts': [], 'summarized_count': 0})
+            fold_start = memory['summarized_count']
+            in_flight = self._futures.get(npc_id)
+            if fold_end - fold_start < self.summarize_batch or (in_flight is not None and not in_flight.done()):
+                return False
+            previous_summary, previous_facts = memory['summary'], list(memory['facts'])
+            entries = [dict(entry) for entry in dialogue_log[fold_start:fold_end]]
+            self._futures[npc_id] = self.executor.submit(
+                contextvars.copy_context().run, self._fold, npc_id, npc_name, entries, fold_start, fold_end,
+                previous_summary, previous_facts, model_id)
+        return True
+
+    def _fold(self, npc_id: str, npc_name: str, entries: list, fold_start: int, fold_end: int,
+              previous_summary: str, previous_facts: list, model_id: str | None):
+        summary, new_facts = None, []
+        if model_id:
+            prompt = self.prompt_assembler.assemble('npc_memory_summary', session_segments=[
+                f"NPC: {npc_name} (ID: {npc_id})\nPrevious Summary: {previous_summary or '(none)'}\n"
+                f"Known Facts: {json.dumps(previous_facts)}"
+            ], turn_segments=[
+                "Exchanges to fold in:\n" + "\n".join(format_exchange(entry, npc_name) for entry in entries)
+            ])
+            response = self.llm_interface.generate(prompt, model_id, 'npc_memory_summary')
+            try:
+                data = json.loads(response) if response else {}
+                summary = data.get('summary') if isinstance(data.get('summary'), str) else None
+                new_facts = [fact for fact in data.get('salient_facts') or [] if isinstance(fact, str)]
+            except (json.JSONDecodeError, AttributeError):
+                summary = None
+        with self._lock:
+            if summary is None:
+                self.stats['llm_failures'] += 1
+                # Keep the memory bounded anyway: half the budget for the old summary, half for a digest of the batch.
+                half_budget = self.summary_token_budget // 2
+                summary = " ".join(filter(None, [truncate_to_token_budget(previous_summary, half_budget, marker="..."),
+                                                 self._local_digest(entries, npc_name, half_budget)]))
+            memory = self._memories.get(npc_id)
+            if memory is None or memory['summarized_count'] != fold_start:
+                return # Forgotten while the fold was running
+            facts = [fact for fact in previous_facts if fact not in new_facts] + new_facts
+            memory['summary'] = truncate_to_token_budget(summary, self.summary_token_budget, marker="...")
+            memory['facts'] = [truncate_to_token_budget(fact, self.fact_token_budget, marker="...") for fact in facts[-self.max_facts:]]
+            memory['summarized_count'] = fold_end
+            self.stats['refreshes'] += 1
+            self.stats['exchanges_summarized'] += len(entries)
+
+    def forget(self, npc_id: str):
+        with self._lock:
+            self._memories.pop(npc_id, None)
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        with self._lock:
+            futures = list(self._futures.values())
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, npcs_tracked=len(self._memories))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+import math
+import time
+import random
+from array import array
+
+# Mood valence buckets, -3..+3; GWHR keeps the label in attributes['mood'].
+MOOD_LABELS = ("furious", "hostile", "irritated", "neutral", "content", "cheerful", "elated")
+EXTREME_MOODS = (MOOD_LABELS[0], MOOD_LABELS[-1])
+NO_LOCATION = -1
+# NPC attributes NPCSimulation drifts on every time advance.
+SIMULATED_ATTRIBUTES = ('mood', 'disposition_towards_player', 'current_hp')
+
+
+def mood_label(valence: float) -> str:
+    return MOOD_LABELS[min(len(MOOD_LABELS) - 1, max(0, int(round(valence)) + 3))]
+
+
+def mood_valence(label) -> float | None:
+    # None for labels outside the scale (e.g. an authored "anxious"), which the simulation leaves alone.
+    return float(MOOD_LABELS.index(label) - 3) if label in MOOD_LABELS else None
+
+
+class NPCSimulation:
+    # Cheap local world simulation for every NPC on each time advance: mood drifts back to its baseline with
+    # some noise, disposition towards the player decays towards 0, HP regenerates, and NPCs wander between
+    # key_locations. State lives in flat arrays (one slot per NPC) mirrored from GWHR; only NPCs whose
+    # visible state changed (mood label, whole disposition/HP points, location) are written back, in one
+    # batched GWHR update. Notable changes (an NPC reaching an extreme mood, recovering from grave wounds)
+    # come back as dynamic event hints for the LLM, capped per tick and per NPC.
+    def __init__(self, seed: int | None = None, mood_decay: float = 0.9, mood_noise: float = 0.35,
+                 disposition_decay: float = 0.995, hp_regen_fraction: float = 0.02, move_chance: float = 0.05,
+                 roam_unplaced: bool = True, max_escalations_per_tick: int = 1, escalation_cooldown: int = 50):
+        self.rng = random.Random(seed)
+        self.mood_decay = mood_decay # Share of the distance from baseline kept per time unit
+        self.mood_noise = mood_noise # Width of the random mood nudge per time unit
+        self.disposition_decay = disposition_decay
+        self.hp_regen_fraction = hp_regen_fraction # Of max HP per time unit
+        self.move_chance = move_chance # Per NPC per time unit
+        self.roam_unplaced = roam_unplaced # NPCs without a location may wander into one
+        self.max_escalations_per_tick = max_escalations_per_tick
+        self.escalation_cooldown = escalation_cooldown # Game time units before the same NPC may escalate again
+        self.ids: list[str] = []
+        self.locations: list[str] = []
+        self.mood = array('d')
+        self.mood_baseline = array('d')
+        self.mood_tracked = array('b') # 0 when the NPC's mood label is outside MOOD_LABELS
+        self.disposition = array('d')
+        self.hp = array('d')
+        self.max_hp = array('d')
+        self.location = array('i')
+        self._last_escalation: dict[str, int] = {}
+        self._gwhr = None
+        self._stale = True # GWHR NPCs changed outside the simulation; re-sync before the next tick
+        self._writing = False
+        self.stats = {'ticks': 0, 'npc_updates': 0, 'writes': 0, 'escalations': 0, 'syncs': 0,
+                      'total_tick_s': 0.0, 'last_tick_ms': 0.0}
+
+    def attach(self, gwhr):
+        self._gwhr = gwhr
+        gwhr.add_mutation_listener(self._on_mutation)
+        self._stale = True
+
+    def _on_mutation(self, keys: list | None):
+        if keys is None: # A new world: same-named NPCs start over from their authored state
+            self.ids = []
+        if not self._writing and (keys is None or 'npcs' in keys or 'key_locations' in keys):
+            self._stale = True
+
+    def _sync(self, data_store: dict):
+        # Rebuilds the arrays from GWHR, keeping the fractional state of NPCs whose stored (rounded) values
+        # still match, so slow drifts are not reset by every dialogue elsewhere in the world. An NPC's mood
+        # baseline is its mood when first seen (the authored one), which later mood swings drift back to.
+        previous = {npc_id: index for index, npc_id in enumerate(self.ids)}
+        self.locations = [loc.get('id') or loc.get('name') for loc in data_store.get('key_locations', [])
+                          if isinstance(loc, dict) and (loc.get('id') or loc.get('name'))]
+        location_index = {name: index for index, name in enumerate(self.locations)}
+        ids, mood, baseline, tracked, disposition, hp, max_hp, location = [], [], [], [], [], [], [], []
+        for npc_id, npc in data_store.get('npcs', {}).items():
+            attributes = npc.get('attributes', {})
+            old = previous.get(npc_id)
+            stored_mood = mood_valence(attributes.get('mood', 'neutral'))
+            known_mood = old is not None and self.mood_tracked[old]
+            if known_mood and stored_mood is not None and mood_label(self.mood[old]) == attributes.get('mood'):
+                mood.append(self.mood[old])
+            else:
+                mood.append(stored_mood or 0.0)
+            baseline.append(self.mood_baseline[old] if known_mood else stored_mood or 0.0)
+            tracked.append(stored_mood is not None)
+            stored_disposition = attributes.get('disposition_towards_player', 0) or 0
+            keep = old is not None and round(self.disposition[old]) == stored_disposition
+            disposition.append(self.disposition[old] if keep else float(stored_disposition))
+            stored_hp = attributes.get('current_hp', 0) or 0
+            keep = old is not None and round(self.hp[old]) == stored_hp
+            hp.append(self.hp[old] if keep else float(stored_hp))
+            max_hp.append(float(attributes.get('max_hp', stored_hp) or 0))
+            location.append(location_index.get(npc.get('current_location_id'), NO_LOCATION))
+            ids.append(npc_id)
+        self.ids = ids
+        self.mood, self.mood_baseline, self.mood_tracked = array('d', mood), array('d', baseline), array('b', tracked)
+        self.disposition, self.hp, self.max_hp = array('d', disposition), array('d', hp), array('d', max_hp)
+        self.location = array('i', location)
+        self._stale = False
+        self.stats['syncs'] += 1
+
+    def tick(self, gwhr, elapsed: int, now: int = 0) -> list:
+        # Advances every NPC by `elapsed` time units; returns dynamic event hints for notable changes.
+        if elapsed <= 0:
+            return []
+        started = time.perf_counter()
+        if self._stale or gwhr is not self._gwhr:
+            self._sync(gwhr.data_store)
+        count = len(self.ids)
+        rng = self.rng
+        random_values = [rng.random() for _ in range(count)]
+
+        # Mood: exponential return to baseline plus noise that grows with sqrt(elapsed), clamped to the scale.
+        keep = self.mood_decay ** elapsed
+        width = 2 * self.mood_noise * math.sqrt(elapsed)
+        old_mood = self.mood
+        new_mood = array('d', [min(3.0, max(-3.0, b + (m - b) * keep + (r - 0.5) * width))
+                               for m, b, r in zip(old_mood, self.mood_baseline, random_values)])
+        old_disposition = self.disposition
+        disposition_keep = self.disposition_decay ** elapsed
+        new_disposition = array('d', [d * disposition_keep for d in old_disposition])
+        old_hp = self.hp
+        regen = self.hp_regen_fraction * elapsed
+        new_hp = array('d', [h if h <= 0 else min(mh, h + mh * regen) for h, mh in zip(old_hp, self.max_hp)]) # The dead stay down
+
+        # Movement: one roll per living NPC; movers always pick a different key location.
+        new_location = self.location
+        location_count = len(self.locations)
+        move_probability = 1 - (1 - self.move_chance) ** elapsed
+        movers = []
+        if location_count > 1 or (location_count == 1 and self.roam_unplaced):
+            movers = [i for i, r in enumerate(rng.random() for _ in range(count))
+                      if r < move_probability and new_hp[i] > 0
+                      and (self.location[i] != NO_LOCATION or self.roam_unplaced)]
+            if movers:
+                new_location = array('i', self.location)
+                for i in movers:
+                    target = rng.randrange(location_count)
+                    if target == new_location[i]:
+                        target = (target + 1) % location_count
+                    new_location[i] = target
+
+        # Write back only what a player could notice, and collect escalations.
+        updates = {}
+        notable = []
+        tracked = self.mood_tracked
+        for i in range(count):
+            attributes = {}
+            if tracked[i]:
+                label = mood_label(new_mood[i])
+                if label != mood_label(old_mood[i]):
+                    attributes['mood'] = label
+                    if label in EXTREME_MOODS:
+                        notable.append((i, f"npc_mood:{self.ids[i]}:{label}"))
+            if round(new_disposition[i]) != round(old_disposition[i]):
+                attributes['disposition_towards_player'] = int(round(new_disposition[i]))
+            if round(new_hp[i]) != round(old_hp[i]):
+                attributes['current_hp'] = int(round(new_hp[i]))
+                if old_hp[i] < 0.25 * self.max_hp[i] and new_hp[i] >= self.max_hp[i]:
+                    notable.append((i, f"npc_recovered:{self.ids[i]}"))
+            update = {'attributes': attributes} if attributes else {}
+            if new_location[i] != self.location[i]:
+                update['fields'] = {'current_location_id': self.locations[new_location[i]]}
+            if update:
+                updates[self.ids[i]] = update
+        self.mood, self.disposition, self.hp, self.location = new_mood, new_disposition, new_hp, new_location
+
+        if updates:
+            self._writing = True
+            try:
+                gwhr.update_npcs(updates)
+            finally:
+                self._writing = False
+            self.stats['writes'] += 1
+            self.stats['npc_updates'] += len(updates)
+
+        hints = []
+        for i, hint in notable:
+            if len(hints) >= self.max_escalations_per_tick:
+                break
+            last = self._last_escalation.get(self.ids[i])
+            if last is not None and now - last < self.escalation_cooldown:
+                continue
+            self._last_escalation[self.ids[i]] = now
+            hints.append(hint)
+        self.stats['escalations'] += len(hints)
+        elapsed_s = time.perf_counter() - started
+        self.stats['ticks'] += 1
+        self.stats['total_tick_s'] += elapsed_s
+        self.stats['last_tick_ms'] = elapsed_s * 1000
+        return hints
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats, npcs=len(self.ids))
+        stats['mean_tick_ms'] = stats['total_tick_s'] * 1000 / stats['ticks'] if stats['ticks'] else 0.0
+        return stats
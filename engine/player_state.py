@@ -0,0 +1,269 @@
+import copy
+import math
+
+PLAYER_UPDATE_SECTIONS = ('attributes', 'skills_learned', 'inventory_updates')
+
+
+def parse_number(value) -> int | float | None:
+    # A number from an LLM value (5, 2.5, "7", " 0.05"); None for bools, NaN/inf and anything non-numeric.
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            number = float(text)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+    return None
+
+
+def _positive_int(value) -> int | None:
+    number = parse_number(value)
+    if number is None or number != int(number) or number < 1:
+        return None
+    return int(number)
+
+
+def _valid_key(value) -> bool:
+    return (isinstance(value, str) and value != '') or (isinstance(value, int) and not isinstance(value, bool))
+
+
+def compile_player_updates(payload) -> tuple[dict, list]:
+    # Validates a whole player_updates payload up front and turns it into flat operations:
+    #   attributes: [(attr, relative, amount)]   "+N"/"-N" are relative, plain numbers absolute
+    #   skills:     [skill dict]                 name required, level defaults to 1
+    #   add:        [item dict]                  id, name and a positive whole quantity required
+    #   remove:     [(item_id, quantity|None)]   None removes the whole stack
+    # Returns (compiled, warnings); malformed entries become warnings and are dropped, never raise.
+    compiled = {'attributes': [], 'skills': [], 'add': [], 'remove': []}
+    warnings = []
+    if not isinstance(payload, dict):
+        return compiled, [f"Malformed player_updates (not a dict): {payload!r}"]
+    for key in payload:
+        if key not in PLAYER_UPDATE_SECTIONS:
+            warnings.append(f"Ignoring unknown player_updates section {key!r}.")
+
+    attributes = payload.get('attributes')
+    if isinstance(attributes, dict):
+        for attr, change in attributes.items():
+            if not isinstance(attr, str):
+                warnings.append(f"Malformed attribute name: {attr!r}")
+                continue
+            relative = isinstance(change, str) and change.strip()[:1] in ('+', '-')
+            amount = parse_number(change)
+            if amount is None:
+                warnings.append(f"Invalid value for attribute change {attr}: {change!r}")
+                continue
+            compiled['attributes'].append((attr, relative, amount))
+    elif attributes is not None:
+        warnings.append(f"Malformed 'attributes' in player_updates (not a dict): {attributes!r}")
+
+    skills = payload.get('skills_learned')
+    if isinstance(skills, list):
+        for skill in skills:
+            if not isinstance(skill, dict) or not isinstance(skill.get('name'), str) or not skill['name']:
+                warnings.append(f"Malformed skill_learned entry: {skill!r}")
+                continue
+            skill = copy.deepcopy(skill)
+            skill['level'] = _positive_int(skill.get('level', 1)) or 1
+            compiled['skills'].append(skill)
+    elif skills is not None:
+        warnings.append(f"Malformed 'skills_learned' in player_updates (not a list): {skills!r}")
+
+    inventory = payload.get('inventory_updates')
+    if isinstance(inventory, dict):
+        additions = inventory.get('add', [])
+        if not isinstance(additions, list):
+            warnings.append(f"Malformed inventory 'add' (not a list): {additions!r}")
+            additions = []
+        for item in additions:
+            quantity = _positive_int(item.get('quantity')) if isinstance(item, dict) else None
+            if quantity is None or not _valid_key(item.get('id')) or not isinstance(item.get('name'), str):
+                warnings.append(f"Malformed item_to_add entry: {item!r}")
+                continue
+            item = copy.deepcopy(item)
+            item['quantity'] = quantity
+            compiled['add'].append(item)
+        removals = inventory.get('remove', [])
+        if not isinstance(removals, list):
+            warnings.append(f"Malformed inventory 'remove' (not a list): {removals!r}")
+            removals = []
+        for entry in removals:
+            if _valid_key(entry): # A bare id drops the whole stack
+                compiled['remove'].append((entry, None))
+            elif isinstance(entry, dict) and _valid_key(entry.get('id')) and (
+                    'quantity' not in entry or _positive_int(entry['quantity']) is not None):
+                compiled['remove'].append((entry['id'], _positive_int(entry['quantity']) if 'quantity' in entry else None))
+            else:
+                warnings.append(f"Malformed item_to_remove entry: {entry!r}")
+    elif inventory is not None:
+        warnings.append(f"Malformed 'inventory_updates' in player_updates (not a dict): {inventory!r}")
+    return compiled, warnings
+
+
+class PlayerStateIndex:
+    # O(1) lookups into GWHR's player_state lists: inventory position by item id, skill position by name.
+    # GWHR keeps the lists (the UI and saves read them as they are); the index is rebuilt only when
+    # player_state is replaced from outside, or the lists it indexed are no longer the ones stored.
+    # apply() runs a whole player_updates payload against it in one pass: the inventory and skill lists
+    # are copied on write (a pointer copy, changed items replaced by new dicts) and stored with a single
+    # GWHR.update_player_state call.
+    def __init__(self):
+        self._inventory: list = [] # The lists the positions refer to, and their lengths when indexed
+        self._skills: list = []
+        self._inventory_length = 0
+        self._skills_length = 0
+        self._item_positions: dict = {}
+        self._skill_positions: dict = {}
+        self._stale = True
+        self._writing = False
+        self.stats = {'payloads': 0, 'changes': 0, 'rejected': 0, 'writes': 0, 'rebuilds': 0}
+
+    def attach(self, gwhr):
+        gwhr.add_mutation_listener(self._on_mutation)
+        self._stale = True
+
+    def _on_mutation(self, keys: list | None):
+        if not self._writing and (keys is None or 'player_state' in keys):
+            self._stale = True
+
+    def _refresh(self, player_state: dict):
+        inventory = player_state.get('inventory')
+        skills = player_state.get('skills')
+        inventory = inventory if isinstance(inventory, list) else []
+        skills = skills if isinstance(skills, list) else []
+        if self._stale or inventory is not self._inventory or len(inventory) != self._inventory_length:
+            self._rebuild_items(inventory)
+        if self._stale or skills is not self._skills or len(skills) != self._skills_length:
+            self._skill_positions = {}
+            for position, skill in enumerate(skills):
+                if isinstance(skill, dict) and isinstance(skill.get('name'), str):
+                    self._skill_positions.setdefault(skill['name'], position) # First entry wins, as a scan would
+            self._skills = skills
+            self._skills_length = len(skills)
+            self.stats['rebuilds'] += 1
+        self._stale = False
+
+    def _rebuild_items(self, inventory: list):
+        self._item_positions = {}
+        for position, item in enumerate(inventory):
+            if isinstance(item, dict) and _valid_key(item.get('id')):
+                self._item_positions.setdefault(item['id'], position)
+        self._inventory = inventory
+        self._inventory_length = len(inventory)
+        self.stats['rebuilds'] += 1
+
+    def item(self, player_state: dict, item_id) -> dict | None:
+        self._refresh(player_state)
+        position = self._item_positions.get(item_id)
+        return None if position is None else self._inventory[position]
+
+    def skill(self, player_state: dict, name: str) -> dict | None:
+        self._refresh(player_state)
+        position = self._skill_positions.get(name)
+        return None if position is None else self._skills[position]
+
+    def apply(self, gwhr, payload) -> tuple[list, list]:
+        # Returns (growth messages, warnings) in payload order; GWHR is written once, and only if something changed.
+        compiled, warnings = compile_player_updates(payload)
+        self.stats['payloads'] += 1
+        player_state = gwhr.data_store.setdefault('player_state', {})
+        self._refresh(player_state)
+        messages = []
+
+        current_attributes = player_state.get('attributes')
+        current_attributes = current_attributes if isinstance(current_attributes, dict) else {}
+        attribute_changes = {}
+        for attr, relative, amount in compiled['attributes']:
+            current = current_attributes.get(attr)
+            if attr not in current_attributes:
+                warnings.append(f"Attempt to update unknown attribute {attr}.")
+                continue
+            if parse_number(current) is None or isinstance(current, str):
+                warnings.append(f"Attribute {attr} is not numeric ({current!r}); ignoring change {amount!r}.")
+                continue
+            try:
+                new_value = current + amount if relative else amount
+                new_value = int(new_value) if isinstance(current, int) else round(float(new_value), 6) # Keep the attribute's type
+            except (OverflowError, ValueError):
+                warnings.append(f"Attribute change {attr} {amount!r} is out of range.")
+                continue
+            attribute_changes[attr] = new_value
+            messages.append(f"Attribute {attr} changed from {current} to {new_value}.")
+
+        skills = None
+        for skill in compiled['skills']:
+            if skill['name'] in self._skill_positions:
+                continue # Already known; re-learning is not growth
+            if skills is None:
+                skills = list(self._skills)
+            self._skill_positions[skill['name']] = len(skills)
+            skills.append(skill)
+            messages.append(f"New skill learned: {skill['name']} (Level {skill['level']})!")
+
+        inventory = list(self._inventory) if compiled['add'] or compiled['remove'] else None
+        inventory_changed = removed_any = False
+        for item in compiled['add']:
+            position = self._item_positions.get(item['id'])
+            if position is None:
+                self._item_positions[item['id']] = len(inventory)
+                inventory.append(item)
+            else:
+                held = inventory[position]
+                held_quantity = _positive_int(held.get('quantity')) or 0
+                inventory[position] = dict(held, quantity=held_quantity + item['quantity'])
+            inventory_changed = True
+            messages.append(f"Obtained: {item['name']} (x{item['quantity']}).")
+        for item_id, quantity in compiled['remove']:
+            position = self._item_positions.get(item_id)
+            if position is None:
+                warnings.append(f"Cannot remove item {item_id!r}: not in inventory.")
+                continue
+            held = inventory[position]
+            held_quantity = _positive_int(held.get('quantity')) or 1
+            taken = held_quantity if quantity is None else min(quantity, held_quantity)
+            if taken >= held_quantity:
+                inventory[position] = None
+                del self._item_positions[item_id]
+                removed_any = True
+            else:
+                inventory[position] = dict(held, quantity=held_quantity - taken)
+            inventory_changed = True
+            messages.append(f"Lost: {held.get('name', item_id)} (x{taken}).")
+        if removed_any:
+            inventory = [item for item in inventory if item is not None]
+
+        fields = {}
+        if skills is not None:
+            fields['skills'] = skills
+        if inventory_changed:
+            fields['inventory'] = inventory
+        self.stats['rejected'] += len(warnings)
+        if not messages:
+            return messages, warnings
+        self._writing = True
+        try:
+            gwhr.update_player_state(fields=fields, attributes=attribute_changes)
+        finally:
+            self._writing = False
+        if skills is not None:
+            self._skills, self._skills_length = skills, len(skills)
+        if removed_any:
+            self._rebuild_items(inventory)
+        elif inventory_changed:
+            self._inventory, self._inventory_length = inventory, len(inventory)
+        self.stats['writes'] += 1
+        self.stats['changes'] += len(messages)
+        return messages, warnings
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, indexed_items=len(self._item_positions), indexed_skills=len(self._skill_positions))
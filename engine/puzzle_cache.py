@@ -0,0 +1,146 @@
+import os
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Fields of an 'environmental_puzzle_solution_eval' response that a cached transition replays.
+TRANSITION_FIELDS = ('action_feedback_narrative', 'puzzle_state_changed', 'updated_puzzle_elements_state',
+                     'new_clues_revealed', 'puzzle_solved', 'solution_narrative')
+
+
+def puzzle_transition_key(world_key: str, puzzle_id: str, elements_state: dict, element_id: str, item_id: str | None) -> str:
+    # Canonical JSON so key order in elements_state (or a missing vs. empty state) never splits entries.
+    canonical = json.dumps([world_key or '', puzzle_id, elements_state or {}, element_id, item_id],
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def evaluate_authored_puzzle(definition: dict, elements_state: dict, element_id: str, item_id: str | None) -> dict:
+    # Authored puzzles are plain state machines:
+    #   {'puzzle_id', 'initial_state': {...}, 'solved_when': {...}, 'solution_narrative', 'default_feedback',
+    #    'transitions': [{'element_id', 'item_id' (optional), 'when': {...}, 'set': {...}, 'clues': [...], 'feedback'}]}
+    # The first transition whose element, item and 'when' conditions match is applied. A transition without
+    # 'item_id' matches with or without an item.
+    state = dict(definition.get('initial_state') or {})
+    state.update(elements_state or {})
+    for transition in definition.get('transitions', []):
+        if transition.get('element_id') != element_id:
+            continue
+        if 'item_id' in transition and transition['item_id'] != item_id:
+            continue
+        if any(state.get(key) != value for key, value in (transition.get('when') or {}).items()):
+            continue
+        new_state = dict(state)
+        new_state.update(transition.get('set') or {})
+        solved_when = definition.get('solved_when') or {}
+        solved = bool(solved_when) and all(new_state.get(key) == value for key, value in solved_when.items())
+        return {
+            "action_feedback_narrative": transition.get('feedback', "Something shifts."),
+            "puzzle_state_changed": new_state != (elements_state or {}) or bool(transition.get('clues')),
+            "updated_puzzle_elements_state": new_state, # Full state, so initial_state is stored on the first action
+            "new_clues_revealed": list(transition.get('clues') or []),
+            "puzzle_solved": solved,
+            "solution_narrative": definition.get('solution_narrative') if solved else None
+        }
+    return {
+        "action_feedback_narrative": definition.get('default_feedback', "Nothing seems to happen."),
+        "puzzle_state_changed": False,
+        "updated_puzzle_elements_state": {},
+        "new_clues_revealed": [],
+        "puzzle_solved": False,
+        "solution_narrative": None
+    }
+
+
+class PuzzleTransitionCache:
+    # Remembers how a puzzle reacted to an action in a given state, keyed by
+    # (world, puzzle_id, canonical elements_state, element_id, item_id). A repeated action in the same state,
+    # in this session or (with cache_path) any later session of the same world, replays the recorded result
+    # instead of asking the LLM again. Puzzles registered with an authored definition never reach the LLM.
+    def __init__(self, cache_path: str | None = None, max_entries: int = 5000, authored_puzzles: list | None = None):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict() # key -> recorded transition, least recently used first
+        self._authored: dict[str, dict] = {} # puzzle_id -> authored definition
+        self.stats = {'hits': 0, 'misses': 0, 'authored': 0, 'stores': 0}
+        self._lock = threading.Lock()
+        for definition in authored_puzzles or []:
+            self.register_puzzle(definition)
+        if self.cache_path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"PuzzleTransitionCache: Ignoring unreadable cache '{self.cache_path}': {e}")
+            return
+        if isinstance(entries, dict):
+            self._entries.update(entries)
+            print(f"PuzzleTransitionCache: Loaded {len(entries)} puzzle transition(s) from '{self.cache_path}'.")
+
+    def _save(self):
+        # Called with the lock held.
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"PuzzleTransitionCache: Could not write '{self.cache_path}': {e}")
+
+    def register_puzzle(self, definition: dict) -> bool:
+        puzzle_id = definition.get('puzzle_id') if isinstance(definition, dict) else None
+        if not puzzle_id:
+            print("PuzzleTransitionCache: Authored puzzle definition without a puzzle_id ignored.")
+            return False
+        with self._lock:
+            self._authored[puzzle_id] = copy.deepcopy(definition)
+        return True
+
+    def is_authored(self, puzzle_id: str) -> bool:
+        with self._lock:
+            return puzzle_id in self._authored
+
+    def lookup(self, world_key: str, puzzle_id: str, elements_state: dict, element_id: str, item_id: str | None) -> tuple:
+        # (eval_data, source) with source 'authored' or 'cache'; (None, None) when the LLM has to decide.
+        with self._lock:
+            definition = self._authored.get(puzzle_id)
+            if definition is not None:
+                self.stats['authored'] += 1
+                return evaluate_authored_puzzle(definition, elements_state, element_id, item_id), 'authored'
+            key = puzzle_transition_key(world_key, puzzle_id, elements_state, element_id, item_id)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None, None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return copy.deepcopy(entry), 'cache'
+
+    def record(self, world_key: str, puzzle_id: str, elements_state: dict, element_id: str, item_id: str | None, eval_data: dict):
+        # Only well-formed LLM evaluations should be recorded; a fallback narrative would be replayed forever.
+        entry = {field: copy.deepcopy(eval_data[field]) for field in TRANSITION_FIELDS if field in eval_data}
+        key = puzzle_transition_key(world_key, puzzle_id, elements_state, element_id, item_id)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stats['stores'] += 1
+            if self.cache_path:
+                self._save()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, entries=len(self._entries), authored_puzzles=len(self._authored),
+                        hit_rate=self.stats['hits'] / lookups if lookups else 0.0)
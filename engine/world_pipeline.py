@@ -0,0 +1,101 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from engine.adventure_setup import AdventureSetup
+
+# Independent slices of the World Conception Document, generated in parallel once the blueprint exists.
+WORLD_SECTIONS = {
+    'core': ('world_title', 'setting_description'),
+    'locations': ('key_locations',),
+    'characters': ('main_characters',),
+    'plot_hook': ('initial_plot_hook',),
+}
+
+# Sections behind GWHR.get_world_summary: once these exist the first scene can be generated,
+# while the slower character section is still in flight.
+SCENE_CONTEXT_SECTIONS = ('core', 'locations', 'plot_hook')
+
+
+class WorldGenerationPipeline:
+    # Blueprint -> parallel conception sections -> early first-scene hook. Replaces the strictly sequential
+    # blueprint / conception / initialize / first scene startup and records how long each stage took.
+    def __init__(self, adventure_setup: AdventureSetup, sections: dict | None = None,
+                 scene_context_sections: tuple = SCENE_CONTEXT_SECTIONS, max_workers: int | None = None):
+        self.adventure_setup = adventure_setup
+        self.sections = dict(sections or WORLD_SECTIONS)
+        self.scene_context_sections = tuple(scene_context_sections)
+        # One worker per section plus one for the early scene, so the scene job never waits behind a section.
+        self.max_workers = max_workers or len(self.sections) + 1
+        self.stage_timings: dict[str, float] = {}
+        self.scene_context_result = None # Return value of on_scene_context_ready, if it ran and is still valid
+        self._lock = threading.Lock()
+
+    def _timed(self, stage: str, fn, *args):
+        start_time = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.stage_timings[stage] = time.perf_counter() - start_time
+
+    def _submit(self, executor: ThreadPoolExecutor, stage: str, fn, *args):
+        # Carry the caller's context (session tag for token metering) onto the worker thread.
+        return executor.submit(contextvars.copy_context().run, self._timed, stage, fn, *args)
+
+    def run(self, on_scene_context_ready=None) -> dict | None:
+        # on_scene_context_ready(partial_document) runs on a worker as soon as the scene context sections
+        # are in; its result is kept in scene_context_result unless the document had to be regenerated.
+        self.stage_timings = {}
+        self.scene_context_result = None
+        started = time.perf_counter()
+
+        blueprint = self._timed('blueprint', self.adventure_setup.generate_detailed_world_blueprint)
+        if not blueprint:
+            return None
+
+        conception_started = time.perf_counter()
+        document = {}
+        completed, failed = set(), []
+        scene_future = None
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="world-gen")
+        try:
+            pending = {
+                self._submit(executor, f"section:{name}", self.adventure_setup.generate_world_section, name, list(keys)): name
+                for name, keys in self.sections.items()
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    section = future.result()
+                    if section is None:
+                        failed.append(name)
+                    else:
+                        document.update(section)
+                        completed.add(name)
+                if (on_scene_context_ready and scene_future is None and not failed
+                        and all(name in completed for name in self.scene_context_sections)):
+                    self.stage_timings['scene_context_ready'] = time.perf_counter() - started
+                    scene_future = self._submit(executor, 'first_scene', on_scene_context_ready, dict(document))
+
+            if failed:
+                # A missing section would leave the world incomplete; fall back to the one-shot document.
+                print(f"WorldGenerationPipeline: Section(s) {failed} failed; falling back to a single conception request.")
+                document = self._timed('conception_fallback', self.adventure_setup.generate_initial_world)
+            self.stage_timings['conception'] = time.perf_counter() - conception_started
+            if scene_future is not None:
+                scene_result = scene_future.result()
+                # A regenerated document may describe a different world than the early scene was built from.
+                self.scene_context_result = scene_result if not failed else None
+        finally:
+            executor.shutdown(wait=True)
+
+        if document:
+            self.adventure_setup.world_conception_document = document
+        self.stage_timings['total'] = time.perf_counter() - started
+        return document or None
+
+    def get_stage_timings(self) -> dict:
+        with self._lock:
+            return dict(self.stage_timings)
@@ -0,0 +1,126 @@
+import heapq
+import itertools
+
+
+class WorldEventScheduler:
+    # Game-time event scheduler: a heap of (due_time, sequence, event_id), so advancing time by any amount
+    # pops exactly the events that fall due, in time order (ties in scheduling order), and never walks the
+    # skipped time units one by one. Callbacks are called as callback(due_time, payload).
+    # Recurring events either fire once per occurrence or, with coalesce=True, once for the latest
+    # occurrence of a jump (payload gets 'missed_occurrences'); the latter suits state that only needs its
+    # newest value, such as the weather. Cancelled and rescheduled events are dropped lazily when popped.
+    def __init__(self, now: int = 0):
+        self.now = now # Everything due at or before now has been processed
+        self._heap: list = []
+        self._events: dict[str, dict] = {}
+        self._sequence = itertools.count()
+        self._advancing = False
+        self._target: int | None = None # Furthest time asked for while a callback was running
+        self.stats = {'advances': 0, 'fired': 0, 'coalesced': 0, 'stale_pops': 0, 'errors': 0}
+
+    def _push(self, event_id: str, due_time: int):
+        self._events[event_id]['due'] = due_time
+        heapq.heappush(self._heap, (due_time, next(self._sequence), event_id))
+
+    def _add(self, event_id: str | None, due_time: int, callback, payload, interval: int | None, coalesce: bool) -> str:
+        event_id = event_id or f"event_{next(self._sequence)}"
+        # Re-using an id replaces the earlier event; its heap entry goes stale.
+        self._events[event_id] = {'callback': callback, 'payload': payload, 'interval': interval, 'coalesce': coalesce}
+        self._push(event_id, due_time)
+        return event_id
+
+    def at(self, due_time: int, callback, payload: dict | None = None, event_id: str | None = None) -> str:
+        # One-shot event; a due_time already in the past fires on the next advance.
+        return self._add(event_id, due_time, callback, payload, None, False)
+
+    def after(self, delay: int, callback, payload: dict | None = None, event_id: str | None = None) -> str:
+        return self.at(self.now + max(0, delay), callback, payload, event_id)
+
+    def every(self, interval: int, callback, payload: dict | None = None, event_id: str | None = None,
+              first_due: int | None = None, coalesce: bool = False) -> str:
+        # By default the first occurrence is the next multiple of interval after now, so a 10-unit event
+        # fires at 10, 20, 30... however the time gets there.
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if first_due is None:
+            first_due = (self.now // interval + 1) * interval
+        return self._add(event_id, first_due, callback, payload, interval, coalesce)
+
+    def cancel(self, event_id: str) -> bool:
+        return self._events.pop(event_id, None) is not None
+
+    def next_due(self) -> int | None:
+        while self._heap:
+            due_time, _, event_id = self._heap[0]
+            event = self._events.get(event_id)
+            if event is not None and event['due'] == due_time:
+                return due_time
+            heapq.heappop(self._heap)
+            self.stats['stale_pops'] += 1
+        return None
+
+    def advance_to(self, new_time: int) -> list:
+        # Fires every event due in (now, new_time] in order; returns [(event_id, due_time)] fired.
+        # Called again from inside a callback, it only extends the current advance.
+        if self._advancing:
+            self._target = max(self._target, new_time)
+            return []
+        self._advancing = True
+        self._target = new_time
+        self.stats['advances'] += 1
+        fired = []
+        try:
+            while True:
+                due_time = self.next_due()
+                if due_time is None or due_time > self._target:
+                    break
+                _, _, event_id = heapq.heappop(self._heap)
+                event = self._events[event_id]
+                interval = event['interval']
+                if interval and event['coalesce']:
+                    skipped = (self._target - due_time) // interval
+                    if skipped:
+                        # Wait in the heap for the latest occurrence so it fires in its own place in time
+                        event['missed'] = event.get('missed', 0) + skipped
+                        self.stats['coalesced'] += skipped
+                        self._push(event_id, due_time + skipped * interval)
+                        continue
+                payload = event['payload']
+                missed = event.pop('missed', 0)
+                if missed:
+                    payload = dict(payload or {}, missed_occurrences=missed)
+                if interval:
+                    self._push(event_id, due_time + interval)
+                else:
+                    del self._events[event_id]
+                self.now = max(self.now, due_time)
+                self.stats['fired'] += 1
+                fired.append((event_id, due_time))
+                try:
+                    event['callback'](due_time, payload)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"WorldEventScheduler: Error - Event '{event_id}' at time {due_time} failed: {e}")
+            self.now = max(self.now, self._target)
+        finally:
+            self._advancing = False
+            self._target = None
+        return fired
+
+    def reset(self, now: int):
+        # The world was replaced (new game or a restored save): one-shot events belonged to the old world
+        # and are dropped; recurring ones are re-anchored to their next occurrence after now.
+        recurring = {event_id: event for event_id, event in self._events.items() if event['interval']}
+        self.now = now
+        self._heap = []
+        self._events = {}
+        for event_id, event in recurring.items():
+            self._events[event_id] = event
+            self._push(event_id, (now // event['interval'] + 1) * event['interval'])
+
+    def pending(self) -> list:
+        # [(due_time, event_id)] in firing order.
+        return sorted((event['due'], event_id) for event_id, event in self._events.items())
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, now=self.now, pending=len(self._events), heap_size=len(self._heap))
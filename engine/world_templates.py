@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+
+DEFAULT_TEMPLATE_LIBRARY_DIR = "world_templates"
+
+# Latin words, digits, and single CJK characters (Chinese preferences have no spaces to split on).
+_TERM_PATTERN = re.compile(r"[a-z0-9]+|[㐀-䶿一-鿿]")
+_STOPWORDS = {'a', 'an', 'the', 'and', 'or', 'of', 'in', 'on', 'with', 'to', 'for', 'i', 'want', 'like',
+              'some', 'where', 'that', 'is', 'are', 'be', 'my', 'me', 'game', 'adventure', 'world', 'story'}
+
+
+def preference_terms(text: str) -> list:
+    return [term for term in _TERM_PATTERN.findall((text or '').lower()) if term not in _STOPWORDS]
+
+
+def template_id_for(theme: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", theme.lower()).strip("_")[:40] or "world"
+    return f"{slug}_{hashlib.sha1(theme.encode('utf-8')).hexdigest()[:8]}"
+
+
+def template_profile_text(template: dict) -> str:
+    # What a preference is matched against: the theme it was generated for plus the world it produced.
+    document = template.get('world_conception_document') or {}
+    location_names = [loc.get('name', '') for loc in document.get('key_locations', []) if isinstance(loc, dict)]
+    return " ".join([template.get('theme', ''), template.get('preference', ''), document.get('world_title', ''),
+                     document.get('setting_description', ''), " ".join(location_names)])
+
+
+class WorldTemplateLibrary:
+    # Pre-generated worlds (blueprint, World Conception Document and opening scene) stored as one JSON file
+    # per template, plus index.json holding each template's term counts for TF-IDF matching.
+    def __init__(self, library_dir: str = DEFAULT_TEMPLATE_LIBRARY_DIR):
+        self.library_dir = library_dir
+        self._index: dict[str, dict] = {} # template_id -> {'theme', 'title', 'terms'}
+        self._idf: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.library_dir, "index.json")
+
+    def _template_path(self, template_id: str) -> str:
+        return os.path.join(self.library_dir, f"{template_id}.json")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            self._index = {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"WorldTemplateLibrary: Ignoring unreadable index in '{self.library_dir}': {e}")
+            self._index = {}
+        self._rebuild_idf()
+        if self._index:
+            print(f"WorldTemplateLibrary: Loaded {len(self._index)} world template(s) from '{self.library_dir}'.")
+
+    def _rebuild_idf(self):
+        document_frequency = Counter()
+        for entry in self._index.values():
+            document_frequency.update(entry['terms'].keys())
+        total = len(self._index)
+        self._idf = {term: math.log((1 + total) / (1 + df)) + 1.0 for term, df in document_frequency.items()}
+
+    def _write_json(self, path: str, data: dict):
+        os.makedirs(self.library_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def add(self, template: dict) -> str:
+        template_id = template.get('template_id') or template_id_for(template.get('theme', ''))
+        template = dict(template, template_id=template_id, created_at=template.get('created_at', time.time()))
+        with self._lock:
+            self._write_json(self._template_path(template_id), template)
+            self._index[template_id] = {
+                'theme': template.get('theme', ''),
+                'title': (template.get('world_conception_document') or {}).get('world_title', ''),
+                'terms': dict(Counter(preference_terms(template_profile_text(template)))),
+            }
+            self._write_json(self._index_path(), self._index)
+            self._rebuild_idf()
+        return template_id
+
+    def get(self, template_id: str) -> dict | None:
+        try:
+            with open(self._template_path(template_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"WorldTemplateLibrary: Could not read template '{template_id}': {e}")
+            return None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _vector(self, term_counts: dict) -> dict:
+        return {term: count * self._idf.get(term, 0.0) for term, count in term_counts.items()}
+
+    def rank(self, preference_text: str, limit: int = 3) -> list:
+        # [(template_id, cosine similarity)] best first, TF-IDF weighted over the library's vocabulary.
+        query = self._vector(Counter(preference_terms(preference_text)))
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        if not query_norm:
+            return []
+        scores = []
+        with self._lock:
+            for template_id, entry in self._index.items():
+                vector = self._vector(entry['terms'])
+                norm = math.sqrt(sum(w * w for w in vector.values()))
+                if not norm:
+                    continue
+                dot = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                scores.append((template_id, dot / (query_norm * norm)))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:limit]
+
+    def find_best(self, preference_text: str, min_score: float = 0.3) -> tuple | None:
+        # (template, score) for the closest template, or None if nothing is lexically close enough.
+        ranked = self.rank(preference_text, limit=1)
+        if not ranked or ranked[0][1] < min_score:
+            return None
+        template = self.get(ranked[0][0])
+        return (template, ranked[0][1]) if template else None
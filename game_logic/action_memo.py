@@ -0,0 +1,139 @@
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from engine.gwhr import GWHR
+from engine.npc_simulation import SIMULATED_ATTRIBUTES
+
+# Top-level GWHR keys a generic action outcome depends on, besides the current scene itself.
+DEFAULT_ACTION_STATE_KEYS = ('player_state', 'world_state', 'environmental_puzzle_log', 'npcs')
+# NPC fields that can change how a scene plays out; dialogue logs and timestamps only grow.
+NPC_STATE_FIELDS = ('status', 'attributes', 'current_location_id', 'status_effects')
+
+
+def scene_npc_ids(scene_data: dict, npcs: dict) -> set:
+    # GWHR ids of the NPCs a scene involves: interaction targets and the NPCs it lists (by id, or by name
+    # under GWHR's id convention).
+    ids = {element.get('target_id') for element in scene_data.get('interactive_elements') or [] if isinstance(element, dict)}
+    for npc in scene_data.get('npcs_in_scene') or []:
+        if isinstance(npc, dict):
+            ids.add(npc.get('id'))
+            if isinstance(npc.get('name'), str):
+                ids.add(npc['name'].lower().replace(' ', '_'))
+    return {npc_id for npc_id in ids if npc_id in npcs}
+
+
+def npc_state_slice(npc: dict) -> dict:
+    # Simulation-driven drift (mood, disposition, HP) is left out; whether the NPC is alive is kept.
+    npc_slice = {field: npc.get(field) for field in NPC_STATE_FIELDS}
+    attributes = npc_slice['attributes']
+    if isinstance(attributes, dict):
+        npc_slice['attributes'] = {key: value for key, value in attributes.items() if key not in SIMULATED_ATTRIBUTES}
+        if 'current_hp' in attributes:
+            npc_slice['alive'] = not isinstance(attributes['current_hp'], (int, float)) or attributes['current_hp'] > 0
+    return npc_slice
+
+
+def action_state_slice(data_store: dict, state_keys: tuple = DEFAULT_ACTION_STATE_KEYS) -> dict:
+    # The part of the world an action outcome is a function of. Game time, logs and image fields are left
+    # out, so re-reading a sign one turn later (or once its image arrived) maps to the same slice. Only the
+    # NPCs in the current scene are part of it, so NPCs ticking elsewhere in the world do not change it.
+    scene_data = {key: value for key, value in (data_store.get('current_scene_data') or {}).items()
+                  if key not in GWHR.SCENE_PRESENTATION_KEYS}
+    state_slice = {'current_scene_data': scene_data}
+    for key in state_keys:
+        value = data_store.get(key)
+        if key == 'npcs' and isinstance(value, dict):
+            value = {npc_id: npc_state_slice(value[npc_id]) for npc_id in scene_npc_ids(scene_data, value)}
+        state_slice[key] = value
+    return state_slice
+
+
+def action_state_hash(data_store: dict, state_keys: tuple = DEFAULT_ACTION_STATE_KEYS) -> str:
+    canonical = json.dumps(action_state_slice(data_store, state_keys), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ActionOutcomeMemo:
+    # Memoizes process_player_action outcomes by (scene_id, element id, hash of the state slice above).
+    # The state hash is computed once and reused until GWHR reports a mutation of a key in the slice;
+    # a new world (GWHR.initialize) drops every entry. Element types in excluded_types (e.g. ones whose
+    # outcome should vary) are never memoized, and neither are outcomes carrying player_updates, since
+    # replaying those would grant the same rewards again.
+    def __init__(self, state_keys: tuple = DEFAULT_ACTION_STATE_KEYS, excluded_types: tuple = (), max_entries: int = 512):
+        self.state_keys = tuple(state_keys)
+        self.excluded_types = tuple(excluded_types)
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict() # key -> {'outcome', 'cost_s'}, least recently used first
+        self._state_hash: str | None = None # Valid until a relevant GWHR mutation
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'skipped_types': 0, 'not_stored': 0,
+                      'hash_computations': 0, 'invalidations': 0, 'saved_latency_s': 0.0}
+        self._lock = threading.Lock()
+
+    def attach(self, gwhr: GWHR):
+        gwhr.add_mutation_listener(self._on_mutation)
+
+    def _on_mutation(self, keys: list | None):
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self._state_hash = None
+                self.stats['invalidations'] += 1
+            elif self._state_hash is not None and any(key == 'current_scene_data' or key in self.state_keys for key in keys):
+                self._state_hash = None
+                self.stats['invalidations'] += 1
+
+    def _current_state_hash(self, gwhr: GWHR) -> str:
+        # Called with the lock held.
+        if self._state_hash is None:
+            self._state_hash = action_state_hash(gwhr.data_store, self.state_keys)
+            self.stats['hash_computations'] += 1
+        return self._state_hash
+
+    def key_for(self, scene_id: str, element: dict | None, element_id: str, gwhr: GWHR) -> str | None:
+        # None when this element type opted out of memoization.
+        if (element or {}).get('type') in self.excluded_types:
+            return None
+        with self._lock:
+            return f"{scene_id}|{element_id}|{self._current_state_hash(gwhr)}"
+
+    def lookup(self, scene_id: str, element: dict | None, element_id: str, gwhr: GWHR) -> tuple:
+        # (key, outcome): outcome is a copy of the memoized response_data or None; key is None if opted out.
+        key = self.key_for(scene_id, element, element_id, gwhr)
+        with self._lock:
+            if key is None:
+                self.stats['skipped_types'] += 1
+                return None, None
+            self.stats['lookups'] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return key, None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['saved_latency_s'] += entry['cost_s']
+            return key, copy.deepcopy(entry['outcome'])
+
+    def contains(self, key: str | None) -> bool:
+        with self._lock:
+            return key is not None and key in self._entries
+
+    def record(self, key: str | None, outcome: dict, cost_s: float) -> bool:
+        # cost_s: what producing the outcome took (LLM call plus blocking image), credited on every hit.
+        if key is None:
+            return False
+        with self._lock:
+            if outcome.get('player_updates'):
+                self.stats['not_stored'] += 1
+                return False
+            self._entries[key] = {'outcome': copy.deepcopy(outcome), 'cost_s': cost_s}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries),
+                        hit_rate=self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0)
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from api.llm_interface import LLMInterface
+from api.token_meter import estimate_tokens, speculative_records
+
+
+def prompt_fingerprint(prompt: str) -> str:
+    return hashlib.sha1(str(prompt).encode('utf-8')).hexdigest()
+
+
+class ActionPrefetcher:
+    # Speculatively generates process_player_action outcomes while the player is still reading.
+    # A prefetched response is only handed out if the prompt the controller would send now is
+    # byte-identical to the one generated from the snapshot, i.e. the state the LLM saw has not diverged.
+    # Speculative calls are metered apart from the live session and turn budgets; only a used outcome is
+    # charged to them, at the turn that takes it.
+    def __init__(self, llm_interface: LLMInterface, max_concurrency: int = 2, max_prefetch_per_scene: int = 2,
+                 token_budget_per_scene: int = 6000, expected_completion_tokens: int = 600,
+                 prefetch_types: tuple = ('navigate', 'dialogue'), wait_timeout_s: float = 30.0):
+        self.llm_interface = llm_interface
+        self.max_prefetch_per_scene = max_prefetch_per_scene
+        self.token_budget_per_scene = token_budget_per_scene
+        self.expected_completion_tokens = expected_completion_tokens
+        self.prefetch_types = prefetch_types
+        self.wait_timeout_s = wait_timeout_s
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="action-prefetch")
+        self.entries: dict[str, dict] = {} # element_id -> {'future', 'fingerprint', 'response_type', 'prompt_tokens', 'records'}
+        self.type_pick_counts: dict[str, int] = {t: 0 for t in prefetch_types}
+        self.stats = {'submitted': 0, 'hits': 0, 'diverged': 0, 'cancelled': 0, 'discarded': 0, 'skipped_budget': 0,
+                      'speculative_tokens': 0, 'charged_tokens': 0}
+        self._lock = threading.Lock()
+
+    def rank_candidates(self, interactive_elements: list) -> list:
+        # Elements whose type the player has historically picked most come first; ties keep menu order.
+        candidates = [el for el in interactive_elements or [] if isinstance(el, dict) and el.get('id') and el.get('type') in self.prefetch_types]
+        return sorted(candidates, key=lambda el: (-self.type_pick_counts.get(el.get('type'), 0), self.prefetch_types.index(el.get('type'))))
+
+    def prefetch(self, jobs: list, model_id: str):
+        # jobs: list of (element_id, response_type, prompt), already ranked most likely first.
+        if not model_id:
+            return
+        spent = 0
+        with self._lock:
+            for entry in self.entries.values():
+                spent += entry['prompt_tokens'] + self.expected_completion_tokens
+            for element_id, response_type, prompt in jobs[:self.max_prefetch_per_scene]:
+                fingerprint = prompt_fingerprint(prompt)
+                existing = self.entries.get(element_id)
+                if existing and existing['fingerprint'] == fingerprint:
+                    continue # Same speculation already in flight or done
+                if existing:
+                    self._discard(existing)
+                prompt_tokens = estimate_tokens(str(prompt))
+                if spent + prompt_tokens + self.expected_completion_tokens > self.token_budget_per_scene:
+                    self.stats['skipped_budget'] += 1
+                    continue
+                spent += prompt_tokens + self.expected_completion_tokens
+                # Carry the caller's context (session tag for token metering) into the worker thread.
+                context = contextvars.copy_context()
+                records = []
+                future = self.executor.submit(context.run, self._speculate, records, prompt, model_id, response_type)
+                self.entries[element_id] = {
+                    'future': future, 'fingerprint': fingerprint, 'response_type': response_type, 'prompt_tokens': prompt_tokens,
+                    'records': records
+                }
+                self.stats['submitted'] += 1
+                self.stats['speculative_tokens'] += prompt_tokens
+                print(f"ActionPrefetcher: Speculating '{element_id}' ({response_type}, ~{prompt_tokens} prompt tokens).")
+
+    def _speculate(self, records: list, prompt, model_id: str, response_type: str) -> str | None:
+        # Runs in a copy of the caller's context, so the speculative marker stays on this worker call.
+        speculative_records.set(records)
+        return self.llm_interface.generate(prompt, model_id, response_type)
+
+    def select(self, element_id: str, element_type: str | None = None):
+        # The player committed to an element: cancel every other speculation.
+        with self._lock:
+            if element_type in self.type_pick_counts:
+                self.type_pick_counts[element_type] += 1
+            for other_id in [eid for eid in self.entries if eid != element_id]:
+                self._discard(self.entries.pop(other_id))
+
+    def take(self, element_id: str, live_prompt: str) -> str | None:
+        # Called on the live turn; a committed outcome's tokens are charged to that turn and session.
+        with self._lock:
+            entry = self.entries.pop(element_id, None)
+            if not entry:
+                return None
+            diverged = entry['fingerprint'] != prompt_fingerprint(live_prompt)
+            if diverged:
+                self._discard(entry)
+                self.stats['diverged'] += 1
+        if diverged:
+            print(f"ActionPrefetcher: State diverged since speculating '{element_id}'. Discarding prefetched outcome.")
+            return None
+        try:
+            # An identical request still in flight is cheaper to wait for than to re-issue.
+            result = entry['future'].result(timeout=self.wait_timeout_s)
+        except FutureTimeoutError:
+            with self._lock:
+                self._discard(entry)
+            return None
+        except Exception as e:
+            print(f"ActionPrefetcher: Speculative generation for '{element_id}' failed: {e}")
+            return None
+        if result is None:
+            return None
+        charged = self.llm_interface.token_meter.charge(entry['records'])
+        with self._lock:
+            self.stats['hits'] += 1
+            self.stats['charged_tokens'] += charged
+        print(f"ActionPrefetcher: Committing prefetched outcome for '{element_id}'.")
+        return result
+
+    def cancel_all(self):
+        with self._lock:
+            for entry in self.entries.values():
+                self._discard(entry)
+            self.entries.clear()
+
+    def _discard(self, entry: dict):
+        # Called with the lock held.
+        if entry['future'].cancel():
+            self.stats['cancelled'] += 1
+        else:
+            self.stats['discarded'] += 1 # Already running or finished; its result is simply dropped
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['hit_rate'] = stats['hits'] / stats['submitted'] if stats['submitted'] else 0.0
+        return stats
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
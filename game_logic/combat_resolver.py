@@ -0,0 +1,210 @@
+import copy
+import random
+
+# Per-strategy modifiers applied to the player's side of a turn.
+#   hit / damage: multipliers on the player's hit chance and attack power (0 damage = no attack)
+#   incoming: multiplier on damage the player takes this turn
+#   evasion_bonus: added to the player's evasion chance for this turn's enemy attacks
+#   flee: base chance the player escapes before the enemies act
+STRATEGY_MODIFIERS = {
+    'standard_attack': {'hit': 1.0, 'damage': 1.0, 'incoming': 1.0, 'evasion_bonus': 0.0, 'flee': 0.0},
+    'power_attack': {'hit': 0.75, 'damage': 1.6, 'incoming': 1.15, 'evasion_bonus': 0.0, 'flee': 0.0},
+    'quick_attack': {'hit': 1.2, 'damage': 0.7, 'incoming': 1.0, 'evasion_bonus': 0.05, 'flee': 0.0},
+    'defend': {'hit': 0.0, 'damage': 0.0, 'incoming': 0.5, 'evasion_bonus': 0.15, 'flee': 0.0},
+    'try_flee': {'hit': 0.0, 'damage': 0.0, 'incoming': 1.25, 'evasion_bonus': 0.0, 'flee': 0.35},
+}
+DEFAULT_STRATEGY_ID = 'standard_attack'
+
+DEFAULT_PLAYER_STRATEGIES = [
+    {"id": "standard_attack", "name": "Standard Attack"},
+    {"id": "power_attack", "name": "Power Attack (Low Hit, High Dmg)"},
+    {"id": "quick_attack", "name": "Quick Attack (High Hit, Low Dmg)"},
+    {"id": "defend", "name": "Defend"},
+    {"id": "try_flee", "name": "Attempt to Flee"}
+]
+
+# Combat stats assumed when a player or NPC attributes dict leaves them out.
+PLAYER_COMBAT_DEFAULTS = {'current_hp': 100, 'max_hp': 100, 'attack_power': 10, 'defense_power': 5, 'evasion_chance': 0.1, 'hit_chance': 0.8}
+NPC_COMBAT_DEFAULTS = {'current_hp': 50, 'max_hp': 50, 'attack_power': 8, 'defense_power': 3, 'evasion_chance': 0.05, 'hit_chance': 0.7}
+
+AUTO_BATTLE_STRATEGY = {"id": "auto_battle", "name": "Auto-Battle (fight on until a decision is needed)"}
+
+MIN_HIT_CHANCE = 0.05
+MAX_HIT_CHANCE = 0.95
+DAMAGE_VARIANCE = 0.2 # Damage rolls land within +/-20% of the expected value
+
+
+def combat_stats(attributes: dict, defaults: dict) -> dict:
+    return {stat: attributes.get(stat, default) for stat, default in defaults.items()}
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def default_battle_policy(combat_data: dict) -> str:
+    # Auto-battle strategy for the player: finish off a nearly dead foe reliably, hit hard while
+    # healthy, otherwise attack normally. Never flees or defends; low HP is left to the player.
+    player = combat_data['player']
+    live_npcs = [npc for npc in combat_data.get('npcs', []) if npc.get('current_hp', 0) > 0]
+    if not live_npcs:
+        return DEFAULT_STRATEGY_ID
+    weakest = min(live_npcs, key=lambda npc: npc['current_hp'])
+    quick_damage = player.get('attack_power', 10) * STRATEGY_MODIFIERS['quick_attack']['damage'] - weakest.get('defense_power', 0)
+    if weakest['current_hp'] <= quick_damage:
+        return 'quick_attack'
+    if player['current_hp'] >= 0.6 * player.get('max_hp', player['current_hp']):
+        return 'power_attack'
+    return DEFAULT_STRATEGY_ID
+
+
+def apply_turn_outcome(combat_data: dict, outcome: dict):
+    # Mechanics-only application of a resolved turn to a combat state (no narrative, no GWHR).
+    combat_data['player']['current_hp'] = max(0, combat_data['player']['current_hp'] + outcome['player_hp_change'])
+    hp_changes = {change['npc_id']: change['hp_change'] for change in outcome['npc_hp_changes']}
+    for npc in combat_data.get('npcs', []):
+        if npc['id'] in hp_changes:
+            npc['current_hp'] = max(0, npc['current_hp'] + hp_changes[npc['id']])
+    combat_data['combat_ended'] = outcome['combat_ended']
+    combat_data['victor'] = outcome['victor']
+
+
+def format_turn_log(outcome: dict, names: dict) -> str:
+    # One compact line per turn, e.g. "T3 power_attack: Player>Goblin 12, Goblin>Player miss".
+    if outcome.get('fled'):
+        blows = "fled"
+    else:
+        blows = ", ".join(
+            f"{names.get(a['attacker_id'], a['attacker_id'])}>{names.get(a['target_id'], a['target_id'])} "
+            f"{a['damage'] if a['hit'] else 'miss'}" for a in outcome.get('attacks', [])) or "no blows"
+    return f"T{outcome.get('turn', '?')} {outcome.get('strategy_id')}: {blows}"
+
+
+class CombatResolver:
+    # Resolves combat turn mechanics locally from the attack/defense/hit/evasion stats already in
+    # active_combat_data, so the LLM only has to narrate. Every roll comes from one seeded RNG, so a
+    # given seed and sequence of strategies always plays out the same fight.
+    def __init__(self, seed: int | None = None, strategy_modifiers: dict | None = None):
+        self.seed = seed
+        self.strategy_modifiers = dict(strategy_modifiers or STRATEGY_MODIFIERS)
+        self._rng = random.Random(seed)
+
+    def reseed(self, seed: int | None):
+        self.seed = seed
+        self._rng = random.Random(seed)
+
+    def _modifiers(self, strategy_id: str) -> dict:
+        return self.strategy_modifiers.get(strategy_id) or self.strategy_modifiers[DEFAULT_STRATEGY_ID]
+
+    def _damage(self, attack_power: float, defense_power: float, multiplier: float, variance_roll: float) -> int:
+        # variance_roll is uniform in [0, 1); every landed hit deals at least 1.
+        base = attack_power * multiplier * (1.0 - DAMAGE_VARIANCE + 2 * DAMAGE_VARIANCE * variance_roll)
+        return max(1, int(round(base - defense_power)))
+
+    def _npc_attacks(self, player: dict, attackers: list, modifiers: dict) -> list:
+        # All enemy attacks of a turn resolve as one batch: draw every roll first, then reduce them in
+        # order, so adding combatants never changes how earlier rolls are consumed.
+        rolls = [(self._rng.random(), self._rng.random()) for _ in attackers]
+        evasion = player.get('evasion_chance', 0.0) + modifiers['evasion_bonus']
+        hit_chances = [_clamp(npc.get('hit_chance', 0.7) - evasion, MIN_HIT_CHANCE, MAX_HIT_CHANCE) for npc in attackers]
+        attacks = []
+        for npc, hit_chance, (hit_roll, variance_roll) in zip(attackers, hit_chances, rolls):
+            hit = hit_roll < hit_chance
+            damage = self._damage(npc.get('attack_power', 8), player.get('defense_power', 0), modifiers['incoming'], variance_roll) if hit else 0
+            attacks.append({'attacker_id': npc['id'], 'target_id': 'player', 'hit': hit, 'damage': damage})
+        return attacks
+
+    def resolve_turn(self, combat_data: dict, player_strategy_id: str, target_npc_id: str | None = None) -> dict:
+        # Returns a combat_turn_outcome shaped dict (minus the narrative) plus 'attacks', the per-blow
+        # record the narration is written from. combat_data itself is not modified.
+        modifiers = self._modifiers(player_strategy_id)
+        player = combat_data['player']
+        live_npcs = [npc for npc in combat_data.get('npcs', []) if npc.get('current_hp', 0) > 0]
+        attacks = []
+        npc_damage: dict[str, int] = {}
+        fled = False
+
+        if modifiers['flee'] > 0:
+            fled = self._rng.random() < _clamp(modifiers['flee'] + player.get('evasion_chance', 0.0), 0.0, MAX_HIT_CHANCE)
+        elif modifiers['damage'] > 0 and live_npcs:
+            # Focus the named target, otherwise the weakest opponent still standing.
+            target = next((npc for npc in live_npcs if npc['id'] == target_npc_id), None) or min(live_npcs, key=lambda npc: npc['current_hp'])
+            hit_roll, variance_roll = self._rng.random(), self._rng.random()
+            hit_chance = _clamp(player.get('hit_chance', 0.8) * modifiers['hit'] - target.get('evasion_chance', 0.0), MIN_HIT_CHANCE, MAX_HIT_CHANCE)
+            hit = hit_roll < hit_chance
+            damage = self._damage(player.get('attack_power', 10), target.get('defense_power', 0), modifiers['damage'], variance_roll) if hit else 0
+            damage = min(damage, target['current_hp'])
+            attacks.append({'attacker_id': 'player', 'target_id': target['id'], 'hit': hit, 'damage': damage})
+            if damage:
+                npc_damage[target['id']] = damage
+
+        attackers = [npc for npc in live_npcs if npc['current_hp'] - npc_damage.get(npc['id'], 0) > 0] if not fled else []
+        npc_attacks = self._npc_attacks(player, attackers, modifiers)
+        attacks.extend(npc_attacks)
+        player_damage = min(sum(attack['damage'] for attack in npc_attacks), player['current_hp'])
+
+        player_hp_after = player['current_hp'] - player_damage
+        npcs_standing = [npc for npc in live_npcs if npc['current_hp'] - npc_damage.get(npc['id'], 0) > 0]
+        if fled:
+            combat_ended, victor = True, 'fled'
+        elif player_hp_after <= 0:
+            combat_ended, victor = True, 'npc'
+        elif not npcs_standing:
+            combat_ended, victor = True, 'player'
+        else:
+            combat_ended, victor = False, None
+        return {
+            'strategy_id': player_strategy_id if player_strategy_id in self.strategy_modifiers else DEFAULT_STRATEGY_ID,
+            'player_hp_change': -player_damage,
+            'npc_hp_changes': [{'npc_id': npc_id, 'hp_change': -damage} for npc_id, damage in npc_damage.items()],
+            'attacks': attacks,
+            'fled': fled,
+            'combat_ended': combat_ended,
+            'victor': victor,
+            'available_player_strategies': [] if combat_ended else list(combat_data.get('last_turn_player_strategies') or DEFAULT_PLAYER_STRATEGIES),
+        }
+
+    def describe_turn(self, outcome: dict, names: dict) -> str:
+        # Plain mechanical summary, used as the narration when the LLM is unavailable.
+        if outcome.get('fled'):
+            return "You break away from the fight and escape."
+        lines = []
+        for attack in outcome.get('attacks', []):
+            attacker = names.get(attack['attacker_id'], attack['attacker_id'])
+            target = names.get(attack['target_id'], attack['target_id'])
+            if attack['hit']:
+                lines.append(f"{attacker} hits {target} for {attack['damage']} damage.")
+            else:
+                lines.append(f"{attacker} misses {target}.")
+        if outcome.get('strategy_id') == 'defend':
+            lines.insert(0, "You brace yourself behind your guard.")
+        elif outcome.get('strategy_id') == 'try_flee':
+            lines.insert(0, "You try to escape, but your opponents cut you off.")
+        return " ".join(lines) or "The combatants circle each other warily."
+
+    def auto_battle(self, combat_data: dict, policy=default_battle_policy, max_turns: int = 30,
+                    decision_hp_fraction: float = 0.3) -> dict:
+        # Plays turns locally with policy(combat_state) choosing the player's strategy until the fight ends,
+        # the player drops below decision_hp_fraction of max HP (a decision point the player should take
+        # over), or max_turns pass. Works on a copy; 'final_state' is the combat state to apply in one go.
+        # A fight that is already below the threshold when auto-battle starts is not interrupted again.
+        state = copy.deepcopy(combat_data)
+        player = state['player']
+        threshold_hp = decision_hp_fraction * player.get('max_hp', player['current_hp'])
+        check_decision_point = player['current_hp'] >= threshold_hp
+        turns = []
+        stop_reason = 'max_turns'
+        turn_number = state.get('turn', 1)
+        for index in range(max_turns):
+            state['turn'] = turn_number + index
+            outcome = self.resolve_turn(state, policy(state))
+            outcome['turn'] = state['turn']
+            apply_turn_outcome(state, outcome)
+            turns.append(outcome)
+            if outcome['combat_ended']:
+                stop_reason = 'combat_ended'
+                break
+            if check_decision_point and player['current_hp'] < threshold_hp:
+                stop_reason = 'decision_point'
+                break
+        return {'turns': turns, 'stop_reason': stop_reason, 'final_state': state}
@@ -0,0 +1,181 @@
+import time
+from game_logic.combat_resolver import (CombatResolver, STRATEGY_MODIFIERS, DAMAGE_VARIANCE, MIN_HIT_CHANCE, MAX_HIT_CHANCE,
+                                        PLAYER_COMBAT_DEFAULTS, NPC_COMBAT_DEFAULTS, combat_stats, default_battle_policy,
+                                        apply_turn_outcome)
+
+try:
+    import numpy as np
+except ImportError: # Optional: without NumPy fights are simulated one by one with CombatResolver
+    np = None
+
+# (minimum win probability, label) checked in order; anything below the last is 'deadly'.
+THREAT_LEVELS = ((0.95, 'trivial'), (0.8, 'manageable'), (0.5, 'risky'))
+HP_LOSS_BINS = 10 # Histogram buckets of HP lost, each 10% of the player's max HP
+
+
+def threat_label(win_probability: float) -> str:
+    for minimum, label in THREAT_LEVELS:
+        if win_probability >= minimum:
+            return label
+    return 'deadly'
+
+
+def _percentile(sorted_values, fraction: float):
+    # Nearest-rank on an already sorted sequence, identical for lists and arrays.
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+
+class CombatSimulator:
+    # Monte Carlo balance checks with the same mechanics as CombatResolver: win probability, expected
+    # turns and HP-loss distribution for the player against a group of NPCs. With NumPy every fight of a
+    # batch advances one turn per array step; without it the fights are played one at a time.
+    # A fixed 'try_flee' escapes as CombatResolver does; a fled fight counts as neither a win nor a loss.
+    def __init__(self, n_fights: int = 20000, n_threat_fights: int = 2000, max_turns: int = 50,
+                 seed: int | None = None, use_numpy: bool | None = None):
+        self.n_fights = n_fights
+        self.n_threat_fights = n_threat_fights # Smaller batch for the interactive pre-fight estimate
+        self.max_turns = max_turns
+        self.seed = seed
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+
+    def simulate(self, player_attrs: dict, npc_attrs_list: list, strategy: str | None = None, n_fights: int | None = None) -> dict:
+        # strategy: a STRATEGY_MODIFIERS id used every turn, or None for the auto-battle policy.
+        n_fights = n_fights or self.n_fights
+        player = combat_stats(player_attrs, PLAYER_COMBAT_DEFAULTS)
+        npcs = [combat_stats(attrs, NPC_COMBAT_DEFAULTS) for attrs in npc_attrs_list]
+        started = time.perf_counter()
+        if not npcs:
+            outcomes, turns, hp_loss = [1] * n_fights, [0] * n_fights, [0] * n_fights
+            backend = 'none'
+        elif self.use_numpy:
+            outcomes, turns, hp_loss = self._simulate_numpy(player, npcs, strategy, n_fights)
+            backend = 'numpy'
+        else:
+            outcomes, turns, hp_loss = self._simulate_python(player, npcs, strategy, n_fights)
+            backend = 'python'
+        return self._summarize(outcomes, turns, hp_loss, player['max_hp'], backend, time.perf_counter() - started)
+
+    def _simulate_python(self, player: dict, npcs: list, strategy: str | None, n_fights: int) -> tuple:
+        resolver = CombatResolver(seed=self.seed)
+        outcomes, turns, hp_loss = [], [], []
+        for _ in range(n_fights):
+            state = {'player': dict(player, id='player'),
+                     'npcs': [dict(npc, id=f'npc_{i}') for i, npc in enumerate(npcs)], 'last_turn_player_strategies': []}
+            result, turn = 0, self.max_turns
+            for turn_number in range(1, self.max_turns + 1):
+                outcome = resolver.resolve_turn(state, strategy or default_battle_policy(state))
+                apply_turn_outcome(state, outcome)
+                if outcome['combat_ended']:
+                    result, turn = (1 if outcome['victor'] == 'player' else -1 if outcome['victor'] == 'npc' else 0), turn_number
+                    break
+            outcomes.append(result)
+            turns.append(turn)
+            hp_loss.append(player['current_hp'] - state['player']['current_hp'])
+        return outcomes, turns, hp_loss
+
+    def _simulate_numpy(self, player: dict, npcs: list, strategy: str | None, n_fights: int) -> tuple:
+        rng = np.random.default_rng(self.seed)
+        strategy_ids = list(STRATEGY_MODIFIERS)
+        modifier_table = np.array([[STRATEGY_MODIFIERS[s][k] for k in ('hit', 'damage', 'incoming', 'evasion_bonus', 'flee')] for s in strategy_ids])
+        rows = np.arange(n_fights)
+        npc_attack = np.array([npc['attack_power'] for npc in npcs], dtype=float)
+        npc_defense = np.array([npc['defense_power'] for npc in npcs], dtype=float)
+        npc_evasion = np.array([npc['evasion_chance'] for npc in npcs], dtype=float)
+        npc_hit = np.array([npc['hit_chance'] for npc in npcs], dtype=float)
+        npc_hp = np.tile(np.array([npc['current_hp'] for npc in npcs], dtype=float), (n_fights, 1))
+        player_hp = np.full(n_fights, float(player['current_hp']))
+        outcomes = np.zeros(n_fights, dtype=np.int8)
+        turns = np.full(n_fights, self.max_turns, dtype=np.int32)
+        active = np.ones(n_fights, dtype=bool)
+        fixed_code = strategy_ids.index(strategy) if strategy in STRATEGY_MODIFIERS else strategy_ids.index('standard_attack')
+
+        for turn_number in range(1, self.max_turns + 1):
+            if not active.any():
+                break
+            # Player strikes the weakest opponent still standing (CombatResolver's default target).
+            alive = npc_hp > 0
+            target = np.where(alive, npc_hp, np.inf).argmin(axis=1)
+            target_hp = npc_hp[rows, target]
+            if strategy is None:
+                # default_battle_policy, vectorized
+                quick_damage = player['attack_power'] * STRATEGY_MODIFIERS['quick_attack']['damage'] - npc_defense[target]
+                codes = np.where(target_hp <= quick_damage, strategy_ids.index('quick_attack'),
+                                 np.where(player_hp >= 0.6 * player['max_hp'], strategy_ids.index('power_attack'), strategy_ids.index('standard_attack')))
+            else:
+                codes = np.full(n_fights, fixed_code)
+            hit_mult, damage_mult, incoming, evasion_bonus, flee = modifier_table[codes].T
+            # An escape roll replaces the attack, and a fled fight ends before the enemies act.
+            fled = active & (flee > 0) & (rng.random(n_fights) < np.clip(flee + player['evasion_chance'], 0.0, MAX_HIT_CHANCE))
+
+            hit_chance = np.clip(player['hit_chance'] * hit_mult - npc_evasion[target], MIN_HIT_CHANCE, MAX_HIT_CHANCE)
+            hit = rng.random(n_fights) < hit_chance
+            spread = 1.0 - DAMAGE_VARIANCE + 2 * DAMAGE_VARIANCE * rng.random(n_fights)
+            damage = np.maximum(1.0, np.rint(player['attack_power'] * damage_mult * spread - npc_defense[target]))
+            damage = np.where(active & hit & (damage_mult > 0), np.minimum(damage, target_hp), 0.0)
+            npc_hp[rows, target] -= damage
+            alive = npc_hp > 0
+
+            # Every surviving NPC of every fight attacks at once.
+            npc_hit_chance = np.clip(npc_hit[None, :] - (player['evasion_chance'] + evasion_bonus)[:, None], MIN_HIT_CHANCE, MAX_HIT_CHANCE)
+            npc_hits = rng.random(npc_hp.shape) < npc_hit_chance
+            npc_spread = 1.0 - DAMAGE_VARIANCE + 2 * DAMAGE_VARIANCE * rng.random(npc_hp.shape)
+            npc_damage = np.maximum(1.0, np.rint(npc_attack[None, :] * incoming[:, None] * npc_spread - player['defense_power']))
+            taken = np.where(npc_hits & alive & (active & ~fled)[:, None], npc_damage, 0.0).sum(axis=1)
+            player_hp = np.maximum(0.0, player_hp - taken)
+
+            lost = active & ~fled & (player_hp <= 0)
+            won = active & ~fled & ~lost & ~alive.any(axis=1)
+            outcomes[lost], outcomes[won] = -1, 1
+            turns[lost | won | fled] = turn_number
+            active &= ~(lost | won | fled)
+        return outcomes, turns, player['current_hp'] - player_hp
+
+    def _summarize(self, outcomes, turns, hp_loss, max_hp: int, backend: str, elapsed_s: float) -> dict:
+        n_fights = len(outcomes)
+        if backend == 'numpy':
+            wins, losses = int((outcomes == 1).sum()), int((outcomes == -1).sum())
+            won_turns = turns[outcomes == 1]
+            expected_turns = float(turns.mean())
+            expected_turns_to_win = float(won_turns.mean()) if len(won_turns) else None
+            sorted_loss = np.sort(hp_loss)
+            loss_mean = float(hp_loss.mean())
+            buckets = np.minimum((hp_loss / max_hp * HP_LOSS_BINS).astype(int), HP_LOSS_BINS - 1)
+            histogram = np.bincount(buckets, minlength=HP_LOSS_BINS).tolist()
+        else:
+            wins, losses = outcomes.count(1), outcomes.count(-1)
+            won_turns = [t for t, o in zip(turns, outcomes) if o == 1]
+            expected_turns = sum(turns) / n_fights
+            expected_turns_to_win = sum(won_turns) / len(won_turns) if won_turns else None
+            sorted_loss = sorted(hp_loss)
+            loss_mean = sum(hp_loss) / n_fights
+            histogram = [0] * HP_LOSS_BINS
+            for loss in hp_loss:
+                histogram[min(int(loss / max_hp * HP_LOSS_BINS), HP_LOSS_BINS - 1)] += 1
+        win_probability = wins / n_fights
+        return {
+            'fights': n_fights, 'backend': backend, 'elapsed_s': elapsed_s,
+            'win_probability': win_probability, 'loss_probability': losses / n_fights,
+            'timeout_probability': (n_fights - wins - losses) / n_fights,
+            'expected_turns': expected_turns, 'expected_turns_to_win': expected_turns_to_win,
+            'hp_loss': {'mean': loss_mean, 'p10': float(_percentile(sorted_loss, 0.1)), 'p50': float(_percentile(sorted_loss, 0.5)),
+                        'p90': float(_percentile(sorted_loss, 0.9)), 'max': float(sorted_loss[-1])},
+            'hp_loss_histogram': histogram,
+            'threat': threat_label(win_probability),
+        }
+
+    def threat_estimate(self, player_attrs: dict, npc_attrs_list: list) -> dict:
+        # Quick pre-fight estimate under the auto-battle policy, sized for interactive use.
+        return self.simulate(player_attrs, npc_attrs_list, strategy=None, n_fights=self.n_threat_fights)
+
+    def assess_world(self, data_store: dict, min_win_probability: float = 0.25) -> dict:
+        # World-generation validation: every NPC fought one-on-one by the starting player.
+        # {'per_npc': {npc_id: summary}, 'unwinnable': [npc_ids below min_win_probability]}
+        player_attrs = data_store.get('player_state', {}).get('attributes', {})
+        per_npc, unwinnable = {}, []
+        for npc_id, npc in data_store.get('npcs', {}).items():
+            result = self.simulate(player_attrs, [npc.get('attributes', {})], n_fights=self.n_threat_fights)
+            per_npc[npc_id] = {k: result[k] for k in ('win_probability', 'expected_turns', 'threat')}
+            per_npc[npc_id]['mean_hp_loss'] = result['hp_loss']['mean']
+            if result['win_probability'] < min_win_probability:
+                unwinnable.append(npc_id)
+        return {'per_npc': per_npc, 'unwinnable': unwinnable}
@@ -0,0 +1,78 @@
+import copy
+import json
+from engine.gwhr import GWHR
+from engine.npc_memory import NPCMemory
+
+
+class DialogueSession:
+    # One conversation with one NPC. The character profile and the game context around the conversation
+    # do not change while it runs (time only advances between player actions), so both are read and
+    # serialized once; each exchange only re-serializes the NPC's own state. Writes go back to GWHR with
+    # GWHR.update_npc, so per-turn cost no longer grows with the number of NPCs or the size of the world.
+    def __init__(self, npc_id: str, npc_data: dict, gwhr: GWHR, memory: NPCMemory | None = None):
+        self.npc_id = npc_id
+        self.gwhr = gwhr
+        self.memory = memory # Optional rolling memory; without it the prompt shows the last two exchanges
+        self.npc_data = copy.deepcopy(npc_data) # Working copy, kept in sync with what is written to GWHR
+        self.npc_name = self.npc_data.get('name', npc_id)
+        self.exchanges: list = [] # Exchanges added during this session
+        self._session_segment = self._build_session_segment()
+        self._context_json = self._build_context_json()
+
+    def _build_session_segment(self) -> str:
+        npc_profile_context = {
+            "id": self.npc_data.get('id'), "name": self.npc_name,
+            "description": self.npc_data.get('description', '')[:100] + "...",
+            "role": self.npc_data.get('role'),
+            "knowledge_preview": [k.get('topic_id', k) for k in self.npc_data.get('knowledge', [])[:3]]
+        }
+        return (f"You are roleplaying as {self.npc_name} (ID: {self.npc_id}).\n"
+                f"Your Character Profile (NPC): {json.dumps(npc_profile_context, indent=2)}")
+
+    def _build_context_json(self) -> str:
+        # Targeted reads instead of GWHR.get_current_context(), which deep-copies the whole store.
+        data_store = self.gwhr.data_store
+        player_state = data_store.get('player_state', {})
+        scene_data = data_store.get('current_scene_data', {})
+        prompt_context_for_llm = {
+            "player_state_summary": {
+                "attributes": player_state.get('attributes'),
+                "current_location_id": player_state.get('current_location_id')
+            },
+            "current_scene_summary": {
+                "scene_id": scene_data.get('scene_id'),
+                "narrative_snippet": scene_data.get('narrative', '')[:100] + "..."
+            },
+            "game_time": data_store.get('current_game_time')
+        }
+        return json.dumps(prompt_context_for_llm, indent=2)
+
+    def prompt_segments(self, player_input: str) -> tuple:
+        # (session_segments, turn_segments) for PromptAssembler; only the NPC state is built per turn.
+        npc_specific_context = {
+            "attributes": self.npc_data.get('attributes'),
+            "status": self.npc_data.get('status'),
+        }
+        if self.memory:
+            npc_specific_context["memory_of_player"] = self.memory.memory_context(self.npc_id, self.npc_name, self.npc_data.get('dialogue_log', []))
+        else:
+            npc_specific_context["dialogue_log_with_player_preview"] = self.npc_data.get('dialogue_log', [])[-2:]
+        turn_segment = (f"Your Current State (NPC): {json.dumps(npc_specific_context, indent=2)}\n"
+                        f"Overall Game Context: {self._context_json}\n"
+                        f"Player says/does to you: '{player_input}'")
+        return [self._session_segment], [turn_segment]
+
+    def record_exchange(self, player_input: str, npc_text: str, new_status, attitude_change: int | None, game_time) -> dict:
+        # Applies one exchange to the working copy and writes only the changed NPC fields to GWHR.
+        dialogue_log_entry = {'player': player_input, 'npc': npc_text, 'time': game_time}
+        fields = {'status': new_status, 'last_interaction_time': game_time}
+        attributes = None
+        self.npc_data.update(fields)
+        self.npc_data.setdefault('dialogue_log', []).append(dialogue_log_entry)
+        if attitude_change is not None:
+            npc_attributes = self.npc_data.setdefault('attributes', {})
+            npc_attributes['disposition_towards_player'] = npc_attributes.get('disposition_towards_player', 0) + attitude_change
+            attributes = {'disposition_towards_player': npc_attributes['disposition_towards_player']}
+        self.exchanges.append(dialogue_log_entry)
+        self.gwhr.update_npc(self.npc_id, fields=fields, attributes=attributes, dialogue_entry=dialogue_log_entry)
+        return dialogue_log_entry
@@ -1,34 +1,141 @@
 from api.api_key_manager import ApiKeyManager
 from ui.ui_manager import UIManager
 import json # For LLM response parsing
-import time # For game loop delay
+import time # For loop overhead measurement
+import threading
 # from api.api_key_manager import ApiKeyManager # Redundant
 # from ui.ui_manager import UIManager # Redundant
 from engine.model_selector import ModelSelector
 from engine.adventure_setup import AdventureSetup
 from engine.gwhr import GWHR 
 from api.llm_interface import LLMInterface 
+from api.prompt_assembler import PromptAssembler
+from api.token_meter import truncate_to_token_budget
+from game_logic.action_prefetcher import ActionPrefetcher
+from game_logic import game_events
+from game_logic.game_events import GameEventQueue
+from engine.image_pipeline import ImagePipeline
+from engine.image_cache import image_prompt_key, build_scene_image_prompt
+from engine.image_similarity import MinHashIndex
+from api.response_validation import ResponseValidator
+from engine.world_pipeline import WorldGenerationPipeline
+from game_logic.combat_simulator import CombatSimulator
+from game_logic.dialogue_session import DialogueSession
+from engine.npc_memory import NPCMemory
+from engine.puzzle_cache import PuzzleTransitionCache
+from game_logic.action_memo import ActionOutcomeMemo
+from engine.world_scheduler import WorldEventScheduler
+from engine.npc_simulation import NPCSimulation
+from engine.player_state import PlayerStateIndex
+from game_logic.combat_resolver import CombatResolver, AUTO_BATTLE_STRATEGY, format_turn_log, combat_stats, PLAYER_COMBAT_DEFAULTS, NPC_COMBAT_DEFAULTS
 import copy # For deepcopying NPC data for dialogue session
 
 # GameEngine will be imported here later when needed
 
 class GameController:
+    WEATHER_INTERVAL = 10 # Game time units between weather changes
     def __init__(self, api_key_manager: ApiKeyManager, ui_manager: UIManager, 
                  model_selector: ModelSelector, adventure_setup: AdventureSetup, 
-                 gwhr: GWHR, llm_interface: LLMInterface): 
+                 gwhr: GWHR, llm_interface: LLMInterface,
+                 prompt_assembler: PromptAssembler | None = None,
+                 action_prefetcher: ActionPrefetcher | None = None,
+                 image_pipeline: ImagePipeline | None = None,
+                 image_similarity_index: MinHashIndex | None = None,
+                 response_validator: ResponseValidator | None = None,
+                 world_pipeline: WorldGenerationPipeline | None = None,
+                 combat_resolver: CombatResolver | None = None,
+                 combat_simulator: CombatSimulator | None = None,
+                 npc_memory: NPCMemory | None = None,
+                 puzzle_cache: PuzzleTransitionCache | None = None,
+                 action_memo: ActionOutcomeMemo | None = None,
+                 world_scheduler: WorldEventScheduler | None = None,
+                 npc_simulation: NPCSimulation | None = None,
+                 player_state_index: PlayerStateIndex | None = None): 
         self.api_key_manager = api_key_manager
         self.ui_manager = ui_manager
         self.model_selector = model_selector
         self.adventure_setup = adventure_setup
         self.gwhr = gwhr 
         self.llm_interface = llm_interface 
+        # Share AdventureSetup's assembler by default so prefix reuse is reported for the whole session.
+        if prompt_assembler is None:
+            prompt_assembler = getattr(adventure_setup, 'prompt_assembler', None) or PromptAssembler()
+        self.prompt_assembler = prompt_assembler
+        self.context_token_budget: int = 250 # Max estimated tokens of GWHR session context per scene/action prompt
+        self.action_prefetcher = action_prefetcher # Optional speculative generation while the player reads a scene
+        self.image_pipeline = image_pipeline # Optional background image generation; None keeps images blocking
+        self._awaited_image_key: str | None = None # Image the displayed scene is still waiting for
+        self.image_similarity_index = image_similarity_index # Optional near-duplicate image prompt reuse
+        self._image_requests: dict[str, tuple] = {} # image key -> (image_prompt_elements, scene_type) in flight
+        self._image_requests_lock = threading.Lock() # Image workers pop from _image_requests
+        if self.image_pipeline:
+            self.image_pipeline.add_listener(self._on_image_ready)
+        self.response_validator = response_validator # Optional schema check + local JSON repair of LLM responses
+        self.world_pipeline = world_pipeline # Optional parallel world generation; None keeps the sequential flows
+        self.combat_resolver = combat_resolver # Optional local combat mechanics; the LLM then only narrates
+        self.combat_simulator = combat_simulator # Optional Monte Carlo threat estimates and world balance checks
+        self.npc_memory = npc_memory # Optional rolling per-NPC memory for dialogue prompts
+        self.puzzle_cache = puzzle_cache # Optional replay of known puzzle transitions and authored puzzles
+        self.action_memo = action_memo # Optional replay of generic action outcomes while the relevant state is unchanged
+        if self.action_memo:
+            self.action_memo.attach(self.gwhr)
+        # Time-driven world events (weather, NPC schedules, dynamic events); always present so weather keeps changing
+        self.world_scheduler = world_scheduler if world_scheduler is not None else WorldEventScheduler()
+        self.world_scheduler.every(self.WEATHER_INTERVAL, self._scheduled_weather_update, event_id='weather', coalesce=True)
+        self.gwhr.add_mutation_listener(self._on_world_mutation)
+        self.npc_simulation = npc_simulation # Optional per-time-unit NPC autonomy (mood, disposition, HP, movement)
+        if self.npc_simulation:
+            self.npc_simulation.attach(self.gwhr)
+            self.world_scheduler.every(1, self._scheduled_npc_autonomy, event_id='npc_autonomy', coalesce=True)
+        # Id-indexed inventory and name-indexed skills for applying player_updates; always present
+        self.player_state_index = player_state_index if player_state_index is not None else PlayerStateIndex()
+        self.player_state_index.attach(self.gwhr)
+        self._pregenerated_scene: tuple | None = None # (scene_id, scene JSON) generated during world setup
+        self.scene_version = 0 # Bumped by every scene render, so the game loop knows what is on screen
+        # Everything the game loop reacts to: input, finished images, timers
+        self.events = GameEventQueue(read_line=getattr(ui_manager, 'read_line', None),
+                                     threaded_input=getattr(ui_manager, 'interactive', True))
+        self.loop_stats = {'events': 0, 'actions': 0, 'overhead_s': 0.0} # Loop time outside action handlers
         self.current_game_state: str = "INIT" 
         self.active_combat_data: dict = {} 
         # self.game_engine will be initialized later
 
+    def _assemble_prompt(self, response_type: str, session_segments: list = None, turn_segments: list = None,
+                         gwhr: GWHR = None, record_stats: bool = True):
+        # Static tier: engine guidelines + world summary + schema; then session state; then the turn.
+        # Both are passed per call: pipeline workers assemble against a provisional GWHR on the shared assembler.
+        gwhr = gwhr or self.gwhr
+        static_overrides = {'engine_guidelines': self.adventure_setup.get_engine_guidelines(),
+                            'world_summary': gwhr.get_world_summary()}
+        return self.prompt_assembler.assemble(response_type, session_segments, turn_segments, record_stats=record_stats,
+                                              static_overrides=static_overrides)
+
+    def _session_context_segment(self, gwhr: GWHR = None) -> str:
+        # Sorted keys keep the serialization byte-stable while the underlying state is unchanged.
+        gwhr = gwhr or self.gwhr
+        context_json_str = json.dumps(gwhr.get_current_context(granularity="session"), indent=2, sort_keys=True)
+        truncated_context_str = truncate_to_token_budget(context_json_str, self.context_token_budget)
+        return f"Current Game Context (JSON):\n{truncated_context_str}"
+
+    def _parse_llm_json(self, json_str: str, response_type: str, model_id: str | None = None) -> dict:
+        # Without a validator this is plain json.loads. With one, repairable responses come back fixed and
+        # unrepairable ones raise JSONDecodeError so every call site keeps its existing fallback.
+        if not self.response_validator:
+            return json.loads(json_str)
+        data = self.response_validator.parse(json_str, response_type, model_id)
+        if data is None:
+            raise json.JSONDecodeError(f"{response_type} response failed validation", str(json_str), 0)
+        return data
+
+    def get_prefix_reuse_report(self) -> dict:
+        return self.prompt_assembler.get_prefix_reuse_report()
+
+    def get_token_usage_report(self, group_by: str = 'response_type') -> dict:
+        return self.llm_interface.token_meter.get_usage_report(group_by)
+
     def request_and_validate_api_key(self) -> bool:
         self.ui_manager.show_api_key_screen()
-        key_input = input() 
+        key_input = self.ui_manager.read_line("", kind='api_key')
         self.api_key_manager.store_api_key(key_input)
         is_valid = self.api_key_manager.validate_api_key()
         if is_valid:
@@ -86,19 +193,73 @@ class GameController:
             self.ui_manager.display_message("GameController: Failed to generate or parse World Conception Document. GWHR not initialized.", "error")
             return False
 
+    def generate_world_flow(self) -> bool:
+        world_initialized = self._generate_world()
+        if world_initialized and self.combat_simulator:
+            self.check_combat_balance()
+        return world_initialized
+
+    def check_combat_balance(self, min_win_probability: float = 0.25) -> dict:
+        # Flags generated NPCs the starting player could practically never beat one-on-one.
+        assessment = self.combat_simulator.assess_world(self.gwhr.get_data_store(), min_win_probability=min_win_probability)
+        for npc_id in assessment['unwinnable']:
+            win_probability = assessment['per_npc'][npc_id]['win_probability']
+            print(f"GameController: Balance warning - NPC '{npc_id}' is beaten only {win_probability:.0%} of the time by the starting player.")
+        return assessment
+
+    def _generate_world(self) -> bool:
+        # Blueprint, World Conception Document and the first scene in one pipelined pass when available.
+        template = self.adventure_setup.matched_template
+        if template:
+            # Instant start: world and opening scene were generated offline (see world_template_builder).
+            self.gwhr.initialize(self.adventure_setup.get_world_conception_document())
+            if template.get('opening_scene_json'):
+                self._pregenerated_scene = (template.get('opening_scene_id', 'scene_01_start'), template['opening_scene_json'])
+            self.ui_manager.display_message(f"GameController: World initialized from template '{template.get('template_id')}'.", "info")
+            return True
+        if not self.world_pipeline:
+            return self.generate_blueprint_flow() and self.initialize_world_from_blueprint_flow()
+        self.ui_manager.display_message("GameController: Starting pipelined world generation...", "info")
+        world_data_dict = self.world_pipeline.run(on_scene_context_ready=self.pregenerate_opening_scene)
+        if not world_data_dict:
+            self.ui_manager.display_message("GameController: Pipelined world generation failed. GWHR not initialized.", "error")
+            return False
+        self.gwhr.initialize(world_data_dict)
+        self._pregenerated_scene = self.world_pipeline.scene_context_result
+        timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.world_pipeline.get_stage_timings().items())
+        self.ui_manager.display_message(f"GameController: World generation stage timings - {timings}", "info")
+        retrieved_title = self.gwhr.get_data_store().get('world_title', 'N/A')
+        self.ui_manager.display_message(f"GameController: GWHR has been initialized. World Title from GWHR: '{retrieved_title}'.", "info")
+        return True
+
+    def pregenerate_opening_scene(self, partial_world_data: dict) -> tuple | None:
+        # (scene_id, scene JSON) for a world that is not loaded yet. The pipeline runs this while the remaining
+        # conception sections generate; the scene prompt only needs the world summary, so a provisional GWHR
+        # built from the partial document is enough.
+        provisional_gwhr = GWHR()
+        provisional_gwhr.initialize(partial_world_data)
+        scene_id = provisional_gwhr.get_data_store().get('initial_scene_id', 'scene_01_start')
+        model_id = self.model_selector.get_selected_model()
+        if not model_id:
+            return None
+        prompt = self._build_scene_prompt(scene_id, gwhr=provisional_gwhr)
+        scene_json_str = self.llm_interface.generate(prompt, model_id, expected_response_type='scene_description')
+        if scene_json_str and self.image_pipeline:
+            # Start the image now too; initiate_scene picks it up from the pipeline by the same prompt key.
+            try:
+                scene_data = self._parse_llm_json(scene_json_str, 'scene_description', model_id)
+                self.image_pipeline.request([build_scene_image_prompt(scene_data, "Scene")])
+            except json.JSONDecodeError:
+                pass # initiate_scene reports the parse error
+        return (scene_id, scene_json_str) if scene_json_str else None
+
     def unlock_knowledge_entry(self, source_type: str, source_detail: str, context_prompt_hint: str):
         self.ui_manager.display_message(f"Attempting to unlock knowledge based on: {context_prompt_hint}...", "info")
-        llm_prompt = (
+        llm_prompt = self._assemble_prompt('codex_entry_generation', turn_segments=[
             f"Context Hint: {context_prompt_hint}\n"
             f"Source Type: {source_type}\n"
-            f"Source Detail: {source_detail}\n"
-            f"Task: Generate a new Knowledge Codex entry based on this discovery. The entry should be factual and expand on the hint. "
-            f"Output JSON with fields: 'knowledge_id' (string, unique, derived from context_prompt_hint, e.g., 'ancient_runes_translation_codex'), "
-            f"'title' (string, concise title for the codex entry), "
-            f"'content' (string, detailed textual content of the codex entry, 2-3 sentences), "
-            f"'source_type' (string, echo back the provided source_type), "
-            f"'source_detail' (string, echo back the provided source_detail)."
-        )
+            f"Source Detail: {source_detail}"
+        ])
         model_id = self.model_selector.get_selected_model()
         if not model_id:
             self.ui_manager.display_message("GameController: Error - No model selected for codex generation.", "error")
@@ -106,7 +267,7 @@ class GameController:
         json_str = self.llm_interface.generate(llm_prompt, model_id, 'codex_entry_generation')
         if json_str:
             try:
-                entry_data = json.loads(json_str)
+                entry_data = self._parse_llm_json(json_str, 'codex_entry_generation', model_id)
                 kid = entry_data.get('knowledge_id')
                 if not kid:
                     self.ui_manager.display_message("GameController: Error - Codex entry from LLM missing ID.", "error")
@@ -137,12 +298,7 @@ class GameController:
         player_attrs = player_gwhr_state.get('attributes', {})
         self.active_combat_data = {
             'turn': 0,
-            'player': {
-                'id': 'player', 'name': 'Player',
-                'current_hp': player_attrs.get('current_hp', 100), 'max_hp': player_attrs.get('max_hp', 100),
-                'attack_power': player_attrs.get('attack_power', 10), 'defense_power': player_attrs.get('defense_power', 5),
-                'evasion_chance': player_attrs.get('evasion_chance', 0.1), 'hit_chance': player_attrs.get('hit_chance', 0.8)
-            },
+            'player': {'id': 'player', 'name': 'Player', **combat_stats(player_attrs, PLAYER_COMBAT_DEFAULTS)},
             'npcs': [],
             'last_turn_player_strategies': [
                 {"id": "standard_attack", "name": "Standard Attack"}, 
@@ -153,6 +309,8 @@ class GameController:
             ], 
             'combat_ended': False, 'victor': None, 'final_summary_narrative': ''
         }
+        if self.combat_resolver:
+            self.active_combat_data['last_turn_player_strategies'].append(dict(AUTO_BATTLE_STRATEGY))
         all_gwhr_npcs = self.gwhr.get_data_store().get('npcs', {})
         for npc_id in npc_ids_to_engage:
             npc_gwhr_data = all_gwhr_npcs.get(npc_id)
@@ -160,14 +318,14 @@ class GameController:
                 self.ui_manager.display_message(f"Warning: NPC {npc_id} not found for combat.", "warning"); continue
             npc_attrs = npc_gwhr_data.get('attributes', {})
             self.active_combat_data['npcs'].append({
-                'id': npc_id, 'name': npc_gwhr_data.get('name', npc_id),
-                'current_hp': npc_attrs.get('current_hp', 50), 'max_hp': npc_attrs.get('max_hp', 50),
-                'attack_power': npc_attrs.get('attack_power', 8), 'defense_power': npc_attrs.get('defense_power', 3),
-                'evasion_chance': npc_attrs.get('evasion_chance', 0.05), 'hit_chance': npc_attrs.get('hit_chance', 0.7),
+                'id': npc_id, 'name': npc_gwhr_data.get('name', npc_id), **combat_stats(npc_attrs, NPC_COMBAT_DEFAULTS),
                 'original_gwhr_data_snapshot': copy.deepcopy(npc_gwhr_data)
             })
         if not self.active_combat_data['npcs']:
             self.ui_manager.display_message("No valid opponents found to engage in combat.", "error"); self.current_game_state = "AWAITING_PLAYER_ACTION"; self.active_combat_data = {}; return
+        if self.combat_simulator:
+            self.active_combat_data['threat_estimate'] = self.combat_simulator.threat_estimate(
+                self.active_combat_data['player'], self.active_combat_data['npcs'])
         self.gwhr.log_event(f"Combat started against: {[npc['name'] for npc in self.active_combat_data['npcs']]}", event_type="combat_start")
         self.combat_loop()
 
@@ -182,46 +340,86 @@ class GameController:
                  self.ui_manager.display_message("All opponents appear to be defeated!", "info")
                  self.active_combat_data['combat_ended'] = True; self.active_combat_data['victor'] = 'player'
                  self.active_combat_data.setdefault('final_summary_narrative', "With no more foes standing, the battle ends.")
-            self.ui_manager.show_combat_interface(player_combat_data['current_hp'], player_combat_data['max_hp'], npc_combatants_info_for_ui)
+            threat_estimate = self.active_combat_data.get('threat_estimate') if self.active_combat_data['turn'] == 1 else None
+            self.ui_manager.show_combat_interface(player_combat_data['current_hp'], player_combat_data['max_hp'], npc_combatants_info_for_ui, threat_estimate=threat_estimate)
             if self.active_combat_data.get('combat_ended'):
                 self.ui_manager.show_combat_results(self.active_combat_data.get('final_summary_narrative', "The dust settles."), self.active_combat_data.get('victor'))
-                final_player_hp = self.active_combat_data['player']['current_hp']
-                player_state_gwhr = copy.deepcopy(self.gwhr.get_data_store().get('player_state', {}))
-                player_state_gwhr.setdefault('attributes', {})['current_hp'] = final_player_hp
-                self.gwhr.update_state({'player_state': player_state_gwhr})
-                npcs_gwhr_full_update = copy.deepcopy(self.gwhr.get_data_store().get('npcs', {}))
-                for npc_combat_data in self.active_combat_data['npcs']:
-                    npc_id_to_update = npc_combat_data['id']
-                    if npc_id_to_update in npcs_gwhr_full_update:
-                        restored_npc_data = copy.deepcopy(npc_combat_data['original_gwhr_data_snapshot'])
-                        restored_npc_data.setdefault('attributes', {})['current_hp'] = npc_combat_data['current_hp']
-                        if npc_combat_data['current_hp'] <= 0: restored_npc_data['status'] = 'defeated'
-                        npcs_gwhr_full_update[npc_id_to_update] = restored_npc_data
-                    else: 
-                         npcs_gwhr_full_update[npc_id_to_update] = npc_combat_data['original_gwhr_data_snapshot']
-                         npcs_gwhr_full_update[npc_id_to_update].setdefault('attributes',{})['current_hp'] = npc_combat_data['current_hp']
-                         if npc_combat_data['current_hp'] <= 0: npcs_gwhr_full_update[npc_id_to_update]['status'] = 'defeated'
-                if npcs_gwhr_full_update: self.gwhr.update_state({'npcs': npcs_gwhr_full_update})
+                self._write_back_combat_state()
                 self.gwhr.log_event(f"Combat ended. Victor: {self.active_combat_data.get('victor', 'Unknown')}. Summary: {self.active_combat_data.get('final_summary_narrative', '')}", event_type="combat_end", payload={'summary': self.active_combat_data.get('final_summary_narrative')})
                 self.current_game_state = "AWAITING_PLAYER_ACTION"; self.active_combat_data = {}
                 current_scene_data_after_combat = self.gwhr.get_data_store().get('current_scene_data', {})
-                self.ui_manager.display_scene(current_scene_data_after_combat); break
+                self._show_scene(current_scene_data_after_combat); break
             available_strategies = self.active_combat_data.get('last_turn_player_strategies', [{"id": "standard_attack", "name": "Standard Attack"}])
             player_chosen_strategy_id = self.ui_manager.present_combat_strategies(available_strategies)
             if not player_chosen_strategy_id: player_chosen_strategy_id = "defend"
-            self.process_combat_turn(player_chosen_strategy_id)
-            time.sleep(0.1)
+            self.llm_interface.begin_turn()
+            if self.combat_resolver and player_chosen_strategy_id == AUTO_BATTLE_STRATEGY['id']:
+                self.run_auto_battle()
+            else:
+                self.process_combat_turn(player_chosen_strategy_id)
+
+    def _write_back_combat_state(self):
+        # Player HP plus every combatant's HP and status go to GWHR in a single update.
+        player_state_gwhr = copy.deepcopy(self.gwhr.get_data_store().get('player_state', {}))
+        player_state_gwhr.setdefault('attributes', {})['current_hp'] = self.active_combat_data['player']['current_hp']
+        updates = {'player_state': player_state_gwhr}
+        npcs_gwhr_full_update = copy.deepcopy(self.gwhr.get_data_store().get('npcs', {}))
+        for npc_combat_data in self.active_combat_data['npcs']:
+            npc_id_to_update = npc_combat_data['id']
+            if npc_id_to_update in npcs_gwhr_full_update:
+                restored_npc_data = copy.deepcopy(npc_combat_data['original_gwhr_data_snapshot'])
+            else:
+                restored_npc_data = npc_combat_data['original_gwhr_data_snapshot']
+            restored_npc_data.setdefault('attributes', {})['current_hp'] = npc_combat_data['current_hp']
+            if npc_combat_data['current_hp'] <= 0: restored_npc_data['status'] = 'defeated'
+            npcs_gwhr_full_update[npc_id_to_update] = restored_npc_data
+        if npcs_gwhr_full_update: updates['npcs'] = npcs_gwhr_full_update
+        self.gwhr.update_state(updates)
+
+    def run_auto_battle(self):
+        # Plays turns locally with the resolver's policy until the fight ends or the player's HP reaches a
+        # decision point, then narrates the whole stretch with one LLM call and writes HP back in one batch.
+        self.ui_manager.display_message("Auto-battle: resolving the fight...", "info")
+        result = self.combat_resolver.auto_battle(self.active_combat_data)
+        turns, final_state = result['turns'], result['final_state']
+        if not turns:
+            return
+        narrative, feedback = self._narrate_combat_turns(turns)
+        self.active_combat_data['player']['current_hp'] = final_state['player']['current_hp']
+        final_npc_hp = {npc['id']: npc['current_hp'] for npc in final_state['npcs']}
+        for npc_combatant in self.active_combat_data['npcs']:
+            npc_combatant['current_hp'] = final_npc_hp.get(npc_combatant['id'], npc_combatant['current_hp'])
+        self.active_combat_data.update({
+            'turn': final_state['turn'],
+            'last_turn_player_strategies': turns[-1]['available_player_strategies'] or self.active_combat_data.get('last_turn_player_strategies'),
+            'combat_ended': final_state['combat_ended'], 'victor': final_state['victor'],
+            'final_summary_narrative': narrative
+        })
+        self._write_back_combat_state()
+        names = {'player': self.active_combat_data['player']['name'], **{npc['id']: npc['name'] for npc in self.active_combat_data['npcs']}}
+        self.gwhr.log_event(f"Auto-battle turns {turns[0]['turn']}-{turns[-1]['turn']} ({result['stop_reason']}): {narrative}", event_type="combat_auto_battle",
+                            payload={'turn_log': [format_turn_log(t, names) for t in turns], 'stop_reason': result['stop_reason'], 'narrative': narrative})
+        self.ui_manager.display_combat_narrative(narrative)
+        if feedback: self.ui_manager.display_message(f"Feedback: {feedback}", "info")
+        if result['stop_reason'] == 'decision_point':
+            self.ui_manager.display_message("Auto-battle paused: your health is running low. Choose your next move.", "warning")
 
     def process_combat_turn(self, player_strategy_id: str):
         self.ui_manager.display_message(f"Processing your strategy: {player_strategy_id}...", "info")
+        if self.combat_resolver:
+            outcome_data = self.combat_resolver.resolve_turn(self.active_combat_data, player_strategy_id)
+            outcome_data['turn'] = self.active_combat_data['turn']
+            narrative, feedback = self._narrate_combat_turns([outcome_data])
+            outcome_data.update({'turn_summary_narrative': narrative, 'player_strategy_feedback': feedback})
+            self._apply_combat_outcome(outcome_data); return
         active_npcs_for_prompt = [npc for npc in self.active_combat_data.get('npcs', []) if npc.get('current_hp', 0) > 0]
         prompt_combatants_state = [{'id': 'player', 'hp': self.active_combat_data['player']['current_hp'], **{k:v for k,v in self.active_combat_data['player'].items() if k in ['attack_power','defense_power','evasion_chance','hit_chance']}}]
         for npc_data in active_npcs_for_prompt:
             prompt_combatants_state.append({'id': npc_data['id'], 'name': npc_data['name'], 'hp': npc_data['current_hp'], **{k:v for k,v in npc_data.items() if k in ['attack_power','defense_power','evasion_chance','hit_chance']}})
-        llm_prompt = (
+        llm_prompt = self._assemble_prompt('combat_turn_outcome', turn_segments=[
             f"Combat Turn: {self.active_combat_data['turn']}\nPlayer chose strategy: '{player_strategy_id}'.\n"
-            f"Current Combatants State (active ones): {json.dumps(prompt_combatants_state)}\n\n"
-            f"Task: Based on player's chosen strategy and current combatant states, determine the detailed outcome of this combat turn. Narrate the action and its results. Calculate HP changes for all affected combatants. Decide if the combat has ended (e.g., player defeated, or all NPCs defeated). Provide feedback on the player's strategy if appropriate. Suggest 3-4 available strategies for the player's next turn if combat continues. Output a single valid JSON object with fields: 'turn_summary_narrative' (string), 'player_hp_change' (int), 'npc_hp_changes' (list of {{'npc_id': string, 'hp_change': int}}), 'combat_ended' (boolean), 'victor' (string: 'player', 'npc', 'draw', or null), 'player_strategy_feedback' (optional string), and 'available_player_strategies' (list of {{'id': string, 'name': string}} objects for next turn if combat is not ended).")
+            f"Current Combatants State (active ones): {json.dumps(prompt_combatants_state)}"
+        ])
         model_id = self.model_selector.get_selected_model()
         if not model_id:
             self.ui_manager.display_message("GameController: CRITICAL - No model selected for LLM call in combat!", "error")
@@ -232,10 +430,45 @@ class GameController:
             self.ui_manager.display_message("GameController: LLM failed to provide combat outcome. Assuming a glancing blow...", "error")
             outcome_data = {"turn_summary_narrative": "The combatants eye each other warily; a tense moment passes.", "player_hp_change": 0, "npc_hp_changes": [], "combat_ended": False, "available_player_strategies": self.active_combat_data.get('last_turn_player_strategies')}
         else:
-            try: outcome_data = json.loads(outcome_json_str)
+            try: outcome_data = self._parse_llm_json(outcome_json_str, 'combat_turn_outcome', model_id)
             except json.JSONDecodeError as e:
                 self.ui_manager.display_message(f"GameController: Error parsing combat outcome JSON: {e}. Assuming glancing blows.", "error")
                 outcome_data = {"turn_summary_narrative": f"Confusion (LLM Error: {e}). No clear result.", "player_hp_change": 0, "npc_hp_changes": [], "combat_ended": False, "available_player_strategies": self.active_combat_data.get('last_turn_player_strategies')}
+        self._apply_combat_outcome(outcome_data)
+
+    def _narrate_combat_turns(self, outcomes: list) -> tuple:
+        # One narration call for one or many locally resolved turns; (narrative, feedback).
+        # Falls back to the resolver's plain description if the LLM is unavailable or returns junk.
+        names = {'player': self.active_combat_data['player']['name'], **{npc['id']: npc['name'] for npc in self.active_combat_data.get('npcs', [])}}
+        if len(outcomes) == 1:
+            instruction = ""
+            local_narrative = self.combat_resolver.describe_turn(outcomes[0], names)
+            resolved_lines = [f"Turn {outcomes[0].get('turn', '?')} ({outcomes[0]['strategy_id']}): {local_narrative}"]
+        else:
+            # A whole auto-battle: compact per-turn log, summarized as one narrative.
+            instruction = f"Summarize these {len(outcomes)} turns as one continuous fight.\n"
+            resolved_lines = [format_turn_log(o, names) for o in outcomes]
+            damage_dealt = -sum(change['hp_change'] for o in outcomes for change in o['npc_hp_changes'])
+            damage_taken = -sum(o['player_hp_change'] for o in outcomes)
+            local_narrative = f"{len(outcomes)} turns of fighting: you deal {damage_dealt} damage and take {damage_taken}. {self.combat_resolver.describe_turn(outcomes[-1], names)}"
+        model_id = self.model_selector.get_selected_model()
+        if not model_id:
+            return local_narrative, None
+        # Per-blow JSON only for single turns; for a batch the compact log already carries every blow.
+        attacks_segment = f"\nResolved Attacks (JSON): {json.dumps(outcomes[0]['attacks'])}" if len(outcomes) == 1 else ""
+        llm_prompt = self._assemble_prompt('combat_turn_narration', turn_segments=[
+            f"Player Strategy: {outcomes[-1]['strategy_id']}\n{instruction}Resolved Mechanics:\n" + "\n".join(resolved_lines) +
+            f"\n{attacks_segment}\nCombat Ended: {outcomes[-1]['combat_ended']} (victor: {outcomes[-1]['victor']})"
+        ])
+        narration_json_str = self.llm_interface.generate(llm_prompt, model_id, expected_response_type='combat_turn_narration')
+        if not narration_json_str:
+            return local_narrative, None
+        try: narration = self._parse_llm_json(narration_json_str, 'combat_turn_narration', model_id)
+        except json.JSONDecodeError:
+            return local_narrative, None
+        return narration.get('turn_summary_narrative') or local_narrative, narration.get('player_strategy_feedback')
+
+    def _apply_combat_outcome(self, outcome_data: dict):
         player_c_data = self.active_combat_data['player']
         player_c_data['current_hp'] = max(0, player_c_data['current_hp'] + outcome_data.get('player_hp_change', 0))
         for npc_hp_update in outcome_data.get('npc_hp_changes', []):
@@ -266,39 +499,20 @@ class GameController:
     
         all_puzzle_states = self.gwhr.get_data_store().get('environmental_puzzle_log', {})
         current_puzzle_specific_state = copy.deepcopy(all_puzzle_states.get(puzzle_id, {})) 
-    
-        current_scene_data = self.gwhr.get_data_store().get('current_scene_data', {})
-        scene_context_for_prompt = {
-            "scene_id": current_scene_data.get('scene_id'),
-            "narrative_snippet": current_scene_data.get('narrative', '')[:150],
-            "relevant_elements_in_scene_names": [el.get('name') for el in current_scene_data.get('interactive_elements', []) if el.get('puzzle_id') == puzzle_id]
-        }
-        llm_prompt = (
-            f"Context: Player is interacting with an environmental puzzle.\n"
-            f"Puzzle ID: {puzzle_id}\n"
-            f"Element Acted Upon ID: {element_id_acted_on}\n" 
-            f"Item Used ID: {item_id_used if item_id_used else 'None'}\n"
-            f"Current Known State of this Puzzle (elements_state, clues_found, status): {json.dumps(current_puzzle_specific_state)}\n"
-            f"Relevant Scene Context: {json.dumps(scene_context_for_prompt)}\n\n"
-            f"Task: Evaluate this puzzle interaction. Output a single valid JSON object with fields: "
-            f"'puzzle_id' (string, echo back the puzzle_id), 'action_feedback_narrative' (string, immediate result of action), "
-            f"'puzzle_state_changed' (boolean), 'updated_puzzle_elements_state' (optional dictionary of specific element state changes, e.g., {{'element_X': 'new_value'}}), "
-            f"'new_clues_revealed' (optional list of strings or clue_ids representing new information gained), 'puzzle_solved' (boolean), "
-            f"and 'solution_narrative' (optional string if solved)."
-        )
-        model_id = self.model_selector.get_selected_model()
-        if not model_id: 
-            self.ui_manager.display_message("GameController: CRITICAL: No model selected for puzzle evaluation!", "error"); self.current_game_state = "AWAITING_PLAYER_ACTION"; return
-        eval_json_str = self.llm_interface.generate(llm_prompt, model_id, 'environmental_puzzle_solution_eval')
-        eval_data = {}
-        if not eval_json_str:
-            self.ui_manager.display_message("The puzzle doesn't seem to react (LLM error).", "error")
-            eval_data = {"action_feedback_narrative": "You interact, but nothing definitive happens this time."}
+        elements_state_before = copy.deepcopy(current_puzzle_specific_state.get('elements_state') or {})
+        world_key = self.gwhr.get_world_summary() or ''
+
+        eval_data, source = None, None
+        if self.puzzle_cache:
+            eval_data, source = self.puzzle_cache.lookup(world_key, puzzle_id, elements_state_before, element_id_acted_on, item_id_used)
+        if eval_data is not None:
+            print(f"GameController: Puzzle '{puzzle_id}' action resolved locally ({source}).")
         else:
-            try: eval_data = json.loads(eval_json_str)
-            except json.JSONDecodeError as e:
-                self.ui_manager.display_message(f"The puzzle's reaction is confusing (JSON Error: {e}).", "error")
-                eval_data = {"action_feedback_narrative": "A strange energy crackles, but the effect is unclear."}
+            eval_data, evaluated = self._evaluate_puzzle_with_llm(puzzle_id, element_id_acted_on, item_id_used, current_puzzle_specific_state)
+            if eval_data is None:
+                self.current_game_state = "AWAITING_PLAYER_ACTION"; return
+            if evaluated and self.puzzle_cache:
+                self.puzzle_cache.record(world_key, puzzle_id, elements_state_before, element_id_acted_on, item_id_used, eval_data)
         feedback_narrative = eval_data.get('action_feedback_narrative', "You interact with the puzzle element.")
         self.ui_manager.display_narrative(feedback_narrative) 
         puzzle_state_changed_by_action = eval_data.get('puzzle_state_changed', False)
@@ -337,15 +551,63 @@ class GameController:
         
         self.advance_time(1) 
         self.current_game_state = "AWAITING_PLAYER_ACTION"
-        self.ui_manager.display_scene(self.gwhr.get_data_store().get('current_scene_data', {}))
+        self._show_scene(self.gwhr.get_data_store().get('current_scene_data', {}))
 
-    def handle_npc_dialogue(self, npc_id: str, initial_player_input: str = None):
+    def _evaluate_puzzle_with_llm(self, puzzle_id: str, element_id_acted_on: str, item_id_used: str | None,
+                                  current_puzzle_specific_state: dict) -> tuple:
+        # (eval_data, evaluated): evaluated is False when eval_data is a local fallback after an LLM failure.
+        current_scene_data = self.gwhr.get_data_store().get('current_scene_data', {})
+        scene_context_for_prompt = {
+            "scene_id": current_scene_data.get('scene_id'),
+            "narrative_snippet": current_scene_data.get('narrative', '')[:150],
+            "relevant_elements_in_scene_names": [el.get('name') for el in current_scene_data.get('interactive_elements', []) if el.get('puzzle_id') == puzzle_id]
+        }
+        llm_prompt = self._assemble_prompt(
+            'environmental_puzzle_solution_eval',
+            session_segments=[
+                f"Context: Player is interacting with an environmental puzzle.\n"
+                f"Relevant Scene Context: {json.dumps(scene_context_for_prompt, sort_keys=True)}"
+            ],
+            turn_segments=[
+                f"Puzzle ID: {puzzle_id}\n"
+                f"Element Acted Upon ID: {element_id_acted_on}\n" 
+                f"Item Used ID: {item_id_used if item_id_used else 'None'}\n"
+                f"Current Known State of this Puzzle (elements_state, clues_found, status): {json.dumps(current_puzzle_specific_state, sort_keys=True)}"
+            ]
+        )
+        model_id = self.model_selector.get_selected_model()
+        if not model_id: 
+            self.ui_manager.display_message("GameController: CRITICAL: No model selected for puzzle evaluation!", "error"); return None, False
+        eval_json_str = self.llm_interface.generate(llm_prompt, model_id, 'environmental_puzzle_solution_eval')
+        eval_data = {}
+        if not eval_json_str:
+            self.ui_manager.display_message("The puzzle doesn't seem to react (LLM error).", "error")
+            eval_data = {"action_feedback_narrative": "You interact, but nothing definitive happens this time."}
+        else:
+            try: eval_data = self._parse_llm_json(eval_json_str, 'environmental_puzzle_solution_eval', model_id)
+            except json.JSONDecodeError as e:
+                self.ui_manager.display_message(f"The puzzle's reaction is confusing (JSON Error: {e}).", "error")
+                eval_data = {"action_feedback_narrative": "A strange energy crackles, but the effect is unclear."}
+                return eval_data, False
+            return eval_data, True
+        return eval_data, False
+
+    def _build_dialogue_prompt(self, npc_id: str, npc_data: dict, player_input: str, gwhr: GWHR = None, record_stats: bool = True,
+                               session: DialogueSession | None = None):
+        # Identity fields stay fixed for the whole conversation and go in the session tier;
+        # the live NPC state changes every exchange and goes in the turn tier.
+        gwhr = gwhr or self.gwhr
+        session = session or DialogueSession(npc_id, npc_data, gwhr, memory=self.npc_memory)
+        session_segments, turn_segments = session.prompt_segments(player_input)
+        return self._assemble_prompt('npc_dialogue_response', session_segments=session_segments, turn_segments=turn_segments,
+                                     gwhr=gwhr, record_stats=record_stats)
+
+    def handle_npc_dialogue(self, npc_id: str, initial_player_input: str = None, prefetch_key: str = None):
         # original_game_state = self.current_game_state # Not strictly needed if we always aim for AWAITING_PLAYER_ACTION
         self.current_game_state = "NPC_DIALOGUE"
         self.ui_manager.display_message(f"\nStarting dialogue with NPC ID: {npc_id}...", "info")
         
-        all_npcs_data = self.gwhr.get_data_store().get('npcs', {})
-        npc_data_snapshot = copy.deepcopy(all_npcs_data.get(npc_id)) 
+        npc_data_snapshot = self.gwhr.data_store.get('npcs', {}).get(npc_id) # DialogueSession takes its own copy
 
         if not npc_data_snapshot:
             self.ui_manager.display_message(f"Error: NPC with ID '{npc_id}' not found in GWHR.", "error")
@@ -353,46 +615,15 @@ class GameController:
             return
 
         npc_name = npc_data_snapshot.get('name', npc_id)
+        session = DialogueSession(npc_id, npc_data_snapshot, self.gwhr, memory=self.npc_memory)
+        npc_data_snapshot = session.npc_data
         player_input_for_llm = initial_player_input if initial_player_input is not None else "..." 
 
+        first_exchange = True
         while self.current_game_state == "NPC_DIALOGUE":
-            gwhr_snapshot = self.gwhr.get_current_context() 
-
-            npc_specific_context = {
-                "id": npc_data_snapshot.get('id'), "name": npc_name, 
-                "description": npc_data_snapshot.get('description', '')[:100] + "...", 
-                "role": npc_data_snapshot.get('role'), 
-                "attributes": npc_data_snapshot.get('attributes'), 
-                "status": npc_data_snapshot.get('status'), 
-                "knowledge_preview": [k.get('topic_id', k) for k in npc_data_snapshot.get('knowledge', [])[:3]], 
-                "dialogue_log_with_player_preview": npc_data_snapshot.get('dialogue_log', [])[-2:] 
-            }
-            
-            prompt_context_for_llm = {
-                "player_state_summary": {
-                    "attributes": gwhr_snapshot.get('player_state',{}).get('attributes'),
-                    "current_location_id": gwhr_snapshot.get('player_state',{}).get('current_location_id')
-                },
-                "current_scene_summary": {
-                    "scene_id": gwhr_snapshot.get('current_scene_data',{}).get('scene_id'),
-                    "narrative_snippet": gwhr_snapshot.get('current_scene_data',{}).get('narrative', '')[:100] + "..."
-                },
-                "game_time": gwhr_snapshot.get('current_game_time')
-            }
-            
-            llm_prompt = (
-                f"You are roleplaying as {npc_name} (ID: {npc_id}).\n"
-                f"Your Character Details (NPC): {json.dumps(npc_specific_context, indent=2)}\n"
-                f"Overall Game Context: {json.dumps(prompt_context_for_llm, indent=2)}\n"
-                f"Player says/does to you: '{player_input_for_llm}'\n\n"
-                f"Task: Generate {npc_name}'s dialogue response. Your response must be a single valid JSON object including fields: "
-                f"'dialogue_text' (string, what you, {npc_name}, say), "
-                f"'new_npc_status' (string, your updated short-term status, e.g., 'intrigued', 'annoyed', 'helpful'), "
-                f"'attitude_towards_player_change' (string, e.g., '+5', '-2', or '0', reflecting change in your disposition), "
-                f"'knowledge_revealed' (list of new knowledge topic objects with 'topic_id' and 'summary' if you reveal something new), "
-                f"and optional 'dialogue_options_for_player' (list of 2-4 objects with 'id' and 'name' for player choices to continue talking to you). "
-                f"If the player says '/bye' or '/end', or if the conversation naturally concludes, make 'dialogue_text' a polite closing and set 'new_npc_status' to 'ending_dialogue'."
-            )
+            if not first_exchange:
+                self.llm_interface.begin_turn() # Each player reply is a new turn; the first belongs to the triggering action
+            llm_prompt = self._build_dialogue_prompt(npc_id, npc_data_snapshot, player_input_for_llm, session=session)
 
             model_id = self.model_selector.get_selected_model()
             if not model_id:
@@ -400,7 +631,10 @@ class GameController:
                 self.current_game_state = "GAME_OVER"
                 break
             
-            response_json_str = self.llm_interface.generate(llm_prompt, model_id, expected_response_type='npc_dialogue_response')
+            # Only the opening exchange can have been speculated on by the prefetcher.
+            response_json_str = self._generate_action_outcome(llm_prompt, model_id, 'npc_dialogue_response',
+                                                              prefetch_key=prefetch_key if first_exchange else None)
+            first_exchange = False
 
             if not response_json_str:
                 self.ui_manager.display_message(f"Error: {npc_name} seems lost for words (LLM failed to respond). Try again or type '/bye'.", "error")
@@ -410,7 +644,7 @@ class GameController:
                 continue 
 
             try:
-                dialogue_data = json.loads(response_json_str)
+                dialogue_data = self._parse_llm_json(response_json_str, 'npc_dialogue_response', model_id)
             except json.JSONDecodeError as e:
                 self.ui_manager.display_message(f"Error: Received garbled response from {npc_name} (JSON Error: {e}). Snippet: {response_json_str[:100]}...", "error")
                 player_input_for_llm = self.ui_manager.get_free_text_input(f"Your reply to {npc_name} (or /bye to end): ")
@@ -423,18 +657,19 @@ class GameController:
             
             self.ui_manager.display_npc_dialogue(npc_name, npc_actual_response_text, player_reply_options)
 
-            npc_data_snapshot['status'] = dialogue_data.get('new_npc_status', npc_data_snapshot.get('status'))
-            dialogue_log_entry = {'player': player_input_for_llm, 'npc': npc_actual_response_text, 'time': self.gwhr.data_store.get('current_game_time')}
-            npc_data_snapshot.setdefault('dialogue_log', []).append(dialogue_log_entry)
-            npc_data_snapshot['last_interaction_time'] = self.gwhr.data_store.get('current_game_time')
-            
             attitude_change_str = dialogue_data.get('attitude_towards_player_change', '0')
             try:
                 attitude_change = int(attitude_change_str) 
-                npc_data_snapshot.setdefault('attributes', {}).setdefault('disposition_towards_player', 0)
-                npc_data_snapshot['attributes']['disposition_towards_player'] += attitude_change
-            except ValueError:
+            except (ValueError, TypeError):
+                attitude_change = None
                 self.ui_manager.display_message(f"Warning: Invalid attitude_towards_player_change format: {attitude_change_str}", "warning")
+            # Status, disposition and the log entry go to this NPC only (GWHR.update_npc), not a rewrite of all NPCs.
+            session.record_exchange(player_input_for_llm, npc_actual_response_text,
+                                    dialogue_data.get('new_npc_status', npc_data_snapshot.get('status')), attitude_change,
+                                    self.gwhr.data_store.get('current_game_time'))
+            if self.npc_memory:
+                # Older exchanges are folded into the NPC's summary in the background while the player replies.
+                self.npc_memory.refresh_if_needed(npc_id, npc_name, npc_data_snapshot.get('dialogue_log', []), model_id)
             
             # Example conceptual hookup:
             if isinstance(dialogue_data.get('knowledge_revealed'), list):
@@ -446,10 +681,6 @@ class GameController:
                             context_prompt_hint=knowledge_item.get('summary', knowledge_item.get('topic_id'))
                         )
 
-            current_npcs_in_gwhr = self.gwhr.get_data_store().get('npcs', {})
-            current_npcs_in_gwhr[npc_id] = npc_data_snapshot 
-            self.gwhr.update_state({'npcs': current_npcs_in_gwhr}) 
-            
             self.gwhr.log_event(
                 f"Dialogue: Player: '{player_input_for_llm}', {npc_name}: '{npc_actual_response_text[:50]}...'. Attitude change: {attitude_change_str}.",
                 event_type="dialogue_exchange", 
@@ -489,7 +720,7 @@ class GameController:
             self.current_game_state = "AWAITING_PLAYER_ACTION"
 
     def advance_time(self, duration: int = 1):
-        current_time = self.gwhr.get_data_store().get('current_game_time', 0)
+        current_time = self.gwhr.data_store.get('current_game_time', 0)
         new_time = current_time + duration
         self.gwhr.update_state({'current_game_time': new_time})
         self.gwhr.log_event(f"Time advanced by {duration} unit(s). New game time is {new_time}.", event_type="time_passage")
@@ -566,16 +797,11 @@ class GameController:
         self.ui_manager.display_message(f"A dynamic event '{event_id_hint}' is being triggered...", "info")
         
         current_time = self.gwhr.get_data_store().get('current_game_time', 0)
-        llm_prompt = (
+        llm_prompt = self._assemble_prompt('dynamic_event_outcome', turn_segments=[
             f"Event Hint: {event_id_hint}\n"
             f"NPC Driven: {is_npc_driven}\n"
-            f"Game Time: {current_time}\n"
-            f"Task: Generate the outcome for this dynamic world event. The outcome should be surprising yet plausible. "
-            f"Output JSON with fields: 'event_id' (string, can be a more specific ID derived from the hint), "
-            f"'description' (string, narrative of what happens), "
-            f"'effects_on_world' (list of strings, describing changes to game state, environment, or NPC status; these are for logging and potential future state changes), "
-            f"'new_scene_id' (optional string, if the event forces an immediate scene change)."
-        )
+            f"Game Time: {current_time}"
+        ])
         
         model_id = self.model_selector.get_selected_model()
         if not model_id:
@@ -586,7 +812,7 @@ class GameController:
 
         if json_str:
             try:
-                event_data = json.loads(json_str)
+                event_data = self._parse_llm_json(json_str, 'dynamic_event_outcome', model_id)
                 description = event_data.get('description', 'An unexpected event occurred, but its nature is unclear.')
                 
                 self.ui_manager.display_dynamic_event_notification(description)
@@ -631,90 +857,183 @@ class GameController:
             self.ui_manager.display_message("GameController: Failed to generate dynamic event outcome from LLM.", "error")
 
     def check_and_update_time_based_events(self):
-        current_time = self.gwhr.get_data_store().get('current_game_time', 0)
+        # Fires every scheduled world event due up to the current game time, in order, however far time moved.
+        self.world_scheduler.advance_to(self.gwhr.data_store.get('current_game_time', 0))
+
+    def _on_world_mutation(self, keys: list | None):
+        if keys is None: # New world or restored save: the schedule follows its clock
+            self.world_scheduler.reset(self.gwhr.data_store.get('current_game_time', 0))
+
+    def schedule_dynamic_event(self, delay: int, event_id_hint: str, is_npc_driven: bool = False) -> str:
+        return self.world_scheduler.after(delay, self._scheduled_dynamic_event,
+                                          payload={'event_id_hint': event_id_hint, 'is_npc_driven': is_npc_driven})
+
+    def _scheduled_dynamic_event(self, due_time: int, payload: dict):
+        self.trigger_dynamic_event(payload['event_id_hint'], is_npc_driven=payload.get('is_npc_driven', False))
+
+    def schedule_npc_event(self, npc_id: str, delay: int, fields: dict, every: int | None = None) -> str:
+        # NPC schedules: set fields on an NPC (e.g. current_location_id) once after delay, or every `every` units.
+        payload = {'npc_id': npc_id, 'fields': copy.deepcopy(fields)}
+        if every:
+            return self.world_scheduler.every(every, self._scheduled_npc_event, payload=payload,
+                                              first_due=self.world_scheduler.now + max(1, delay))
+        return self.world_scheduler.after(delay, self._scheduled_npc_event, payload=payload)
+
+    def _scheduled_npc_event(self, due_time: int, payload: dict):
+        if self.gwhr.update_npc(payload['npc_id'], fields=payload['fields']):
+            self.gwhr.log_event(f"NPC '{payload['npc_id']}' schedule: {sorted(payload['fields'])} updated at time {due_time}.",
+                                event_type="npc_schedule", payload=payload)
+
+    def _scheduled_npc_autonomy(self, due_time: int, payload: dict | None = None):
+        # Coalesced: a jump of N units is one batched tick of N units rather than N ticks.
+        elapsed = 1 + (payload or {}).get('missed_occurrences', 0)
+        for event_id_hint in self.npc_simulation.tick(self.gwhr, elapsed, now=due_time):
+            self.trigger_dynamic_event(event_id_hint, is_npc_driven=True)
+
+    def _scheduled_weather_update(self, due_time: int, payload: dict | None = None):
+        self.ui_manager.display_message("The air shifts... the weather might be changing.", "info")
         
-        # Example: Every 10 turns, chance of weather change
-        if current_time > 0 and current_time % 10 == 0: # Trigger on turns 10, 20, 30...
-            self.ui_manager.display_message("The air shifts... the weather might be changing.", "info")
-            
-            current_world_state = self.gwhr.get_data_store().get('world_state', {})
-            current_weather = current_world_state.get('current_weather', {"condition":"unknown"}) # Get current weather
-            
-            llm_prompt = (
-                f"Old Condition: {current_weather.get('condition','clear')}\n"
-                f"Current Game Time: {current_time}\n" # Provide game time for context
-                f"Task: Describe a plausible weather change based on the old condition. "
-                f"Output JSON with fields: 'new_weather_condition' (e.g., 'rainy', 'foggy', 'sunny'), "
-                f"'new_weather_intensity' (e.g., 'light', 'moderate', 'heavy'), "
-                f"and 'weather_effects_description' (a narrative string for the player)."
-            )
-            model_id = self.model_selector.get_selected_model()
-            if not model_id:
-                self.ui_manager.display_message("GameController: Error - No model selected for weather update generation.", "error")
-                return
+        current_world_state = self.gwhr.get_data_store().get('world_state', {})
+        current_weather = current_world_state.get('current_weather', {"condition":"unknown"}) # Get current weather
+        
+        llm_prompt = self._assemble_prompt('weather_update_description', turn_segments=[
+            f"Old Condition: {current_weather.get('condition','clear')}\n"
+            f"Current Game Time: {due_time}" # The time this change is due, which a fast-forward may have passed
+        ])
+        model_id = self.model_selector.get_selected_model()
+        if not model_id:
+            self.ui_manager.display_message("GameController: Error - No model selected for weather update generation.", "error")
+            return
 
-            json_str = self.llm_interface.generate(llm_prompt, model_id, 'weather_update_description')
-            
-            if json_str:
-                try:
-                    weather_data = json.loads(json_str)
-                    # Update GWHR: get a copy of world_state, update weather, then set it back
-                    updated_world_state = copy.deepcopy(current_world_state) # Make a copy to modify
-                    updated_world_state['current_weather'] = { # Replace with new weather data
-                        "condition": weather_data.get('new_weather_condition', 'unchanged'),
-                        "intensity": weather_data.get('new_weather_intensity', 'mild'),
-                        "effects_description": weather_data.get('weather_effects_description', 'The weather remains difficult to discern.')
-                    }
-                    self.gwhr.update_state({'world_state': updated_world_state})
-                    
-                    self.ui_manager.display_dynamic_event_notification(
-                        f"Weather changes: {weather_data.get('weather_effects_description', 'The atmosphere shifts.')}"
-                    )
-                    self.gwhr.log_event(
-                        f"Weather changed to {weather_data.get('new_weather_condition', 'unknown')}, intensity {weather_data.get('new_weather_intensity', 'unknown')}.",
-                        event_type="weather_change", 
-                        payload=weather_data
-                    )
-                except json.JSONDecodeError as e:
-                    self.ui_manager.display_message(f"GameController: Error parsing weather data from LLM: {e}", "error")
-            else:
-                self.ui_manager.display_message("GameController: LLM failed to describe weather change.", "error")
+        json_str = self.llm_interface.generate(llm_prompt, model_id, 'weather_update_description')
         
-        # TODO: Add more time-based event triggers here if needed.
+        if json_str:
+            try:
+                weather_data = self._parse_llm_json(json_str, 'weather_update_description', model_id)
+                # Update GWHR: get a copy of world_state, update weather, then set it back
+                updated_world_state = copy.deepcopy(current_world_state) # Make a copy to modify
+                updated_world_state['current_weather'] = { # Replace with new weather data
+                    "condition": weather_data.get('new_weather_condition', 'unchanged'),
+                    "intensity": weather_data.get('new_weather_intensity', 'mild'),
+                    "effects_description": weather_data.get('weather_effects_description', 'The weather remains difficult to discern.')
+                }
+                self.gwhr.update_state({'world_state': updated_world_state})
+                
+                self.ui_manager.display_dynamic_event_notification(
+                    f"Weather changes: {weather_data.get('weather_effects_description', 'The atmosphere shifts.')}"
+                )
+                self.gwhr.log_event(
+                    f"Weather changed to {weather_data.get('new_weather_condition', 'unknown')}, intensity {weather_data.get('new_weather_intensity', 'unknown')}.",
+                    event_type="weather_change", 
+                    payload=weather_data
+                )
+            except json.JSONDecodeError as e:
+                self.ui_manager.display_message(f"GameController: Error parsing weather data from LLM: {e}", "error")
+        else:
+            self.ui_manager.display_message("GameController: LLM failed to describe weather change.", "error")
+
+    @staticmethod
+    def _image_scene_type(scene_data: dict, default_scene_type: str) -> str:
+        return scene_data.get('scene_type') or default_scene_type
+
+    def _show_scene(self, scene_data: dict):
+        self.ui_manager.display_scene(scene_data)
+        self.scene_version += 1
+
+    def _find_similar_image(self, scene_data: dict, default_scene_type: str) -> str | None:
+        if not self.image_similarity_index:
+            return None
+        match = self.image_similarity_index.find_similar(scene_data['image_prompt_elements'], self._image_scene_type(scene_data, default_scene_type))
+        if not match:
+            return None
+        image_url, similarity = match
+        self.ui_manager.display_message(f"GameController: Reusing a near-identical image (similarity {similarity:.2f}) for scene '{scene_data.get('scene_id')}'. URL: {image_url}", "info")
+        return image_url
+
+    def _remember_image(self, scene_data: dict, image_url: str, default_scene_type: str):
+        if self.image_similarity_index:
+            self.image_similarity_index.add(scene_data['image_prompt_elements'], image_url, self._image_scene_type(scene_data, default_scene_type))
+
+    def _request_scene_image(self, scene_data: dict, default_scene_type: str):
+        # Non-blocking: the scene renders with the previous image (or a placeholder) and the new one
+        # is swapped in by _on_image_ready / apply_ready_images once it exists.
+        image_key = image_prompt_key(scene_data['image_prompt_elements'])
+        self._awaited_image_key = image_key # Set before requesting; the worker may finish immediately
+        with self._image_requests_lock:
+            self._image_requests[image_key] = (list(scene_data['image_prompt_elements']), self._image_scene_type(scene_data, default_scene_type))
+        image_url = self.image_pipeline.request(scene_data['image_prompt_elements'])
+        scene_data['background_image_url'] = image_url
+        if image_url:
+            self._awaited_image_key = None
+            self._remember_image(scene_data, image_url, default_scene_type)
+            with self._image_requests_lock:
+                self._image_requests.pop(image_key, None)
+            self.ui_manager.display_message(f"GameController: Reusing cached image for scene '{scene_data.get('scene_id')}'. URL: {image_url}", "info")
+        else:
+            scene_data['background_image_pending'] = True
+
+    def _on_image_ready(self, image_key: str, image_url: str | None):
+        # Runs on an image worker thread: only the UI swap happens here, GWHR is updated by apply_ready_images.
+        # image_url is None when generation failed; the request is dropped all the same.
+        with self._image_requests_lock:
+            request = self._image_requests.pop(image_key, None)
+        if request and image_url and self.image_similarity_index:
+            self.image_similarity_index.add(request[0], image_url, request[1]) # The index is thread-safe
+        if image_url and image_key == self._awaited_image_key:
+            self.ui_manager.update_background_image(image_url)
+        self.events.post(game_events.IMAGE_READY, image_key) # Wakes the game loop to record it in GWHR
+
+    def apply_ready_images(self):
+        if not self.image_pipeline:
+            return
+        for image_key, image_url in self.image_pipeline.drain_completed():
+            current_scene = self.gwhr.data_store.get('current_scene_data', {})
+            if image_key == self._awaited_image_key:
+                self._awaited_image_key = None
+            if image_key != image_prompt_key(current_scene.get('image_prompt_elements')):
+                continue # The player has moved on; the image stays cached for a revisit
+            if not image_url and not current_scene.get('background_image_pending'):
+                continue
+            # A failed image leaves the scene without one instead of pending forever.
+            self.gwhr.set_scene_image(image_url, current_scene.get('scene_id'))
+            if not image_url:
+                self.ui_manager.display_message(f"GameController: No image could be generated for scene '{current_scene.get('scene_id')}'.", "info")
+
+    def _build_scene_prompt(self, scene_id: str, gwhr: GWHR = None):
+        gwhr = gwhr or self.gwhr
+        return self._assemble_prompt(
+            'scene_description',
+            session_segments=[self._session_context_segment(gwhr)],
+            turn_segments=[
+                f"Current Game Time: {gwhr.data_store.get('current_game_time', 0)}\n"
+                f"Requested Scene ID: {scene_id}\n\n"
+                "Task: Generate the scene description, NPCs, interactive elements, and environmental effects for the scene "
+                "specified by 'Requested Scene ID'. The 'scene_id' in your response should match the 'Requested Scene ID'."
+            ],
+            gwhr=gwhr
+        )
 
     def initiate_scene(self, scene_id: str) -> bool:
         self.current_game_state = "PRESENTING_SCENE"
         self.ui_manager.display_message(f"GameController: Loading scene '{scene_id}'...", "info")
         self.gwhr.log_event(f"Initiating scene: {scene_id}", event_type="scene_load")
         
-        # Get context (currently full dump, will be refined)
-        context_for_llm = self.gwhr.get_current_context() 
-        
-        # Limit context size for prompt (example: take first 1000 chars of JSON string)
-        context_json_str = json.dumps(context_for_llm, indent=2)
-        truncated_context_str = context_json_str[:1000]
-        if len(context_json_str) > 1000:
-            truncated_context_str += "\n... (context truncated)"
-
-        prompt = (
-            f"Current Game Context (JSON):\n{truncated_context_str}\n\n"
-            f"Requested Scene ID: {scene_id}\n\n"
-            "Task: Generate the scene description, NPCs, interactive elements, and environmental effects for the scene "
-            "specified by 'Requested Scene ID'. Ensure the output is a single valid JSON object adhering to the "
-            "established scene data structure. The 'scene_id' in your response should match the 'Requested Scene ID'."
-        )
-        
         model_id = self.model_selector.get_selected_model()
         if not model_id:
             self.ui_manager.display_message("GameController: CRITICAL - No model selected for LLM call during scene initiation.", "error")
             self.current_game_state = "GAME_OVER"
             return False
 
-        scene_json_str = self.llm_interface.generate(prompt, model_id, expected_response_type='scene_description')
+        pregenerated, self._pregenerated_scene = self._pregenerated_scene, None
+        if pregenerated and pregenerated[0] == scene_id:
+            scene_json_str = pregenerated[1] # Generated during world setup
+        else:
+            prompt = self._build_scene_prompt(scene_id)
+            scene_json_str = self.llm_interface.generate(prompt, model_id, expected_response_type='scene_description')
 
         if scene_json_str:
             try:
-                scene_data = json.loads(scene_json_str)
+                scene_data = self._parse_llm_json(scene_json_str, 'scene_description', model_id)
                 # Validate if LLM followed instructions for scene_id
                 if scene_data.get('scene_id') != scene_id:
                     self.ui_manager.display_message(
@@ -724,21 +1043,26 @@ class GameController:
                     scene_data['scene_id'] = scene_id # Force consistency
                 
                 # --- Image Generation for new scene ---
-                narrative_for_prompt = scene_data.get('narrative', '')
-                npcs_for_prompt = ", ".join([npc.get('name', 'N/A') for npc in scene_data.get('npcs_in_scene', []) if npc.get('name')])
-                image_prompt_text = f"Scene: {narrative_for_prompt[:150]}. NPCs: {npcs_for_prompt[:100]}."
+                image_prompt_text = build_scene_image_prompt(scene_data, "Scene")
                 scene_data['image_prompt_elements'] = [image_prompt_text] # Store the generated prompt
 
-                self.ui_manager.show_image_loading_indicator()
-                image_url = self.llm_interface.generate_image(image_prompt_text)
-                self.ui_manager.hide_image_loading_indicator()
-
-                if image_url:
-                    scene_data['background_image_url'] = image_url
-                    self.ui_manager.display_message(f"GameController: Image generated for scene '{scene_data.get('scene_id', scene_id)}'. URL: {image_url}", "info")
+                reused_image_url = self._find_similar_image(scene_data, 'scene')
+                if reused_image_url:
+                    scene_data['background_image_url'] = reused_image_url
+                elif self.image_pipeline:
+                    self._request_scene_image(scene_data, 'scene')
                 else:
-                    scene_data['background_image_url'] = None
-                    self.ui_manager.display_message(f"GameController: Failed to generate image for scene '{scene_data.get('scene_id', scene_id)}'.", "warning")
+                    self.ui_manager.show_image_loading_indicator()
+                    image_url = self.llm_interface.generate_image(image_prompt_text)
+                    self.ui_manager.hide_image_loading_indicator()
+
+                    if image_url:
+                        scene_data['background_image_url'] = image_url
+                        self._remember_image(scene_data, image_url, 'scene')
+                        self.ui_manager.display_message(f"GameController: Image generated for scene '{scene_data.get('scene_id', scene_id)}'. URL: {image_url}", "info")
+                    else:
+                        scene_data['background_image_url'] = None
+                        self.ui_manager.display_message(f"GameController: Failed to generate image for scene '{scene_data.get('scene_id', scene_id)}'.", "warning")
                 # --- End Image Generation ---
 
                 # Add current weather to scene_data for display
@@ -746,7 +1070,7 @@ class GameController:
                 scene_data['current_weather_in_scene'] = copy.deepcopy(current_weather)
 
                 self.gwhr.update_state({'current_scene_data': scene_data}) # This also logs to scene_history
-                self.ui_manager.display_scene(scene_data)
+                self._show_scene(scene_data)
                 self.current_game_state = "AWAITING_PLAYER_ACTION"
                 return True
             except json.JSONDecodeError as e:
@@ -758,9 +1082,73 @@ class GameController:
             self.current_game_state = "GAME_OVER" # Critical if first scene fails
             return False
 
+    def _build_action_prompt(self, action_detail: str, chosen_element: dict | None, scene_data: dict,
+                             gwhr: GWHR = None, record_stats: bool = True):
+        gwhr = gwhr or self.gwhr
+        current_scene_id_from_gwhr = scene_data.get('scene_id', 'UNKNOWN_SCENE')
+        chosen_element_name = chosen_element.get('name', action_detail) if chosen_element else action_detail
+        
+        return self._assemble_prompt(
+            'scene_description',
+            session_segments=[self._session_context_segment(gwhr)],
+            turn_segments=[
+                f"Current Game Time: {gwhr.data_store.get('current_game_time', 0)}\n"
+                f"Player selected the option '{chosen_element_name}' (ID: '{action_detail}') from the interaction menu in scene '{current_scene_id_from_gwhr}'.\n\n"
+                f"Task: Generate the outcome of this specific interaction. This might mean updating the current scene (e.g., a narrative update, changed NPC status, modified/new interactive elements) or transitioning to a new scene. "
+                f"If transitioning to a new scene, provide the full data for the new scene, including a new 'scene_id' which MUST be different from '{current_scene_id_from_gwhr}'. "
+                f"If updating the current scene, the response can omit 'scene_id' or use the current one ('{current_scene_id_from_gwhr}'), but should detail changes, potentially including a 'narrative_update' field."
+            ],
+            gwhr=gwhr, record_stats=record_stats
+        )
+
+    @staticmethod
+    def _dialogue_opening_line(element: dict) -> str:
+        return f"Selected interaction: '{element.get('name', element.get('id'))}'"
+
+    def _generate_action_outcome(self, prompt, model_id: str, response_type: str, prefetch_key: str = None) -> str | None:
+        # A prefetched response is only used if it was generated from exactly this prompt.
+        if prefetch_key and self.action_prefetcher:
+            prefetched = self.action_prefetcher.take(prefetch_key, prompt)
+            if prefetched is not None:
+                return prefetched
+        return self.llm_interface.generate(prompt, model_id, expected_response_type=response_type)
+
+    def prefetch_likely_actions(self, interactive_choices: list):
+        if not self.action_prefetcher:
+            return
+        model_id = self.model_selector.get_selected_model()
+        candidates = self.action_prefetcher.rank_candidates(interactive_choices)
+        if not model_id or not candidates:
+            return
+        # Build against a detached snapshot advanced the way process_player_action advances the live
+        # state before generating; anything else that changes in between shows up as a prompt mismatch.
+        snapshot = self.gwhr.snapshot()
+        snapshot.data_store['current_game_time'] = snapshot.data_store.get('current_game_time', 0) + 1
+        scene_data = snapshot.data_store.get('current_scene_data', {})
+        jobs = []
+        for element in candidates:
+            if element.get('type') == 'dialogue' and element.get('target_id'):
+                npc_data = snapshot.data_store.get('npcs', {}).get(element['target_id'])
+                if not npc_data:
+                    continue
+                prompt = self._build_dialogue_prompt(element['target_id'], npc_data, self._dialogue_opening_line(element),
+                                                     gwhr=snapshot, record_stats=False)
+                jobs.append((element['id'], 'npc_dialogue_response', prompt))
+            else:
+                if self.action_memo and self.action_memo.contains(self.action_memo.key_for(scene_data.get('scene_id', 'UNKNOWN_SCENE'), element, element['id'], self.gwhr)):
+                    continue # The outcome will be replayed from the memo
+                prompt = self._build_action_prompt(element['id'], element, scene_data, gwhr=snapshot, record_stats=False)
+                jobs.append((element['id'], 'scene_description', prompt))
+        self.action_prefetcher.prefetch(jobs, model_id)
+
     def process_player_action(self, action_type: str, action_detail: any):
         self.current_game_state = "PROCESSING_ACTION"
+        self.llm_interface.begin_turn() # Per-turn token budget covers everything this action triggers
         self.ui_manager.display_message(f"GameController: Processing action: {action_type} on '{action_detail}'...", "info")
+        if self.action_prefetcher:
+            # Speculations for the elements not picked are dead now.
+            picked = next((el for el in self.gwhr.data_store.get('current_scene_data', {}).get('interactive_elements', []) if el.get('id') == action_detail), {})
+            self.action_prefetcher.select(action_detail, picked.get('type'))
         self.gwhr.log_event(f"Player action: {action_type} on element '{action_detail}'", event_type="player_action")
         
         self.advance_time(1) # Advance game time by 1 unit
@@ -772,8 +1160,8 @@ class GameController:
 
         if chosen_element and chosen_element.get('type') == 'dialogue' and chosen_element.get('target_id'):
             npc_id_to_talk_to = chosen_element['target_id']
-            initial_dialogue_input = f"Selected interaction: '{chosen_element.get('name', action_detail)}'"
-            self.handle_npc_dialogue(npc_id_to_talk_to, initial_player_input=initial_dialogue_input)
+            initial_dialogue_input = self._dialogue_opening_line(chosen_element)
+            self.handle_npc_dialogue(npc_id_to_talk_to, initial_player_input=initial_dialogue_input, prefetch_key=action_detail)
             return 
         elif chosen_element and chosen_element.get('type') == 'combat_trigger' and chosen_element.get('target_id'):
             npc_id_to_engage = chosen_element['target_id']
@@ -795,243 +1183,182 @@ class GameController:
                 return
         
         # If not a dialogue or combat_trigger action, proceed with generic action processing:
-        context_for_llm = self.gwhr.get_current_context()
-        current_scene_id_from_gwhr = context_for_llm.get('current_scene_data', {}).get('scene_id', 'UNKNOWN_SCENE')
-
-        context_json_str = json.dumps(context_for_llm, indent=2)
-        truncated_context_str = context_json_str[:1000]
-        if len(context_json_str) > 1000:
-            truncated_context_str += "\n... (context truncated)"
-
-        # New prompt structure for process_player_action
-        current_scene_elements = context_for_llm.get('current_scene_data', {}).get('interactive_elements', [])
-        chosen_element_info = next((el for el in current_scene_elements if el.get('id') == action_detail), None)
-        chosen_element_name = chosen_element_info.get('name', action_detail) if chosen_element_info else action_detail
-        
-        prompt = (
-            f"Current Game Context (JSON):\n{truncated_context_str}\n\n"
-            f"Player selected the option '{chosen_element_name}' (ID: '{action_detail}') from the interaction menu in scene '{current_scene_id_from_gwhr}'.\n\n"
-            f"Task: Generate the outcome of this specific interaction. This might mean updating the current scene (e.g., a narrative update, changed NPC status, modified/new interactive elements) or transitioning to a new scene. "
-            f"If transitioning to a new scene, provide the full data for the new scene, including a new 'scene_id' which MUST be different from '{current_scene_id_from_gwhr}'. "
-            f"If updating the current scene, the response can omit 'scene_id' or use the current one ('{current_scene_id_from_gwhr}'), but should detail changes, potentially including a 'narrative_update' field. "
-            f"Ensure the output is a single valid JSON object structured as scene data."
-        )
-        
-        model_id = self.model_selector.get_selected_model()
-        if not model_id:
-            self.ui_manager.display_message("GameController: CRITICAL - No model selected for LLM call during action processing.", "error")
-            self.current_game_state = "GAME_OVER" # Or AWAITING_PLAYER_ACTION to allow recovery if possible
-            return
-
-        response_json_str = self.llm_interface.generate(prompt, model_id, expected_response_type='scene_description') # Re-using scene_description type
-
-        if response_json_str:
-            try:
-                response_data = json.loads(response_json_str)
-                new_scene_id = response_data.get('scene_id')
-
-                
-                # --- Image Generation for action outcome scene data ---
-                narrative_for_prompt_action = response_data.get('narrative', '')
-                npcs_for_prompt_action = ", ".join([npc.get('name', 'N/A') for npc in response_data.get('npcs_in_scene', []) if npc.get('name')])
-                image_prompt_text_action = f"Scene after action: {narrative_for_prompt_action[:150]}. NPCs: {npcs_for_prompt_action[:100]}."
-                response_data['image_prompt_elements'] = [image_prompt_text_action]
-
-                self.ui_manager.show_image_loading_indicator()
-                image_url_action = self.llm_interface.generate_image(image_prompt_text_action)
-                self.ui_manager.hide_image_loading_indicator()
-
-                if image_url_action:
-                    response_data['background_image_url'] = image_url_action
-                    self.ui_manager.display_message(f"GameController: Image updated/generated for scene '{response_data.get('scene_id')}'. URL: {image_url_action}", "info")
-                else:
-                    response_data['background_image_url'] = None
-                    self.ui_manager.display_message(f"GameController: Failed to update/generate image for scene '{response_data.get('scene_id')}'.", "warning")
-                # --- End Image Generation for action outcome ---
-
-                # Add current weather to response_data before updating GWHR and displaying
-                current_weather_for_action_outcome = self.gwhr.get_data_store().get('world_state', {}).get('current_weather', {})
-                response_data['current_weather_in_scene'] = copy.deepcopy(current_weather_for_action_outcome)
-
-                if new_scene_id and new_scene_id != current_scene_id_from_gwhr: # LLM decided to change scene
-                    self.ui_manager.display_message(f"GameController: Transitioning to new scene: {new_scene_id}", "info")
-                    self.gwhr.update_state({'current_scene_data': response_data}) # response_data now includes weather
-                    self.ui_manager.display_scene(response_data)
-                elif new_scene_id == current_scene_id_from_gwhr and response_data.get('narrative'): # Update to current scene (full refresh)
-                    self.ui_manager.display_message(f"GameController: Current scene '{current_scene_id_from_gwhr}' updated.", "info")
-                    self.gwhr.update_state({'current_scene_data': response_data}) # response_data now includes weather
-                    self.ui_manager.display_scene(response_data) 
-                elif response_data.get('narrative_update'): # A specific narrative update for current scene
-                    # This path might need more fleshing out if LLM is expected to send *only* narrative_update
-                    # and not a full scene. The image logic above assumes response_data is the new full scene data.
-                    # If it's just a delta, image wouldn't typically change unless also in delta.
-                    self.ui_manager.display_narrative(response_data.get('narrative_update',''))
-                    # If only narrative_update, current_scene_data in GWHR is not updated with response_data here.
-                    # This means the image displayed would be the old one. This might be desired.
-                    # For now, we assume LLM sends full scene data if image is to change.
-                else: # Fallback or unrecognized partial update
-                    self.ui_manager.display_message("GameController: Action resulted in a minor or unclear update. Re-displaying current scene context.", "info")
-                    self.ui_manager.display_scene(self.gwhr.get_data_store().get('current_scene_data', {}))
-                
-                # --- Player Growth/Update Processing ---
-                if 'player_updates' in response_data:
-                    updates_to_log = []
-                    # Get a mutable copy of player_state from GWHR to modify
-                    # Note: get_data_store() returns a deepcopy, so we're modifying a copy.
-                    # We need to explicitly save it back to GWHR if changes are made.
-                    # A more direct approach might be: player_state_ref = self.gwhr.data_store['player_state']
-                    # But to respect GWHR's interface providing copies, let's get, modify, then update.
-                    current_player_state_copy = self.gwhr.get_data_store().get('player_state', {})
-                    player_state_modified = False
-
-                    # Process attribute updates
-                    if 'attributes' in response_data['player_updates']:
-                        attributes_updates = response_data['player_updates']['attributes']
-                        if isinstance(attributes_updates, dict):
-                            player_attributes = current_player_state_copy.setdefault('attributes', {})
-                            for attr, change in attributes_updates.items():
-                                if attr in player_attributes: # Only update existing attributes
-                                    current_value = player_attributes[attr]
-                                    try:
-                                        new_value = current_value # Default if change is invalid
-                                        if isinstance(change, str):
-                                            if change.startswith('+'):
-                                                new_value = current_value + int(change[1:])
-                                            elif change.startswith('-'):
-                                                new_value = current_value - int(change[1:])
-                                            else: # Absolute value
-                                                new_value = int(change)
-                                        elif isinstance(change, (int, float)): # Absolute value
-                                            new_value = int(change) # cast to int just in case
-                                        else: 
-                                            self.ui_manager.display_message(f"Warning: Unrecognized attribute change format for {attr}: {change}", "warning")
-                                            continue
-
-                                        player_attributes[attr] = new_value
-                                        player_state_modified = True
-                                        update_msg = f"Attribute {attr} changed from {current_value} to {new_value}."
-                                        self.ui_manager.display_message(update_msg, "growth") 
-                                        updates_to_log.append(update_msg)
-                                    except ValueError:
-                                        self.ui_manager.display_message(f"Warning: Invalid value for attribute change {attr}: {change}", "warning")
-                                else:
-                                    self.ui_manager.display_message(f"Warning: Attempt to update unknown attribute {attr}.", "warning")
-                        else:
-                            self.ui_manager.display_message(f"Warning: Malformed 'attributes' in player_updates (not a dict): {attributes_updates}", "warning")
+        current_scene_id_from_gwhr = current_scene_data_for_action.get('scene_id', 'UNKNOWN_SCENE')
+        memo_key, response_data = None, None
+        if self.action_memo:
+            memo_key, response_data = self.action_memo.lookup(current_scene_id_from_gwhr, chosen_element, action_detail, self.gwhr)
+        if response_data is not None:
+            print(f"GameController: Replaying memoized outcome for '{action_detail}' in scene '{current_scene_id_from_gwhr}'.")
+            if response_data.pop('background_image_pending', False):
+                self._attach_action_image(response_data) # Image was still generating when memoized; the image cache has it by now
+            if self.action_prefetcher:
+                self.action_prefetcher.select(None) # The speculation for this element is not needed either
+        else:
+            prompt = self._build_action_prompt(action_detail, chosen_element, current_scene_data_for_action)
             
-                    # Process skill updates
-                    if 'skills_learned' in response_data['player_updates']:
-                        skills_to_learn_list = response_data['player_updates']['skills_learned']
-                        if isinstance(skills_to_learn_list, list):
-                            player_skills = current_player_state_copy.setdefault('skills', [])
-                            for skill_to_learn in skills_to_learn_list:
-                                if isinstance(skill_to_learn, dict) and 'name' in skill_to_learn:
-                                    existing_skill = next((s for s in player_skills if s.get('name') == skill_to_learn['name']), None)
-                                    if not existing_skill:
-                                        # Ensure default level if not provided
-                                        skill_to_learn.setdefault('level', 1)
-                                        player_skills.append(skill_to_learn) # skill_to_learn is a dict
-                                        player_state_modified = True
-                                        update_msg = f"New skill learned: {skill_to_learn['name']} (Level {skill_to_learn.get('level', 1)})!"
-                                        self.ui_manager.display_message(update_msg, "growth")
-                                        updates_to_log.append(update_msg)
-                                else:
-                                    self.ui_manager.display_message(f"Warning: Malformed skill_learned entry: {skill_to_learn}", "warning")
-                        else:
-                             self.ui_manager.display_message(f"Warning: Malformed 'skills_learned' in player_updates (not a list): {skills_to_learn_list}", "warning")
-
-                    # Process inventory updates
-                    if 'inventory_updates' in response_data['player_updates']:
-                        inventory_changes = response_data['player_updates']['inventory_updates']
-                        if isinstance(inventory_changes, dict):
-                            player_inventory = current_player_state_copy.setdefault('inventory', [])
-                            if 'add' in inventory_changes and isinstance(inventory_changes['add'], list):
-                                for item_to_add in inventory_changes['add']:
-                                    if isinstance(item_to_add, dict) and 'id' in item_to_add and 'name' in item_to_add and 'quantity' in item_to_add:
-                                        existing_item = next((item for item in player_inventory if item.get('id') == item_to_add['id']), None)
-                                        if existing_item:
-                                            existing_item['quantity'] = existing_item.get('quantity', 0) + item_to_add['quantity']
-                                        else:
-                                            player_inventory.append(item_to_add) # item_to_add is a dict
-                                        player_state_modified = True
-                                        update_msg = f"Obtained: {item_to_add['name']} (x{item_to_add['quantity']})."
-                                        self.ui_manager.display_message(update_msg, "growth")
-                                        updates_to_log.append(update_msg)
-                                    else:
-                                        self.ui_manager.display_message(f"Warning: Malformed item_to_add entry: {item_to_add}", "warning")
-                            # TODO: Implement 'remove' logic similarly if needed
-                            # if 'remove' in inventory_changes ...
-                        else:
-                            self.ui_manager.display_message(f"Warning: Malformed 'inventory_updates' in player_updates (not a dict): {inventory_changes}", "warning")
-
-                    if player_state_modified and updates_to_log: # Only update GWHR if actual changes happened
-                        self.gwhr.update_state({'player_state': current_player_state_copy}) 
-                        self.gwhr.log_event(f"Player growth/update: {'; '.join(updates_to_log)}", event_type="player_update")
-                # --- End Player Growth/Update Processing ---
-                # TODO: Conceptual hookup for knowledge from generic actions
-                # if isinstance(response_data.get('knowledge_revealed_by_action'), list):
-                #    for knowledge_item in response_data.get('knowledge_revealed_by_action'):
-                #        self.unlock_knowledge_entry(
-                #            source_type="action_outcome", 
-                #            source_detail=f"Action on element {action_detail} in scene {current_scene_id_from_gwhr}", 
-                #            context_prompt_hint=knowledge_item.get('summary', knowledge_item.get('topic_id'))
-                #        )
-
+            model_id = self.model_selector.get_selected_model()
+            if not model_id:
+                self.ui_manager.display_message("GameController: CRITICAL - No model selected for LLM call during action processing.", "error")
+                self.current_game_state = "GAME_OVER" # Or AWAITING_PLAYER_ACTION to allow recovery if possible
+                return
 
-                self.current_game_state = "AWAITING_PLAYER_ACTION"
+            outcome_started = time.perf_counter()
+            response_json_str = self._generate_action_outcome(prompt, model_id, 'scene_description', prefetch_key=action_detail) # Re-using scene_description type
+            if not response_json_str: # LLM returned None
+                self.ui_manager.display_message("GameController: Failed to get action response from LLM.", "error")
+                self.current_game_state = "AWAITING_PLAYER_ACTION" # Allow player to try again
+                return
+            try:
+                response_data = self._parse_llm_json(response_json_str, 'scene_description', model_id)
             except json.JSONDecodeError as e:
                 self.ui_manager.display_message(f"GameController: Error parsing action response JSON from LLM: {e}. Response snippet: {response_json_str[:200]}...", "error")
                 self.current_game_state = "AWAITING_PLAYER_ACTION" # Allow player to try again
-        else: # LLM returned None
-            self.ui_manager.display_message("GameController: Failed to get action response from LLM.", "error")
-            self.current_game_state = "AWAITING_PLAYER_ACTION" # Allow player to try again
+                return
+            self._attach_action_image(response_data)
+            if self.action_memo:
+                self.action_memo.record(memo_key, response_data, time.perf_counter() - outcome_started)
+        self._apply_action_outcome(response_data, current_scene_id_from_gwhr)
+        self.current_game_state = "AWAITING_PLAYER_ACTION"
+
+    def _attach_action_image(self, response_data: dict):
+        # --- Image Generation for action outcome scene data ---
+        image_prompt_text_action = build_scene_image_prompt(response_data, "Scene after action")
+        response_data['image_prompt_elements'] = [image_prompt_text_action]
+
+        reused_image_url = self._find_similar_image(response_data, 'scene_after_action')
+        if reused_image_url:
+            response_data['background_image_url'] = reused_image_url
+        elif self.image_pipeline:
+            self._request_scene_image(response_data, 'scene_after_action')
+        else:
+            self.ui_manager.show_image_loading_indicator()
+            image_url_action = self.llm_interface.generate_image(image_prompt_text_action)
+            self.ui_manager.hide_image_loading_indicator()
+
+            if image_url_action:
+                response_data['background_image_url'] = image_url_action
+                self._remember_image(response_data, image_url_action, 'scene_after_action')
+                self.ui_manager.display_message(f"GameController: Image updated/generated for scene '{response_data.get('scene_id')}'. URL: {image_url_action}", "info")
+            else:
+                response_data['background_image_url'] = None
+                self.ui_manager.display_message(f"GameController: Failed to update/generate image for scene '{response_data.get('scene_id')}'.", "warning")
+        # --- End Image Generation for action outcome ---
+
+    def _apply_action_outcome(self, response_data: dict, current_scene_id_from_gwhr: str):
+        new_scene_id = response_data.get('scene_id')
+        # Add current weather to response_data before updating GWHR and displaying
+        current_weather_for_action_outcome = self.gwhr.get_data_store().get('world_state', {}).get('current_weather', {})
+        response_data['current_weather_in_scene'] = copy.deepcopy(current_weather_for_action_outcome)
+
+        if new_scene_id and new_scene_id != current_scene_id_from_gwhr: # LLM decided to change scene
+            self.ui_manager.display_message(f"GameController: Transitioning to new scene: {new_scene_id}", "info")
+            self.gwhr.update_state({'current_scene_data': response_data}) # response_data now includes weather
+            self._show_scene(response_data)
+        elif new_scene_id == current_scene_id_from_gwhr and response_data.get('narrative'): # Update to current scene (full refresh)
+            self.ui_manager.display_message(f"GameController: Current scene '{current_scene_id_from_gwhr}' updated.", "info")
+            self.gwhr.update_state({'current_scene_data': response_data}) # response_data now includes weather
+            self._show_scene(response_data) 
+        elif response_data.get('narrative_update'): # A specific narrative update for current scene
+            # This path might need more fleshing out if LLM is expected to send *only* narrative_update
+            # and not a full scene. The image logic above assumes response_data is the new full scene data.
+            # If it's just a delta, image wouldn't typically change unless also in delta.
+            self.ui_manager.display_narrative(response_data.get('narrative_update',''))
+            # If only narrative_update, current_scene_data in GWHR is not updated with response_data here.
+            # This means the image displayed would be the old one. This might be desired.
+            # For now, we assume LLM sends full scene data if image is to change.
+        else: # Fallback or unrecognized partial update
+            self.ui_manager.display_message("GameController: Action resulted in a minor or unclear update. Re-displaying current scene context.", "info")
+            self._show_scene(self.gwhr.get_data_store().get('current_scene_data', {}))
+        
+        # --- Player Growth/Update Processing ---
+        if 'player_updates' in response_data:
+            # Validated and applied in one pass against the inventory/skill index, with a single GWHR write
+            growth_messages, warnings = self.player_state_index.apply(self.gwhr, response_data['player_updates'])
+            for warning in warnings:
+                self.ui_manager.display_message(f"Warning: {warning}", "warning")
+            for update_msg in growth_messages:
+                self.ui_manager.display_message(update_msg, "growth")
+            if growth_messages:
+                self.gwhr.log_event(f"Player growth/update: {'; '.join(growth_messages)}", event_type="player_update")
+        # --- End Player Growth/Update Processing ---
+        # TODO: Conceptual hookup for knowledge from generic actions
+        # if isinstance(response_data.get('knowledge_revealed_by_action'), list):
+        #    for knowledge_item in response_data.get('knowledge_revealed_by_action'):
+        #        self.unlock_knowledge_entry(
+        #            source_type="action_outcome", 
+        #            source_detail=f"Action on element {action_detail} in scene {current_scene_id_from_gwhr}", 
+        #            context_prompt_hint=knowledge_item.get('summary', knowledge_item.get('topic_id'))
+        #        )
 
     def game_loop(self):
         self.ui_manager.display_message("GameController: Entering game loop.", "info")
+        # The scene is redrawn only when nothing else has shown it: initiate_scene, actions and combat render their own.
+        needs_render = not self.scene_version
+        seen_version = None # scene_version when the choices were last read
+        interactive_choices = []
         while self.current_game_state != "GAME_OVER":
-            if self.current_game_state == "AWAITING_PLAYER_ACTION":
-                current_scene_data = self.gwhr.get_data_store().get('current_scene_data', {})
-                interactive_choices = current_scene_data.get('interactive_elements', [])
-                
-                # Display scene first, which now includes the (M) Game Menu hint
-                self.ui_manager.display_scene(current_scene_data) 
-
-                if not interactive_choices: # Check after display_scene, as scene might say "no actions"
-                    self.ui_manager.display_message("No interactive actions presented by the scene. The story might require a different approach or this path ends here.", "info")
-                    self.current_game_state = "GAME_OVER" # Or some other state if game can continue without choices
-                    self.gwhr.log_event("Game ended: No interactive choices available in scene.", event_type="game_flow_end")
-                    break 
-                
-                raw_command = input("Your command (e.g., 1, 2, ..., or M for Menu): ").strip().lower()
-
+            if self.current_game_state == "AWAITING_PLAYER_ACTION" and not self.events.input_pending():
+                self.apply_ready_images() # Images that finished in the background since the last command
+                if needs_render or self.scene_version != seen_version:
+                    # A new scene is on screen (or needs to be): refresh the choices it offers.
+                    current_scene_data = self.gwhr.get_current_scene_data()
+                    interactive_choices = current_scene_data.get('interactive_elements', [])
+                    if needs_render:
+                        self._show_scene(current_scene_data)
+                    needs_render = False
+                    seen_version = self.scene_version
+                    if interactive_choices:
+                        self.prefetch_likely_actions(interactive_choices) # Runs in the background while the player reads
+                    else:
+                        self.ui_manager.display_message("No interactive actions presented by the scene. The story might require a different approach or this path ends here.", "info")
+                        self.current_game_state = "GAME_OVER" # Or some other state if game can continue without choices
+                        self.gwhr.log_event("Game ended: No interactive choices available in scene.", event_type="game_flow_end")
+                        break
+                self.events.request_input("Your command (e.g., 1, 2, ..., or M for Menu): ")
+
+            event_type, payload = self.events.get() # Blocks until input, an image, a timer or a job arrives
+            handled_at = time.perf_counter()
+            handler_time_s = 0.0
+            self.loop_stats['events'] += 1
+            if event_type == game_events.INPUT_EOF:
+                raise EOFError("stdin closed while waiting for a command")
+            elif event_type == game_events.IMAGE_READY:
+                self.apply_ready_images() # The UI already swapped the image; this records it in GWHR
+            elif event_type == game_events.PLAYER_INPUT:
+                raw_command = (payload or "").strip().lower()
                 if raw_command == 'm':
+                    handler_started = time.perf_counter()
                     self.handle_game_menu()
+                    handler_time_s = time.perf_counter() - handler_started
                     self.ui_manager.display_message("\n--- Returning to game ---", "info")
-                    # Re-display current scene after menu closes to refresh context for player
-                    refreshed_scene_data = self.gwhr.get_data_store().get('current_scene_data', {})
-                    # self.ui_manager.display_scene(refreshed_scene_data) # This would re-print the menu hint.
-                    # The loop will re-enter AWAITING_PLAYER_ACTION and call display_scene.
-                    # So, no explicit re-display here is needed, just let the loop continue.
-                    continue # Continue to next iteration of game_loop to re-evaluate state and display scene
+                    needs_render = True # The menu scrolled the scene away
                 else:
                     action_id = self.validate_and_get_action_id(raw_command, interactive_choices)
                     if action_id:
+                        version_before = self.scene_version
+                        handler_started = time.perf_counter()
                         self.process_player_action(action_type="interact_element", action_detail=action_id)
+                        handler_time_s = time.perf_counter() - handler_started
+                        self.loop_stats['actions'] += 1
+                        if self.scene_version == version_before:
+                            needs_render = True # e.g. a dialogue ended: show the scene's choices again
                     else:
                         self.ui_manager.display_message(f"Invalid command: '{raw_command}'. Please enter a valid action number or 'M' for the menu.", "error")
-                        # Game state remains AWAITING_PLAYER_ACTION, loop will re-prompt after re-displaying scene.
-            
-            elif self.current_game_state == "GAME_OVER": 
-                break 
-            
-            # Small delay to prevent tight loop if states are rapidly changing without blocking input
-            # also makes game feel a bit more paced if LLM responses were instant.
-            time.sleep(0.1) 
-        
+            elif event_type == game_events.TIMER and callable(payload):
+                payload()
+            self.loop_stats['overhead_s'] += time.perf_counter() - handled_at - handler_time_s
+
         self.ui_manager.display_message("GameController: Exited game loop.", "info")
+        self.events.cancel_timers()
+        if self.action_prefetcher:
+            self.action_prefetcher.cancel_all()
         if self.current_game_state == "GAME_OVER":
              self.ui_manager.display_message("Game Over.", "info")
 
+    def get_loop_stats(self) -> dict:
+        stats = dict(self.loop_stats)
+        stats['overhead_per_event_ms'] = stats['overhead_s'] * 1000 / stats['events'] if stats['events'] else 0.0
+        return stats
 
     def start_game(self):
         self.ui_manager.display_message("GameController: Starting game setup...", "info")
@@ -1055,4 +1382,3 @@ class GameController:
         if self.current_game_state == "GAME_OVER":
              self.ui_manager.display_message("Game Over.", "info") # Ensure game over is messaged if loop not entered.
 
-[end of game_logic/game_controller.py]
@@ -0,0 +1,85 @@
+import queue
+import threading
+
+# Event types posted to the game loop.
+PLAYER_INPUT = 'player_input' # payload: the raw line the player entered
+INPUT_EOF = 'input_eof' # stdin closed while a command was being read
+IMAGE_READY = 'image_ready' # payload: image key of a background image that just finished
+TIMER = 'timer' # payload: whatever was passed to call_later
+JOB_DONE = 'job_done' # payload: (job name, result) from a background job
+
+
+class GameEventQueue:
+    # Single queue the game loop blocks on. Player input, background image completions, timers and other
+    # jobs all post here, so the loop wakes up exactly when something happened instead of polling.
+    # Input is read on a helper thread one line at a time and only while the loop asks for it, so nested
+    # synchronous prompts (dialogue, menus, combat) never compete with it for stdin.
+    # read_line replaces input() (e.g. UIManager.read_line); with threaded_input=False the line is read
+    # synchronously, which is what a scripted, non-interactive input source wants.
+    def __init__(self, read_line=None, threaded_input: bool = True):
+        self.read_line = read_line
+        self.threaded_input = threaded_input
+        self._queue: queue.Queue = queue.Queue()
+        self._input_pending = False
+        self._timers: list = []
+        self._lock = threading.Lock()
+
+    def post(self, event_type: str, payload=None):
+        self._queue.put((event_type, payload))
+
+    def request_input(self, prompt_message: str) -> bool:
+        # Returns False if a read is already outstanding; its line will still arrive as an event.
+        with self._lock:
+            if self._input_pending:
+                return False
+            self._input_pending = True
+        if not self.threaded_input:
+            self._read_line(prompt_message)
+            return True
+        threading.Thread(target=self._read_line, args=(prompt_message,), name="game-input", daemon=True).start()
+        return True
+
+    def _read_line(self, prompt_message: str):
+        try:
+            # Looked up at call time so patched builtins.input still applies
+            line = self.read_line(prompt_message) if self.read_line else input(prompt_message)
+            event = (PLAYER_INPUT, line)
+        except EOFError:
+            event = (INPUT_EOF, None)
+        with self._lock:
+            self._input_pending = False
+        self._queue.put(event)
+
+    def input_pending(self) -> bool:
+        with self._lock:
+            return self._input_pending
+
+    def call_later(self, delay_s: float, payload=None) -> threading.Timer:
+        timer = threading.Timer(delay_s, self.post, args=(TIMER, payload))
+        timer.daemon = True
+        with self._lock:
+            self._timers = [t for t in self._timers if t.is_alive()]
+            self._timers.append(timer)
+        timer.start()
+        return timer
+
+    def cancel_timers(self):
+        with self._lock:
+            timers, self._timers = self._timers, []
+        for timer in timers:
+            timer.cancel()
+
+    def get(self, timeout: float | None = None) -> tuple | None:
+        # Blocks until the next event; None only if a timeout was given and nothing arrived.
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self) -> list:
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
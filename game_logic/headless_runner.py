@@ -0,0 +1,263 @@
+import os
+import time
+import random
+import argparse
+import functools
+import contextlib
+import tracemalloc
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.llm_cassette import LLMCassette
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from ui.headless_ui import HeadlessUIManager
+from game_logic.game_controller import GameController
+
+# Headless sessions for throughput benchmarking: a scripted or random-policy command stream drives a full
+# GameController session through HeadlessUIManager, as fast as the backend allows.
+# Run as: python -m game_logic.headless_runner [--turns N] [--seed S] [--sessions K]
+
+# Timed GameController methods; nested phases overlap (an 'action' includes its 'action_llm').
+PHASE_METHODS = {
+    'setup': 'generate_world_flow',
+    'scene': 'initiate_scene',
+    'action': 'process_player_action',
+    'action_prompt': '_build_action_prompt',
+    'action_llm': '_generate_action_outcome',
+    'action_image': '_attach_action_image',
+    'action_apply': '_apply_action_outcome',
+    'dialogue': 'handle_npc_dialogue',
+    'combat': 'combat_loop',
+    'puzzle': 'evaluate_environmental_puzzle_action',
+    'menu': 'handle_game_menu',
+}
+
+# Answers for the setup prompts and menus a policy is not really choosing in.
+DEFAULT_ANSWERS = {
+    'api_key': "headless-session-key",
+    'model_choice': "1",
+    'preference': "A fog-bound coastal town with a lighthouse that keeps the dead away",
+    'continue': "",
+    'menu': "0",
+    'codex': "0",
+}
+
+
+class ScriptedPolicy:
+    # Plays back a fixed list of lines in order for the prompts a player actually decides on; setup
+    # prompts and 'continue' are answered from answers without using a line.
+    SCRIPTED_KINDS = ('command', 'choice', 'free_text', 'menu', 'codex')
+
+    def __init__(self, lines: list, answers: dict | None = None):
+        self._lines = iter(lines)
+        self.answers = dict(DEFAULT_ANSWERS, **(answers or {}))
+
+    def next_line(self, kind: str, prompt_message: str, choices: list) -> str:
+        if kind not in self.SCRIPTED_KINDS:
+            return self.answers.get(kind, "")
+        try:
+            return next(self._lines)
+        except StopIteration:
+            raise EOFError("script exhausted")
+
+
+class RandomPolicy:
+    # Picks uniformly among the offered choices, opens the game menu now and then, says a few lines in
+    # each dialogue before leaving, and stops after max_commands game loop commands.
+    def __init__(self, seed: int | None = None, max_commands: int = 1000, menu_rate: float = 0.02,
+                 dialogue_replies: int = 1, answers: dict | None = None):
+        self.rng = random.Random(seed)
+        self.max_commands = max_commands
+        self.menu_rate = menu_rate
+        self.dialogue_replies = dialogue_replies
+        self.answers = dict(DEFAULT_ANSWERS, **(answers or {}))
+        self.commands = 0
+        self._replies_in_dialogue = 0
+
+    def next_line(self, kind: str, prompt_message: str, choices: list) -> str:
+        if kind == 'command':
+            if self.commands >= self.max_commands:
+                raise EOFError("command budget used up")
+            self.commands += 1
+            if not choices or self.rng.random() < self.menu_rate:
+                return "m"
+            return str(self.rng.randint(1, len(choices)))
+        if kind == 'choice':
+            return str(self.rng.randint(1, len(choices))) if choices else "1"
+        if kind == 'free_text':
+            if self._replies_in_dialogue >= self.dialogue_replies:
+                self._replies_in_dialogue = 0
+                return "/bye"
+            self._replies_in_dialogue += 1
+            return "Tell me more."
+        return self.answers.get(kind, "")
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def latency_summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {'count': len(ordered), 'p50_ms': percentile(ordered, 0.5) * 1000, 'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000, 'max_ms': ordered[-1] * 1000 if ordered else 0.0}
+
+
+def build_headless_controller(ui_manager: HeadlessUIManager, cassette: LLMCassette | None = None, **controller_kwargs) -> GameController:
+    # A fresh stack on the built-in mock backend (or a cassette recording/replaying it); optional
+    # subsystems go in controller_kwargs.
+    api_key_manager = ApiKeyManager()
+    llm_interface = LLMInterface(api_key_manager, cassette=cassette)
+    model_selector = ModelSelector(api_key_manager)
+    adventure_setup = AdventureSetup(ui_manager, llm_interface, model_selector)
+    return GameController(api_key_manager, ui_manager, model_selector, adventure_setup, GWHR(), llm_interface, **controller_kwargs)
+
+
+class HeadlessSessionRunner:
+    def __init__(self, controller_factory=build_headless_controller, quiet: bool = True, track_memory: bool = True,
+                 memory_sample_every: int = 500, restart_on_game_over: bool = True):
+        self.controller_factory = controller_factory
+        self.quiet = quiet # Send the game's console output to os.devnull while a session runs
+        self.track_memory = track_memory # tracemalloc roughly halves throughput; turn off for pure speed runs
+        self.memory_sample_every = memory_sample_every
+        self.restart_on_game_over = restart_on_game_over # Restart from the opening scene, same world, same GWHR
+
+    def _instrument(self, controller: GameController, timings: dict):
+        for phase, method_name in PHASE_METHODS.items():
+            method = getattr(controller, method_name, None)
+            if method is None:
+                continue
+            samples = timings.setdefault(phase, [])
+            @functools.wraps(method)
+            def timed(*args, _method=method, _samples=samples, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    _samples.append(time.perf_counter() - started)
+            setattr(controller, method_name, timed)
+
+    def run(self, policy) -> dict:
+        timings: dict[str, list] = {}
+        memory_samples: list = []
+        command_times: list = [] # When each game loop command was asked for; the gaps are turn latencies
+        controller_holder = []
+
+        def on_command(command_count: int):
+            command_times.append(time.perf_counter())
+            if self.track_memory and command_count % self.memory_sample_every == 0 and controller_holder:
+                data_store = controller_holder[0].gwhr.data_store
+                memory_samples.append({'turn': command_count, 'traced_bytes': tracemalloc.get_traced_memory()[0],
+                                       'event_log': len(data_store.get('event_log', [])),
+                                       'scene_history': len(data_store.get('scene_history', []))})
+
+        ui_manager = HeadlessUIManager(policy, on_command=on_command)
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        end_reason = None
+        session_started = time.perf_counter()
+        loop_started = None
+        with open(os.devnull, 'w') as devnull, contextlib.ExitStack() as stack:
+            if self.quiet:
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            controller = self.controller_factory(ui_manager)
+            controller_holder.append(controller)
+            self._instrument(controller, timings)
+            try:
+                if not (controller.request_and_validate_api_key() and controller.select_model_flow()
+                        and controller.request_adventure_preferences_flow() and controller.generate_world_flow()):
+                    end_reason = 'setup_failed'
+                else:
+                    loop_started = time.perf_counter()
+                    while end_reason is None:
+                        lines_before = sum(ui_manager.lines_by_kind.values())
+                        controller.start_game()
+                        # A pass that read nothing (e.g. the opening scene failed to generate) would repeat forever.
+                        if sum(ui_manager.lines_by_kind.values()) == lines_before or controller.current_game_state != "GAME_OVER":
+                            end_reason = 'start_failed'
+                        elif not self.restart_on_game_over:
+                            end_reason = 'game_over'
+            except EOFError:
+                end_reason = 'policy_finished'
+            finally:
+                if controller.action_prefetcher:
+                    controller.action_prefetcher.cancel_all()
+        ended = time.perf_counter()
+        if self.track_memory:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        turns = ui_manager.command_count
+        loop_elapsed_s = ended - loop_started if loop_started else 0.0
+        report = {
+            'turns': turns,
+            'end_reason': end_reason,
+            'elapsed_s': ended - session_started,
+            'loop_elapsed_s': loop_elapsed_s,
+            'turns_per_s': turns / loop_elapsed_s if loop_elapsed_s > 0 else 0.0,
+            'lines_by_kind': dict(ui_manager.lines_by_kind),
+            'phases': {},
+        }
+        # Input to next input, so everything a command costs (outcome, image, time-based events) counts once
+        turn_latencies = [later - earlier for earlier, later in zip(command_times, command_times[1:])]
+        report['turn_latency'] = dict(latency_summary(turn_latencies), samples_s=turn_latencies)
+        for phase, samples in timings.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            report['phases'][phase] = {
+                'calls': len(ordered), 'total_s': sum(ordered),
+                'p50_ms': percentile(ordered, 0.5) * 1000, 'p90_ms': percentile(ordered, 0.9) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000, 'max_ms': ordered[-1] * 1000,
+            }
+        if self.track_memory:
+            baseline = memory_samples[0]['traced_bytes'] if memory_samples else current_bytes
+            report['memory'] = {
+                'baseline_bytes': baseline, 'end_bytes': current_bytes, 'peak_bytes': peak_bytes,
+                'growth_bytes_per_1k_turns': (current_bytes - baseline) * 1000 / turns if turns else 0.0,
+                'samples': memory_samples,
+            }
+        return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"HeadlessSessionRunner: {report['turns']} turn(s) in {report['loop_elapsed_s']:.2f}s "
+             f"({report['turns_per_s']:.1f} turns/s), ended: {report['end_reason']}."]
+    turn_latency = report.get('turn_latency')
+    if turn_latency and turn_latency['count']:
+        lines.append(f"  {'turn':<14} {turn_latency['count']:>6} turn(s)  p50 {turn_latency['p50_ms']:8.2f} ms  "
+                     f"p95 {turn_latency['p95_ms']:8.2f} ms  p99 {turn_latency['p99_ms']:8.2f} ms  max {turn_latency['max_ms']:8.2f} ms")
+    for phase, stats in sorted(report['phases'].items(), key=lambda item: -item[1]['total_s']):
+        lines.append(f"  {phase:<14} {stats['calls']:>6} call(s)  p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms  "
+                     f"p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms")
+    memory = report.get('memory')
+    if memory:
+        lines.append(f"  memory: {memory['baseline_bytes'] / 1e6:.1f} MB -> {memory['end_bytes'] / 1e6:.1f} MB "
+                     f"(peak {memory['peak_bytes'] / 1e6:.1f} MB), {memory['growth_bytes_per_1k_turns'] / 1e3:.1f} KB per 1k turns")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless game sessions and report throughput.")
+    parser.add_argument("--turns", type=int, default=10000, help="Game loop commands per session.")
+    parser.add_argument("--sessions", type=int, default=1, help="Sessions to run one after another.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random policy.")
+    parser.add_argument("--script", help="File with one command per line instead of the random policy.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc memory tracking.")
+    args = parser.parse_args()
+
+    runner = HeadlessSessionRunner(track_memory=not args.no_memory)
+    for session_index in range(args.sessions):
+        if args.script:
+            with open(args.script, 'r', encoding='utf-8') as f:
+                policy = ScriptedPolicy([line.rstrip("\n") for line in f])
+        else:
+            seed = None if args.seed is None else args.seed + session_index
+            policy = RandomPolicy(seed=seed, max_commands=args.turns)
+        print(format_report(runner.run(policy)))
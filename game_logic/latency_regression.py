@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import argparse
+import functools
+import threading
+from api.llm_cassette import LLMCassette
+from game_logic.headless_runner import HeadlessSessionRunner, RandomPolicy, build_headless_controller, latency_summary
+
+# Turn latency regression check on recorded sessions. A cassette is recorded once (against the mock or a
+# real backend); every later run replays the same seeded sessions from it, so the LLM's share of each turn
+# is the recorded latency and any change in turn p50/p95 comes from the local code. A run is compared
+# with a saved baseline and fails when a percentile grew by more than the threshold.
+# Run as:
+#   python -m game_logic.latency_regression --record .cache/latency/cassette.json
+#   python -m game_logic.latency_regression --replay .cache/latency/cassette.json --write-baseline .cache/latency/baseline.json
+#   python -m game_logic.latency_regression --replay .cache/latency/cassette.json --baseline .cache/latency/baseline.json
+
+DEFAULT_SEEDS = (101, 202, 303)
+DEFAULT_TURNS = 300
+CHECKED_PERCENTILES = ('p50_ms', 'p95_ms')
+
+
+def run_sessions(cassette: LLMCassette, seeds=DEFAULT_SEEDS, turns: int = DEFAULT_TURNS) -> dict:
+    # Plays one RandomPolicy session per seed through the cassette; turn latencies are pooled over all of them.
+    runner = HeadlessSessionRunner(controller_factory=functools.partial(build_headless_controller, cassette=cassette),
+                                   track_memory=False)
+    samples = []
+    turns_played = 0
+    for seed in seeds:
+        report = runner.run(RandomPolicy(seed=seed, max_commands=turns))
+        samples.extend(report['turn_latency']['samples_s'])
+        turns_played += report['turns']
+    return {'seeds': list(seeds), 'turns': turns_played, 'turn_latency': latency_summary(samples),
+            'cassette': cassette.get_stats()}
+
+
+def record_cassette(path: str, seeds=DEFAULT_SEEDS, turns: int = DEFAULT_TURNS) -> dict:
+    cassette = LLMCassette(path, mode='record')
+    result = run_sessions(cassette, seeds, turns)
+    cassette.save()
+    return result
+
+
+def replay_cassette(path: str, seeds=DEFAULT_SEEDS, turns: int = DEFAULT_TURNS, latency_scale: float = 1.0) -> dict:
+    return run_sessions(LLMCassette(path, mode='replay', latency_scale=latency_scale), seeds, turns)
+
+
+def compare_latency(baseline: dict, current: dict, threshold: float = 0.2, min_delta_ms: float = 1.0) -> list:
+    # Regressions as messages, empty when current is within threshold (a fraction) of baseline. Growth under
+    # min_delta_ms is ignored, so sub-millisecond turns do not fail on scheduler noise.
+    regressions = []
+    for name in CHECKED_PERCENTILES:
+        before = baseline['turn_latency'][name]
+        after = current['turn_latency'][name]
+        if after > before * (1 + threshold) and after - before > min_delta_ms:
+            regressions.append(f"turn {name[:-3]} {before:.2f} ms -> {after:.2f} ms (+{(after / before - 1) * 100 if before else float('inf'):.0f}%, "
+                               f"threshold {threshold * 100:.0f}%)")
+    if current['cassette'].get('misses'):
+        regressions.append(f"{current['cassette']['misses']} request(s) missing from the cassette; re-record it")
+    return regressions
+
+
+def write_json(path: str, data: dict):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def format_result(result: dict) -> str:
+    latency = result['turn_latency']
+    return (f"{result['turns']} turn(s) over seeds {result['seeds']}: turn p50 {latency['p50_ms']:.2f} ms, "
+            f"p95 {latency['p95_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms, max {latency['max_ms']:.2f} ms; "
+            f"cassette: {result['cassette']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay LLM cassettes and check turn latency against a baseline.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--record", metavar="CASSETTE", help="Play the sessions on the backend and record a cassette.")
+    mode.add_argument("--replay", metavar="CASSETTE", help="Play the sessions from a recorded cassette.")
+    parser.add_argument("--baseline", help="Baseline result to compare the replay with; exits 1 on regression.")
+    parser.add_argument("--write-baseline", metavar="PATH", help="Save this replay's result as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p50/p95 growth as a fraction (0.2 = 20%%).")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore growth smaller than this.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies on replay.")
+    parser.add_argument("--seeds", type=int, nargs="+", default=list(DEFAULT_SEEDS), help="One session per seed.")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="Game loop commands per session.")
+    args = parser.parse_args()
+
+    if args.record:
+        print(f"Recorded: {format_result(record_cassette(args.record, args.seeds, args.turns))}")
+        sys.exit(0)
+    result = replay_cassette(args.replay, args.seeds, args.turns, args.latency_scale)
+    print(f"Replayed: {format_result(result)}")
+    if args.write_baseline:
+        write_json(args.write_baseline, result)
+        print(f"Baseline written to '{args.write_baseline}'.")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_latency(baseline, result, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No turn latency regression against '{args.baseline}' (p50 {baseline['turn_latency']['p50_ms']:.2f} ms, "
+              f"p95 {baseline['turn_latency']['p95_ms']:.2f} ms).")
@@ -0,0 +1,498 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import asyncio
+import argparse
+import threading
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from ui.server_ui import ServerUIManager
+from game_logic.game_controller import GameController
+
+# Multi-session game server: one asyncio HTTP endpoint hosting many independent GameController sessions,
+# each with its own GWHR, all sharing one LLMInterface. GameController is blocking, so every live session
+# runs on its own thread and parks in ServerUIManager.read_line between turns; the event loop only routes
+# lines and replies. Idle sessions are evicted to disk (GWHR data store + model) and restored on demand,
+# which keeps the number of live threads bounded by max_live_sessions rather than by players.
+# Run as: python -m game_logic.session_server [--port 8765] [--idle-timeout 300] [--max-live 1000]
+#
+#   POST   /sessions               {"preference": "..."}  -> 201, output of world setup and the first scene
+#   POST   /sessions/<id>/input    {"line": "1"}          -> 200, output of the turn; 429 when the session's queue is full
+#   GET    /sessions/<id>                                 -> session status
+#   DELETE /sessions/<id>                                 -> close the session and drop its saved state
+#   GET    /stats                                         -> server counters
+
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                410: "Gone", 413: "Payload Too Large", 429: "Too Many Requests", 503: "Service Unavailable",
+                504: "Gateway Timeout"}
+MAX_BODY_BYTES = 64 * 1024
+
+
+class _SessionStdout:
+    # Routes print() from session threads into that session's output; every other thread writes through.
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._local = threading.local()
+
+    def bind(self, sink: list | None):
+        self._local.sink = sink
+
+    def write(self, text: str) -> int:
+        sink = getattr(self._local, 'sink', None)
+        if sink is None:
+            return self.fallback.write(text)
+        sink.append(text)
+        return len(text)
+
+    def flush(self):
+        self.fallback.flush()
+
+
+def build_server_controller(ui_manager: ServerUIManager, llm_interface: LLMInterface, api_key_manager: ApiKeyManager,
+                            **controller_kwargs) -> GameController:
+    # Per-session GWHR, model selection and setup; the LLM interface and key manager are shared.
+    model_selector = ModelSelector(api_key_manager)
+    adventure_setup = AdventureSetup(ui_manager, llm_interface, model_selector)
+    return GameController(api_key_manager, ui_manager, model_selector, adventure_setup, GWHR(), llm_interface, **controller_kwargs)
+
+
+class SessionHttpEndpoint:
+    # Minimal HTTP/1.1 + JSON front end over create_session, send_line, close_session, session_status and
+    # get_stats; shared by SessionServer and the sharded router so both speak the same protocol.
+    async def listen(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"{type(self).__name__}: Listening on {', '.join(str(s.getsockname()) for s in self._server.sockets)}.")
+        return self._server
+
+    async def handle_request(self, method: str, path: str, body: dict) -> tuple[int, dict]:
+        self.stats['requests'] += 1
+        parts = [p for p in path.split('?', 1)[0].split('/') if p]
+        if parts == ['stats'] and method == 'GET':
+            return 200, self.get_stats()
+        if parts == ['sessions'] and method == 'POST':
+            return await self.create_session(body.get('preference'))
+        if len(parts) == 3 and parts[0] == 'sessions' and parts[2] == 'input' and method == 'POST':
+            line = body.get('line')
+            if not isinstance(line, str):
+                return 400, {'error': "Body must be a JSON object with a string 'line'."}
+            return await self.send_line(parts[1], line)
+        if len(parts) == 2 and parts[0] == 'sessions':
+            if method == 'DELETE':
+                return (200, {'closed': True}) if await self.close_session(parts[1]) else (404, {'error': "Unknown session."})
+            if method == 'GET':
+                status = await self.session_status(parts[1])
+                return (200, status) if status else (404, {'error': "Unknown session."})
+        if parts and parts[0] in ('sessions', 'stats'):
+            return 405, {'error': f"{method} is not supported on {path}."}
+        return 404, {'error': f"No route for {path}."}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True: # HTTP/1.1 keep-alive: one request after another on the same connection
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header_line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, path, _ = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    status, payload, length = 400, {'error': "Malformed request."}, 0
+                else:
+                    status, payload = None, None
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': f"Bodies are limited to {MAX_BODY_BYTES} bytes."}
+                    length = 0
+                raw_body = await reader.readexactly(length) if length else b""
+                if status is None:
+                    try:
+                        body = json.loads(raw_body) if raw_body else {}
+                        if not isinstance(body, dict):
+                            raise ValueError("not an object")
+                    except ValueError:
+                        status, payload = 400, {'error': "Body must be a JSON object."}
+                    else:
+                        status, payload = await self.handle_request(method.upper(), path, body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close' and status != 413
+                writer.write((f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class GameSession:
+    def __init__(self, session_id: str, controller: GameController, ui_manager: ServerUIManager):
+        self.session_id = session_id
+        self.controller = controller
+        self.ui_manager = ui_manager
+        self.thread: threading.Thread | None = None
+        self.in_flight = 0 # Lines submitted and not yet answered
+        self.turns = 0
+        self.last_active = time.monotonic()
+        self.end_reason: str | None = None # Set by the session thread when the controller returns
+
+
+class SessionServer(SessionHttpEndpoint):
+    def __init__(self, llm_interface: LLMInterface | None = None, api_key_manager: ApiKeyManager | None = None,
+                 controller_factory=build_server_controller, api_key: str = "session-server-key",
+                 default_preference: str = "A fog-bound coastal town with a lighthouse that keeps the dead away",
+                 eviction_dir: str = ".cache/sessions", idle_timeout_s: float = 300.0, max_live_sessions: int = 1000,
+                 max_pending_per_session: int = 4, turn_timeout_s: float = 60.0, sweep_interval_s: float = 5.0,
+                 capture_output: bool = True, controller_kwargs: dict | None = None):
+        self.api_key_manager = api_key_manager if api_key_manager is not None else ApiKeyManager()
+        self.llm_interface = llm_interface if llm_interface is not None else LLMInterface(self.api_key_manager)
+        self.controller_factory = controller_factory
+        self.api_key = api_key
+        self.default_preference = default_preference
+        self.eviction_dir = eviction_dir
+        self.idle_timeout_s = idle_timeout_s
+        self.max_live_sessions = max_live_sessions
+        self.max_pending_per_session = max_pending_per_session # Per-session backpressure: further lines get 429
+        self.turn_timeout_s = turn_timeout_s # A request stops waiting (504) but the turn keeps running
+        self.sweep_interval_s = sweep_interval_s
+        self.capture_output = capture_output # Return each session's console output with its replies
+        self.controller_kwargs = dict(controller_kwargs or {})
+        self.sessions: dict[str, GameSession] = {} # Live sessions only; evicted ones live in eviction_dir
+        self._transitions: dict[str, asyncio.Future] = {} # Sessions being evicted or restored
+        self._server: asyncio.AbstractServer | None = None
+        self._sweeper: asyncio.Task | None = None
+        self._stdout: _SessionStdout | None = None
+        self.stats = {'created': 0, 'restored': 0, 'evicted': 0, 'closed': 0, 'exported': 0,
+                      'lines': 0, 'rejected': 0, 'timeouts': 0, 'requests': 0}
+
+    # --- Session lifecycle (event loop thread only) ---
+
+    def _session_path(self, session_id: str) -> str:
+        return os.path.join(self.eviction_dir, f"{session_id}.json")
+
+    def _new_session(self, session_id: str, preference: str | None) -> GameSession:
+        answers = {'api_key': self.api_key, 'model_choice': "1", 'preference': preference or self.default_preference, 'continue': ""}
+        ui_manager = ServerUIManager(answers=answers, max_pending=self.max_pending_per_session)
+        controller = self.controller_factory(ui_manager, self.llm_interface, self.api_key_manager, **self.controller_kwargs)
+        return GameSession(session_id, controller, ui_manager)
+
+    def _start_thread(self, session: GameSession, resume: bool):
+        session.thread = threading.Thread(target=self._run_session, args=(session, resume),
+                                          name=f"session-{session.session_id[:8]}", daemon=True)
+        session.thread.start()
+
+    def _run_session(self, session: GameSession, resume: bool):
+        self.llm_interface.set_session(session.session_id) # Token accounting per session (a ContextVar, so per thread)
+        if self._stdout:
+            self._stdout.bind(session.ui_manager.output)
+        controller = session.controller
+        end_reason = 'game_over'
+        try:
+            if resume:
+                controller.current_game_state = "AWAITING_PLAYER_ACTION" # Back to the saved scene
+                controller.game_loop()
+            elif not (controller.request_and_validate_api_key() and controller.select_model_flow()
+                      and controller.request_adventure_preferences_flow() and controller.generate_world_flow()):
+                end_reason = 'setup_failed'
+            else:
+                controller.start_game()
+        except EOFError:
+            end_reason = 'closed'
+        except Exception as e:
+            print(f"SessionServer: Error - Session '{session.session_id}' stopped: {e}")
+            end_reason = 'error'
+        finally:
+            if controller.action_prefetcher:
+                controller.action_prefetcher.cancel_all()
+            if self._stdout:
+                self._stdout.bind(None)
+            session.end_reason = end_reason
+            final = {'ended': True, 'end_reason': end_reason, 'scene': session.ui_manager.last_scene}
+            session.ui_manager.finish_turn(final)
+            while True: # Lines queued behind the end get the same answer
+                try:
+                    _, reply = session.ui_manager.inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if reply:
+                    reply(dict(final, output=""))
+
+    def _reply_callback(self, session: GameSession, future: asyncio.Future):
+        loop = asyncio.get_running_loop()
+        def deliver(result: dict):
+            session.in_flight -= 1
+            session.last_active = time.monotonic()
+            if not future.done():
+                future.set_result(result)
+        return lambda result: loop.call_soon_threadsafe(deliver, result)
+
+    async def _await_reply(self, future: asyncio.Future) -> tuple[int, dict]:
+        try:
+            return 200, await asyncio.wait_for(asyncio.shield(future), self.turn_timeout_s)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            return 504, {'error': "The turn is still running; its output will come with the next reply."}
+
+    async def _make_room(self) -> bool:
+        # Evicts least recently used idle sessions until a new one fits.
+        while len(self.sessions) >= self.max_live_sessions:
+            idle = [s for s in self.sessions.values() if not s.in_flight]
+            if not idle:
+                return False
+            await self.evict(min(idle, key=lambda s: s.last_active).session_id)
+        return True
+
+    async def create_session(self, preference: str | None = None, session_id: str | None = None) -> tuple[int, dict]:
+        # session_id lets a front router pick the id it routes by; it must look like one of ours.
+        if session_id is not None and (not SESSION_ID_PATTERN.match(session_id) or session_id in self.sessions):
+            return 400, {'error': "Invalid or duplicate session id."}
+        if not await self._make_room():
+            self.stats['rejected'] += 1
+            return 503, {'error': "Every live session is busy."}
+        session = self._new_session(session_id or uuid.uuid4().hex, preference)
+        future = asyncio.get_running_loop().create_future()
+        session.ui_manager._reply = self._reply_callback(session, future) # Answered when setup first asks for input
+        session.in_flight = 1
+        self.sessions[session.session_id] = session
+        self.stats['created'] += 1
+        self._start_thread(session, resume=False)
+        status, result = await self._await_reply(future)
+        result['session_id'] = session.session_id
+        return (201 if status == 200 else status), result
+
+    def _read_saved_session(self, session_id: str) -> dict | None:
+        try:
+            with open(self._session_path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"SessionServer: Ignoring unreadable session file for '{session_id}': {e}")
+            return None
+
+    def _session_snapshot(self, session: GameSession) -> dict:
+        # Everything needed to resume a stopped session elsewhere; the GWHR store is the game state.
+        return {'session_id': session.session_id, 'turns': session.turns,
+                'model_id': session.controller.model_selector.get_selected_model(),
+                'data_store': session.controller.gwhr.data_store}
+
+    def _write_saved_session(self, session: GameSession):
+        os.makedirs(self.eviction_dir, exist_ok=True)
+        path = self._session_path(session.session_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        saved = self._session_snapshot(session)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"SessionServer: Could not save session '{session.session_id}': {e}")
+
+    def _remove_saved_session(self, session_id: str):
+        try:
+            os.remove(self._session_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _resume_session(self, saved: dict) -> GameSession:
+        session = self._new_session(saved['session_id'], None)
+        session.turns = saved.get('turns', 0)
+        session.controller.gwhr.restore(saved['data_store'])
+        session.controller.model_selector.set_selected_model(saved.get('model_id'))
+        self.sessions[session.session_id] = session
+        self.stats['restored'] += 1
+        self._start_thread(session, resume=True)
+        return session
+
+    async def _get_session(self, session_id: str) -> GameSession | None:
+        # The live session, restored from disk if it was evicted.
+        while session_id in self._transitions:
+            await asyncio.shield(self._transitions[session_id])
+        session = self.sessions.get(session_id)
+        if session or not SESSION_ID_PATTERN.match(session_id):
+            return session
+        done = asyncio.get_running_loop().create_future()
+        self._transitions[session_id] = done
+        try:
+            saved = await asyncio.to_thread(self._read_saved_session, session_id)
+            if not saved or not await self._make_room():
+                return None
+            return self._resume_session(saved)
+        finally:
+            del self._transitions[session_id]
+            done.set_result(None)
+
+    async def _stop_session(self, session: GameSession, keep_state: bool) -> dict | None:
+        # Ends the session thread, then saves (evict) or forgets (close) its state. Returns the snapshot of
+        # a session that was still playable.
+        del self.sessions[session.session_id]
+        done = asyncio.get_running_loop().create_future()
+        self._transitions[session.session_id] = done
+        try:
+            if session.thread.is_alive(): # Queued lines are played first; the session then reads the close
+                await asyncio.to_thread(session.ui_manager.inbox.put, (None, None))
+            await asyncio.to_thread(session.thread.join)
+            if keep_state and session.end_reason == 'closed':
+                await asyncio.to_thread(self._write_saved_session, session)
+            else:
+                await asyncio.to_thread(self._remove_saved_session, session.session_id)
+        finally:
+            del self._transitions[session.session_id]
+            done.set_result(None)
+        return self._session_snapshot(session) if session.end_reason == 'closed' else None
+
+    async def evict(self, session_id: str) -> bool:
+        session = self.sessions.get(session_id)
+        if not session or session.in_flight:
+            return False
+        await self._stop_session(session, keep_state=session.end_reason is None)
+        self.stats['evicted'] += 1
+        return True
+
+    async def close_session(self, session_id: str) -> bool:
+        session = await self._get_session(session_id)
+        if not session:
+            return False
+        await self._stop_session(session, keep_state=False)
+        self.stats['closed'] += 1
+        return True
+
+    async def export_session(self, session_id: str) -> dict | None:
+        # Hands a session over to another server: queued lines finish here, then the snapshot leaves and
+        # nothing of the session is kept (live or on disk). None if there is no playable session.
+        while session_id in self._transitions:
+            await asyncio.shield(self._transitions[session_id])
+        session = self.sessions.get(session_id)
+        if session:
+            self.stats['exported'] += 1
+            return await self._stop_session(session, keep_state=False)
+        if not SESSION_ID_PATTERN.match(session_id):
+            return None
+        saved = await asyncio.to_thread(self._read_saved_session, session_id)
+        if saved:
+            await asyncio.to_thread(self._remove_saved_session, session_id)
+            self.stats['exported'] += 1
+        return saved
+
+    async def import_session(self, saved: dict) -> bool:
+        # Takes over a snapshot from export_session and resumes it live.
+        session_id = saved.get('session_id', '')
+        if not SESSION_ID_PATTERN.match(session_id) or 'data_store' not in saved:
+            return False
+        while session_id in self._transitions:
+            await asyncio.shield(self._transitions[session_id])
+        if session_id in self.sessions or not await self._make_room():
+            return False
+        self._resume_session(saved)
+        return True
+
+    async def session_status(self, session_id: str) -> dict | None:
+        session = self.sessions.get(session_id)
+        if session:
+            return {'session_id': session.session_id, 'live': True, 'turns': session.turns, 'in_flight': session.in_flight,
+                    'ended': session.end_reason is not None, 'game_time': session.controller.gwhr.data_store.get('current_game_time')}
+        if SESSION_ID_PATTERN.match(session_id) and os.path.exists(self._session_path(session_id)):
+            return {'session_id': session_id, 'live': False}
+        return None
+
+    async def send_line(self, session_id: str, line: str) -> tuple[int, dict]:
+        session = await self._get_session(session_id)
+        if not session:
+            return 404, {'error': f"Unknown session '{session_id}'."}
+        if session.end_reason:
+            return 410, {'ended': True, 'end_reason': session.end_reason}
+        future = asyncio.get_running_loop().create_future()
+        try:
+            session.ui_manager.inbox.put_nowait((line, self._reply_callback(session, future)))
+        except queue.Full:
+            self.stats['rejected'] += 1
+            return 429, {'error': f"Session has {self.max_pending_per_session} line(s) waiting; retry later."}
+        session.in_flight += 1
+        session.turns += 1
+        self.stats['lines'] += 1
+        return await self._await_reply(future)
+
+    async def sweep_idle(self) -> int:
+        now = time.monotonic()
+        idle_ids = [s.session_id for s in self.sessions.values()
+                    if not s.in_flight and now - s.last_active >= self.idle_timeout_s]
+        evicted = 0
+        for session_id in idle_ids:
+            evicted += await self.evict(session_id)
+        return evicted
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval_s)
+            evicted = await self.sweep_idle()
+            if evicted:
+                print(f"SessionServer: Evicted {evicted} idle session(s) to '{self.eviction_dir}'.")
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats['live_sessions'] = len(self.sessions)
+        stats['busy_sessions'] = sum(1 for s in self.sessions.values() if s.in_flight)
+        return stats
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, listen: bool = True) -> asyncio.AbstractServer | None:
+        # listen=False runs sessions without the HTTP endpoint (e.g. inside a shard worker process).
+        if self.capture_output and not isinstance(sys.stdout, _SessionStdout):
+            self._stdout = _SessionStdout(sys.stdout)
+            sys.stdout = self._stdout
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+        return await self.listen(host, port) if listen else None
+
+    async def stop(self):
+        # Live sessions are evicted, not lost: a restarted server picks them up from eviction_dir.
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for session_id in list(self.sessions):
+            session = self.sessions.get(session_id)
+            if session:
+                await self._stop_session(session, keep_state=session.end_reason is None)
+        if self._stdout and sys.stdout is self._stdout:
+            sys.stdout = self._stdout.fallback
+        self._stdout = None
+
+
+async def _serve(args):
+    server = SessionServer(eviction_dir=args.eviction_dir, idle_timeout_s=args.idle_timeout, max_live_sessions=args.max_live,
+                           max_pending_per_session=args.max_pending)
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host many game sessions over HTTP on the simulated LLM backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--eviction-dir", default=".cache/sessions", help="Where idle sessions are saved.")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="Seconds before an idle session is evicted.")
+    parser.add_argument("--max-live", type=int, default=1000, help="Live sessions (threads) before the least recent is evicted.")
+    parser.add_argument("--max-pending", type=int, default=4, help="Lines a session may have queued before 429.")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
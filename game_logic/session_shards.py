@@ -0,0 +1,378 @@
+import os
+import sys
+import time
+import uuid
+import bisect
+import asyncio
+import hashlib
+import argparse
+import itertools
+import tempfile
+import threading
+import multiprocessing
+from game_logic.session_server import SessionServer, SessionHttpEndpoint
+from game_logic.headless_runner import RandomPolicy
+
+# Sharded deployment of the session server: N worker processes each run a SessionServer (no HTTP) for
+# the sessions the front router hashes onto them, so GWHR copies, JSON and prompt building for different
+# sessions run on different cores. The router speaks the same HTTP protocol as SessionServer, routes by
+# consistent hashing of the session id (sticky: a session only moves when the ring changes), and on a
+# rebalance moves each affected session as a GWHR snapshot (export on the old worker, import on the new).
+# Evicted sessions live in one shared eviction_dir, so whichever worker owns them can restore them.
+# Run as: python -m game_logic.session_shards [--workers N] [--port 8765]
+#     or: python -m game_logic.session_shards --bench [--workers 1 2 4] [--sessions 32] [--turns 50]
+
+
+class ConsistentHashRing:
+    def __init__(self, nodes=(), replicas: int = 128):
+        self.replicas = replicas # Virtual points per node; more points, more even spread
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self.nodes: set[str] = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def add_node(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+# --- Worker process ---
+
+def _shard_worker_main(conn, server_kwargs: dict, quiet: bool):
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    asyncio.run(_serve_shard(conn, server_kwargs))
+
+
+async def _serve_shard(conn, server_kwargs: dict):
+    # Requests arrive as (request_id, op, args) and are answered with (request_id, result), in completion
+    # order; a reader thread feeds them to the loop so slow turns never block other sessions' requests.
+    server = SessionServer(**server_kwargs)
+    await server.start(listen=False)
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+
+    async def get_stats():
+        return server.get_stats()
+
+    handlers = {'create': server.create_session, 'line': server.send_line, 'close': server.close_session,
+                'status': server.session_status, 'export': server.export_session, 'import': server.import_session,
+                'stats': get_stats}
+
+    async def handle(request_id: int, op: str, args: tuple):
+        try:
+            result = await handlers[op](*args)
+        except Exception as e:
+            print(f"SessionShard: Error - '{op}' failed: {e}")
+            result = None
+        conn.send((request_id, result))
+
+    def receive():
+        while True:
+            try:
+                request_id, op, args = conn.recv()
+            except (EOFError, OSError):
+                request_id, op = None, 'stop' # Router went away
+            if op == 'stop':
+                loop.call_soon_threadsafe(stopped.set_result, request_id)
+                return
+            asyncio.run_coroutine_threadsafe(handle(request_id, op, args), loop)
+
+    threading.Thread(target=receive, name="shard-receive", daemon=True).start()
+    stop_request_id = await stopped
+    await server.stop() # Live sessions are saved to the shared eviction_dir
+    if stop_request_id is not None:
+        conn.send((stop_request_id, server.get_stats()))
+    conn.close()
+
+
+class ShardWorker:
+    # Router-side handle of one worker process.
+    def __init__(self, name: str, context, server_kwargs: dict, quiet: bool):
+        self.name = name
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_shard_worker_main, args=(child_conn, server_kwargs, quiet),
+                                       name=f"shard-{name}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._pending: dict[int, tuple] = {}
+        self._request_ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._receive_loop, name=f"shard-{name}-replies", daemon=True)
+        self._reader.start()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                request_id, result = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            loop, future = self._pending.pop(request_id, (None, None))
+            if loop:
+                loop.call_soon_threadsafe(lambda f=future, r=result: f.done() or f.set_result(r))
+        for loop, future in list(self._pending.values()): # Worker died: nobody else will answer
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+        self._pending.clear()
+
+    async def call(self, op: str, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._request_ids)
+        self._pending[request_id] = (loop, future)
+        try:
+            with self._send_lock:
+                self.conn.send((request_id, op, args))
+        except (OSError, ValueError) as e:
+            self._pending.pop(request_id, None)
+            print(f"ShardedSessionRouter: Error - Worker '{self.name}' is unreachable: {e}")
+            return None
+        return await future
+
+    async def stop(self) -> dict | None:
+        stats = await self.call('stop')
+        await asyncio.to_thread(self.process.join, 30)
+        return stats
+
+
+class ShardedSessionRouter(SessionHttpEndpoint):
+    def __init__(self, num_workers: int | None = None, replicas: int = 128, eviction_dir: str = ".cache/sessions",
+                 quiet_workers: bool = True, start_method: str = 'spawn', **server_kwargs):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.server_kwargs = dict(server_kwargs, eviction_dir=eviction_dir) # Passed to every worker's SessionServer
+        self.quiet_workers = quiet_workers
+        self.context = multiprocessing.get_context(start_method) # spawn: workers never inherit the router's threads
+        self.ring = ConsistentHashRing(replicas=replicas)
+        self.workers: dict[str, ShardWorker] = {}
+        self.placement: dict[str, str] = {} # session id -> worker holding it, for the sessions this router has seen
+        self._migrations: dict[str, asyncio.Future] = {}
+        self._worker_numbers = itertools.count()
+        self._server: asyncio.AbstractServer | None = None
+        self.stats = {'requests': 0, 'rebalances': 0, 'migrated': 0, 'migration_s': 0.0}
+
+    def _spawn_worker(self) -> str:
+        name = f"w{next(self._worker_numbers)}"
+        self.workers[name] = ShardWorker(name, self.context, self.server_kwargs, self.quiet_workers)
+        self.ring.add_node(name)
+        return name
+
+    async def _owner(self, session_id: str) -> ShardWorker | None:
+        while session_id in self._migrations:
+            await asyncio.shield(self._migrations[session_id])
+        name = self.placement.get(session_id) or self.ring.node_for(session_id)
+        return self.workers.get(name)
+
+    async def _migrate(self, session_id: str, source: str, target: str) -> bool:
+        done = asyncio.get_running_loop().create_future()
+        self._migrations[session_id] = done
+        try:
+            saved = await self.workers[source].call('export', session_id)
+            if not saved:
+                self.placement.pop(session_id, None) # Ended or unknown: nothing to carry over
+                return False
+            if not await self.workers[target].call('import', saved):
+                print(f"ShardedSessionRouter: Error - Worker '{target}' refused session '{session_id}'; returning it to '{source}'.")
+                await self.workers[source].call('import', saved)
+                return False
+            self.placement[session_id] = target
+            return True
+        finally:
+            del self._migrations[session_id]
+            done.set_result(None)
+
+    async def rebalance(self) -> int:
+        # Moves every known session whose ring owner is no longer the worker holding it.
+        started = time.perf_counter()
+        moves = [(session_id, holder, self.ring.node_for(session_id)) for session_id, holder in self.placement.items()
+                 if self.ring.node_for(session_id) != holder]
+        results = await asyncio.gather(*(self._migrate(*move) for move in moves))
+        moved = sum(results)
+        self.stats['rebalances'] += 1
+        self.stats['migrated'] += moved
+        self.stats['migration_s'] += time.perf_counter() - started
+        print(f"ShardedSessionRouter: Rebalanced {moved}/{len(moves)} session(s) across {len(self.workers)} worker(s).")
+        return moved
+
+    async def add_worker(self) -> str:
+        name = self._spawn_worker()
+        await self.rebalance()
+        return name
+
+    async def remove_worker(self, name: str) -> bool:
+        if name not in self.workers or len(self.workers) == 1:
+            return False
+        self.ring.remove_node(name)
+        await self.rebalance()
+        worker = self.workers.pop(name)
+        await worker.stop()
+        return True
+
+    async def create_session(self, preference: str | None = None) -> tuple[int, dict]:
+        session_id = uuid.uuid4().hex
+        worker = await self._owner(session_id)
+        result = await worker.call('create', preference, session_id)
+        if result is None:
+            return 503, {'error': f"Worker '{worker.name}' is unavailable."}
+        status, reply = result
+        if status == 201:
+            self.placement[session_id] = worker.name
+        return status, reply
+
+    async def send_line(self, session_id: str, line: str) -> tuple[int, dict]:
+        worker = await self._owner(session_id)
+        result = await worker.call('line', session_id, line) if worker else None
+        if result is None:
+            return 503, {'error': "The session's worker is unavailable."}
+        status, reply = result
+        if status == 404:
+            self.placement.pop(session_id, None)
+        else:
+            self.placement.setdefault(session_id, worker.name) # Restored from eviction_dir by its ring owner
+        return status, reply
+
+    async def close_session(self, session_id: str) -> bool:
+        worker = await self._owner(session_id)
+        self.placement.pop(session_id, None)
+        return bool(worker and await worker.call('close', session_id))
+
+    async def session_status(self, session_id: str) -> dict | None:
+        worker = await self._owner(session_id)
+        status = await worker.call('status', session_id) if worker else None
+        return dict(status, worker=worker.name) if status else None
+
+    async def get_worker_stats(self) -> dict:
+        names = list(self.workers)
+        results = await asyncio.gather(*(self.workers[name].call('stats') for name in names))
+        return dict(zip(names, results))
+
+    async def get_stats_async(self) -> dict:
+        per_worker = await self.get_worker_stats()
+        stats = dict(self.stats, workers=len(self.workers), known_sessions=len(self.placement), per_worker=per_worker)
+        for key in ('live_sessions', 'lines', 'created', 'restored', 'evicted', 'rejected'):
+            stats[key] = sum((worker_stats or {}).get(key, 0) for worker_stats in per_worker.values())
+        return stats
+
+    def get_stats(self) -> dict:
+        # Router-side counters only; worker totals need a round trip (get_stats_async, and GET /stats).
+        return dict(self.stats, workers=len(self.workers), known_sessions=len(self.placement))
+
+    async def handle_request(self, method: str, path: str, body: dict) -> tuple[int, dict]:
+        if method == 'GET' and path.split('?', 1)[0].strip('/') == 'stats':
+            self.stats['requests'] += 1
+            return 200, await self.get_stats_async()
+        return await super().handle_request(method, path, body)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, listen: bool = True) -> asyncio.AbstractServer | None:
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+        return await self.listen(host, port) if listen else None
+
+    async def stop(self) -> dict:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        workers, self.workers = self.workers, {}
+        final = await asyncio.gather(*(worker.stop() for worker in workers.values()))
+        return dict(zip(workers, final))
+
+
+async def drive_session(router, session_id: str, first_reply: dict, policy) -> int:
+    # Plays one session until the policy stops or the game ends; returns the lines answered.
+    reply, answered = first_reply, 0
+    while not reply.get('ended'):
+        try:
+            line = policy.next_line(reply.get('kind', 'command'), reply.get('prompt', ""), reply.get('choices') or [])
+        except EOFError:
+            break
+        status, reply = await router.send_line(session_id, line)
+        if status != 200:
+            break
+        answered += 1
+    return answered
+
+
+async def run_scaling_benchmark(worker_counts: list, sessions: int = 32, turns: int = 50, seed: int = 0) -> list:
+    # Same random sessions at each worker count; throughput counts only replies after setup.
+    results = []
+    for workers in worker_counts:
+        router = ShardedSessionRouter(num_workers=workers, eviction_dir=tempfile.mkdtemp(prefix="shard-bench-"))
+        await router.start(listen=False)
+        try:
+            created = await asyncio.gather(*(router.create_session() for _ in range(sessions)))
+            ready = [(reply['session_id'], reply) for status, reply in created if status == 201]
+            started = time.perf_counter()
+            replies = await asyncio.gather(*(drive_session(router, session_id, reply, RandomPolicy(seed=seed + index, max_commands=turns, menu_rate=0.0))
+                                             for index, (session_id, reply) in enumerate(ready)))
+            elapsed_s = time.perf_counter() - started
+        finally:
+            await router.stop()
+        total = sum(replies)
+        results.append({'workers': workers, 'sessions': len(ready), 'replies': total, 'elapsed_s': elapsed_s,
+                        'replies_per_s': total / elapsed_s if elapsed_s > 0 else 0.0})
+    base = results[0]['replies_per_s'] / results[0]['workers'] if results and results[0]['replies_per_s'] else 0.0
+    for result in results:
+        result['speedup'] = result['replies_per_s'] / results[0]['replies_per_s'] if results[0]['replies_per_s'] else 0.0
+        result['efficiency'] = result['replies_per_s'] / (base * result['workers']) if base else 0.0
+    return results
+
+
+def format_benchmark(results: list) -> str:
+    lines = [f"Sharded session benchmark ({os.cpu_count()} CPU(s) available):"]
+    for result in results:
+        lines.append(f"  {result['workers']:>3} worker(s)  {result['sessions']:>4} session(s)  {result['replies']:>6} replies  "
+                     f"{result['replies_per_s']:8.1f} replies/s  speedup {result['speedup']:.2f}x  efficiency {result['efficiency']:.0%}")
+    return "\n".join(lines)
+
+
+async def _serve(args):
+    router = ShardedSessionRouter(num_workers=args.workers[0], eviction_dir=args.eviction_dir)
+    await router.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await router.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded multi-process session server and its scaling benchmark.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1],
+                        help="Worker processes (several values with --bench).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--eviction-dir", default=".cache/sessions")
+    parser.add_argument("--bench", action="store_true", help="Measure reply throughput at each --workers count.")
+    parser.add_argument("--sessions", type=int, default=32, help="Concurrent sessions in the benchmark.")
+    parser.add_argument("--turns", type=int, default=50, help="Commands per benchmark session.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.bench:
+        print(format_benchmark(asyncio.run(run_scaling_benchmark(args.workers, args.sessions, args.turns, args.seed))))
+    else:
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
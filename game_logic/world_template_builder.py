@@ -0,0 +1,102 @@
+import os
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from api.api_key_manager import ApiKeyManager
+from api.llm_interface import LLMInterface
+from api.prompt_assembler import PromptAssembler
+from ui.ui_manager import UIManager
+from engine.model_selector import ModelSelector
+from engine.adventure_setup import AdventureSetup
+from engine.gwhr import GWHR
+from engine.world_templates import WorldTemplateLibrary, DEFAULT_TEMPLATE_LIBRARY_DIR
+from game_logic.game_controller import GameController
+
+# Offline batch generation of the world template library that AdventureSetup matches preferences against.
+# Run as: python -m game_logic.world_template_builder --api-key <key> [--library DIR] [--workers N]
+
+DEFAULT_THEMES = [
+    "High fantasy quest through elven forests and dragon-haunted mountains",
+    "Cyberpunk megacity heist against a corrupt AI corporation",
+    "Victorian gothic horror in a fog-bound mansion with a family curse",
+    "Pirate adventure among cursed islands hunting a sunken treasure",
+    "Hard science fiction survival on a derelict generation starship",
+    "1940s noir detective mystery in a rain-soaked port city",
+    "Steampunk airship intrigue between rival sky-cities",
+    "Post-apocalyptic wasteland trek to find the last clean water source",
+    "Wuxia martial arts tale of rival sects and a stolen sword manual",
+    "Cosmic horror investigation in a remote fishing village",
+    "Lighthearted fairy-tale journey with talking animals and a lost crown",
+    "Ancient Egyptian tomb exploration full of traps and gods' riddles",
+]
+
+
+def build_template(theme: str, llm_interface: LLMInterface, model_selector: ModelSelector, ui_manager: UIManager) -> dict | None:
+    # Each theme gets its own AdventureSetup and assembler so parallel builds share no mutable state.
+    setup = AdventureSetup(ui_manager, llm_interface, model_selector, prompt_assembler=PromptAssembler())
+    setup.store_preference(theme)
+    blueprint = setup.generate_detailed_world_blueprint()
+    if not blueprint:
+        return None
+    document = setup.generate_initial_world()
+    if not document:
+        return None
+    controller = GameController(llm_interface.api_key_manager, ui_manager, model_selector, setup, GWHR(), llm_interface)
+    opening_scene = controller.pregenerate_opening_scene(document)
+    return {
+        'theme': theme,
+        'preference': theme,
+        'blueprint': blueprint,
+        'world_conception_document': document,
+        'opening_scene_id': opening_scene[0] if opening_scene else None,
+        'opening_scene_json': opening_scene[1] if opening_scene else None,
+    }
+
+
+def build_template_library(themes: list, library: WorldTemplateLibrary, llm_interface: LLMInterface,
+                           model_selector: ModelSelector, ui_manager: UIManager, max_workers: int = 4) -> list:
+    template_ids = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="template-build") as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, build_template, theme, llm_interface, model_selector, ui_manager): theme
+            for theme in themes
+        }
+        for future in as_completed(futures):
+            theme = futures[future]
+            try:
+                template = future.result()
+            except Exception as e:
+                print(f"WorldTemplateBuilder: Building '{theme}' raised {e}; skipped.")
+                continue
+            if not template:
+                print(f"WorldTemplateBuilder: Could not build a template for '{theme}'; skipped.")
+                continue
+            template_ids.append(library.add(template))
+            print(f"WorldTemplateBuilder: Stored template {len(template_ids)}/{len(themes)}: {template_ids[-1]}")
+    return template_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate world templates for instant game starts.")
+    parser.add_argument("--library", default=DEFAULT_TEMPLATE_LIBRARY_DIR, help="Template library directory.")
+    parser.add_argument("--workers", type=int, default=4, help="Themes generated in parallel.")
+    parser.add_argument("--model", default="gemini-2.5-pro-mock", help="Model used for generation.")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="API key (defaults to $GEMINI_API_KEY).")
+    parser.add_argument("--themes-file", help="Optional file with one theme per line instead of the built-in list.")
+    args = parser.parse_args()
+
+    themes = DEFAULT_THEMES
+    if args.themes_file:
+        with open(args.themes_file, 'r', encoding='utf-8') as f:
+            themes = [line.strip() for line in f if line.strip()]
+
+    api_key_manager = ApiKeyManager()
+    api_key_manager.store_api_key(args.api_key or "")
+    if not api_key_manager.validate_api_key():
+        raise SystemExit("WorldTemplateBuilder: A valid API key is required (--api-key or $GEMINI_API_KEY).")
+    llm_interface = LLMInterface(api_key_manager)
+    model_selector = ModelSelector(api_key_manager)
+    model_selector.set_selected_model(args.model)
+    library = WorldTemplateLibrary(args.library)
+    built = build_template_library(themes, library, llm_interface, model_selector, UIManager(), max_workers=args.workers)
+    print(f"WorldTemplateBuilder: Built {len(built)} of {len(themes)} template(s); library now holds {len(library)}.")
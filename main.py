@@ -7,16 +7,53 @@ from engine.adventure_setup import AdventureSetup
 # ApiKeyManager is already imported once at the top
 from api.llm_interface import LLMInterface
 from engine.gwhr import GWHR # Import GWHR
+from api.prompt_assembler import PromptAssembler
+from api.token_meter import TokenMeter
+from api.model_router import ModelRouter
+from game_logic.action_prefetcher import ActionPrefetcher
+from engine.image_cache import ImageCache
+from engine.image_pipeline import ImagePipeline
+from engine.image_similarity import MinHashIndex
+from engine.world_pipeline import WorldGenerationPipeline
+from engine.world_templates import WorldTemplateLibrary, DEFAULT_TEMPLATE_LIBRARY_DIR
+from api.response_validation import ResponseValidator
+from api.single_flight import SingleFlight
+from game_logic.combat_resolver import CombatResolver
+from game_logic.combat_simulator import CombatSimulator
+from engine.npc_memory import NPCMemory
+from engine.puzzle_cache import PuzzleTransitionCache
+from game_logic.action_memo import ActionOutcomeMemo
+from engine.npc_simulation import NPCSimulation
 # UIManager is already imported once at the top
 
 if __name__ == "__main__":
     ui_manager = UIManager() 
     api_key_manager = ApiKeyManager()
-    llm_interface = LLMInterface(api_key_manager) 
-    model_selector = ModelSelector(api_key_manager)
+    token_meter = TokenMeter(per_session_token_budget=None, per_turn_token_budget=12000) # Per-call records by response type, model and session
+    model_router = ModelRouter() # Fast models for per-turn calls, strong ones for world generation, with fallback
+    single_flight = SingleFlight() # Identical concurrent scene/codex/event requests share one backend call
+    llm_interface = LLMInterface(api_key_manager, token_meter=token_meter, model_router=model_router, single_flight=single_flight) 
+    model_selector = ModelSelector(api_key_manager, model_router=model_router, models_cache_ttl_s=300.0)
+    prompt_assembler = PromptAssembler() # Shared so prefix reuse is tracked across setup and gameplay prompts
     # AdventureSetup now requires llm_interface and model_selector
-    adventure_setup = AdventureSetup(ui_manager, llm_interface, model_selector) 
+    # Built offline by game_logic.world_template_builder; a close preference match skips world generation.
+    template_library = WorldTemplateLibrary(DEFAULT_TEMPLATE_LIBRARY_DIR)
+    adventure_setup = AdventureSetup(ui_manager, llm_interface, model_selector, prompt_assembler=prompt_assembler,
+                                     template_library=template_library) 
     gwhr = GWHR() # Instantiate GWHR
+    world_pipeline = WorldGenerationPipeline(adventure_setup) # Conception sections in parallel, first scene started early
+    image_cache = ImageCache(cache_dir=".cache/scene_images", max_bytes=20 * 1024 * 1024) # Revisited scenes reuse their image
+    image_pipeline = ImagePipeline(llm_interface, image_cache=image_cache, max_workers=2)
+    # Action outcomes often only tweak the previous scene, so they reuse images more eagerly than fresh scenes.
+    image_similarity_index = MinHashIndex(default_threshold=0.9, thresholds={'scene_after_action': 0.8})
+    response_validator = ResponseValidator(llm_interface, max_followups=1) # Repairs malformed JSON locally before re-asking
+    combat_resolver = CombatResolver() # Combat mechanics resolve locally; the LLM only narrates each turn
+    combat_simulator = CombatSimulator() # Pre-fight threat estimates and a balance check of generated NPCs
+    npc_memory = NPCMemory(llm_interface, prompt_assembler=prompt_assembler) # Bounded per-NPC memory, summarized in the background
+    puzzle_cache = PuzzleTransitionCache(cache_path=".cache/puzzle_transitions.json") # Known puzzle reactions replay without the LLM
+    action_memo = ActionOutcomeMemo(max_entries=512) # Repeat actions in an unchanged state skip the LLM and the image
+    npc_simulation = NPCSimulation() # NPCs drift, heal and wander each time unit; notable changes become dynamic events
+    action_prefetcher = ActionPrefetcher(llm_interface, max_concurrency=2, max_prefetch_per_scene=2, token_budget_per_scene=6000)
     game_engine = GameEngine()
     
     game_controller = GameController(
@@ -25,7 +62,19 @@ if __name__ == "__main__":
         model_selector=model_selector,
         adventure_setup=adventure_setup,
         gwhr=gwhr, # Pass GWHR to GameController
-        llm_interface=llm_interface # Add missing llm_interface
+        llm_interface=llm_interface, # Add missing llm_interface
+        prompt_assembler=prompt_assembler,
+        action_prefetcher=action_prefetcher, # Pre-generates likely action outcomes while the player reads
+        image_pipeline=image_pipeline, # Scene images generate in the background instead of blocking display
+        image_similarity_index=image_similarity_index, # Near-identical image prompts reuse a prior image
+        response_validator=response_validator,
+        world_pipeline=world_pipeline,
+        combat_resolver=combat_resolver,
+        combat_simulator=combat_simulator,
+        npc_memory=npc_memory,
+        puzzle_cache=puzzle_cache,
+        action_memo=action_memo,
+        npc_simulation=npc_simulation
     )
 
     ui_manager.display_message("Main: Starting application setup...", "info")
@@ -42,23 +91,39 @@ if __name__ == "__main__":
             if adventure_pref_text:
                 ui_manager.display_message(f"Main: Adventure preference set. Proceeding to Detailed Blueprint generation.", "info")
 
-                blueprint_generated = game_controller.generate_blueprint_flow()
-                if blueprint_generated:
-                    ui_manager.display_message("Main: Detailed World Blueprint generated. Proceeding to World Conception and GWHR init.", "info")
-
-                    world_initialized = game_controller.initialize_world_from_blueprint_flow()
-                    if world_initialized:
-                        ui_manager.display_message("Main: World Conception Document generated and GWHR successfully initialized.", "info")
-                        ui_manager.display_message("Main: System ready for Phase 5 (Basic Game Loop & Scene Presentation).", "info")
-                        # game_engine.start_game_loop() # Placeholder for actual game start - REMOVE THIS
-                        game_controller.start_game() # CALL NEW GAME CONTROLLER START
-                    else:
-                        ui_manager.display_message("Main: Failed to generate World Conception Document or initialize GWHR. Cannot proceed.", "error")
+                # Blueprint, conception sections and the first scene are generated as one pipeline.
+                world_initialized = game_controller.generate_world_flow()
+                if world_initialized:
+                    ui_manager.display_message("Main: World Conception Document generated and GWHR successfully initialized.", "info")
+                    ui_manager.display_message("Main: System ready for Phase 5 (Basic Game Loop & Scene Presentation).", "info")
+                    # game_engine.start_game_loop() # Placeholder for actual game start - REMOVE THIS
+                    game_controller.start_game() # CALL NEW GAME CONTROLLER START
+                    for response_type, usage in game_controller.get_token_usage_report().items():
+                        ui_manager.display_message(f"Main: Token usage - {response_type}: {usage['total_tokens']} tokens over {usage['calls']} call(s).", "info")
+                    image_stats = image_cache.get_stats()
+                    ui_manager.display_message(f"Main: Image cache - {image_stats['hits']} hit(s), {image_stats['misses']} miss(es), {image_stats['entries']} entries ({image_stats['total_bytes']} bytes).", "info")
+                    image_reuse = image_similarity_index.get_reuse_report()['_overall']
+                    ui_manager.display_message(f"Main: Image reuse - {image_reuse['reuses']}/{image_reuse['lookups']} image prompts served by a near-duplicate ({image_reuse['reuse_rate']:.0%}).", "info")
+                    repairs = response_validator.get_repair_report()['_overall']
+                    ui_manager.display_message(f"Main: Response repair - {repairs['repaired_locally']} fixed locally, {repairs['repaired_by_followup']} via follow-up, {repairs['failed']} unrepairable out of {repairs['responses']} response(s).", "info")
+                    loop_stats = game_controller.get_loop_stats()
+                    ui_manager.display_message(f"Main: Game loop - {loop_stats['actions']} action(s), {loop_stats['overhead_per_event_ms']:.2f} ms loop overhead per event.", "info")
+                    prefetch_stats = action_prefetcher.get_stats()
+                    ui_manager.display_message(f"Main: Action prefetch - {prefetch_stats['hits']}/{prefetch_stats['submitted']} speculative outcomes used, {prefetch_stats['diverged']} discarded on state divergence.", "info")
+                    puzzle_stats = puzzle_cache.get_stats()
+                    ui_manager.display_message(f"Main: Puzzle cache - {puzzle_stats['hits']} replayed, {puzzle_stats['authored']} authored, {puzzle_stats['misses']} LLM evaluation(s).", "info")
+                    memo_stats = action_memo.get_stats()
+                    ui_manager.display_message(f"Main: Action memo - {memo_stats['hits']}/{memo_stats['lookups']} outcomes replayed ({memo_stats['hit_rate']:.0%}), ~{memo_stats['saved_latency_s']:.1f}s of generation saved.", "info")
+                    memory_stats = npc_memory.get_stats()
+                    ui_manager.display_message(f"Main: NPC memory - {memory_stats['exchanges_summarized']} exchange(s) summarized in {memory_stats['refreshes']} background refresh(es) across {memory_stats['npcs_tracked']} NPC(s).", "info")
                 else:
-                    ui_manager.display_message("Main: Failed to generate the Detailed World Blueprint. Cannot proceed.", "error")
+                    ui_manager.display_message("Main: Failed to generate the world or initialize GWHR. Cannot proceed.", "error")
             else:
                 ui_manager.display_message("Main: Adventure preference setup failed. Cannot proceed to blueprint generation.", "error")
         else:
             ui_manager.display_message("Main: Model selection failed. Cannot proceed.", "error")
     else:
         ui_manager.display_message("Main: API Key is invalid. Cannot start game.", "error")
+    action_prefetcher.shutdown()
+    image_pipeline.shutdown()
+    npc_memory.shutdown()
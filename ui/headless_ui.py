@@ -0,0 +1,32 @@
+from ui.ui_manager import UIManager
+
+
+class HeadlessUIManager(UIManager):
+    # Non-interactive UIManager: every line of input is answered by a policy instead of a person, and
+    # rendering still goes through UIManager (callers redirect stdout to silence it). The policy is any
+    # object with next_line(kind, prompt_message, choices) -> str that raises EOFError when it is done,
+    # which the game loop treats exactly like a closed stdin.
+    interactive = False # The game loop reads commands synchronously instead of on a helper thread
+
+    def __init__(self, policy, on_command=None):
+        super().__init__()
+        self.policy = policy
+        self.on_command = on_command # Optional callback(commands so far) before each game loop command is read
+        self.current_choices: list = [] # Interaction menu of the last scene rendered
+        self.command_count = 0
+        self.lines_by_kind: dict[str, int] = {}
+
+    def display_scene(self, scene_data: dict):
+        self.current_choices = list(scene_data.get('interactive_elements') or [])
+        super().display_scene(scene_data)
+
+    def read_line(self, prompt_message: str = "", kind: str = 'command', choices: list | None = None) -> str:
+        if kind == 'command':
+            if self.on_command:
+                self.on_command(self.command_count)
+            choices = self.current_choices
+        line = self.policy.next_line(kind, prompt_message, choices or [])
+        if kind == 'command':
+            self.command_count += 1
+        self.lines_by_kind[kind] = self.lines_by_kind.get(kind, 0) + 1
+        return line
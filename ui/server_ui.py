@@ -0,0 +1,51 @@
+import queue
+from ui.ui_manager import UIManager
+
+# Lines a remote player never types: setup prompts are answered from the session's settings instead.
+SETUP_KINDS = ('api_key', 'model_choice', 'preference', 'continue')
+
+
+class ServerUIManager(UIManager):
+    # UIManager for one session hosted by the session server. The controller runs on the session's own
+    # thread; read_line hands the turn's output back to the waiting request and blocks until the next line
+    # arrives. Queue items are (line, reply) where reply(result) is called once the controller asks for
+    # input again (or the session ends); a line of None closes the session like a closed stdin.
+    interactive = False # The game loop reads commands synchronously on the session thread
+
+    def __init__(self, answers: dict | None = None, max_pending: int = 4):
+        super().__init__()
+        self.answers = dict(answers or {})
+        self.inbox: queue.Queue = queue.Queue(maxsize=max_pending) # Backpressure: put_nowait fails when full
+        self.output: list[str] = [] # Everything the session printed since the last reply
+        self.current_choices: list = []
+        self.last_scene: dict | None = None
+        self._reply = None # Reply callback of the line being processed
+
+    def display_scene(self, scene_data: dict):
+        self.current_choices = list(scene_data.get('interactive_elements') or [])
+        self.last_scene = {'scene_id': scene_data.get('scene_id'), 'narrative': scene_data.get('narrative'),
+                           'background_image_url': scene_data.get('background_image_url')}
+        super().display_scene(scene_data)
+
+    def take_output(self) -> str:
+        text, self.output = "".join(self.output), []
+        return text
+
+    def finish_turn(self, result: dict):
+        # Sends result (plus the output so far) to whoever is waiting on the line just processed.
+        reply, self._reply = self._reply, None
+        if reply:
+            reply(dict(result, output=self.take_output()))
+
+    def read_line(self, prompt_message: str = "", kind: str = 'command', choices: list | None = None) -> str:
+        if kind in SETUP_KINDS:
+            return self.answers.get(kind, "")
+        if kind == 'command':
+            choices = self.current_choices
+        self.finish_turn({'ended': False, 'kind': kind, 'prompt': prompt_message,
+                          'choices': [{'id': c.get('id'), 'name': c.get('name')} if isinstance(c, dict) else str(c) for c in (choices or [])],
+                          'scene': self.last_scene})
+        line, self._reply = self.inbox.get()
+        if line is None:
+            raise EOFError("session closed")
+        return line
@@ -1,13 +1,27 @@
 class UIManager:
+    IMAGE_PLACEHOLDER_URL = "https://via.placeholder.com/800x600.png?text=Loading+scene"
+    interactive = True # Input blocks on a person; the game loop reads it on a helper thread
+
     def __init__(self):
         self.current_background_image_url: str | None = None
 
+    def read_line(self, prompt_message: str = "", kind: str = 'command', choices: list | None = None) -> str:
+        # Every line of player input goes through here. kind says what is being asked for ('command',
+        # 'choice', 'free_text', 'menu', 'codex', 'continue', 'model_choice', 'preference', 'api_key') and
+        # choices lists the options when there are any, so a non-interactive adapter can answer without a person.
+        return input(prompt_message)
+
     def show_image_loading_indicator(self):
         print("\n[UI IMAGE]: --- Loading scene image ---")
 
     def hide_image_loading_indicator(self):
         print("[UI IMAGE]: --- Image loading attempt complete ---")
 
+    def update_background_image(self, image_url: str):
+        # Swaps in an image that finished generating after its scene was displayed.
+        self.current_background_image_url = image_url
+        print(f"\n[UI IMAGE]: Scene image ready, now displaying: {image_url}")
+
     def show_api_key_screen(self):
         print("UI: Please enter your API Key: ")
 
@@ -23,7 +37,7 @@ class UIManager:
         for i, model_name in enumerate(models):
             print(f"  {i+1}: {model_name}")
         
-        choice = input("UI: Select a model by number (or press Enter to skip): ")
+        choice = self.read_line("UI: Select a model by number (or press Enter to skip): ", kind='model_choice', choices=models)
 
         if not choice:
             print("UI: No model selected.")
@@ -41,7 +55,7 @@ class UIManager:
             return None
 
     def show_adventure_preference_screen(self) -> str:
-        preference = input("UI: Describe your desired adventure theme/setting: ")
+        preference = self.read_line("UI: Describe your desired adventure theme/setting: ", kind='preference')
         return preference.strip()
 
     def display_scene(self, scene_data: dict):
@@ -55,6 +69,11 @@ class UIManager:
             print(f"[UI IMAGE]: Displaying image from: {self.current_background_image_url}")
             print("[UI IMAGE]: (Imagine a beautiful, contextually relevant image is displayed here, setting the scene visually.)")
             print("="*45 + "\n")
+        elif scene_data.get('background_image_pending'): # New image still generating in the background
+            if self.current_background_image_url:
+                print(f"[UI IMAGE]: Keeping previous image while the new one loads: {self.current_background_image_url}")
+            else:
+                print(f"[UI IMAGE]: Displaying placeholder while the scene image loads: {self.IMAGE_PLACEHOLDER_URL}")
         elif self.current_background_image_url: # No new image, but there was an old one
             print("\n[UI IMAGE]: (Previous scene image fades or is removed. No new image for this view.)\n")
             self.current_background_image_url = None
@@ -144,7 +163,7 @@ class UIManager:
                 
         print(f"\nLocation: {player_data.get('current_location_id', 'Unknown')}")
         print("\n" + "="*48)
-        input("--- Press Enter to close ---")
+        self.read_line("--- Press Enter to close ---", kind='continue')
 
     def display_inventory_screen(self, inventory_list: list):
         print("\n" + "="*15 + " INVENTORY " + "="*15 + "\n")
@@ -156,7 +175,7 @@ class UIManager:
                 if item.get('description'): 
                     print(f"    '{item.get('description')}'")
         print("\n" + "="*39)
-        input("--- Press Enter to close ---")
+        self.read_line("--- Press Enter to close ---", kind='continue')
 
     def display_equipment_screen(self, equipment_slots: dict, inventory_list: list):
         print("\n" + "="*15 + " EQUIPMENT " + "="*15 + "\n")
@@ -173,7 +192,7 @@ class UIManager:
                         item_name = str(item_id_or_obj) if not isinstance(item_id_or_obj, dict) else item_id_or_obj.get('name', 'Unknown Equipped Item')
                 print(f"  {slot.capitalize()}: {item_name}")
         print("\n" + "="*41) # Length of " EQUIPMENT " + 2*15 + 2 = 11+30+2 = 43. Matches roughly.
-        input("--- Press Enter to close ---")
+        self.read_line("--- Press Enter to close ---", kind='continue')
 
     def display_codex_entry_content(self, entry_title: str, entry_content: str, entry_source_type: str, entry_source_detail: str):
         header = f"--- Codex: {entry_title} ---"
@@ -181,7 +200,7 @@ class UIManager:
         print(f"Content: {entry_content}")
         print(f"Source: Discovered via {entry_source_type} from '{entry_source_detail}'.")
         print("-" * len(header))
-        input("--- Press Enter to close entry ---")
+        self.read_line("--- Press Enter to close entry ---", kind='continue')
 
     def display_knowledge_codex_ui(self, codex_entries: dict) -> tuple[str, str | None] | None:
         header = "="*15 + " KNOWLEDGE CODEX " + "="*15
@@ -190,7 +209,7 @@ class UIManager:
         if not codex_entries or not isinstance(codex_entries, dict) or not codex_entries:
             print("  (No knowledge entries discovered yet.)")
             # Wait for input before returning to prevent instant loop if called from menu
-            input("--- Press Enter to return to menu ---") 
+            self.read_line("--- Press Enter to return to menu ---", kind='continue')
             return ('show_codex_again', None) # Or 'close_menu' depending on desired flow
 
         entries_list = list(codex_entries.values()) 
@@ -198,7 +217,7 @@ class UIManager:
             print(f"  {i+1}. {entry.get('title', 'Untitled Entry')}")
         print("  0. Exit Codex")
         
-        choice_str = input("\nSelect an entry to read (number) or 0 to exit: ").strip()
+        choice_str = self.read_line("\nSelect an entry to read (number) or 0 to exit: ", kind='codex', choices=entries_list).strip()
         
         try:
             choice_num = int(choice_str)
@@ -231,7 +250,7 @@ class UIManager:
         print("  4. Knowledge Codex") # New Option
         print("  0. Close Menu")
         
-        choice = input("Select an option: ").strip()
+        choice = self.read_line("Select an option: ", kind='menu').strip()
 
         if choice == '1':
             self.display_character_status_screen(player_state_data)
@@ -287,10 +306,10 @@ class UIManager:
         # (e.g., proceed, or call get_free_text_input if that's the flow)
 
     def get_free_text_input(self, prompt_message: str) -> str:
-        user_input = input(f"\n{prompt_message} ").strip()
+        user_input = self.read_line(f"\n{prompt_message} ", kind='free_text').strip()
         return user_input
 
-    def show_combat_interface(self, player_hp: int, player_max_hp: int, combatants_info: list):
+    def show_combat_interface(self, player_hp: int, player_max_hp: int, combatants_info: list, threat_estimate: dict | None = None):
         print("\n" + "="*20 + " COMBAT " + "="*20 + "\n")
         print(f"Player HP: {player_hp}/{player_max_hp}")
         print("--- Opponents ---")
@@ -299,6 +318,13 @@ class UIManager:
         else:
             for npc_info in combatants_info:
                 print(f"  - {npc_info.get('name', 'Unknown Combatant')} HP: {npc_info.get('hp', '?')}/{npc_info.get('max_hp', '?')}")
+        if threat_estimate: # Pre-fight Monte Carlo estimate (CombatSimulator.threat_estimate)
+            turns_to_win = threat_estimate.get('expected_turns_to_win')
+            print(f"--- Threat: {threat_estimate.get('threat', 'unknown').upper()} ---")
+            print(f"  Win chance ~{threat_estimate.get('win_probability', 0):.0%}"
+                  + (f", about {turns_to_win:.1f} turns" if turns_to_win else "")
+                  + f", expected HP loss ~{threat_estimate.get('hp_loss', {}).get('mean', 0):.0f}"
+                  + f" (worst 10%: {threat_estimate.get('hp_loss', {}).get('p90', 0):.0f}+)")
         # Note: Player actions/strategies will be displayed separately by present_combat_strategies
 
     def display_combat_narrative(self, text: str):
@@ -335,10 +361,12 @@ class UIManager:
             print("You have been defeated.")
         elif victor == 'draw':
             print("The battle ends in a draw.")
+        elif victor == 'fled':
+            print("You escaped the battle.")
         else: # Covers None or other unexpected victor strings
             print(f"Combat finished. Victor: {victor if victor else 'Undetermined'}")
         print("="*46) # Matches header length roughly
-        input("\n--- Press Enter to continue ---")
+        self.read_line("\n--- Press Enter to continue ---", kind='continue')
 
     def display_narrative(self, text: str):
         print("\n" + "-"*10 + " NARRATIVE UPDATE " + "-"*10 + "\n")
@@ -354,7 +382,7 @@ class UIManager:
         prompt_message = "Choose an action by number (1-{}): ".format(len(choices))
         
         while True:
-            action_input = input(prompt_message).strip()
+            action_input = self.read_line(prompt_message, kind='choice', choices=choices).strip()
             try:
                 selected_index = int(action_input) - 1
                 if 0 <= selected_index < len(choices):